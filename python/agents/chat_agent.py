@@ -37,7 +37,7 @@ from langgraph.prebuilt import ToolNode
 from langgraph.types import interrupt
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
+from lib.provider_clients import get_chat_model
 from langgraph.checkpoint.redis import AsyncRedisSaver
 import asyncio
 from dotenv import load_dotenv
@@ -87,7 +87,7 @@ class ChatState(MessagesState):
 # LLM INSTANCES
 # ============================================================
 # Main agent model (streaming enabled for better UX)
-_base_llm = ChatOpenAI(
+_base_llm = get_chat_model(
     model="openai/gpt-oss-120b",
     api_key=GROQ_API_KEY,
     base_url="https://api.groq.com/openai/v1",
@@ -96,7 +96,7 @@ _base_llm = ChatOpenAI(
 )
 
 # Summarization LLM - Groq Llama 3.1 8B (cheapest, fast for simple task)
-summarization_llm = ChatOpenAI(
+summarization_llm = get_chat_model(
     model="llama-3.1-8b-instant",
     api_key=GROQ_API_KEY,
     base_url="https://api.groq.com/openai/v1",
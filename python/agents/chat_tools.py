@@ -17,13 +17,13 @@ from pathlib import Path
 from typing import Optional, List
 from langchain_core.tools import tool
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
+from lib.provider_clients import get_chat_model
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Import from existing modules
-from retrieval import retrieve_context_with_sources
+from retrieval import aretrieve_context_with_sources
 from ingestion_workflow import get_neo4j_driver
 
 
@@ -60,7 +60,7 @@ def get_user_context_from_config(config: RunnableConfig) -> tuple[Optional[str],
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 # Lightweight LLM for Cypher generation
-cypher_llm = ChatOpenAI(
+cypher_llm = get_chat_model(
     model="llama-3.1-8b-instant",
     api_key=GROQ_API_KEY,
     base_url="https://api.groq.com/openai/v1",
@@ -106,7 +106,7 @@ CRITICAL RULES:
 # TOOL: SEARCH DOCUMENTS (Hybrid RAG)
 # ============================================================
 @tool
-def search_documents(query: str, config: RunnableConfig) -> str:
+async def search_documents(query: str, config: RunnableConfig) -> str:
     """
     Search document content using semantic + keyword hybrid search.
 
@@ -129,7 +129,7 @@ def search_documents(query: str, config: RunnableConfig) -> str:
 
     print(f"🔍 search_documents: query='{query[:50]}...', user={user_id}, doc={doc_id}")
 
-    context, sources = retrieve_context_with_sources(
+    context, sources = await aretrieve_context_with_sources(
         query_text=query,
         user_id=user_id,
         doc_id=doc_id,
@@ -297,6 +297,33 @@ def format_cypher_results(question: str, records: List[dict]) -> str:
     return f"Found {len(records)} results:\n" + "\n".join(result_lines)
 
 
+# Fallback structure queries (used when Text2Cypher fails)
+DOCUMENT_STRUCTURE_QUERY = """
+MATCH (u:User {id: $user_id})-[:UPLOADED]->(d:Document {documentId: $doc_id})
+OPTIONAL MATCH (d)-[:HAS_CHAPTER]->(c:Chapter)
+OPTIONAL MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+WITH d,
+     collect(DISTINCT c.title) AS chapters,
+     collect(DISTINCT cb.chapter_title) AS content_chapters,
+     count(DISTINCT cb) AS block_count
+RETURN d.title AS document,
+       d.documentId AS doc_id,
+       chapters,
+       content_chapters,
+       block_count
+"""
+
+USER_DOCUMENTS_QUERY = """
+MATCH (u:User {id: $user_id})-[:UPLOADED]->(d:Document)
+OPTIONAL MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+WITH d, count(DISTINCT cb) AS block_count
+RETURN d.title AS document,
+       d.documentId AS doc_id,
+       block_count
+ORDER BY d.title
+"""
+
+
 def fallback_structure_query(user_id: str, doc_id: Optional[str] = None, error_context: Optional[str] = None) -> str:
     """Fallback when Text2Cypher fails - return basic structure with context."""
     driver = get_neo4j_driver()
@@ -305,31 +332,10 @@ def fallback_structure_query(user_id: str, doc_id: Optional[str] = None, error_c
         with driver.session() as session:
             if doc_id:
                 # Query for specific document structure
-                result = session.run("""
-                    MATCH (u:User {id: $user_id})-[:UPLOADED]->(d:Document {documentId: $doc_id})
-                    OPTIONAL MATCH (d)-[:HAS_CHAPTER]->(c:Chapter)
-                    OPTIONAL MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
-                    WITH d,
-                         collect(DISTINCT c.title) AS chapters,
-                         collect(DISTINCT cb.chapter_title) AS content_chapters,
-                         count(DISTINCT cb) AS block_count
-                    RETURN d.title AS document,
-                           d.documentId AS doc_id,
-                           chapters,
-                           content_chapters,
-                           block_count
-                """, user_id=user_id, doc_id=doc_id)
+                result = session.run(DOCUMENT_STRUCTURE_QUERY, user_id=user_id, doc_id=doc_id)
             else:
                 # Query all documents
-                result = session.run("""
-                    MATCH (u:User {id: $user_id})-[:UPLOADED]->(d:Document)
-                    OPTIONAL MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
-                    WITH d, count(DISTINCT cb) AS block_count
-                    RETURN d.title AS document,
-                           d.documentId AS doc_id,
-                           block_count
-                    ORDER BY d.title
-                """, user_id=user_id)
+                result = session.run(USER_DOCUMENTS_QUERY, user_id=user_id)
 
             records = [dict(r) for r in result]
 
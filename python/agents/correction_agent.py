@@ -7,7 +7,7 @@ This agent:
 3. Calculates Bloom's taxonomy and difficulty breakdowns
 4. Generates detailed feedback and recommendations
 """
-from langchain_openai import ChatOpenAI
+from lib.provider_clients import get_chat_model
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
@@ -18,7 +18,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Kimi-K2-Thinking via DeepInfra
-llm = ChatOpenAI(
+llm = get_chat_model(
     model="moonshotai/Kimi-K2-Thinking",
     base_url="https://api.deepinfra.com/v1/openai",
     api_key=os.getenv("DEEPINFRA_API_KEY"),
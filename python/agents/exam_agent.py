@@ -1,5 +1,5 @@
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
-from langchain_openai import ChatOpenAI
+from lib.provider_clients import get_chat_model
 from langgraph.graph import StateGraph, END, MessagesState
 from langgraph.checkpoint.redis import RedisSaver
 from dotenv import load_dotenv
@@ -304,7 +304,7 @@ def preload_first_question(qp_id: str) -> tuple[dict, int]:
 
 tools = [advance_to_next_question, search_conversation_history, get_rules, emit_thinking, get_time_remaining]
 # Using Groq GPT OSS 120B for superior reasoning
-llm = ChatOpenAI(
+llm = get_chat_model(
     model="openai/gpt-oss-120b",
     api_key=GROQ_API_KEY,
     base_url="https://api.groq.com/openai/v1",
@@ -473,7 +473,7 @@ def summarization_node(state: State) -> dict:
     convo_text = "\n".join(convo_lines)
 
     # Use Groq Llama 3.1 8B for fast, cheap summarization (9x faster than DeepInfra)
-    summary_llm = ChatOpenAI(
+    summary_llm = get_chat_model(
         model="llama-3.1-8b-instant",
         api_key=GROQ_API_KEY,
         base_url="https://api.groq.com/openai/v1",
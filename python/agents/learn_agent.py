@@ -18,7 +18,7 @@ Flow:
 """
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+from lib.provider_clients import get_chat_model
 from langgraph.graph import StateGraph, END, MessagesState
 from langgraph.checkpoint.redis import RedisSaver
 from dotenv import load_dotenv
@@ -191,7 +191,7 @@ def fetch_document_topics(doc_id: str) -> dict:
     Returns:
         dict with 'found' (bool), 'topics' (list of strings), and 'message' (str)
     """
-    from neo4j import GraphDatabase
+    from lib.neo4j_pool import get_driver
 
     neo4j_uri = os.getenv("NEO4J_URI")
     neo4j_user = os.getenv("NEO4J_USER")
@@ -212,11 +212,10 @@ def fetch_document_topics(doc_id: str) -> dict:
     """
 
     try:
-        driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        driver = get_driver(neo4j_uri, neo4j_user, neo4j_password)
         with driver.session() as session:
             result = session.run(query, doc_id=doc_id)
             topics = [r["topic"] for r in result]
-        driver.close()
 
         if topics:
             return {
@@ -249,7 +248,7 @@ def fetch_topic_content(doc_id: str, topic_name: str) -> dict:
     Returns:
         dict with 'found' (bool), 'topic' (dict with name, content, key_concepts, pages)
     """
-    from neo4j import GraphDatabase
+    from lib.neo4j_pool import get_driver
 
     neo4j_uri = os.getenv("NEO4J_URI")
     neo4j_user = os.getenv("NEO4J_USER")
@@ -266,11 +265,10 @@ def fetch_topic_content(doc_id: str, topic_name: str) -> dict:
     """
 
     try:
-        driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        driver = get_driver(neo4j_uri, neo4j_user, neo4j_password)
         with driver.session() as session:
             result = session.run(query, doc_id=doc_id, topic_name=topic_name)
             blocks = list(result)
-        driver.close()
 
         if not blocks:
             return {"found": False, "message": f"No content found for '{topic_name}'"}
@@ -300,7 +298,7 @@ def fetch_topic_content(doc_id: str, topic_name: str) -> dict:
 def extract_key_concepts(content: str, max_concepts: int = 7) -> List[str]:
     """Extract key concepts from content using fast LLM."""
     try:
-        concept_llm = ChatOpenAI(
+        concept_llm = get_chat_model(
             model="llama-3.1-8b-instant",
             api_key=GROQ_API_KEY,
             base_url="https://api.groq.com/openai/v1",
@@ -326,7 +324,7 @@ Key concepts:"""
 
 
 @tool
-def search_document_content(query: str, doc_id: str, user_id: str) -> str:
+async def search_document_content(query: str, doc_id: str, user_id: str) -> str:
     """
     Search the full document for relevant content using hybrid search.
     Use when student asks about something not in current topic.
@@ -339,10 +337,10 @@ def search_document_content(query: str, doc_id: str, user_id: str) -> str:
     Returns:
         Relevant passages with page references
     """
-    from retrieval import retrieve_context_with_sources
+    from retrieval import aretrieve_context_with_sources
 
     try:
-        context, sources = retrieve_context_with_sources(
+        context, sources = await aretrieve_context_with_sources(
             query_text=query,
             user_id=user_id,
             doc_id=doc_id,
@@ -578,7 +576,7 @@ tools = [
 ]
 
 # Main LLM
-llm = ChatOpenAI(
+llm = get_chat_model(
     model="openai/gpt-oss-120b",
     api_key=GROQ_API_KEY,
     base_url="https://api.groq.com/openai/v1",
@@ -737,7 +735,7 @@ def summarization_node(state: LearnState) -> dict:
 
     convo_text = "\n".join(convo_lines)
 
-    summary_llm = ChatOpenAI(
+    summary_llm = get_chat_model(
         model="llama-3.1-8b-instant",
         api_key=GROQ_API_KEY,
         base_url="https://api.groq.com/openai/v1",
@@ -1016,7 +1014,7 @@ def ground_and_respond_node(state: LearnState) -> dict:
     topic_content = (state.get("current_topic_content") or state.get("current_topic") or {}).get("content", "")[:500]
     original_query = state.get("search_query", "the question")
 
-    grounding_llm = ChatOpenAI(
+    grounding_llm = get_chat_model(
         model="llama-3.1-8b-instant",
         api_key=GROQ_API_KEY,
         base_url="https://api.groq.com/openai/v1",
@@ -1109,7 +1107,7 @@ def check_if_session_complete(state: LearnState) -> Literal["cleanup", "__end__"
 
 def generate_session_summary(state: LearnState) -> LearnSessionSummary:
     """Generate LLM summary from session conversation."""
-    summary_llm = ChatOpenAI(
+    summary_llm = get_chat_model(
         model="llama-3.1-8b-instant",
         api_key=GROQ_API_KEY,
         base_url="https://api.groq.com/openai/v1",
@@ -45,6 +45,34 @@ async def initialize_chat_graph():
     get_chat_graph()  # Lazy init with AsyncRedisSaver
     print("✅ Chat graph initialized")
 
+
+# Neo4j connection pools: verify once at startup, close cleanly on shutdown
+@app.on_event("startup")
+async def warm_up_neo4j():
+    """Open the shared Neo4j pools so the first request doesn't pay the handshake."""
+    from lib.neo4j_pool import warm_up, awarm_up
+
+    await asyncio.to_thread(warm_up)
+    await awarm_up()
+
+
+@app.on_event("shutdown")
+async def close_neo4j():
+    """Close shared Neo4j drivers."""
+    from lib.neo4j_pool import close_all, aclose_all
+
+    await aclose_all()
+    close_all()
+
+
+@app.on_event("shutdown")
+async def close_provider_clients():
+    """Close shared LLM / OCR HTTP pools."""
+    from lib import provider_clients
+
+    await provider_clients.aclose_all()
+    provider_clients.close_all()
+
 # Middleware for auth on /chat/ endpoints
 @app.middleware("http")
 async def verify_chat_request(request: Request, call_next):
@@ -178,8 +206,7 @@ async def get_presigned_upload_url(request_data: PresignRequest, user: dict = De
     Returns the upload URL and file key for subsequent ingestion.
     Requires authentication.
     """
-    import boto3
-    from botocore.client import Config
+    from lib import r2_storage
     import time
 
     user_id = user.get("sub")
@@ -190,26 +217,8 @@ async def get_presigned_upload_url(request_data: PresignRequest, user: dict = De
     timestamp = int(time.time() * 1000)
     file_key = f"uploads/{user_id}/{timestamp}_{filename}"
 
-    # Create R2 client
-    r2 = boto3.client(
-        's3',
-        region_name='auto',
-        endpoint_url=os.environ['R2_ENDPOINT'],
-        aws_access_key_id=os.environ['R2_ACCESS_KEY_ID'],
-        aws_secret_access_key=os.environ['R2_SECRET_ACCESS_KEY'],
-        config=Config(signature_version='s3v4'),
-    )
-
-    # Generate presigned PUT URL (5 minute expiry)
-    upload_url = r2.generate_presigned_url(
-        'put_object',
-        Params={
-            'Bucket': os.environ['R2_BUCKET'],
-            'Key': file_key,
-            'ContentType': content_type,
-        },
-        ExpiresIn=300  # 5 minutes
-    )
+    # Generate presigned PUT URL (5 minute expiry) with the shared R2 client
+    upload_url = r2_storage.presign_put(file_key, content_type, expires_in=300)
 
     return {
         "success": True,
@@ -226,9 +235,8 @@ async def delete_document(document_id: str, user: dict = Depends(verify_token)):
     Postgres deletion is handled by the Next.js server action.
     Requires authentication.
     """
-    import boto3
-    from botocore.client import Config
-    from neo4j import GraphDatabase
+    from lib import r2_storage
+    from lib.neo4j_pool import get_driver
 
     user_id = user.get("sub")
 
@@ -246,7 +254,7 @@ async def delete_document(document_id: str, user: dict = Depends(verify_token)):
         neo4j_password = os.getenv("NEO4J_PASSWORD")
 
         if neo4j_uri and neo4j_user and neo4j_password:
-            driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+            driver = get_driver(neo4j_uri, neo4j_user, neo4j_password)
             with driver.session() as session:
                 # Delete document and all related nodes (ContentBlocks, Questions)
                 result = session.run("""
@@ -259,7 +267,6 @@ async def delete_document(document_id: str, user: dict = Depends(verify_token)):
                 record = result.single()
                 deleted = record["deleted_docs"] if record else 0
                 print(f"✅ Neo4j: Deleted document and related nodes (docs: {deleted})")
-            driver.close()
         else:
             print("⚠️  Neo4j credentials not configured, skipping")
     except Exception as e:
@@ -268,21 +275,7 @@ async def delete_document(document_id: str, user: dict = Depends(verify_token)):
 
     # 2. Delete from R2 (both document file and extracted images)
     try:
-        r2_endpoint = os.getenv("R2_ENDPOINT")
-        r2_access_key = os.getenv("R2_ACCESS_KEY_ID")
-        r2_secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
-        r2_bucket = os.getenv("R2_BUCKET")
-
-        if r2_endpoint and r2_access_key and r2_secret_key and r2_bucket:
-            r2 = boto3.client(
-                's3',
-                region_name='auto',
-                endpoint_url=r2_endpoint,
-                aws_access_key_id=r2_access_key,
-                aws_secret_access_key=r2_secret_key,
-                config=Config(signature_version='s3v4'),
-            )
-
+        if r2_storage.is_configured():
             # List and delete all objects with this document's prefix
             # Documents are stored as: uploads/{user_id}/... and documents/{doc_id}/images/...
             prefixes_to_delete = [
@@ -291,13 +284,7 @@ async def delete_document(document_id: str, user: dict = Depends(verify_token)):
 
             total_deleted = 0
             for prefix in prefixes_to_delete:
-                paginator = r2.get_paginator('list_objects_v2')
-                for page in paginator.paginate(Bucket=r2_bucket, Prefix=prefix):
-                    objects = page.get('Contents', [])
-                    if objects:
-                        delete_keys = [{'Key': obj['Key']} for obj in objects]
-                        r2.delete_objects(Bucket=r2_bucket, Delete={'Objects': delete_keys})
-                        total_deleted += len(delete_keys)
+                total_deleted += r2_storage.delete_prefix(prefix)
 
             print(f"✅ R2: Deleted {total_deleted} objects")
         else:
@@ -322,6 +309,10 @@ async def delete_document(document_id: str, user: dict = Depends(verify_token)):
     except Exception as e:
         print(f"⚠️  Redis cleanup failed (non-critical): {e}")
 
+    # 4. Drop cached vectors (after the Redis cleanup so the new version key survives)
+    from lib.vector_cache import invalidate_document
+    invalidate_document(document_id)
+
     print(f"{'='*60}\n")
 
     if errors:
@@ -343,8 +334,7 @@ async def get_document_url(document_id: str, user: dict = Depends(verify_token))
     Get a presigned URL for viewing a document.
     Requires authentication and document ownership verification.
     """
-    import boto3
-    from botocore.client import Config
+    from lib import r2_storage
     from supabase import create_client
 
     user_id = user.get("sub")
@@ -374,32 +364,11 @@ async def get_document_url(document_id: str, user: dict = Depends(verify_token))
 
     # Generate presigned URL
     try:
-        r2_endpoint = os.getenv("R2_ENDPOINT")
-        r2_access_key = os.getenv("R2_ACCESS_KEY_ID")
-        r2_secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
-        r2_bucket = os.getenv("R2_BUCKET")
-
-        if not all([r2_endpoint, r2_access_key, r2_secret_key, r2_bucket]):
+        if not r2_storage.is_configured():
             return {"success": False, "error": "R2 not configured"}
 
-        r2 = boto3.client(
-            's3',
-            region_name='auto',
-            endpoint_url=r2_endpoint,
-            aws_access_key_id=r2_access_key,
-            aws_secret_access_key=r2_secret_key,
-            config=Config(signature_version='s3v4'),
-        )
-
         # Generate presigned URL valid for 1 hour
-        url = r2.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': r2_bucket,
-                'Key': file_key,
-            },
-            ExpiresIn=3600  # 1 hour
-        )
+        url = r2_storage.presign_get(file_key, expires_in=3600)
 
         return {
             "success": True,
@@ -414,17 +383,30 @@ async def get_document_url(document_id: str, user: dict = Depends(verify_token))
 
 
 @app.post("/documents/{document_id}/retry")
-async def retry_document_ingestion(document_id: str, user: dict = Depends(verify_token)):
+async def retry_document_ingestion(
+    document_id: str,
+    rerun: Optional[str] = None,
+    user: dict = Depends(verify_token)
+):
     """
     Retry ingestion for a failed document.
     Resets status to PROCESSING and re-queues the Celery task.
+    The retry resumes from the last checkpointed phase; pass
+    ?rerun=hierarchy (comma-separated, or "all") to force phases to run again.
     Requires authentication.
     """
     from tasks.ingestion import ingest_document
+    from lib.ingestion_checkpoint import expand_force
     from supabase import create_client
 
     user_id = user.get("sub")
 
+    force_phases = [name.strip() for name in rerun.split(",")] if rerun else None
+    try:
+        expand_force(force_phases)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
     print(f"\n{'='*60}")
     print(f"🔄 Retrying ingestion for document: {document_id}")
     print(f"User: {user_id}")
@@ -469,7 +451,7 @@ async def retry_document_ingestion(document_id: str, user: dict = Depends(verify
         }).eq("id", document_id).execute()
 
         # Queue the ingestion task
-        task = ingest_document.delay(document_id, user_id, file_key)
+        task = ingest_document.delay(document_id, user_id, file_key, force_phases=force_phases)
 
         print(f"✅ Ingestion re-queued with task ID: {task.id}")
 
@@ -9,6 +9,7 @@ Usage:
     Start worker: celery -A celery_app worker --loglevel=info
 """
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 from dotenv import load_dotenv
 import os
 
@@ -48,6 +49,26 @@ celery_app.conf.update(
     worker_concurrency=2,  # 2 workers for ingestion tasks
 )
 
+
+# Shared Neo4j pool per worker process (drivers must not be inherited across fork)
+@worker_process_init.connect
+def init_neo4j_pool(**kwargs):
+    from lib.neo4j_pool import warm_up
+    warm_up()
+
+
+@worker_process_shutdown.connect
+def close_neo4j_pool(**kwargs):
+    from lib.neo4j_pool import close_all
+    close_all()
+
+
+@worker_process_shutdown.connect
+def close_provider_clients(**kwargs):
+    from lib import provider_clients
+    provider_clients.close_all()
+
+
 # NOTE: Add task routing when you need to scale different task types independently
 # celery_app.conf.task_routes = {
 #     "tasks.ingestion.*": {"queue": "ingestion"},
@@ -0,0 +1,242 @@
+"""
+Retrieval Candidate Generation Benchmark
+
+Measures vector-leg recall and latency of the user-scoped hybrid retrieval
+as the number of tenants sharing the vector index grows. Compares the
+candidate modes in retrieval.py:
+
+- global:   global top ($limit * 3) ANN hits, then filter to the user (legacy)
+- exact:    cosine-score only the user's own blocks
+- adaptive: over-fetch the global index, widening until enough in-scope hits
+- auto:     exact for small scopes, adaptive for large ones
+
+Seeds synthetic tenants (User -> Document -> ContentBlock with clustered
+random embeddings, so tenants compete for the same neighbourhoods) into the
+configured Neo4j, then for each tenant count runs random queries and compares
+each mode's top-k against the exact per-tenant top-k computed with numpy.
+
+Requires a Neo4j with contentBlockEmbeddingIdx + contentBlockFulltextIdx
+(python setup_vector_index.py). Use a dev database - benchmark nodes are
+prefixed "bench-" and removed at the end unless --keep is given.
+
+Usage:
+    python evaluation/retrieval_benchmark.py
+    python evaluation/retrieval_benchmark.py --tenants 1,10,50,100 --blocks-per-tenant 200
+    python evaluation/retrieval_benchmark.py --modes global,auto --queries 50
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from ingestion_workflow import get_neo4j_driver
+from retrieval import CANDIDATE_MODES, _run_retrieval
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+RESULTS_DIR = Path(__file__).parent / "results"
+EMBED_DIM = 1536                    # text-embedding-3-small
+BENCH_PREFIX = "bench-"
+NO_MATCH_QUERY = "zzqxbenchnomatch"  # Keeps the keyword leg empty -> pure vector ranking
+WRITE_BATCH = 500
+
+
+# =============================================================================
+# Synthetic Data
+# =============================================================================
+
+def make_embeddings(rng: np.random.Generator, centroids: np.ndarray, n: int, noise: float) -> np.ndarray:
+    """Unit vectors scattered around randomly chosen topic centroids."""
+    topics = rng.integers(0, len(centroids), size=n)
+    vecs = centroids[topics] + noise * rng.standard_normal((n, EMBED_DIM))
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def seed_tenant(session, tenant: int, embeddings: np.ndarray) -> None:
+    """Create one benchmark user with a single document holding the given blocks."""
+    user_id = f"{BENCH_PREFIX}user-{tenant}"
+    doc_id = f"{BENCH_PREFIX}doc-{tenant}"
+
+    session.run(
+        """
+        MERGE (u:User {id: $user_id})
+        MERGE (d:Document {documentId: $doc_id})
+        SET d.title = $doc_id
+        MERGE (u)-[:UPLOADED]->(d)
+        """,
+        user_id=user_id, doc_id=doc_id,
+    ).consume()
+
+    rows = [
+        {"block_id": f"{doc_id}::block::{i}", "embedding": vec.tolist()}
+        for i, vec in enumerate(embeddings)
+    ]
+    for start in range(0, len(rows), WRITE_BATCH):
+        session.run(
+            """
+            MATCH (d:Document {documentId: $doc_id})
+            UNWIND $rows AS row
+            CREATE (cb:ContentBlock {
+                block_id: row.block_id,
+                embedding: row.embedding,
+                combined_context: 'benchmark block',
+                text_content: 'benchmark block'
+            })
+            CREATE (d)-[:HAS_CONTENT_BLOCK]->(cb)
+            """,
+            doc_id=doc_id, rows=rows[start:start + WRITE_BATCH],
+        ).consume()
+
+
+def cleanup(session) -> None:
+    """Remove every benchmark node."""
+    session.run(
+        f"""
+        MATCH (d:Document) WHERE d.documentId STARTS WITH '{BENCH_PREFIX}'
+        OPTIONAL MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+        DETACH DELETE cb, d
+        """
+    ).consume()
+    session.run(
+        f"MATCH (u:User) WHERE u.id STARTS WITH '{BENCH_PREFIX}' DETACH DELETE u"
+    ).consume()
+
+
+# =============================================================================
+# Measurement
+# =============================================================================
+
+def exact_top_k(tenant_vecs: np.ndarray, tenant: int, qvec: np.ndarray, k: int) -> List[str]:
+    """Ground truth: the tenant's k nearest blocks by cosine."""
+    scores = tenant_vecs @ qvec
+    order = np.argsort(-scores)[:k]
+    return [f"{BENCH_PREFIX}doc-{tenant}::block::{i}" for i in order]
+
+
+def run_level(driver, tenant_vectors: Dict[int, np.ndarray], centroids: np.ndarray,
+              rng: np.random.Generator, modes: List[str], queries: int, k: int,
+              noise: float) -> Dict[str, dict]:
+    """Run random queries against random tenants and score every mode."""
+    stats = {mode: {"recall": [], "latency_ms": []} for mode in modes}
+    tenants = list(tenant_vectors)
+
+    for _ in range(queries):
+        tenant = int(rng.choice(tenants))
+        qvec = make_embeddings(rng, centroids, 1, noise)[0]
+        truth = set(exact_top_k(tenant_vectors[tenant], tenant, qvec, k))
+
+        for mode in modes:
+            start = time.perf_counter()
+            items = _run_retrieval(
+                driver, mode,
+                query_text=NO_MATCH_QUERY, qvec=qvec.tolist(),
+                user_id=f"{BENCH_PREFIX}user-{tenant}", doc_id=None,
+                chapter=None, section=None, content_type=None,
+                index_name="contentBlockEmbeddingIdx", k=k,
+                min_vector_score=0.0,
+            )
+            elapsed = (time.perf_counter() - start) * 1000
+
+            found = {item["node"]["block_id"] for item in items}
+            stats[mode]["recall"].append(len(found & truth) / k)
+            stats[mode]["latency_ms"].append(elapsed)
+
+    return {
+        mode: {
+            "recall_at_k": round(float(np.mean(s["recall"])), 3),
+            "p50_ms": round(float(np.percentile(s["latency_ms"], 50)), 1),
+            "p95_ms": round(float(np.percentile(s["latency_ms"], 95)), 1),
+        }
+        for mode, s in stats.items()
+    }
+
+
+def print_table(results: List[dict], modes: List[str]) -> None:
+    """Print recall / latency per tenant count."""
+    header = f"{'tenants':>8} {'blocks':>8} | " + " | ".join(f"{m:^24}" for m in modes)
+    print("\n" + header)
+    print(f"{'':>8} {'':>8} | " + " | ".join(f"{'recall  p50ms  p95ms':^24}" for _ in modes))
+    print("-" * len(header))
+    for row in results:
+        cells = [
+            f"{row['modes'][m]['recall_at_k']:>6.3f} {row['modes'][m]['p50_ms']:>6.1f} {row['modes'][m]['p95_ms']:>6.1f}"
+            for m in modes
+        ]
+        print(f"{row['tenants']:>8} {row['total_blocks']:>8} | " + " | ".join(f"{c:^24}" for c in cells))
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoped vector candidate generation")
+    parser.add_argument("--tenants", default="1,10,50,100", help="Comma-separated tenant counts")
+    parser.add_argument("--blocks-per-tenant", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=20, help="Queries per tenant count")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--topics", type=int, default=20, help="Shared topic centroids")
+    parser.add_argument("--noise", type=float, default=0.05, help="Spread around each centroid")
+    parser.add_argument("--modes", default="global,exact,adaptive,auto")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep benchmark nodes afterwards")
+    args = parser.parse_args()
+
+    levels = sorted(int(t) for t in args.tenants.split(","))
+    modes = [m.strip() for m in args.modes.split(",")]
+    for mode in modes:
+        if mode not in CANDIDATE_MODES:
+            parser.error(f"Unknown mode '{mode}' (choose from {', '.join(CANDIDATE_MODES)})")
+
+    rng = np.random.default_rng(args.seed)
+    centroids = rng.standard_normal((args.topics, EMBED_DIM)) / np.sqrt(EMBED_DIM)
+
+    driver = get_neo4j_driver()
+    tenant_vectors: Dict[int, np.ndarray] = {}
+    results = []
+
+    with driver.session() as session:
+        cleanup(session)
+        try:
+            for level in levels:
+                print(f"\n📄 Seeding up to {level} tenants ({args.blocks_per_tenant} blocks each)...")
+                for tenant in range(len(tenant_vectors), level):
+                    vecs = make_embeddings(rng, centroids, args.blocks_per_tenant, args.noise)
+                    seed_tenant(session, tenant, vecs)
+                    tenant_vectors[tenant] = vecs
+
+                print(f"🔎 Running {args.queries} queries x {len(modes)} modes...")
+                level_stats = run_level(driver, tenant_vectors, centroids, rng, modes, args.queries, args.k, args.noise)
+                results.append({
+                    "tenants": level,
+                    "total_blocks": level * args.blocks_per_tenant,
+                    "modes": level_stats,
+                })
+                for mode, s in level_stats.items():
+                    print(f"   {mode:>8}: recall@{args.k}={s['recall_at_k']:.3f}  p50={s['p50_ms']}ms  p95={s['p95_ms']}ms")
+        finally:
+            if not args.keep:
+                print("\n🧹 Removing benchmark nodes...")
+                cleanup(session)
+
+    print_table(results, modes)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / "retrieval_benchmark.json"
+    with open(output, "w") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -184,7 +184,7 @@ async def generate_image_with_flux(prompt: str, image_type: str = "diagram") ->
     Returns:
         Image bytes or None if failed
     """
-    import httpx
+    from lib import provider_clients
     
     if not DEEPINFRA_API_KEY:
         print("⚠️  DEEPINFRA_API_KEY not set, skipping image generation")
@@ -201,29 +201,29 @@ async def generate_image_with_flux(prompt: str, image_type: str = "diagram") ->
     enhanced_prompt = f"{prompt}. Style: {style_hints.get(image_type, style_hints['diagram'])}"
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://api.deepinfra.com/v1/inference/black-forest-labs/FLUX-1-schnell",
-                headers={"Authorization": f"Bearer {DEEPINFRA_API_KEY}"},
-                json={
-                    "prompt": enhanced_prompt,
-                    "width": 1024,
-                    "height": 768,
-                    "num_inference_steps": 4,  # Schnell is fast
-                }
-            )
+        response = await provider_clients.apost(
+            "https://api.deepinfra.com/v1/inference/black-forest-labs/FLUX-1-schnell",
+            headers={"Authorization": f"Bearer {DEEPINFRA_API_KEY}"},
+            json={
+                "prompt": enhanced_prompt,
+                "width": 1024,
+                "height": 768,
+                "num_inference_steps": 4,  # Schnell is fast
+            },
+            timeout=60.0,
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            # DeepInfra returns base64 image
+            if "images" in result and result["images"]:
+                import base64
+                image_b64 = result["images"][0]
+                return base64.b64decode(image_b64)
+        else:
+            print(f"❌ Flux error: {response.status_code} - {response.text[:200]}")
+            return None
             
-            if response.status_code == 200:
-                result = response.json()
-                # DeepInfra returns base64 image
-                if "images" in result and result["images"]:
-                    import base64
-                    image_b64 = result["images"][0]
-                    return base64.b64decode(image_b64)
-            else:
-                print(f"❌ Flux error: {response.status_code} - {response.text[:200]}")
-                return None
-                
     except Exception as e:
         print(f"❌ Flux generation error: {e}")
         return None
@@ -712,7 +712,7 @@ Generate:
         Returns:
             DocumentStructure with full hierarchy
         """
-        import asyncio
+        from lib import provider_clients
         
         total_start = time.time()
         print(f"\n{'='*60}")
@@ -734,8 +734,7 @@ Generate:
         # Phase 3: Generate questions + images (before persistence)
         questions_map = {}
         if generate_questions:
-            loop = asyncio.get_event_loop()
-            questions_map = loop.run_until_complete(
+            questions_map = provider_clients.run(
                 self.generate_all_questions(structure, doc_id, generate_images)
             )
         
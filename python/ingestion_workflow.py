@@ -9,8 +9,7 @@ from langchain_core.output_parsers import StrOutputParser
 from pydantic import BaseModel, Field
 from typing import List, Literal, Optional, Tuple, Dict, Any
 from enum import Enum
-from openai import OpenAI
-from neo4j import GraphDatabase
+from openai import AsyncOpenAI, OpenAI
 import os
 import json
 import time
@@ -20,6 +19,8 @@ load_dotenv()
 
 # OpenAI client for embeddings
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Async client for request-path callers (chat/learn retrieval) - keeps the event loop free
+async_openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # Embedding models
 EMBED_MODEL_SMALL = "text-embedding-3-small"  # 1536 dims
@@ -36,6 +37,7 @@ CHUNK_OVERLAP = 500              # Was 200 - better context preservation at boun
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_WRITE_BATCH_SIZE = int(os.getenv("NEO4J_WRITE_BATCH_SIZE", "200"))  # Rows per UNWIND transaction
 
 # Groq API for fast inference (5x faster than Cerebras)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -50,6 +52,10 @@ CEREBRAS_URL = "https://api.cerebras.ai/v1/chat/completions"
 # Google API for Gemini (handwriting OCR)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Vision classification (image filter); bump the version when its prompt changes
+VISION_MODEL = "gemini-2.0-flash"
+VISION_PROMPT_VERSION = "v1"
+
 
 # ============================================================
 # Multi-Model OCR: Router & Extraction
@@ -80,11 +86,11 @@ def ocr_with_gemini(file_path: str) -> str:
     Use Gemini 2.5 Flash for OCR - excellent for handwriting.
     Falls back to olmOCR if Gemini fails.
     """
-    import httpx
-    from pdf2image import convert_from_path
-    from io import BytesIO
-    import base64
-    
+    import fitz
+    from lib import provider_clients
+    from lib.page_rasterizer import encode_pages
+    from lib.rate_limiter import get_limiter
+
     print("🖊️  Using Gemini 2.5 Flash for OCR (handwriting mode)...")
     
     if not GOOGLE_API_KEY:
@@ -92,30 +98,27 @@ def ocr_with_gemini(file_path: str) -> str:
         return ocr_with_olmocr(file_path)
     
     try:
-        # Convert PDF to images
-        images = convert_from_path(file_path, dpi=150)
+        # Render pages encoded for Gemini
+        with fitz.open(file_path) as doc:
+            page_count = len(doc)
+        images = encode_pages(file_path, range(1, page_count + 1), model="gemini", dpi=150)
         
         all_text = []
-        for page_num, img in enumerate(images, 1):
-            # Convert to base64
-            buffer = BytesIO()
-            img.save(buffer, format="PNG")
-            b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-            
+        for page_num, img in sorted(images.items()):
             # Call Gemini API
-            response = httpx.post(
+            response = get_limiter("gemini").call(lambda: provider_clients.post(
                 f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GOOGLE_API_KEY}",
                 headers={"Content-Type": "application/json"},
                 json={
                     "contents": [{
                         "parts": [
                             {"text": "Extract ALL text from this image. Preserve formatting, line breaks, and structure. Just output the text, nothing else."},
-                            {"inline_data": {"mime_type": "image/png", "data": b64}}
+                            img.gemini_part()
                         ]
                     }]
                 },
                 timeout=60.0
-            )
+            ), tokens=5000)
             
             if response.status_code == 200:
                 result = response.json()
@@ -124,8 +127,10 @@ def ocr_with_gemini(file_path: str) -> str:
                 print(f"   ✅ Page {page_num}: {len(text)} chars")
             else:
                 print(f"   ⚠️ Page {page_num} failed: {response.status_code}")
-                # Try olmOCR for this page
-                page_text = _ocr_single_page_olmocr(img)
+                # Try olmOCR for this page (re-rendered at olmOCR's resolution)
+                page_text = _ocr_single_page_olmocr(
+                    encode_pages(file_path, [page_num], model="olmocr2", dpi=150)[page_num]
+                )
                 all_text.append(f"=== PAGE {page_num} ===\n{page_text}")
         
         return "\n\n".join(all_text)
@@ -139,21 +144,21 @@ def ocr_with_olmocr(file_path: str) -> str:
     """
     Use olmOCR via DeepInfra for OCR - good for printed scans.
     """
-    import httpx
-    from pdf2image import convert_from_path
-    from io import BytesIO
-    import base64
-    
+    import fitz
+    from lib.page_rasterizer import encode_pages
+
     print("📄 Using olmOCR for OCR (printed scan mode)...")
     
     if not DEEPINFRA_API_KEY:
         raise ValueError("DEEPINFRA_API_KEY not set")
     
-    # Convert PDF to images
-    images = convert_from_path(file_path, dpi=150)
+    # Render pages encoded for olmOCR
+    with fitz.open(file_path) as doc:
+        page_count = len(doc)
+    images = encode_pages(file_path, range(1, page_count + 1), model="olmocr2", dpi=150)
     
     all_text = []
-    for page_num, img in enumerate(images, 1):
+    for page_num, img in sorted(images.items()):
         text = _ocr_single_page_olmocr(img)
         all_text.append(f"=== PAGE {page_num} ===\n{text}")
         print(f"   ✅ Page {page_num}: {len(text)} chars")
@@ -161,18 +166,12 @@ def ocr_with_olmocr(file_path: str) -> str:
     return "\n\n".join(all_text)
 
 
-def _ocr_single_page_olmocr(pil_image) -> str:
-    """OCR a single PIL image using olmOCR via DeepInfra."""
-    import httpx
-    from io import BytesIO
-    import base64
-    
-    # Convert to base64
-    buffer = BytesIO()
-    pil_image.save(buffer, format="PNG")
-    b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+def _ocr_single_page_olmocr(image) -> str:
+    """OCR a single page image (lib.image_encoding.EncodedImage) using olmOCR via DeepInfra."""
+    from lib import provider_clients
+    from lib.rate_limiter import get_limiter
     
-    response = httpx.post(
+    response = get_limiter("deepinfra").call(lambda: provider_clients.post(
         DEEPINFRA_URL,
         headers={
             "Authorization": f"Bearer {DEEPINFRA_API_KEY}",
@@ -184,14 +183,14 @@ def _ocr_single_page_olmocr(pil_image) -> str:
                 "role": "user",
                 "content": [
                     {"type": "text", "text": "Extract all text from this image. Preserve structure and formatting."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
+                    image.openai_part()
                 ]
             }],
             "max_tokens": 4000,
             "temperature": 0
         },
         timeout=90.0
-    )
+    ), tokens=5000)
     
     if response.status_code == 200:
         result = response.json()
@@ -218,21 +217,72 @@ def embed_text(text: str, model: str = EMBED_MODEL_SMALL) -> List[float]:
         print(f"❌ Failed to generate embedding: {e}")
         return []
 
-def get_neo4j_driver():
-    """Get Neo4j database driver"""
-    if not all([NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD]):
-        raise ValueError("Missing Neo4j credentials in .env: NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD")
-    
+
+async def aembed_text(text: str, model: str = EMBED_MODEL_SMALL) -> List[float]:
+    """
+    Async variant of embed_text() for use inside the event loop.
+    Returns [] on failure, same as the sync version.
+    """
     try:
-        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-        # Test connection
-        with driver.session() as session:
-            session.run("RETURN 1")
-        print("✅ Connected to Neo4j")
-        return driver
+        response = await async_openai_client.embeddings.create(
+            model=model,
+            input=text
+        )
+        return response.data[0].embedding
     except Exception as e:
-        print(f"❌ Cannot connect to Neo4j: {e}")
-        raise e
+        print(f"❌ Failed to generate embedding: {e}")
+        return []
+
+
+def _embedding_vectors(response) -> List[List[float]]:
+    """Vectors from an embeddings response, in input order."""
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def embed_texts(texts: List[str], model: str = EMBED_MODEL_SMALL) -> List[List[float]]:
+    """
+    Generate embeddings for many texts with batched requests.
+
+    Packs inputs into as few requests as the token/item limits allow (see
+    lib.embedding_batcher). Output order matches input order; empty texts and
+    inputs the API rejects get [] like embed_text(). Auth errors and outages
+    raise, so the ingestion task fails and is retried instead of persisting
+    blocks without embeddings.
+    """
+    from lib.embedding_batcher import count_tokens, embed_batched
+    from lib.rate_limiter import get_limiter
+
+    limiter = get_limiter("openai")
+
+    def call(batch: List[str]) -> List[List[float]]:
+        # The batcher retries failed batches itself; the limiter only paces them
+        response = limiter.call(
+            lambda: openai_client.embeddings.create(model=model, input=batch),
+            tokens=sum(count_tokens(text) for text in batch),
+            max_retries=0,
+        )
+        return _embedding_vectors(response)
+
+    return embed_batched(texts, call)
+
+
+def get_neo4j_driver():
+    """
+    Get the shared Neo4j driver (pooled, process-wide).
+
+    Connects lazily - no ping on the request path. Do NOT close the returned
+    driver; lifecycle is handled by lib.neo4j_pool shutdown hooks.
+    """
+    from lib.neo4j_pool import get_driver
+
+    return get_driver(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+
+
+def get_async_neo4j_driver():
+    """Get the shared async Neo4j driver for the running event loop."""
+    from lib.neo4j_pool import get_async_driver
+
+    return get_async_driver(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
 
 
 """
@@ -247,33 +297,17 @@ connections should be like user-> document-> topics -> chunks(embeddings) -> que
 """
 
 # ============================================================
-# R2 Storage Configuration
+# R2 Storage (shared client: lib/r2_storage.py)
 # ============================================================
 
-R2_ENDPOINT = os.getenv("R2_ENDPOINT")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
-R2_BUCKET = os.getenv("R2_BUCKET")
-R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", "https://r2.voxam.dev")
-
-
 def get_r2_client():
-    """Get boto3 S3 client configured for Cloudflare R2."""
-    import boto3
-    from botocore.client import Config
+    """Shared boto3 S3 client configured for Cloudflare R2 (None if not configured)."""
+    from lib import r2_storage
 
-    if not all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET]):
+    client = r2_storage.get_client()
+    if client is None:
         print("⚠️  R2 credentials not fully configured")
-        return None
-
-    return boto3.client(
-        's3',
-        endpoint_url=R2_ENDPOINT,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(signature_version='s3v4'),
-        region_name='auto'
-    )
+    return client
 
 
 def upload_to_r2(image_bytes: bytes, file_key: str, content_type: str = "image/png") -> Optional[str]:
@@ -288,25 +322,12 @@ def upload_to_r2(image_bytes: bytes, file_key: str, content_type: str = "image/p
     Returns:
         Public URL or None if upload failed
     """
-    r2_client = get_r2_client()
+    from lib import r2_storage
 
-    if not r2_client:
-        print(f"   📤 [MOCK] Would upload {len(image_bytes)} bytes to R2: {file_key}")
-        return f"{R2_PUBLIC_URL}/{file_key}"
-
-    try:
-        r2_client.put_object(
-            Bucket=R2_BUCKET,
-            Key=file_key,
-            Body=image_bytes,
-            ContentType=content_type
-        )
-        url = f"{R2_PUBLIC_URL}/{file_key}"
+    url = r2_storage.put_object(image_bytes, file_key, content_type)
+    if url and r2_storage.is_configured():
         print(f"   📤 Uploaded to R2: {file_key}")
-        return url
-    except Exception as e:
-        print(f"   ❌ R2 upload failed: {e}")
-        return None
+    return url
 
 
 # ============================================================
@@ -423,7 +444,8 @@ def extract_images_from_pdf(
     min_height: int = 120,
     min_bytes: int = 5000,
     max_aspect_ratio: float = 5.0,
-    skip_header_footer_pct: float = 0.05
+    skip_header_footer_pct: float = 0.05,
+    analysis=None
 ) -> Dict[int, List[dict]]:
     """
     Extract images from PDF using PyMuPDF with light filtering.
@@ -436,104 +458,106 @@ def extract_images_from_pdf(
         min_bytes: Minimum file size in bytes (5KB - filter only very tiny images)
         max_aspect_ratio: Max width/height ratio (5:1 - filter extreme banners)
         skip_header_footer_pct: Skip images in top/bottom X% of page (0.05 = 5%)
+        analysis: PdfAnalysis from lib.pdf_analyzer.analyze_pdf() - reuses its image
+                  inventory instead of re-parsing the PDF
 
     Returns:
         Dict mapping page_number (1-indexed) -> list of image dicts
     """
-    import fitz
     from PIL import Image
     from io import BytesIO
+    from lib.pdf_analyzer import analyze_pdf
 
     print(f"🖼️  Extracting images from PDF with PyMuPDF...")
 
-    doc = fitz.open(file_path)
+    if analysis is None:
+        analysis = analyze_pdf(file_path)
+
     images_by_page: Dict[int, List[dict]] = {}
     total_images = 0
     filtered_count = 0
     filter_reasons = {"size": 0, "dimensions": 0, "aspect": 0, "position": 0}
 
-    for page_num, page in enumerate(doc):
+    for page in analysis.pages:
         page_images = []
-        image_list = page.get_images(full=True)
-        page_height = page.rect.height
+        page_height = page.page_height
+        seen_xrefs = set()
 
-        for img_idx, img in enumerate(image_list):
-            try:
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                image_ext = base_image["ext"]
+        for image in page.images:
+            # One entry per embedded image per page (first placement wins)
+            if image.xref in seen_xrefs:
+                continue
+            seen_xrefs.add(image.xref)
 
-                # Filter 1: Minimum file size (skip tiny images)
-                if len(image_bytes) < min_bytes:
-                    filtered_count += 1
-                    filter_reasons["size"] += 1
-                    continue
+            image_bytes = image.image_bytes
+            if image_bytes is None:
+                continue  # Extraction failed - already logged by the analyzer
 
-                # Filter 2: Check actual dimensions
-                width, height = None, None
-                try:
-                    pil_img = Image.open(BytesIO(image_bytes))
-                    width, height = pil_img.size
-
-                    # Skip small images (icons, bullets, small logos)
-                    if width < min_width or height < min_height:
-                        filtered_count += 1
-                        filter_reasons["dimensions"] += 1
-                        continue
-
-                    # Skip very wide/narrow images (headers, banners, dividers)
-                    aspect_ratio = max(width / height, height / width)
-                    if aspect_ratio > max_aspect_ratio:
-                        filtered_count += 1
-                        filter_reasons["aspect"] += 1
-                        continue
+            # Filter 1: Minimum file size (skip tiny images)
+            if len(image_bytes) < min_bytes:
+                filtered_count += 1
+                filter_reasons["size"] += 1
+                continue
 
+            # Filter 2: Check actual dimensions
+            width, height = image.width, image.height
+            if not (width and height):
+                try:
+                    width, height = Image.open(BytesIO(image_bytes)).size
                 except Exception:
-                    # If we can't read dimensions, apply stricter size filter
-                    if len(image_bytes) < 30000:
-                        filtered_count += 1
-                        filter_reasons["size"] += 1
-                        continue
-
-                # Get image position on page
-                img_rects = page.get_image_rects(xref)
-                bbox = img_rects[0] if img_rects else None
-                y_pos = bbox.y0 if bbox else 0
-
-                # Filter 3: Skip images in header/footer regions
-                if bbox and page_height > 0:
-                    y_center = (bbox.y0 + bbox.y1) / 2
-                    relative_pos = y_center / page_height
-                    # Skip if in top X% or bottom X% of page
-                    if relative_pos < skip_header_footer_pct or relative_pos > (1 - skip_header_footer_pct):
-                        filtered_count += 1
-                        filter_reasons["position"] += 1
-                        continue
-
-                page_images.append({
-                    "image_bytes": image_bytes,
-                    "ext": image_ext,
-                    "bbox": [bbox.x0, bbox.y0, bbox.x1, bbox.y1] if bbox else None,
-                    "y_pos": y_pos,
-                    "page": page_num + 1,
-                    "width": width,
-                    "height": height
-                })
-                total_images += 1
+                    width, height = None, None
 
-            except Exception as e:
-                print(f"   ⚠️ Error extracting image {img_idx} from page {page_num + 1}: {e}")
+            if width and height:
+                # Skip small images (icons, bullets, small logos)
+                if width < min_width or height < min_height:
+                    filtered_count += 1
+                    filter_reasons["dimensions"] += 1
+                    continue
+
+                # Skip very wide/narrow images (headers, banners, dividers)
+                aspect_ratio = max(width / height, height / width)
+                if aspect_ratio > max_aspect_ratio:
+                    filtered_count += 1
+                    filter_reasons["aspect"] += 1
+                    continue
+            elif len(image_bytes) < 30000:
+                # If we can't read dimensions, apply stricter size filter
+                filtered_count += 1
+                filter_reasons["size"] += 1
                 continue
 
+            bbox = image.bbox
+            y_pos = bbox[1] if bbox else 0
+
+            # Filter 3: Skip images in header/footer regions
+            if bbox and page_height > 0:
+                y_center = (bbox[1] + bbox[3]) / 2
+                relative_pos = y_center / page_height
+                # Skip if in top X% or bottom X% of page
+                if relative_pos < skip_header_footer_pct or relative_pos > (1 - skip_header_footer_pct):
+                    filtered_count += 1
+                    filter_reasons["position"] += 1
+                    continue
+
+            page_images.append({
+                "image_bytes": image_bytes,
+                "ext": image.ext,
+                "xref": image.xref,
+                "bbox": list(bbox) if bbox else None,
+                "y_pos": y_pos,
+                "page": page.page_num,
+                "width": width,
+                "height": height
+            })
+            total_images += 1
+
         # Sort by y-position (reading order)
         if page_images:
             page_images.sort(key=lambda x: x["y_pos"])
             for idx, img in enumerate(page_images):
                 img["index"] = idx
-            images_by_page[page_num + 1] = page_images
+            images_by_page[page.page_num] = page_images
 
-    doc.close()
     print(f"   ✅ Extracted {total_images} images, filtered {filtered_count} (size:{filter_reasons['size']}, dim:{filter_reasons['dimensions']}, aspect:{filter_reasons['aspect']}, pos:{filter_reasons['position']})")
     return images_by_page
 
@@ -555,20 +579,10 @@ def classify_and_describe_image(
     Returns:
         Dict with {"is_educational": bool, "description": str} or None on error
     """
-    import base64
-    import httpx
+    from lib import provider_clients
     import json
-
-    # Encode image to base64
-    b64_image = base64.b64encode(image_bytes).decode("utf-8")
-
-    # Detect image type from bytes
-    if image_bytes[:8] == b'\x89PNG\r\n\x1a\n':
-        media_type = "image/png"
-    elif image_bytes[:2] == b'\xff\xd8':
-        media_type = "image/jpeg"
-    else:
-        media_type = "image/png"  # Default fallback
+    from lib.image_encoding import encode_image
+    from lib.rate_limiter import estimate_tokens, get_limiter
 
     prompt = """Analyze this image from an educational document (page """ + str(page_num) + """).
 
@@ -599,20 +613,23 @@ Respond in JSON format ONLY:
 }"""
 
     try:
+        # Downsampled / re-encoded for Gemini; undecodable bytes raise and count as an error
+        image = encode_image(image_bytes, model="gemini")
+
         # Use Gemini Flash for higher rate limits
-        response = httpx.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GOOGLE_API_KEY}",
+        response = get_limiter("gemini").call(lambda: provider_clients.post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/{VISION_MODEL}:generateContent?key={GOOGLE_API_KEY}",
             headers={"Content-Type": "application/json"},
             json={
                 "contents": [{
                     "parts": [
                         {"text": prompt},
-                        {"inline_data": {"mime_type": media_type, "data": b64_image}}
+                        image.gemini_part()
                     ]
                 }]
             },
             timeout=30.0
-        )
+        ), tokens=estimate_tokens(prompt, 500) + 1000)
 
         if response.status_code != 200:
             print(f"   ⚠️ Vision API error: {response.status_code}")
@@ -639,18 +656,21 @@ Respond in JSON format ONLY:
 def filter_and_describe_images(
     images_by_page: Dict[int, List[dict]],
     vision_model: str = "gemini",
-    max_concurrent: int = 5,  # Gemini has higher rate limits
+    max_concurrent: Optional[int] = None,
     max_retries: int = 2,
     fallback_on_failure: bool = True
 ) -> Dict[int, List[dict]]:
     """
     Apply vision LLM filtering to extracted images.
     Removes decorative images and adds descriptions to educational ones.
+    Images clustered by dedupe_images() are classified once (the cluster
+    representative) and the result is copied to every occurrence.
 
     Args:
         images_by_page: Output from extract_images_from_pdf()
         vision_model: Vision model for classification
-        max_concurrent: Max parallel API calls
+        max_concurrent: Thread ceiling (default: the Gemini limiter's max); the shared
+            rate limiter decides how many calls are actually in flight
         max_retries: Retry count for failed API calls
         fallback_on_failure: If True, keep images that fail classification (assume educational)
 
@@ -658,23 +678,58 @@ def filter_and_describe_images(
         Filtered images_by_page with 'description' field added to educational images
     """
     from concurrent.futures import ThreadPoolExecutor, as_completed
+    from lib import ocr_cache
+    from lib.image_dedup import group_by_dedup_key
+    from lib.rate_limiter import get_limiter
 
     total_images = sum(len(imgs) for imgs in images_by_page.values())
     if total_images == 0:
         return images_by_page
 
     print(f"🔍 Classifying {total_images} images with vision LLM...")
+    max_concurrent = max_concurrent or get_limiter("gemini").max_concurrency
 
-    # Flatten for parallel processing
-    all_images = []
+    # Flatten for parallel processing - one entry per duplicate cluster
+    page_of: Dict[int, int] = {}
     for page_num, images in images_by_page.items():
         for img in images:
-            all_images.append((page_num, img))
+            page_of[id(img)] = page_num
+
+    members_of: Dict[int, List[dict]] = {}
+    all_images = []
+    for members in group_by_dedup_key([img for images in images_by_page.values() for img in images]).values():
+        representative = members[0]
+        members_of[id(representative)] = members
+        all_images.append((page_of[id(representative)], representative))
+    if len(all_images) < total_images:
+        print(f"   🧬 {total_images - len(all_images)} repeated images reuse their cluster's classification")
 
     educational_count = 0
     decorative_count = 0
     failed_count = 0
 
+    def apply_result(img: dict, result: dict) -> None:
+        nonlocal educational_count, decorative_count
+        for member in members_of[id(img)]:
+            if result.get("is_educational"):
+                member["description"] = result.get("description", "Educational image")
+                member["is_educational"] = True
+                educational_count += 1
+            else:
+                member["is_educational"] = False
+                decorative_count += 1
+
+    # Images already classified by this model and prompt (retries, re-uploads) skip the API
+    cached = ocr_cache.get_many(
+        "vision", vision_model, VISION_MODEL, VISION_PROMPT_VERSION,
+        {i: img["image_bytes"] for i, (_, img) in enumerate(all_images)},
+    )
+    if cached:
+        print(f"   ♻️  {len(cached)} images served from vision cache")
+        for i, result in cached.items():
+            apply_result(all_images[i][1], result)
+        all_images = [item for i, item in enumerate(all_images) if i not in cached]
+
     def process_image_with_retry(page_num: int, img: dict) -> tuple:
         """Process image with retry logic."""
         last_error = None
@@ -686,11 +741,14 @@ def filter_and_describe_images(
                     vision_model
                 )
                 if result is not None:
+                    ocr_cache.put(
+                        "vision", vision_model, VISION_MODEL, VISION_PROMPT_VERSION,
+                        img["image_bytes"], result,
+                    )
                     return page_num, img, result, None
             except Exception as e:
+                # Throttling / Retry-After is handled by the rate limiter inside the call
                 last_error = e
-                if attempt < max_retries:
-                    time.sleep(1 * (attempt + 1))  # Exponential backoff
         return page_num, img, None, last_error
 
     # Process in parallel
@@ -705,22 +763,18 @@ def filter_and_describe_images(
                 page_num, img, result, error = future.result()
 
                 if error:
-                    failed_count += 1
-                    if fallback_on_failure:
-                        # Assume educational if we can't classify - better to keep than lose
-                        img["description"] = f"Image from page {page_num} (classification unavailable)"
-                        img["is_educational"] = True
-                        img["classification_failed"] = True
-                        educational_count += 1
-                    else:
-                        img["is_educational"] = False
-                elif result and result.get("is_educational"):
-                    img["description"] = result.get("description", "Educational image")
-                    img["is_educational"] = True
-                    educational_count += 1
+                    for member in members_of[id(img)]:
+                        failed_count += 1
+                        if fallback_on_failure:
+                            # Assume educational if we can't classify - better to keep than lose
+                            member["description"] = f"Image from page {page_of[id(member)]} (classification unavailable)"
+                            member["is_educational"] = True
+                            member["classification_failed"] = True
+                            educational_count += 1
+                        else:
+                            member["is_educational"] = False
                 else:
-                    img["is_educational"] = False
-                    decorative_count += 1
+                    apply_result(img, result or {})
             except Exception as e:
                 # Future itself failed
                 failed_count += 1
@@ -744,57 +798,78 @@ def filter_and_describe_images(
     return filtered_by_page
 
 
+
+def strip_image_bytes(images_by_page: Dict[int, List[dict]]) -> Dict[int, List[dict]]:
+    """
+    Copy of images_by_page without raw image bytes, for checkpointing.
+
+    Once images are uploaded to R2 and described, later phases only need
+    their metadata (index, bbox, description).
+    """
+    return {
+        page_num: [{k: v for k, v in img.items() if k != "image_bytes"} for img in images]
+        for page_num, images in images_by_page.items()
+    }
+
 def upload_images_to_r2(
     images_by_page: Dict[int, List[dict]],
     doc_id: str,
-    max_concurrent: int = 10
+    max_concurrent: Optional[int] = None
 ) -> Dict[str, str]:
     """
     Upload all extracted images to R2 in parallel.
 
+    Images clustered by dedupe_images() are uploaded once; every occurrence
+    maps to the representative's URL.
+
     Args:
         images_by_page: Dict mapping page_num -> list of image dicts
         doc_id: Document ID for R2 path
-        max_concurrent: Max parallel uploads (default 10)
+        max_concurrent: Max parallel uploads (default R2_UPLOAD_WORKERS)
 
     Returns:
         Dict mapping "page_N_img_M" -> image_url
     """
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from lib import r2_storage
+    from lib.image_dedup import group_by_dedup_key
 
     print(f"📤 Uploading images to R2...")
 
-    # Collect all upload tasks
-    upload_tasks = []
+    # One upload per duplicate cluster, under the representative's page/index
+    ordered = []
     for page_num in sorted(images_by_page.keys()):
         for img in images_by_page[page_num]:
-            img_idx = img["index"]
-            ext = img.get("ext", "png")
-            file_key = f"documents/{doc_id}/images/p{page_num}_img{img_idx}.{ext}"
-            content_type = f"image/{ext}" if ext != "jpg" else "image/jpeg"
-            upload_tasks.append((page_num, img_idx, img["image_bytes"], file_key, content_type))
+            ordered.append((page_num, img))
+    page_of = {id(img): page_num for page_num, img in ordered}
+
+    upload_tasks = []
+    for members in group_by_dedup_key([img for _, img in ordered]).values():
+        img = members[0]
+        page_num = page_of[id(img)]
+        img_idx = img["index"]
+        ext = img.get("ext", "png")
+        file_key = f"documents/{doc_id}/images/p{page_num}_img{img_idx}.{ext}"
+        content_type = f"image/{ext}" if ext != "jpg" else "image/jpeg"
+        index_keys = [f"page_{page_of[id(m)]}_img_{m['index']}" for m in members]
+        upload_tasks.append((index_keys, img["image_bytes"], file_key, content_type))
 
     if not upload_tasks:
         return {}
 
-    # Upload in parallel
-    def do_upload(task):
-        page_num, img_idx, image_bytes, file_key, content_type = task
-        url = upload_to_r2(image_bytes, file_key, content_type)
-        if url:
-            print(f"   📤 Uploaded to R2: {file_key}")
-            return f"page_{page_num}_img_{img_idx}", url
-        return None, None
+    # Concurrent puts over the shared R2 client's connection pool
+    urls = r2_storage.put_objects(
+        [(file_key, image_bytes, content_type) for _, image_bytes, file_key, content_type in upload_tasks],
+        max_workers=max_concurrent or r2_storage.R2_UPLOAD_WORKERS,
+    )
 
     image_index: Dict[str, str] = {}
-    with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
-        futures = [executor.submit(do_upload, task) for task in upload_tasks]
-        for future in as_completed(futures):
-            key, url = future.result()
-            if key and url:
-                image_index[key] = url
+    for index_keys, _, file_key, _ in upload_tasks:
+        if file_key in urls:
+            for key in index_keys:
+                image_index[key] = urls[file_key]
 
-    print(f"   ✅ Uploaded {len(image_index)} images to R2")
+    repeats = len(ordered) - len(upload_tasks)
+    print(f"   ✅ Uploaded {len(urls)} images to R2" + (f" ({repeats} repeats reuse them)" if repeats else ""))
     return image_index
 
 
@@ -806,9 +881,9 @@ def describe_image(image_bytes: bytes, vision_llm=None) -> str:
     Note: vision_llm parameter is kept for backward compatibility but ignored.
     We use Gemini Flash directly for higher rate limits.
     """
-    import base64
-
-    b64 = base64.b64encode(image_bytes).decode("utf-8")
+    from lib import provider_clients
+    from lib.image_encoding import encode_image
+    from lib.rate_limiter import estimate_tokens, get_limiter
 
     prompt = """Describe what this image shows factually. Include:
 - Type of visual (diagram, graph, flowchart, table, photo, illustration)
@@ -822,19 +897,20 @@ Example: "Diagram of a neuron showing: cell body labeled 'soma' in center, dendr
 """
 
     try:
-        response = httpx.post(
+        image = encode_image(image_bytes, model="gemini")
+        response = get_limiter("gemini").call(lambda: provider_clients.post(
             f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GOOGLE_API_KEY}",
             headers={"Content-Type": "application/json"},
             json={
                 "contents": [{
                     "parts": [
                         {"text": prompt},
-                        {"inline_data": {"mime_type": "image/png", "data": b64}}
+                        image.gemini_part()
                     ]
                 }]
             },
             timeout=30.0
-        )
+        ), tokens=estimate_tokens(prompt, 500) + 1000)
 
         if response.status_code == 200:
             result = response.json()
@@ -852,6 +928,28 @@ Example: "Diagram of a neuron showing: cell body labeled 'soma' in center, dendr
 # LLM Hierarchy Creation
 # ============================================================
 
+def build_document_hierarchy(
+    chunks: List['ContentBlock'],
+    pdf_path: Optional[str] = None
+) -> dict:
+    """
+    Create the chapter/section hierarchy, from PDF structure when possible.
+
+    Native PDFs with an outline or clear heading fonts get a deterministic
+    hierarchy (lib/structural_hierarchy.py); the LLM is only called when that
+    detection is missing or not confident.
+    """
+    if pdf_path and pdf_path.lower().endswith('.pdf'):
+        from lib.structural_hierarchy import detect_structural_hierarchy
+
+        print("🏗️  Detecting hierarchy from PDF structure...")
+        hierarchy = detect_structural_hierarchy(pdf_path, chunks)
+        if hierarchy is not None:
+            return hierarchy
+
+    return create_hierarchy_with_llm(chunks)
+
+
 def create_hierarchy_with_llm(
     chunks: List['ContentBlock'],
     model: str = "llama-3.3-70b"
@@ -860,6 +958,11 @@ def create_hierarchy_with_llm(
     Use LLM to create chapter/section hierarchy from chunk content.
     Analyzes first lines and key content to determine document structure.
 
+    Documents above HIERARCHY_WINDOW_THRESHOLD chunks are split into
+    overlapping windows that are prompted concurrently and merged
+    (lib/hierarchy_windows.py). Either way the result is validated: every
+    chunk index appears exactly once, contiguous within its section.
+
     Returns:
         {
             "chapters": [
@@ -872,24 +975,62 @@ def create_hierarchy_with_llm(
             ]
         }
     """
-    import httpx
+    from lib.hierarchy_windows import HIERARCHY_WINDOW_THRESHOLD, merge_windows
 
     print("🏗️  Creating hierarchy with LLM...")
 
     # Build informative input - first lines + key content hints
-    chunk_summaries = []
-    for i, chunk in enumerate(chunks):
-        text = chunk.text_content if hasattr(chunk, 'text_content') else chunk.get('text', '')
-        page = chunk.page_number if hasattr(chunk, 'page_number') else chunk.get('page_start', i+1)
+    chunk_summaries = [_chunk_summary(i, chunk) for i, chunk in enumerate(chunks)]
+
+    if len(chunks) > HIERARCHY_WINDOW_THRESHOLD:
+        return _create_hierarchy_windowed(chunks, chunk_summaries)
+
+    hierarchy = _request_hierarchy(_hierarchy_prompt(chunk_summaries, 0, len(chunks)))
+    hierarchy = merge_windows([((0, len(chunks)), hierarchy)], len(chunks)) if hierarchy else None
+    if hierarchy is None:
+        return _fallback_hierarchy(chunks)
 
-        # Get first 3 meaningful lines for context
-        lines = [l.strip() for l in text.split('\n') if l.strip() and len(l.strip()) > 10]
-        preview = ' | '.join(lines[:3])[:200] if lines else "Empty chunk"
+    print(f"   ✅ Created hierarchy: {len(hierarchy['chapters'])} chapters, {len(chunks)} chunks mapped")
+    return hierarchy
 
-        chunk_summaries.append(f"Chunk {i} [Page {page}]: {preview}")
 
-    prompt = f"""You are analyzing an educational document to create a chapter/section hierarchy.
+def _chunk_summary(i: int, chunk) -> str:
+    """One prompt line per chunk: index, page and its first meaningful lines."""
+    text = chunk.text_content if hasattr(chunk, 'text_content') else chunk.get('text', '')
+    page = chunk.page_number if hasattr(chunk, 'page_number') else chunk.get('page_start', i+1)
 
+    # Get first 3 meaningful lines for context
+    lines = [l.strip() for l in text.split('\n') if l.strip() and len(l.strip()) > 10]
+    preview = ' | '.join(lines[:3])[:200] if lines else "Empty chunk"
+
+    return f"Chunk {i} [Page {page}]: {preview}"
+
+
+def _hierarchy_prompt(
+    chunk_summaries: List[str],
+    start: int,
+    stop: int,
+    total: Optional[int] = None
+) -> str:
+    """
+    Hierarchy prompt for chunks [start, stop).
+
+    With `total`, the chunks are one window of a larger document: chapters may
+    continue from the previous window, so no chapter count is suggested.
+    """
+    if total is None:
+        window_note = ""
+        size_rule = "- Aim for 2-6 chapters with 1-4 sections each"
+    else:
+        window_note = f"""
+NOTE: These are chunks {start}-{stop - 1} of a {total}-chunk document. The first chunks may continue a
+chapter that started earlier and the last ones may continue into the next part - still give them the
+best chapter/section title you can infer.
+"""
+        size_rule = "- Only start a new chapter at a real chapter/unit boundary; do not split chapters to reach a count"
+
+    return f"""You are analyzing an educational document to create a chapter/section hierarchy.
+{window_note}
 DOCUMENT CHUNKS:
 {chr(10).join(chunk_summaries)}
 
@@ -903,9 +1044,9 @@ ANALYSIS GUIDELINES:
 5. **Create meaningful titles**: Use actual headings from text, or create descriptive titles based on content
 
 RULES:
-- Every chunk index (0 to {len(chunks)-1}) must appear exactly ONCE
+- Every chunk index ({start} to {stop - 1}) must appear exactly ONCE
 - Chunk indices within a section must be consecutive (e.g., [0,1,2] not [0,2,4])
-- Aim for 2-6 chapters with 1-4 sections each
+{size_rule}
 - Section titles should be specific and descriptive
 
 OUTPUT FORMAT - Return ONLY valid JSON:
@@ -929,13 +1070,20 @@ OUTPUT FORMAT - Return ONLY valid JSON:
 
 IMPORTANT: Output ONLY the JSON, no explanation or markdown formatting."""
 
+
+def _request_hierarchy(prompt: str) -> Optional[dict]:
+    """Send one hierarchy prompt; None on HTTP errors, timeouts or unusable JSON."""
+    from lib import provider_clients
+    from lib.rate_limiter import estimate_tokens, get_limiter
+
     try:
         # Use Groq Llama 3.1 8B for hierarchy (fast, cheap, valid JSON output)
         api_url = GROQ_URL if GROQ_API_KEY else (CEREBRAS_URL if CEREBRAS_API_KEY else DEEPINFRA_URL)
         api_key = GROQ_API_KEY if GROQ_API_KEY else (CEREBRAS_API_KEY if CEREBRAS_API_KEY else DEEPINFRA_API_KEY)
         model = "llama-3.1-8b-instant" if GROQ_API_KEY else ("llama-3.3-70b" if CEREBRAS_API_KEY else "meta-llama/Llama-3.3-70B-Instruct")
+        provider = "groq" if GROQ_API_KEY else ("cerebras" if CEREBRAS_API_KEY else "deepinfra")
 
-        response = httpx.post(
+        response = get_limiter(provider).call(lambda: provider_clients.post(
             api_url,
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -951,11 +1099,11 @@ IMPORTANT: Output ONLY the JSON, no explanation or markdown formatting."""
                 "temperature": 0
             },
             timeout=30.0  # Groq is very fast
-        )
+        ), tokens=estimate_tokens(prompt, 2000))
 
         if response.status_code != 200:
             print(f"   ⚠️ LLM hierarchy error: {response.status_code}")
-            return _fallback_hierarchy(chunks)
+            return None
 
         result = response.json()
         text = result["choices"][0]["message"]["content"]
@@ -965,24 +1113,54 @@ IMPORTANT: Output ONLY the JSON, no explanation or markdown formatting."""
         end = text.rfind('}') + 1
         if start != -1 and end > start:
             hierarchy = json.loads(text[start:end])
-
-            # Validate structure
-            if "chapters" in hierarchy and len(hierarchy["chapters"]) > 0:
-                total_chunks = sum(
-                    len(sec.get("chunk_indices", []))
-                    for ch in hierarchy["chapters"]
-                    for sec in ch.get("sections", [])
-                )
-                print(f"   ✅ Created hierarchy: {len(hierarchy['chapters'])} chapters, {total_chunks} chunks mapped")
+            if isinstance(hierarchy, dict) and hierarchy.get("chapters"):
                 return hierarchy
 
-        print("   ⚠️ Invalid hierarchy JSON, using fallback")
-        return _fallback_hierarchy(chunks)
+        print("   ⚠️ Invalid hierarchy JSON")
+        return None
 
     except Exception as e:
         print(f"   ⚠️ Hierarchy creation failed: {e}")
+        return None
+
+
+def _create_hierarchy_windowed(chunks: List['ContentBlock'], chunk_summaries: List[str]) -> dict:
+    """
+    Map-reduce hierarchy for large documents.
+
+    Overlapping windows are prompted concurrently; a window whose call fails
+    is passed to merge_windows() as None and continues its neighbours'
+    sections. Only if every window fails does the whole document get the
+    page-based fallback.
+    """
+    from lib.hierarchy_windows import (
+        HIERARCHY_WINDOW_WORKERS,
+        merge_windows,
+        plan_windows,
+    )
+
+    total = len(chunks)
+    windows = plan_windows(total)
+    print(f"   🪟 {total} chunks → {len(windows)} overlapping windows")
+
+    def run_window(window):
+        start, stop = window
+        hierarchy = _request_hierarchy(_hierarchy_prompt(chunk_summaries[start:stop], start, stop, total))
+        if hierarchy is None:
+            print(f"   ⚠️ Window {start}-{stop - 1}: no hierarchy, merging from neighbours")
+        return window, hierarchy
+
+    with ThreadPoolExecutor(max_workers=max(1, min(HIERARCHY_WINDOW_WORKERS, len(windows)))) as executor:
+        results = list(executor.map(run_window, windows))
+
+    hierarchy = merge_windows(results, total)
+    if hierarchy is None:
         return _fallback_hierarchy(chunks)
 
+    sections = sum(len(ch["sections"]) for ch in hierarchy["chapters"])
+    print(f"   ✅ Created hierarchy: {len(hierarchy['chapters'])} chapters, {sections} sections, {total} chunks mapped")
+    return hierarchy
+
 
 def _fallback_hierarchy(chunks: List['ContentBlock']) -> dict:
     """
@@ -1346,6 +1524,72 @@ class ContentBlock:
         # NEW: Image type classification
         self.image_types: List[str] = []  # ["circuit", "anatomy", "graph", "flowchart", ...]
 
+
+# Bloom's-taxonomy instructions shared by the per-block and batched question prompts
+QUESTION_BLOOM_RULES = """REQUIREMENTS - Generate exactly 12 questions (2 per Bloom's level):
+
+BLOOM'S TAXONOMY - Generate EXACTLY 2 questions for EACH level:
+1. REMEMBER (2 questions) - Recall facts, definitions, terms
+   - Question types: "What is...?", "Define...", "List...", "Name..."
+   - Difficulty: basic
+
+2. UNDERSTAND (2 questions) - Explain ideas, summarize, interpret
+   - Question types: "Explain...", "Describe...", "Summarize...", "Compare..."
+   - Difficulty: basic to intermediate
+
+3. APPLY (2 questions) - Use knowledge in new situations, solve problems
+   - Question types: "Calculate...", "Solve...", "Demonstrate...", "How would you use..."
+   - Difficulty: intermediate
+
+4. ANALYZE (2 questions) - Examine relationships, draw connections
+   - Question types: "Why does...?", "What is the relationship...?", "Differentiate..."
+   - Difficulty: intermediate to advanced
+
+5. EVALUATE (2 questions) - Judge, critique, assess validity
+   - Question types: "Assess...", "Critique...", "Justify...", "Which is better..."
+   - Difficulty: advanced
+
+6. CREATE (2 questions) - Design, construct, propose new solutions
+   - Question types: "Design...", "Propose...", "What would happen if...", "Construct..."
+   - Difficulty: advanced
+
+QUESTION TYPE DISTRIBUTION:
+- 4 Long-answer questions (for Analyze, Evaluate, Create levels)
+- 8 Multiple-choice questions (for Remember, Understand, Apply levels)"""
+
+# Formatting rules, also used on their own by follow-up requests for missing questions
+QUESTION_FORMAT_RULES = """MATH/LATEX HANDLING (CRITICAL):
+- The content contains LaTeX math notation like $\\Delta Q$, $10^{22}$, $$E = mc^2$$
+- PRESERVE LaTeX format EXACTLY in question text and options
+- Use $...$ for inline math, $$...$$ for display equations
+- Do NOT convert LaTeX to plain text (wrong: "delta Q", correct: "$\\Delta Q$")
+- Do NOT use Unicode approximations (wrong: "ΔQ", correct: "$\\Delta Q$")
+- Example question: "What is the change in charge $\\Delta Q$ when..."
+- Example option: "A. $v = \\frac{d}{t}$"
+
+FOR ALL QUESTIONS:
+- text: Clear, unambiguous question text (preserve LaTeX math notation)
+- bloom_level: remember/understand/apply/analyze/evaluate/create
+- difficulty: basic/intermediate/advanced
+- key_points: 2-4 points the answer should cover (CRITICAL FOR GRADING)
+
+FOR LONG ANSWER:
+- question_type: "long_answer"
+- expected_time: 5-10 minutes
+
+FOR MULTIPLE CHOICE:
+- question_type: "multiple_choice"
+- expected_time: 1-3 minutes
+- options: Exactly 4 options as full text
+- correct_answer: The letter (A, B, C, or D)
+- DISTRACTOR REQUIREMENTS:
+  * Each wrong option represents a plausible misconception
+  * Base on common student errors
+  * All options similar in length and structure"""
+
+QUESTION_RULES = QUESTION_BLOOM_RULES + "\n\n" + QUESTION_FORMAT_RULES
+
+
 class IngestionPipeline:
     def __init__(self, config):
         self.config = config
@@ -1396,14 +1640,15 @@ class IngestionPipeline:
         self,
         pages_text: List[str],
         format_name: str = "Document",
-        start_time: float = None
+        start_time: float = None,
+        pdf_path: Optional[str] = None
     ) -> List[ContentBlock]:
         """
         UNIFIED PIPELINE: Convert extracted text pages into topic-level ContentBlocks.
 
         This is the common path for ALL document formats after initial text extraction:
         1. Chunking with smart boundaries
-        2. LLM hierarchy creation (chapters/sections)
+        2. Hierarchy creation (chapters/sections; PDF structure or LLM)
         3. Topic-level content block grouping
         4. Content type detection and enrichment
 
@@ -1411,6 +1656,7 @@ class IngestionPipeline:
             pages_text: List of text strings (one per page/slide)
             format_name: Format name for logging (PDF, DOCX, PPTX, Image, etc.)
             start_time: Start time for elapsed calculation
+            pdf_path: Source PDF, lets the hierarchy come from its outline / heading fonts
 
         Returns:
             List of enriched, topic-level ContentBlocks
@@ -1436,7 +1682,7 @@ class IngestionPipeline:
             return []
 
         # Step 2: LLM Hierarchy Creation
-        print("🏗️  Step 2: Creating hierarchy with LLM...")
+        print("🏗️  Step 2: Creating hierarchy...")
         temp_blocks = []
         for chunk in raw_chunks:
             temp = ContentBlock()
@@ -1446,7 +1692,7 @@ class IngestionPipeline:
             temp.page_end = chunk["page_end"]
             temp_blocks.append(temp)
 
-        hierarchy = create_hierarchy_with_llm(temp_blocks)
+        hierarchy = build_document_hierarchy(temp_blocks, pdf_path=pdf_path)
 
         # Step 3: Topic-level Content Blocks
         print("📦 Step 3: Creating topic-level ContentBlocks...")
@@ -1505,7 +1751,7 @@ class IngestionPipeline:
             return self._extract_scanned_pdf(pdf_path, start_time)
 
         # Step 2: Unified pipeline
-        return self._process_text_to_blocks(pages_text, "PDF", start_time)
+        return self._process_text_to_blocks(pages_text, "PDF", start_time, pdf_path=pdf_path)
 
     def _extract_pdf_legacy(self, pdf_path: str) -> List[ContentBlock]:
         """
@@ -2075,72 +2321,93 @@ class IngestionPipeline:
         self,
         content_blocks: List[ContentBlock],
         parallel_questions: bool = True,
-        max_workers: int = 4
+        max_workers: Optional[int] = None,
+        batch_small_blocks: Optional[bool] = None
     ) -> List[ContentBlock]:
         """
         Enrich content blocks with embeddings and questions.
-        Uses parallel processing for significant speedup.
+        Uses parallel processing for significant speedup: the batched embedding
+        requests run on their own thread while questions are generated.
 
         Args:
             content_blocks: List of ContentBlocks to enrich
             parallel_questions: Whether to generate questions in parallel
-            max_workers: Max concurrent question generation workers
+            max_workers: Thread ceiling for question generation (default: the Cerebras
+                limiter's max); the shared rate limiter adapts below it
+            batch_small_blocks: Pack several small blocks into one question request
+                (default: QUESTION_BATCHING_ENABLED); large blocks keep their own call
         """
         from concurrent.futures import ThreadPoolExecutor, as_completed
+        from lib.question_batching import QUESTION_BATCHING_ENABLED, pack_question_batches
+        from lib.rate_limiter import get_limiter
+
+        max_workers = max_workers or get_limiter("cerebras").max_concurrency
+        if batch_small_blocks is None:
+            batch_small_blocks = QUESTION_BATCHING_ENABLED
 
         total_start = time.time()
         print(f"\n⏳ Enriching {len(content_blocks)} content blocks...")
 
         # Step 1: Build combined context for all blocks (fast, sequential)
+        # Keep a context the caller already built (e.g. with figure descriptions)
         for block in content_blocks:
-            block.combined_context = self._combine_context(block)
+            if not block.combined_context:
+                block.combined_context = self._combine_context(block)
 
-        # Step 2: Generate embeddings in parallel (fast, ~1s each)
-        print(f"🔢 Generating embeddings for {len(content_blocks)} blocks in parallel...")
-        embed_start = time.time()
+        # Step 2: Generate embeddings in batched requests (a few calls for the whole document).
+        # Questions don't depend on embeddings, so this overlaps with Step 3.
+        print(f"🔢 Generating embeddings for {len(content_blocks)} blocks in batches...")
 
-        def generate_embedding(block_idx: int) -> tuple:
-            block = content_blocks[block_idx]
-            if block.combined_context:
-                embedding = embed_text(block.combined_context)
-                return block_idx, embedding
-            return block_idx, []
+        def embed_all() -> None:
+            embed_start = time.time()
+            embeddings = embed_texts([block.combined_context for block in content_blocks])
+            for block, embedding in zip(content_blocks, embeddings):
+                block.embeddings = embedding
+            print(f"   ✅ All embeddings done in {time.time() - embed_start:.2f}s")
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(generate_embedding, i) for i in range(len(content_blocks))]
-            for future in as_completed(futures):
-                idx, embedding = future.result()
-                content_blocks[idx].embeddings = embedding
+        embed_executor = ThreadPoolExecutor(max_workers=1)
+        embed_future = embed_executor.submit(embed_all)
 
-        print(f"   ✅ All embeddings done in {time.time() - embed_start:.2f}s")
+        # Step 3: Generate questions (slow, ~30-40s per request - parallelize!)
+        # Small blocks share a request so the long instruction block is sent once per batch
+        if batch_small_blocks:
+            batches = pack_question_batches([len(block.combined_context) for block in content_blocks])
+        else:
+            batches = [[i] for i in range(len(content_blocks))]
+        if len(batches) < len(content_blocks):
+            print(f"   📦 {len(content_blocks)} blocks packed into {len(batches)} question requests")
+
+        def generate_questions_for_batch(indices: List[int]) -> List[tuple]:
+            start = time.time()
+            if len(indices) == 1:
+                question_lists = [self._generate_questions(content_blocks[indices[0]])]
+            else:
+                question_lists = self._generate_questions_batch([content_blocks[i] for i in indices])
+            elapsed = time.time() - start
+            label = f"Block {indices[0] + 1}" if len(indices) == 1 else f"Blocks {', '.join(str(i + 1) for i in indices)}"
+            print(f"   ✅ {label}: {sum(len(q) for q in question_lists)} questions in {elapsed:.1f}s")
+            return list(zip(indices, question_lists))
 
-        # Step 3: Generate questions (slow, ~30-40s each - parallelize!)
         if parallel_questions:
             print(f"❓ Generating questions for {len(content_blocks)} blocks in parallel (max {max_workers} workers)...")
             question_start = time.time()
 
-            def generate_questions_for_block(block_idx: int) -> tuple:
-                block = content_blocks[block_idx]
-                start = time.time()
-                questions = self._generate_questions(block)
-                elapsed = time.time() - start
-                print(f"   ✅ Block {block_idx + 1}: {len(questions)} questions in {elapsed:.1f}s")
-                return block_idx, questions
-
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [executor.submit(generate_questions_for_block, i) for i in range(len(content_blocks))]
+                futures = [executor.submit(generate_questions_for_batch, indices) for indices in batches]
                 for future in as_completed(futures):
-                    idx, questions = future.result()
-                    content_blocks[idx].questions = questions
+                    for idx, questions in future.result():
+                        content_blocks[idx].questions = questions
 
             print(f"   ✅ All questions done in {time.time() - question_start:.2f}s")
         else:
             # Sequential fallback
-            for i, block in enumerate(content_blocks):
-                question_start = time.time()
-                print(f"❓ Generating questions for block {i+1}/{len(content_blocks)}...")
-                block.questions = self._generate_questions(block)
-                print(f"   ✅ Questions done in {time.time() - question_start:.2f}s ({len(block.questions)} questions)")
+            for n, indices in enumerate(batches):
+                print(f"❓ Generating questions for request {n + 1}/{len(batches)}...")
+                for idx, questions in generate_questions_for_batch(indices):
+                    content_blocks[idx].questions = questions
+
+        embed_future.result()
+        embed_executor.shutdown()
 
         total_elapsed = time.time() - total_start
         total_questions = sum(len(b.questions) for b in content_blocks)
@@ -2155,7 +2422,26 @@ class IngestionPipeline:
         if block.table_descriptions:
             components.append("\n".join(block.table_descriptions))
         return "\n\n".join(components)
-    def _generate_questions(self, block: ContentBlock, max_retries: int = 2) -> List[Question]:
+    def _figure_bounds(self, block: ContentBlock) -> Tuple[bool, int]:
+        """(has_figures, highest valid figure number) for a block."""
+        has_figures = bool(getattr(block, 'figure_map', None))
+        return has_figures, (max(block.figure_map.keys()) if has_figures else 0)
+
+    def _topic_info(self, block: ContentBlock) -> str:
+        """Topic line for question prompts."""
+        topic_info = ""
+        if block.section_title:
+            topic_info = f"\nTOPIC: {block.section_title}"
+            if block.chapter_title:
+                topic_info += f" (from {block.chapter_title})"
+        return topic_info
+
+    def _generate_questions(
+        self,
+        block: ContentBlock,
+        max_retries: int = 2,
+        existing: Optional[List[Question]] = None
+    ) -> List[Question]:
         """
         Generate structured questions for a topic-level content block.
 
@@ -2165,19 +2451,21 @@ class IngestionPipeline:
         - Balanced difficulty distribution
 
         Includes:
-        - Retry logic for API failures
-        - JSON parsing with error recovery
+        - Streamed, item-by-item parsing: every valid question is kept even when
+          others in the response are malformed or the output is cut off
+        - Follow-up requests for only the Bloom's levels still missing, instead of
+          regenerating the whole block
         - Figure reference validation
-        - Graceful handling of invalid enum values
         - TTS-optimized versions (spoken_text, spoken_options)
+
+        Args:
+            existing: Questions already generated for this block (e.g. by a batched
+                request); only the levels they don't cover are requested
         """
-        import httpx
-        import json
-        from lib.voice_optimizer import optimize_for_tts
+        from lib.question_batching import QUESTION_OUTPUT_TOKENS_PER_QUESTION, missing_bloom_levels
 
         # Build figure info for prompt if figures exist
-        has_figures = hasattr(block, 'figure_map') and block.figure_map
-        max_figure = max(block.figure_map.keys()) if has_figures else 0
+        has_figures, max_figure = self._figure_bounds(block)
         figure_instruction = ""
         if has_figures:
             figure_instruction = f"""
@@ -2188,77 +2476,12 @@ IMPORTANT - This content includes {len(block.figure_map)} figure(s):
 - At least 1-2 questions should test understanding of the figures if they contain educational content
 """
 
-        # Topic info for context
-        topic_info = ""
-        if block.section_title:
-            topic_info = f"\nTOPIC: {block.section_title}"
-            if block.chapter_title:
-                topic_info += f" (from {block.chapter_title})"
-
         prompt = f"""You are an expert educational assessment designer. Generate balanced questions across Bloom's taxonomy.
-{topic_info}
+{self._topic_info(block)}
 CONTENT:
 {block.combined_context[:8000]}
 {figure_instruction}
-REQUIREMENTS - Generate exactly 12 questions (2 per Bloom's level):
-
-BLOOM'S TAXONOMY - Generate EXACTLY 2 questions for EACH level:
-1. REMEMBER (2 questions) - Recall facts, definitions, terms
-   - Question types: "What is...?", "Define...", "List...", "Name..."
-   - Difficulty: basic
-
-2. UNDERSTAND (2 questions) - Explain ideas, summarize, interpret
-   - Question types: "Explain...", "Describe...", "Summarize...", "Compare..."
-   - Difficulty: basic to intermediate
-
-3. APPLY (2 questions) - Use knowledge in new situations, solve problems
-   - Question types: "Calculate...", "Solve...", "Demonstrate...", "How would you use..."
-   - Difficulty: intermediate
-
-4. ANALYZE (2 questions) - Examine relationships, draw connections
-   - Question types: "Why does...?", "What is the relationship...?", "Differentiate..."
-   - Difficulty: intermediate to advanced
-
-5. EVALUATE (2 questions) - Judge, critique, assess validity
-   - Question types: "Assess...", "Critique...", "Justify...", "Which is better..."
-   - Difficulty: advanced
-
-6. CREATE (2 questions) - Design, construct, propose new solutions
-   - Question types: "Design...", "Propose...", "What would happen if...", "Construct..."
-   - Difficulty: advanced
-
-QUESTION TYPE DISTRIBUTION:
-- 4 Long-answer questions (for Analyze, Evaluate, Create levels)
-- 8 Multiple-choice questions (for Remember, Understand, Apply levels)
-
-MATH/LATEX HANDLING (CRITICAL):
-- The content contains LaTeX math notation like $\\Delta Q$, $10^{{22}}$, $$E = mc^2$$
-- PRESERVE LaTeX format EXACTLY in question text and options
-- Use $...$ for inline math, $$...$$ for display equations
-- Do NOT convert LaTeX to plain text (wrong: "delta Q", correct: "$\\Delta Q$")
-- Do NOT use Unicode approximations (wrong: "ΔQ", correct: "$\\Delta Q$")
-- Example question: "What is the change in charge $\\Delta Q$ when..."
-- Example option: "A. $v = \\frac{{d}}{{t}}$"
-
-FOR ALL QUESTIONS:
-- text: Clear, unambiguous question text (preserve LaTeX math notation)
-- bloom_level: remember/understand/apply/analyze/evaluate/create
-- difficulty: basic/intermediate/advanced
-- key_points: 2-4 points the answer should cover (CRITICAL FOR GRADING)
-
-FOR LONG ANSWER:
-- question_type: "long_answer"
-- expected_time: 5-10 minutes
-
-FOR MULTIPLE CHOICE:
-- question_type: "multiple_choice"
-- expected_time: 1-3 minutes
-- options: Exactly 4 options as full text
-- correct_answer: The letter (A, B, C, or D)
-- DISTRACTOR REQUIREMENTS:
-  * Each wrong option represents a plausible misconception
-  * Base on common student errors
-  * All options similar in length and structure
+{QUESTION_RULES}
 
 Output ONLY valid JSON:
 {{
@@ -2281,12 +2504,311 @@ Output ONLY valid JSON:
 Note: "figure_ref" should be the figure number (1 to {max_figure if max_figure else 'N'}) if the question references a figure, or null if not.
 """
 
-        def parse_bloom_level(value: str) -> BloomLevel:
-            """Safely parse bloom level with fallback."""
+        questions = list(existing or [])
+        last_error = None
+        for attempt in range(max_retries + 1):
+            missing = missing_bloom_levels(q.bloom_level.value for q in questions)
+            if not missing:
+                break
+
+            if questions:
+                # Keep what we have; ask only for the gaps
+                request_prompt = self._question_followup_prompt(block, missing, questions, figure_instruction)
+                max_tokens = QUESTION_OUTPUT_TOKENS_PER_QUESTION * sum(missing.values()) + 1000
+                print(f"   🔁 Requesting {sum(missing.values())} missing question(s): {missing}")
+            else:
+                request_prompt, max_tokens = prompt, 8000
+
             try:
-                return BloomLevel(value.lower())
+                stream = self._call_question_llm(request_prompt, max_tokens)
+                if stream is None:
+                    # The limiter already waited out Retry-After and retried
+                    print("   ⚠️ Rate limited after retries")
+                    break
+
+                items = stream.items
+                if not items and not stream.failed:
+                    # Fallback: support old format with separate arrays
+                    try:
+                        data = self._parse_question_json(stream.text)
+                        items = data.get("long_answer_questions", []) + data.get("multiple_choice_questions", [])
+                    except ValueError:
+                        pass
+                if stream.failed:
+                    print(f"   ⚠️ Skipped {len(stream.failed)} malformed question(s) in response")
+
+                new_questions = self._build_questions(items, block)
+                if not new_questions:
+                    last_error = "no valid questions in response"
+                questions.extend(new_questions)
+            except Exception as e:
+                last_error = str(e)
+                if attempt < max_retries:
+                    time.sleep(1)
+
+        missing = missing_bloom_levels(q.bloom_level.value for q in questions)
+        if not questions:
+            print(f"   ⚠️ Failed to generate questions after {max_retries + 1} attempts: {last_error}")
+            return []
+        if missing:
+            print(f"   ⚠️ Still missing {sum(missing.values())} question(s) after {max_retries + 1} attempts: {missing}")
+
+        self._log_bloom_distribution(questions)
+        return questions
+
+    def _question_followup_prompt(
+        self,
+        block: ContentBlock,
+        missing: Dict[str, int],
+        existing: List[Question],
+        figure_instruction: str
+    ) -> str:
+        """Prompt for only the questions a block is still missing."""
+        wanted = "\n".join(
+            f"- {count} question(s) at the {level.upper()} level" for level, count in missing.items()
+        )
+        already = "\n".join(f"- {q.text}" for q in existing)
+
+        return f"""You are an expert educational assessment designer. Some questions for this content are already written; generate ONLY the missing ones.
+{self._topic_info(block)}
+CONTENT:
+{block.combined_context[:8000]}
+{figure_instruction}
+GENERATE EXACTLY:
+{wanted}
+
+Do NOT repeat or rephrase these existing questions:
+{already}
+
+Use long_answer for analyze/evaluate/create and multiple_choice for remember/understand/apply.
+
+{QUESTION_FORMAT_RULES}
+
+Output ONLY valid JSON:
+{{
+  "questions": [
+    {{"text": "...", "bloom_level": "apply", "difficulty": "intermediate", "question_type": "multiple_choice", "expected_time": 3, "key_points": ["..."], "options": ["A...", "B...", "C...", "D..."], "correct_answer": "B", "figure_ref": null}},
+    {{"text": "...", "bloom_level": "create", "difficulty": "advanced", "question_type": "long_answer", "expected_time": 10, "key_points": ["..."], "figure_ref": null}}
+  ]
+}}
+"""
+
+    def _generate_questions_batch(self, blocks: List[ContentBlock], max_retries: int = 1) -> List[List[Question]]:
+        """
+        Generate questions for several small blocks in one request.
+
+        The Bloom's-taxonomy instructions are sent once for the whole batch
+        instead of once per block, and the model returns one question array
+        per block. Each block is validated on its own: a block the response
+        misses, or whose valid questions don't cover every Bloom's level, is
+        completed with its own _generate_questions call (which only asks for
+        the missing levels).
+
+        Returns:
+            One question list per block, in the order of `blocks`
+        """
+        from lib.question_batching import (
+            QUESTION_BATCH_OUTPUT_TOKENS_PER_BLOCK,
+            missing_bloom_levels,
+            salvage_batched_entries,
+            split_batched_questions,
+        )
+
+        sections = []
+        for number, block in enumerate(blocks, 1):
+            has_figures, max_figure = self._figure_bounds(block)
+            figures = (
+                f"\nFIGURES: {len(block.figure_map)} (reference as \"Figure N\", valid figure_ref 1 to {max_figure})"
+                if has_figures else "\nFIGURES: none (figure_ref must be null)"
+            )
+            sections.append(f"=== BLOCK {number} ==={self._topic_info(block)}{figures}\nCONTENT:\n{block.combined_context}")
+        blocks_text = "\n\n".join(sections)
+
+        prompt = f"""You are an expert educational assessment designer. Generate balanced questions across Bloom's taxonomy for EACH of the {len(blocks)} content blocks below. Treat every block independently: its questions must only use its own content and its own figures.
+
+{blocks_text}
+
+Apply these requirements to EVERY block separately:
+{QUESTION_RULES}
+
+Output ONLY valid JSON with exactly one entry per block, numbered as above:
+{{
+  "blocks": [
+    {{"block": 1, "questions": [
+      {{"text": "...", "bloom_level": "remember", "difficulty": "basic", "question_type": "multiple_choice", "expected_time": 2, "key_points": ["..."], "options": ["A...", "B...", "C...", "D..."], "correct_answer": "A", "figure_ref": null}},
+      {{"text": "...", "bloom_level": "analyze", "difficulty": "advanced", "question_type": "long_answer", "expected_time": 7, "key_points": ["..."], "figure_ref": null}}
+    ]}},
+    {{"block": 2, "questions": [...]}}
+  ]
+}}
+Each "questions" array holds that block's 12 questions (2 per Bloom's level).
+"""
+
+        per_block: Dict[int, List[dict]] = {}
+        last_error = None
+        for attempt in range(max_retries + 1):
+            try:
+                stream = self._call_question_llm(
+                    prompt,
+                    max_tokens=QUESTION_BATCH_OUTPUT_TOKENS_PER_BLOCK * len(blocks),
+                    array_key="blocks",
+                )
+                if stream is None:
+                    last_error = "rate limited after retries"
+                    break
+                # Entries with one malformed question still yield their valid ones
+                entries = stream.items + salvage_batched_entries(stream.failed)
+                per_block = split_batched_questions(entries, len(blocks))
+                if per_block:
+                    break
+                last_error = "no block entries in response"
+            except Exception as e:
+                last_error = str(e)
+            if attempt < max_retries:
+                time.sleep(1)
+
+        results = [self._build_questions(per_block.get(position, []), block) for position, block in enumerate(blocks)]
+        incomplete = [
+            position for position, questions in enumerate(results)
+            if missing_bloom_levels(q.bloom_level.value for q in questions)
+        ]
+
+        if incomplete:
+            reason = f": {last_error}" if not per_block and last_error else ""
+            print(f"   🔁 Batch of {len(blocks)}: completing {len(incomplete)} block(s) individually{reason}")
+        for position, questions in enumerate(results):
+            if position in incomplete:
+                results[position] = self._generate_questions(blocks[position], existing=questions)
+            else:
+                self._log_bloom_distribution(questions)
+        return results
+
+    def _call_question_llm(self, prompt: str, max_tokens: int, array_key: str = "questions") -> Optional["JsonArrayStream"]:
+        """
+        Stream a question-generation prompt to Cerebras, decoding items as they arrive.
+
+        Returns a JsonArrayStream over `array_key` (decoded items plus the raw
+        text of malformed ones), or None when still rate limited after the
+        limiter's retries. Raises on any other API error. If the stream breaks
+        off midway (read timeout, dropped connection), the items received so
+        far are returned.
+        """
+        import httpx
+        from lib import provider_clients
+        from lib.json_stream import JsonArrayStream
+        from lib.rate_limiter import estimate_tokens, get_limiter
+
+        # Use Cerebras for question generation (higher rate limits with pay-as-you-go)
+        api_url = CEREBRAS_URL
+        api_key = CEREBRAS_API_KEY
+        model = "gpt-oss-120b"
+
+        stream = JsonArrayStream(array_key)
+        reasoning: List[str] = []
+
+        def stream_completion():
+            with provider_clients.get_client(api_url).stream(
+                "POST",
+                api_url,
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": "You are an educational question generator. Output valid JSON only."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "max_tokens": max_tokens,
+                    "temperature": 0.3,
+                    "stream": True
+                },
+                timeout=60.0  # Per read: long generations keep streaming
+            ) as response:
+                if response.status_code != 200:
+                    response.read()
+                    return response
+                try:
+                    for line in response.iter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        payload = line[5:].strip()
+                        if payload == "[DONE]":
+                            break
+                        try:
+                            delta = json.loads(payload)["choices"][0].get("delta") or {}
+                        except (ValueError, KeyError, IndexError):
+                            continue
+                        if delta.get("content"):
+                            stream.feed(delta["content"])
+                        elif delta.get("reasoning"):
+                            reasoning.append(delta["reasoning"])
+                except httpx.HTTPError as e:
+                    print(f"   ⚠️ Question stream interrupted after {len(stream.items)} item(s): {e}")
+            return response
+
+        response = get_limiter("cerebras").call(stream_completion, tokens=estimate_tokens(prompt, max_tokens))
+
+        if response.status_code == 429:
+            return None
+        if response.status_code != 200:
+            raise RuntimeError(f"API error: {response.status_code}")
+
+        if not stream.text and reasoning:
+            # gpt-oss-120b sometimes returns the answer in 'reasoning' instead of 'content'
+            stream.feed("".join(reasoning))
+        return stream
+
+    @staticmethod
+    def _parse_question_json(text: str) -> dict:
+        """Parse JSON from LLM response with multiple strategies."""
+        # Strategy 1: Find JSON object directly
+        start = text.find('{')
+        end = text.rfind('}') + 1
+        if start != -1 and end > start:
+            try:
+                return json.loads(text[start:end])
+            except json.JSONDecodeError:
+                pass
+
+        # Strategy 2: Try to extract from markdown code block
+        if "```json" in text:
+            try:
+                json_str = text.split("```json")[1].split("```")[0]
+                return json.loads(json_str.strip())
+            except (IndexError, json.JSONDecodeError):
+                pass
+
+        if "```" in text:
+            try:
+                json_str = text.split("```")[1].split("```")[0]
+                return json.loads(json_str.strip())
+            except (IndexError, json.JSONDecodeError):
+                pass
+
+        raise ValueError("Could not parse JSON from response")
+
+    def _build_questions(self, raw_questions: List[dict], block: ContentBlock) -> List[Question]:
+        """
+        Convert raw question dicts from the LLM into Question objects for a block.
+
+        Each question is validated on its own and invalid ones are dropped (so
+        the caller can request their Bloom's level again): it needs text, a
+        valid bloom_level and, for multiple choice, 4 options and an answer
+        letter. An invalid difficulty falls back to a safe default, and figure
+        references are validated against the block's figure_map.
+        """
+        from lib.voice_optimizer import optimize_for_tts
+
+        has_figures, max_figure = self._figure_bounds(block)
+
+        def parse_bloom_level(value: str) -> Optional[BloomLevel]:
+            """Parse bloom level; None if invalid (the level is then re-requested)."""
+            try:
+                return BloomLevel(value.strip().lower())
             except (ValueError, AttributeError):
-                return BloomLevel.UNDERSTAND  # Safe default
+                return None
 
         def parse_difficulty(value: str) -> Difficulty:
             """Safely parse difficulty with fallback."""
@@ -2295,7 +2817,7 @@ Note: "figure_ref" should be the figure number (1 to {max_figure if max_figure e
             except (ValueError, AttributeError):
                 return Difficulty.INTERMEDIATE  # Safe default
 
-        def resolve_figure_ref(figure_ref, block, has_figures, max_figure) -> tuple:
+        def resolve_figure_ref(figure_ref) -> tuple:
             """Resolve figure_ref to URL and description, with validation."""
             if not figure_ref or not has_figures:
                 return None, None, None
@@ -2318,152 +2840,63 @@ Note: "figure_ref" should be the figure number (1 to {max_figure if max_figure e
 
             return None, None, None
 
-        def parse_json_response(text: str) -> dict:
-            """Parse JSON from LLM response with multiple strategies."""
-            # Strategy 1: Find JSON object directly
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            if start != -1 and end > start:
-                try:
-                    return json.loads(text[start:end])
-                except json.JSONDecodeError:
-                    pass
-
-            # Strategy 2: Try to extract from markdown code block
-            if "```json" in text:
-                try:
-                    json_str = text.split("```json")[1].split("```")[0]
-                    return json.loads(json_str.strip())
-                except (IndexError, json.JSONDecodeError):
-                    pass
-
-            if "```" in text:
-                try:
-                    json_str = text.split("```")[1].split("```")[0]
-                    return json.loads(json_str.strip())
-                except (IndexError, json.JSONDecodeError):
-                    pass
-
-            raise ValueError("Could not parse JSON from response")
-
-        # Retry loop
-        last_error = None
-        for attempt in range(max_retries + 1):
+        questions = []
+        for q in raw_questions:
             try:
-                # Use Cerebras for question generation (higher rate limits with pay-as-you-go)
-                api_url = CEREBRAS_URL
-                api_key = CEREBRAS_API_KEY
-                model = "gpt-oss-120b"
-
-                response = httpx.post(
-                    api_url,
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": model,
-                        "messages": [
-                            {"role": "system", "content": "You are an educational question generator. Output valid JSON only."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 8000,
-                        "temperature": 0.3
-                    },
-                    timeout=60.0
-                )
-
-                if response.status_code == 429:
-                    # Rate limited - wait and retry
-                    if attempt < max_retries:
-                        time.sleep(2 ** attempt)
-                        continue
-                    print(f"   ⚠️ Rate limited after {max_retries + 1} attempts")
-                    return []
-
-                if response.status_code != 200:
-                    last_error = f"API error: {response.status_code}"
-                    if attempt < max_retries:
-                        time.sleep(1)
-                        continue
-                    print(f"   ⚠️ GPT OSS error: {response.status_code}")
-                    return []
-
-                result = response.json()
-                msg = result["choices"][0]["message"]
-                # gpt-oss-120b returns 'reasoning' instead of 'content'
-                text = msg.get("content") or msg.get("reasoning", "")
-
-                # Parse JSON with multiple strategies
-                data = parse_json_response(text)
-
-                # Convert to Question objects
-                questions = []
-
-                # Handle new unified "questions" format (12 questions per topic)
-                all_questions = data.get("questions", [])
-
-                # Fallback: support old format with separate arrays
-                if not all_questions:
-                    all_questions = data.get("long_answer_questions", []) + data.get("multiple_choice_questions", [])
-
-                for q in all_questions:
-                    figure_ref, image_url, image_desc = resolve_figure_ref(
-                        q.get("figure_ref"), block, has_figures, max_figure
-                    )
-
-                    question_text = q.get("text", "")
-                    question_type_str = q.get("question_type", "multiple_choice").lower()
-                    options = q.get("options", [])
-
-                    # Determine question type
-                    if question_type_str == "long_answer":
-                        q_type = QuestionType.LONG_ANSWER
-                    else:
-                        q_type = QuestionType.MULTIPLE_CHOICE
-
-                    try:
-                        questions.append(Question(
-                            text=question_text,
-                            bloom_level=parse_bloom_level(q.get("bloom_level", "understand")),
-                            difficulty=parse_difficulty(q.get("difficulty", "intermediate")),
-                            question_type=q_type,
-                            expected_time=q.get("expected_time", 5 if q_type == QuestionType.LONG_ANSWER else 2),
-                            key_points=q.get("key_points", []),
-                            options=options if q_type == QuestionType.MULTIPLE_CHOICE else None,
-                            correct_answer=q.get("correct_answer") if q_type == QuestionType.MULTIPLE_CHOICE else None,
-                            # TTS: questions are read verbatim
-                            spoken_text=optimize_for_tts(question_text),
-                            spoken_options=[optimize_for_tts(opt) for opt in options] if options and q_type == QuestionType.MULTIPLE_CHOICE else None,
-                            figure_ref=figure_ref,
-                            image_url=image_url,
-                            image_description=image_desc
-                        ))
-                    except Exception as e:
-                        print(f"   ⚠️ Skipping malformed question: {e}")
-
-                # Log Bloom's distribution for verification
-                bloom_counts = {}
-                for q in questions:
-                    level = q.bloom_level.value
-                    bloom_counts[level] = bloom_counts.get(level, 0) + 1
-                print(f"   📊 Generated {len(questions)} questions: {bloom_counts}")
-
-                return questions
-
-            except json.JSONDecodeError as e:
-                last_error = f"JSON parse error: {e}"
-                if attempt < max_retries:
-                    time.sleep(1)
-                    continue
+                if not isinstance(q, dict):
+                    raise ValueError("not an object")
+                figure_ref, image_url, image_desc = resolve_figure_ref(q.get("figure_ref"))
+
+                question_text = (q.get("text") or "").strip()
+                if not question_text:
+                    raise ValueError("empty text")
+                bloom_level = parse_bloom_level(q.get("bloom_level"))
+                if bloom_level is None:
+                    raise ValueError(f"invalid bloom_level {q.get('bloom_level')!r}")
+                question_type_str = (q.get("question_type") or "multiple_choice").lower()
+                options = q.get("options") or []
+
+                # Determine question type
+                if question_type_str == "long_answer":
+                    q_type = QuestionType.LONG_ANSWER
+                else:
+                    q_type = QuestionType.MULTIPLE_CHOICE
+
+                correct_answer = None
+                if q_type == QuestionType.MULTIPLE_CHOICE:
+                    correct_answer = str(q.get("correct_answer") or "").strip()[:1].upper()
+                    if len(options) != 4 or correct_answer not in ("A", "B", "C", "D"):
+                        raise ValueError(f"multiple choice needs 4 options and an answer letter (got {len(options)}, {q.get('correct_answer')!r})")
+
+                questions.append(Question(
+                    text=question_text,
+                    bloom_level=bloom_level,
+                    difficulty=parse_difficulty(q.get("difficulty", "intermediate")),
+                    question_type=q_type,
+                    expected_time=q.get("expected_time", 5 if q_type == QuestionType.LONG_ANSWER else 2),
+                    key_points=q.get("key_points", []),
+                    options=options if q_type == QuestionType.MULTIPLE_CHOICE else None,
+                    correct_answer=correct_answer,
+                    # TTS: questions are read verbatim
+                    spoken_text=optimize_for_tts(question_text),
+                    spoken_options=[optimize_for_tts(opt) for opt in options] if options and q_type == QuestionType.MULTIPLE_CHOICE else None,
+                    figure_ref=figure_ref,
+                    image_url=image_url,
+                    image_description=image_desc
+                ))
             except Exception as e:
-                last_error = str(e)
-                if attempt < max_retries:
-                    time.sleep(1)
-                    continue
+                print(f"   ⚠️ Skipping malformed question: {e}")
 
-        print(f"   ⚠️ Failed to generate questions after {max_retries + 1} attempts: {last_error}")
-        return []
+        return questions
+
+    @staticmethod
+    def _log_bloom_distribution(questions: List[Question]) -> None:
+        """Log Bloom's distribution for verification."""
+        bloom_counts = {}
+        for q in questions:
+            level = q.bloom_level.value
+            bloom_counts[level] = bloom_counts.get(level, 0) + 1
+        print(f"   📊 Generated {len(questions)} questions: {bloom_counts}")
 
     def _extract_image_base64_from_chunk(self, chunk) -> List[str]:
         """Extract base64 image data from chunk without captioning"""
@@ -2484,12 +2917,14 @@ Note: "figure_ref" should be the figure number (1 to {max_figure if max_figure e
     def _batch_caption_images(self, images: List[str], max_workers: int = 5) -> List[Tuple[str, str]]:
         """
         Caption multiple images in parallel and classify their types.
-        GPT-4o-mini handles ~5 concurrent requests well within rate limits.
+        Calls go through the shared OpenAI rate limiter.
 
         Returns:
             List of tuples: (caption, image_type)
             Image types: circuit, anatomy, flowchart, graph, diagram, equation, map, table, photo, other
         """
+        from lib.rate_limiter import get_limiter
+
         def caption_and_classify(img_b64: str) -> Tuple[str, str]:
             messages = [
                 {
@@ -2513,7 +2948,9 @@ DESCRIPTION: [your detailed description]"""
                 }
             ]
             try:
-                response = self.vision_llm.invoke(messages)
+                response = get_limiter("openai").call(
+                    lambda: self.vision_llm.invoke(messages), tokens=1500, max_retries=0
+                )
                 content = response.content
 
                 # Parse response to extract type and description
@@ -2574,110 +3011,120 @@ DESCRIPTION: [your detailed description]"""
             **doc_meta
         )
     
-    def _create_content_block(self, tx, payload: dict):
-        """Create ContentBlock node with embeddings, hierarchy, and rich metadata"""
+    # ---------- Bulk writes (UNWIND, idempotent) ----------
+    # Every statement MERGEs on stable ids (block_id / questionset_id / titles) and
+    # reaches blocks through their Document, so a retried batch or a re-run of the
+    # whole persist rewrites the same nodes instead of duplicating them.
+
+    def _write_content_blocks(self, tx, doc_id: str, rows: List[dict]):
+        """Upsert a batch of ContentBlocks (rows: {block_id, props}) under their Document"""
         tx.run(
             """
             MATCH (d:Document {documentId: $doc_id})
-            CREATE (cb:ContentBlock {
-                block_id: $block_id,
-                chunk_index: $chunk_index,
-                text_content: $text_content,
-                combined_context: $combined_context,
-                page_from: $page_from,
-                page_to: $page_to,
-                page_start: $page_start,
-                page_end: $page_end,
-                has_images: $has_images,
-                has_tables: $has_tables,
-                image_count: $image_count,
-                table_count: $table_count,
-                embedding: $embedding,
-                page_number: $page_number,
-                bbox: $bbox,
-                chapter_title: $chapter_title,
-                section_title: $section_title,
-                heading_level: $heading_level,
-                image_urls: $image_urls,
-                image_descriptions: $image_descriptions,
-                image_types: $image_types,
-                content_type: $content_type,
-                definitions: $definitions,
-                procedure_steps: $procedure_steps,
-                equations: $equations,
-                code_blocks: $code_blocks,
-                tables: $tables
-            })
-            MERGE (d)-[:HAS_CONTENT_BLOCK]->(cb)
+            UNWIND $rows AS row
+            MERGE (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock {block_id: row.block_id})
+            SET cb += row.props
             """,
-            **payload
+            doc_id=doc_id,
+            rows=rows
+        )
+
+    def _write_question_sets(self, tx, doc_id: str, rows: List[dict]):
+        """Upsert a batch of QuestionSets (rows: {block_id, questionset_id, props})"""
+        tx.run(
+            """
+            MATCH (d:Document {documentId: $doc_id})
+            UNWIND $rows AS row
+            MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock {block_id: row.block_id})
+            MERGE (cb)-[:HAS_QUESTIONS]->(qs:QuestionSet {questionset_id: row.questionset_id})
+            SET qs += row.props
+            """,
+            doc_id=doc_id,
+            rows=rows
         )
 
-    def _create_hierarchy_nodes(self, tx, doc_id: str, content_blocks: List[ContentBlock]):
+    def _write_hierarchy(self, tx, doc_id: str, chapters: List[dict], sections: List[dict]):
         """
         Create Chapter and Section nodes in Neo4j for hierarchy-aware retrieval.
-        Links ContentBlocks to their respective Chapter/Section.
+        Links ContentBlocks to their respective Chapter/Section (two statements total).
         """
-        # Collect unique chapters and sections
-        chapters = {}  # {chapter_title: [block_ids]}
-        sections = {}  # {(chapter_title, section_title): [block_ids]}
-
-        for i, block in enumerate(content_blocks):
-            block_id = f"{doc_id}::block::{i}"
-
-            if block.chapter_title:
-                if block.chapter_title not in chapters:
-                    chapters[block.chapter_title] = []
-                chapters[block.chapter_title].append(block_id)
-
-                if block.section_title:
-                    key = (block.chapter_title, block.section_title)
-                    if key not in sections:
-                        sections[key] = []
-                    sections[key].append(block_id)
-
-        # Create Chapter nodes
-        for chapter_title, block_ids in chapters.items():
-            tx.run(
-                """
-                MATCH (d:Document {documentId: $doc_id})
-                MERGE (c:Chapter {doc_id: $doc_id, title: $chapter_title})
-                MERGE (d)-[:HAS_CHAPTER]->(c)
-                WITH c
-                UNWIND $block_ids AS block_id
-                MATCH (cb:ContentBlock {block_id: block_id})
-                MERGE (c)-[:CONTAINS]->(cb)
-                """,
-                doc_id=doc_id,
-                chapter_title=chapter_title,
-                block_ids=block_ids
-            )
+        tx.run(
+            """
+            MATCH (d:Document {documentId: $doc_id})
+            UNWIND $chapters AS row
+            MERGE (c:Chapter {doc_id: $doc_id, title: row.title})
+            MERGE (d)-[:HAS_CHAPTER]->(c)
+            WITH d, c, row
+            UNWIND row.block_ids AS block_id
+            MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock {block_id: block_id})
+            MERGE (c)-[:CONTAINS]->(cb)
+            """,
+            doc_id=doc_id,
+            chapters=chapters
+        )
+        tx.run(
+            """
+            MATCH (d:Document {documentId: $doc_id})
+            UNWIND $sections AS row
+            MATCH (c:Chapter {doc_id: $doc_id, title: row.chapter})
+            MERGE (s:Section {doc_id: $doc_id, title: row.title, chapter: row.chapter})
+            MERGE (c)-[:HAS_SECTION]->(s)
+            WITH d, s, row
+            UNWIND row.block_ids AS block_id
+            MATCH (d)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock {block_id: block_id})
+            MERGE (s)-[:CONTAINS]->(cb)
+            """,
+            doc_id=doc_id,
+            sections=sections
+        )
 
-        # Create Section nodes
-        for (chapter_title, section_title), block_ids in sections.items():
-            tx.run(
-                """
-                MATCH (c:Chapter {doc_id: $doc_id, title: $chapter_title})
-                MERGE (s:Section {doc_id: $doc_id, title: $section_title, chapter: $chapter_title})
-                MERGE (c)-[:HAS_SECTION]->(s)
-                WITH s
-                UNWIND $block_ids AS block_id
-                MATCH (cb:ContentBlock {block_id: block_id})
-                MERGE (s)-[:CONTAINS]->(cb)
-                """,
-                doc_id=doc_id,
-                chapter_title=chapter_title,
-                section_title=section_title,
-                block_ids=block_ids
-            )
+    def _content_block_row(self, doc_id: str, i: int, block: ContentBlock) -> dict:
+        """Build the ContentBlock write row (embeddings, hierarchy, and rich metadata)"""
+        # Use page_start/page_end if available (topic-level blocks), fallback to page_number
+        block_page_start = getattr(block, 'page_start', block.page_number)
+        block_page_end = getattr(block, 'page_end', block.page_number)
+
+        props = {
+            "chunk_index": i,
+            "text_content": block.text_content[:5000],  # Truncate long text
+            "combined_context": block.combined_context[:5000],
+            "page_from": block.meta.get("page_from"),
+            "page_to": block.meta.get("page_to"),
+            "page_start": block_page_start,  # First page of topic
+            "page_end": block_page_end,      # Last page of topic
+            "has_images": len(block.image_urls) > 0 or len(block.image_captions) > 0,
+            "has_tables": len(block.related_tables) > 0,
+            "image_count": len(block.image_urls) or len(block.image_captions),
+            "table_count": len(block.related_tables),
+            "embedding": block.embeddings or [],
+            "page_number": block.page_number,
+            "bbox": block.bbox,  # Optional: [x1, y1, x2, y2] for scroll-to
+            # Hierarchy fields
+            "chapter_title": block.chapter_title,
+            "section_title": block.section_title,
+            "heading_level": block.heading_level,
+            # Image fields
+            "image_urls": block.image_urls,
+            "image_descriptions": block.image_descriptions,
+            "image_types": getattr(block, 'image_types', []),
+            # Content type classification
+            "content_type": getattr(block, 'content_type', 'narrative'),
+            # Extracted structured content (as JSON strings for Neo4j)
+            "definitions": json.dumps(getattr(block, 'definitions', [])),
+            "procedure_steps": json.dumps(getattr(block, 'procedure_steps', [])),
+            "equations": json.dumps(getattr(block, 'equations', [])),
+            "code_blocks": json.dumps(getattr(block, 'code_blocks', [])),
+            "tables": json.dumps(getattr(block, 'tables', [])),
+        }
+        return {"block_id": f"{doc_id}::block::{i}", "props": props}
 
-    def _create_question_set(self, tx, block_id: str, questions: List[Question], doc_id: str):
+    def _question_set_row(self, block_id: str, questions: List[Question], doc_id: str) -> dict:
         """
-        Create a single QuestionSet node containing all questions for a ContentBlock.
+        Build a QuestionSet write row containing all questions for a ContentBlock.
         Stores questions as JSON array instead of separate nodes (78% node reduction).
         """
         from datetime import datetime
-        
+
         # Convert questions to JSON-serializable format
         questions_json = json.dumps([
             {
@@ -2695,7 +3142,7 @@ DESCRIPTION: [your detailed description]"""
             }
             for idx, q in enumerate(questions)
         ])
-        
+
         # Calculate difficulty distribution
         difficulty_dist = {}
         for q in questions:
@@ -2708,34 +3155,47 @@ DESCRIPTION: [your detailed description]"""
             bloom = q.bloom_level.value
             bloom_dist[bloom] = bloom_dist.get(bloom, 0) + 1
 
-        tx.run(
-            """
-            MATCH (cb:ContentBlock {block_id: $block_id})
-            CREATE (qs:QuestionSet {
-                questionset_id: $questionset_id,
-                questions: $questions_json,
-                total_count: $total_count,
-                difficulty_distribution: $difficulty_dist,
-                bloom_distribution: $bloom_dist,
-                generated_at: $generated_at,
-                doc_id: $doc_id
-            })
-            CREATE (cb)-[:HAS_QUESTIONS]->(qs)
-            """,
-            block_id=block_id,
-            questionset_id=f"{block_id}::qs",
-            questions_json=questions_json,
-            total_count=len(questions),
-            difficulty_dist=json.dumps(difficulty_dist),
-            bloom_dist=json.dumps(bloom_dist),
-            generated_at=datetime.utcnow().isoformat(),
-            doc_id=doc_id
+        return {
+            "block_id": block_id,
+            "questionset_id": f"{block_id}::qs",
+            "props": {
+                "questions": questions_json,
+                "total_count": len(questions),
+                "difficulty_distribution": json.dumps(difficulty_dist),
+                "bloom_distribution": json.dumps(bloom_dist),
+                "generated_at": datetime.utcnow().isoformat(),
+                "doc_id": doc_id,
+            },
+        }
+
+    @staticmethod
+    def _hierarchy_rows(block_rows: List[dict]) -> Tuple[List[dict], List[dict]]:
+        """Group persisted blocks into Chapter / Section link rows"""
+        chapters = {}  # {chapter_title: [block_ids]}
+        sections = {}  # {(chapter_title, section_title): [block_ids]}
+
+        for row in block_rows:
+            chapter_title = row["props"]["chapter_title"]
+            section_title = row["props"]["section_title"]
+            if not chapter_title:
+                continue
+            chapters.setdefault(chapter_title, []).append(row["block_id"])
+            if section_title:
+                sections.setdefault((chapter_title, section_title), []).append(row["block_id"])
+
+        return (
+            [{"title": title, "block_ids": ids} for title, ids in chapters.items()],
+            [{"chapter": chapter, "title": title, "block_ids": ids} for (chapter, title), ids in sections.items()],
         )
-    
+
     def persist_to_neo4j(self, doc_id: str, doc_meta: dict, content_blocks: List[ContentBlock]):
         """
         Persist document, content blocks, and questions to Neo4j.
         Creates the full graph structure with embeddings.
+
+        Blocks, question sets and hierarchy links are sent as parameter lists
+        through a few UNWIND statements, in transactions of NEO4J_WRITE_BATCH_SIZE
+        rows. All writes are idempotent, so a failed run can simply be retried.
         """
         if not self.neo4j_driver:
             print("⚠️  Neo4j not available, skipping graph persistence")
@@ -2743,84 +3203,49 @@ DESCRIPTION: [your detailed description]"""
         
         persist_start = time.time()
         print("\n💾 Persisting to Neo4j...")
-        
+
+        # Build all rows up front (no round trips)
+        block_rows = []
+        question_rows = []
+        skipped_blocks = 0
+        for i, block in enumerate(content_blocks):
+            # Validation: Skip blocks with empty text_content to prevent ghost nodes
+            if not block.text_content or not block.text_content.strip():
+                print(f"⚠️  Skipping block {i} - empty text_content")
+                skipped_blocks += 1
+                continue
+
+            row = self._content_block_row(doc_id, i, block)
+            block_rows.append(row)
+            if block.questions:
+                question_rows.append(self._question_set_row(row["block_id"], block.questions, doc_id))
+
+        chapter_rows, section_rows = self._hierarchy_rows(block_rows)
+        batch_size = max(1, NEO4J_WRITE_BATCH_SIZE)
+
         with self.neo4j_driver.session() as session:
             # 1. Create/update document
             session.execute_write(self._upsert_document, doc_meta)
             print(f"✅ Created document: {doc_id}")
-            
-            # 2. Create content blocks
-            block_ids = []
-            skipped_blocks = 0
-            for i, block in enumerate(content_blocks):
-                # Validation: Skip blocks with empty text_content to prevent ghost nodes
-                if not block.text_content or not block.text_content.strip():
-                    print(f"⚠️  Skipping block {i} - empty text_content")
-                    skipped_blocks += 1
-                    continue
 
-                block_id = f"{doc_id}::block::{i}"
-                block_ids.append(block_id)
-
-                # Extract page metadata if available
-                page_from = block.meta.get("page_from")
-                page_to = block.meta.get("page_to")
-                
-                # Use page_start/page_end if available (topic-level blocks), fallback to page_number
-                block_page_start = getattr(block, 'page_start', block.page_number)
-                block_page_end = getattr(block, 'page_end', block.page_number)
-
-                payload = {
-                    "doc_id": doc_id,
-                    "block_id": block_id,
-                    "chunk_index": i,
-                    "text_content": block.text_content[:5000],  # Truncate long text
-                    "combined_context": block.combined_context[:5000],
-                    "page_from": page_from,
-                    "page_to": page_to,
-                    "page_start": block_page_start,  # First page of topic
-                    "page_end": block_page_end,      # Last page of topic
-                    "has_images": len(block.image_urls) > 0 or len(block.image_captions) > 0,
-                    "has_tables": len(block.related_tables) > 0,
-                    "image_count": len(block.image_urls) or len(block.image_captions),
-                    "table_count": len(block.related_tables),
-                    "embedding": block.embeddings or [],
-                    "page_number": block.page_number,
-                    "bbox": block.bbox,  # Optional: [x1, y1, x2, y2] for scroll-to
-                    # Hierarchy fields
-                    "chapter_title": block.chapter_title,
-                    "section_title": block.section_title,
-                    "heading_level": block.heading_level,
-                    # Image fields
-                    "image_urls": block.image_urls,
-                    "image_descriptions": block.image_descriptions,
-                    "image_types": getattr(block, 'image_types', []),
-                    # NEW: Content type classification
-                    "content_type": getattr(block, 'content_type', 'narrative'),
-                    # NEW: Extracted structured content (as JSON strings for Neo4j)
-                    "definitions": json.dumps(getattr(block, 'definitions', [])),
-                    "procedure_steps": json.dumps(getattr(block, 'procedure_steps', [])),
-                    "equations": json.dumps(getattr(block, 'equations', [])),
-                    "code_blocks": json.dumps(getattr(block, 'code_blocks', [])),
-                    "tables": json.dumps(getattr(block, 'tables', [])),
-                }
-                
-                session.execute_write(self._create_content_block, payload)
-                print(f"✅ Created ContentBlock {i+1}/{len(content_blocks)}")
-                
-                # 3. Create QuestionSet for this block (all questions in one node)
-                if block.questions:
-                    session.execute_write(
-                        self._create_question_set,
-                        block_id,
-                        block.questions,
-                        doc_id
-                    )
-                    print(f"  ✅ Created QuestionSet with {len(block.questions)} questions")
+            # 2. Content blocks (embeddings make these the heaviest rows)
+            for start in range(0, len(block_rows), batch_size):
+                session.execute_write(self._write_content_blocks, doc_id, block_rows[start:start + batch_size])
+            print(f"✅ Created {len(block_rows)} ContentBlocks")
+
+            # 3. QuestionSets (all questions of a block in one node)
+            for start in range(0, len(question_rows), batch_size):
+                session.execute_write(self._write_question_sets, doc_id, question_rows[start:start + batch_size])
+            total_questions = sum(row["props"]["total_count"] for row in question_rows)
+            print(f"✅ Created {len(question_rows)} QuestionSets ({total_questions} questions)")
 
             # 4. Create hierarchy nodes (Chapter, Section) for hierarchy-aware retrieval
-            session.execute_write(self._create_hierarchy_nodes, doc_id, content_blocks)
-            print("✅ Created hierarchy nodes (Chapters, Sections)")
+            session.execute_write(self._write_hierarchy, doc_id, chapter_rows, section_rows)
+            print(f"✅ Created hierarchy nodes ({len(chapter_rows)} chapters, {len(section_rows)} sections)")
+
+        # Embeddings changed - drop cached vectors in every API process
+        from lib.vector_cache import invalidate_document
+        invalidate_document(doc_id)
 
         persist_elapsed = time.time() - persist_start
         if skipped_blocks > 0:
@@ -2835,7 +3260,8 @@ DESCRIPTION: [your detailed description]"""
         title: str = None,
         extract_images: bool = True,
         create_hierarchy: bool = True,
-        generate_questions: bool = True
+        generate_questions: bool = True,
+        force_phases: Optional[List[str]] = None
     ) -> dict:
         """
         Full enhanced ingestion pipeline.
@@ -2844,7 +3270,7 @@ DESCRIPTION: [your detailed description]"""
         1. Extract text content (Unstructured for native, OCR for scanned)
         2. Extract images with PyMuPDF (for PDFs)
         3. Upload images to R2
-        4. Create hierarchy with LLM
+        4. Create hierarchy (PDF outline / heading fonts, LLM fallback)
         5. Match images to content chunks
         6. Generate embeddings and questions
         7. Link images to questions
@@ -2858,12 +3284,16 @@ DESCRIPTION: [your detailed description]"""
             extract_images: Whether to extract and upload images
             create_hierarchy: Whether to create chapter/section hierarchy
             generate_questions: Whether to generate questions
+            force_phases: Checkpointed phases to rerun (plus all later ones), or ["all"].
+                See lib/ingestion_checkpoint.PHASES.
 
         Returns:
             Summary dict with counts and timing
         """
         import os
         from pathlib import Path
+        from lib.image_dedup import dedupe_images
+        from lib.ingestion_checkpoint import IngestionCheckpoint
 
         total_start = time.time()
         print(f"\n{'='*60}")
@@ -2876,27 +3306,44 @@ DESCRIPTION: [your detailed description]"""
         if not title:
             title = Path(file_path).stem
 
+        # Retries resume from the first phase without a checkpoint
+        checkpoint = IngestionCheckpoint(
+            doc_id,
+            file_path,
+            variant=f"std-i{int(extract_images)}-h{int(create_hierarchy)}-q{int(generate_questions)}",
+            force=force_phases,
+        )
+
         # ===== Phase 1: Extract text content =====
         print("⏳ Phase 1: Text Extraction...")
-        content_blocks = self.extract_document(file_path)
+        content_blocks = checkpoint.load("extract")
+        if content_blocks is None:
+            content_blocks = self.extract_document(file_path)
+            checkpoint.save("extract", content_blocks)
         print(f"✅ Phase 1 complete: {len(content_blocks)} content blocks\n")
 
         # ===== Phase 2: Extract images (PDFs only) =====
         images_by_page = {}
         image_index = {}
         ext = os.path.splitext(file_path)[1].lower()
+        restored_images = checkpoint.load("images")
 
-        if extract_images and ext == '.pdf':
+        if restored_images is not None:
+            images_by_page, image_index = restored_images
+            print(f"✅ Phase 2 complete: {len(image_index)} images (from checkpoint)\n")
+        elif extract_images and ext == '.pdf':
             print("⏳ Phase 2: Image Extraction...")
             images_by_page = extract_images_from_pdf(file_path)
 
             if images_by_page:
+                # Repeated logos / diagrams are classified and uploaded once
+                dedupe_images(images_by_page)
+
                 # Filter out non-educational images using vision LLM
                 total_before = sum(len(imgs) for imgs in images_by_page.values())
                 images_by_page = filter_and_describe_images(
                     images_by_page,
-                    vision_model="gemini",
-                    max_concurrent=5
+                    vision_model="gemini"
                 )
                 total_after = sum(len(imgs) for imgs in images_by_page.values())
                 print(f"   🎯 Vision filter: {total_after} educational, {total_before - total_after} decorative removed")
@@ -2909,20 +3356,30 @@ DESCRIPTION: [your detailed description]"""
                     print("✅ Phase 2 complete: All images filtered as decorative\n")
             else:
                 print("✅ Phase 2 complete: No images found\n")
+            checkpoint.save("images", (strip_image_bytes(images_by_page), image_index))
         else:
             print("⏳ Phase 2: Skipped (not a PDF or images disabled)\n")
 
         # ===== Phase 3: Create hierarchy =====
-        if create_hierarchy and len(content_blocks) > 1:
+        restored_blocks = checkpoint.load("hierarchy")
+        if restored_blocks is not None:
+            content_blocks = restored_blocks
+            print(f"✅ Phase 3 complete: Hierarchy restored from checkpoint\n")
+        elif create_hierarchy and len(content_blocks) > 1:
             print("⏳ Phase 3: Hierarchy Creation...")
-            hierarchy = create_hierarchy_with_llm(content_blocks)
+            hierarchy = build_document_hierarchy(content_blocks, pdf_path=file_path)
             content_blocks = apply_hierarchy_to_chunks(content_blocks, hierarchy)
+            checkpoint.save("hierarchy", content_blocks)
             print(f"✅ Phase 3 complete: Hierarchy applied\n")
         else:
             print("⏳ Phase 3: Skipped (single block or disabled)\n")
 
         # ===== Phase 4: Match images to chunks =====
-        if images_by_page and image_index:
+        restored_blocks = checkpoint.load("match")
+        if restored_blocks is not None:
+            content_blocks = restored_blocks
+            print(f"✅ Phase 4 complete: Image matches restored from checkpoint\n")
+        elif images_by_page and image_index:
             print("⏳ Phase 4: Image-Chunk Matching...")
             content_blocks = match_images_to_chunks(
                 content_blocks,
@@ -2930,12 +3387,17 @@ DESCRIPTION: [your detailed description]"""
                 image_index,
                 vision_llm=self.vision_llm  # For descriptions
             )
+            checkpoint.save("match", content_blocks)
             print(f"✅ Phase 4 complete\n")
         else:
             print("⏳ Phase 4: Skipped (no images)\n")
 
         # ===== Phase 5: Enrich (embeddings + questions) =====
-        if generate_questions:
+        restored_blocks = checkpoint.load("enrich")
+        if restored_blocks is not None:
+            content_blocks = restored_blocks
+            print(f"✅ Phase 5 complete: Embeddings and questions restored from checkpoint\n")
+        elif generate_questions:
             print("⏳ Phase 5: Enrichment (embeddings + questions)...")
             content_blocks = self.enrich_content_blocks(content_blocks)
 
@@ -2944,14 +3406,17 @@ DESCRIPTION: [your detailed description]"""
                 if block.image_urls:
                     add_image_context_to_questions(block)
 
+            checkpoint.save("enrich", content_blocks)
             print(f"✅ Phase 5 complete\n")
         else:
             # Still generate embeddings even if no questions
             print("⏳ Phase 5: Generating embeddings only...")
             for block in content_blocks:
                 block.combined_context = self._combine_context(block)
-                if block.combined_context:
-                    block.embeddings = embed_text(block.combined_context)
+            embeddings = embed_texts([block.combined_context for block in content_blocks])
+            for block, embedding in zip(content_blocks, embeddings):
+                block.embeddings = embedding
+            checkpoint.save("enrich", content_blocks)
             print(f"✅ Phase 5 complete\n")
 
         # ===== Phase 6: Persist to Neo4j =====
@@ -2963,6 +3428,7 @@ DESCRIPTION: [your detailed description]"""
             "source": Path(file_path).name
         }
         self.persist_to_neo4j(doc_id, doc_meta, content_blocks)
+        checkpoint.clear()
         print(f"✅ Phase 6 complete\n")
 
         # ===== Summary =====
@@ -3009,7 +3475,8 @@ DESCRIPTION: [your detailed description]"""
         user_id: str,
         title: str = None,
         chunk_size: int = 6000,
-        generate_questions: bool = True
+        generate_questions: bool = True,
+        force_phases: Optional[List[str]] = None
     ) -> dict:
         """
         FAST ingestion pipeline using PyMuPDF (no Unstructured).
@@ -3018,11 +3485,15 @@ DESCRIPTION: [your detailed description]"""
         1. Extract text with PyMuPDF (fast, ~2s)
         2. Extract images with PyMuPDF (fast, ~1s)
         3. Upload images to R2
-        4. Create hierarchy with LLM (Groq Llama 3.1 8B, ~1s)
+        4. Create hierarchy from PDF structure, or LLM (Groq Llama 3.1 8B, ~1s)
         5. Match images to chunks
         6. Generate embeddings + questions (Groq GPT-OSS-120B, ~5s parallel)
         7. Persist to Neo4j
 
+        Phases run as a DAG (lib/phase_dag.py): the image branch (2-3) runs
+        concurrently with text extraction + hierarchy (1, 4), and embeddings
+        overlap question generation.
+
         This is ~10x faster than the Unstructured-based pipeline.
 
         Args:
@@ -3032,11 +3503,14 @@ DESCRIPTION: [your detailed description]"""
             title: Optional document title
             chunk_size: Target characters per chunk
             generate_questions: Whether to generate questions
+            force_phases: Checkpointed phases to rerun (plus all later ones), or ["all"].
+                See lib/ingestion_checkpoint.PHASES.
 
         Returns:
             Summary dict with counts and timing
         """
         from pathlib import Path
+        from lib.ingestion_checkpoint import IngestionCheckpoint
 
         total_start = time.time()
         print(f"\n{'='*60}")
@@ -3049,104 +3523,184 @@ DESCRIPTION: [your detailed description]"""
         if not title:
             title = Path(file_path).stem
 
-        # ===== Phase 1: Fast text extraction with OCR fallback for problem pages =====
-        # Uses PyMuPDF for fast extraction, with encoding detection and
-        # DeepInfra Mistral-Small OCR for pages with LaTeX/equation issues
+        # ===== Phases as a DAG =====
+        # Text extraction (PyMuPDF + DeepInfra OCR for problem pages) and hierarchy
+        # creation form one branch; image extraction, vision filtering and R2 upload
+        # form another that runs concurrently. Matching waits for both, then
+        # embeddings + questions, then persistence:
+        #
+        #   analyze ─┬─ extract ── hierarchy ─┬─ match ── enrich ── persist
+        #            └─ images ───────────────┘
         from lib.encoding_check import extract_pdf_with_fallback
+        from lib.image_dedup import dedupe_images
+        from lib.pdf_analyzer import analyze_pdf
+        from lib.phase_dag import PhaseDAG
         from lib.text_chunker import chunk_pages
 
-        print("⏳ Phase 1: Text Extraction (PyMuPDF + OCR fallback)...")
-        pages_text = extract_pdf_with_fallback(file_path, doc_id=doc_id)
+        # Retries resume from the first phase without a checkpoint
+        checkpoint = IngestionCheckpoint(
+            doc_id,
+            file_path,
+            variant=f"fast-c{chunk_size}-q{int(generate_questions)}",
+            force=force_phases,
+        )
 
-        # Chunk the pages with smart boundaries
-        chunks = chunk_pages(pages_text, max_chars=chunk_size, min_chars=500, overlap=200)
+        def analyze_phase():
+            # One fitz pass feeds text, the encoding check and image extraction
+            if checkpoint.has("extract") and checkpoint.has("images"):
+                return None
+            return analyze_pdf(file_path)
 
-        # Add chunk_index to match expected format
-        for i, chunk in enumerate(chunks):
-            chunk["chunk_index"] = i
+        def extract_phase(analysis):
+            chunks = checkpoint.load("extract")
+            if chunks is not None:
+                print(f"✅ Phase 1 complete: {len(chunks)} chunks (from checkpoint)\n")
+                return chunks
 
-        print(f"✅ Phase 1 complete: {len(chunks)} chunks from {len(pages_text)} pages\n")
+            print("⏳ Phase 1: Text Extraction (PyMuPDF + OCR fallback)...")
+            pages_text = extract_pdf_with_fallback(file_path, doc_id=doc_id, analysis=analysis)
 
-        # ===== Phase 2: Image extraction + Vision filtering =====
-        print("⏳ Phase 2: Image Extraction (PyMuPDF)...")
-        images_by_page = extract_images_from_pdf(file_path)
-        image_index = {}
-        images_before_vision = sum(len(imgs) for imgs in images_by_page.values()) if images_by_page else 0
+            # Chunk the pages with smart boundaries
+            chunks = chunk_pages(pages_text, max_chars=chunk_size, min_chars=500, overlap=200)
 
-        if images_by_page:
-            # Apply vision LLM filtering to keep only educational images
-            print("⏳ Phase 2b: Vision LLM Classification...")
-            images_by_page = filter_and_describe_images(images_by_page)
-            images_after_vision = sum(len(imgs) for imgs in images_by_page.values())
+            # Add chunk_index to match expected format
+            for i, chunk in enumerate(chunks):
+                chunk["chunk_index"] = i
+
+            checkpoint.save("extract", chunks)
+            print(f"✅ Phase 1 complete: {len(chunks)} chunks from {len(pages_text)} pages\n")
+            return chunks
+
+        def images_phase(analysis):
+            restored = checkpoint.load("images")
+            if restored is not None:
+                print(f"✅ Phase 2 complete: {len(restored[1])} images (from checkpoint)\n")
+                return restored
+
+            print("⏳ Phase 2: Image Extraction (PyMuPDF)...")
+            images_by_page = extract_images_from_pdf(file_path, analysis=analysis)
+            image_index = {}
+            images_before_vision = sum(len(imgs) for imgs in images_by_page.values()) if images_by_page else 0
 
             if images_by_page:
-                image_index = upload_images_to_r2(images_by_page, doc_id)
-                print(f"✅ Phase 2 complete: {images_after_vision}/{images_before_vision} educational images uploaded\n")
+                # Repeated logos / diagrams are classified and uploaded once
+                dedupe_images(images_by_page)
+
+                # Apply vision LLM filtering to keep only educational images
+                print("⏳ Phase 2b: Vision LLM Classification...")
+                images_by_page = filter_and_describe_images(images_by_page)
+                images_after_vision = sum(len(imgs) for imgs in images_by_page.values())
+
+                if images_by_page:
+                    image_index = upload_images_to_r2(images_by_page, doc_id)
+                    print(f"✅ Phase 2 complete: {images_after_vision}/{images_before_vision} educational images uploaded\n")
+                else:
+                    print(f"✅ Phase 2 complete: 0/{images_before_vision} images passed vision filter\n")
             else:
-                print(f"✅ Phase 2 complete: 0/{images_before_vision} images passed vision filter\n")
-        else:
-            print("✅ Phase 2 complete: No images found\n")
+                print("✅ Phase 2 complete: No images found\n")
 
-        # ===== Phase 3: Create hierarchy with LLM =====
-        print("⏳ Phase 3: Hierarchy Creation (LLM)...")
-        # Create temporary ContentBlock-like objects for hierarchy function
-        temp_blocks = []
-        for chunk in chunks:
-            block = ContentBlock()
-            block.text_content = chunk["text"]
-            block.page_number = chunk["page_start"]
-            block.page_start = chunk["page_start"]
-            block.page_end = chunk["page_end"]
-            block.chunk_index = chunk["chunk_index"]
-            temp_blocks.append(block)
+            result = (strip_image_bytes(images_by_page), image_index, images_before_vision)
+            checkpoint.save("images", result)
+            return result
+
+        def hierarchy_phase(chunks):
+            blocks = checkpoint.load("hierarchy")
+            if blocks is not None:
+                print(f"✅ Phase 3 complete: Hierarchy restored from checkpoint\n")
+                return blocks
+
+            print("⏳ Phase 3: Hierarchy Creation (PDF structure / LLM)...")
+            # Create temporary ContentBlock-like objects for hierarchy function
+            blocks = []
+            for chunk in chunks:
+                block = ContentBlock()
+                block.text_content = chunk["text"]
+                block.page_number = chunk["page_start"]
+                block.page_start = chunk["page_start"]
+                block.page_end = chunk["page_end"]
+                block.chunk_index = chunk["chunk_index"]
+                blocks.append(block)
+
+            hierarchy = build_document_hierarchy(blocks, pdf_path=file_path)
+            blocks = apply_hierarchy_to_chunks(blocks, hierarchy)
+            checkpoint.save("hierarchy", blocks)
+            print(f"✅ Phase 3 complete: Hierarchy applied\n")
+            return blocks
 
-        hierarchy = create_hierarchy_with_llm(temp_blocks)
-        temp_blocks = apply_hierarchy_to_chunks(temp_blocks, hierarchy)
-        print(f"✅ Phase 3 complete: Hierarchy applied\n")
+        def match_phase(blocks, images):
+            restored = checkpoint.load("match")
+            if restored is not None:
+                print(f"✅ Phase 4 complete: Image matches restored from checkpoint\n")
+                return restored
+
+            images_by_page, image_index, _ = images
+            if not (images_by_page and image_index):
+                print("⏳ Phase 4: Skipped (no images)\n")
+                return blocks
 
-        # ===== Phase 4: Match images to chunks =====
-        if images_by_page and image_index:
             print("⏳ Phase 4: Image-Chunk Matching...")
             # Images already have descriptions from vision filtering
-            temp_blocks = match_images_to_chunks(
-                temp_blocks,
+            blocks = match_images_to_chunks(
+                blocks,
                 images_by_page,
                 image_index,
                 vision_llm=None  # Descriptions already in images_by_page from filter_and_describe_images
             )
+            checkpoint.save("match", blocks)
             print(f"✅ Phase 4 complete\n")
-        else:
-            print("⏳ Phase 4: Skipped (no images)\n")
+            return blocks
 
-        # ===== Phase 5: Embeddings + Questions (parallel) =====
-        if generate_questions:
-            print("⏳ Phase 5: Embeddings + Questions (parallel)...")
-            # Build combined context WITH figure descriptions for QP generation
-            for block in temp_blocks:
-                block.combined_context = build_combined_context_with_figures(block)
+        def enrich_phase(blocks):
+            restored = checkpoint.load("enrich")
+            if restored is not None:
+                print(f"✅ Phase 5 complete: Embeddings and questions restored from checkpoint\n")
+                return restored
 
-            temp_blocks = self.enrich_content_blocks(temp_blocks, parallel_questions=True)
-            # Note: image linking now happens inside _generate_questions via figure_ref
-            print(f"✅ Phase 5 complete\n")
-        else:
-            # Just generate embeddings
-            print("⏳ Phase 5: Embeddings only...")
-            for block in temp_blocks:
+            # Build combined context WITH figure descriptions for embeddings and QP generation
+            for block in blocks:
                 block.combined_context = build_combined_context_with_figures(block)
-                if block.combined_context:
-                    block.embeddings = embed_text(block.combined_context)
-            print(f"✅ Phase 5 complete\n")
 
-        # ===== Phase 6: Persist to Neo4j =====
-        print("⏳ Phase 6: Neo4j Persistence...")
-        doc_meta = {
-            "user_id": user_id,
-            "doc_id": doc_id,
-            "title": title,
-            "source": Path(file_path).name
-        }
-        self.persist_to_neo4j(doc_id, doc_meta, temp_blocks)
-        print(f"✅ Phase 6 complete\n")
+            if generate_questions:
+                print("⏳ Phase 5: Embeddings + Questions (parallel)...")
+                # Embeddings run alongside question generation inside enrich_content_blocks
+                blocks = self.enrich_content_blocks(blocks, parallel_questions=True)
+                # Note: image linking now happens inside _generate_questions via figure_ref
+            else:
+                # Just generate embeddings
+                print("⏳ Phase 5: Embeddings only...")
+                embeddings = embed_texts([block.combined_context for block in blocks])
+                for block, embedding in zip(blocks, embeddings):
+                    block.embeddings = embedding
+
+            checkpoint.save("enrich", blocks)
+            print(f"✅ Phase 5 complete\n")
+            return blocks
+
+        def persist_phase(blocks):
+            print("⏳ Phase 6: Neo4j Persistence...")
+            doc_meta = {
+                "user_id": user_id,
+                "doc_id": doc_id,
+                "title": title,
+                "source": Path(file_path).name
+            }
+            self.persist_to_neo4j(doc_id, doc_meta, blocks)
+            checkpoint.clear()
+            print(f"✅ Phase 6 complete\n")
+            return blocks
+
+        dag = PhaseDAG("FAST ingestion")
+        dag.add("analyze", analyze_phase)
+        dag.add("extract", extract_phase, deps=["analyze"])
+        dag.add("images", images_phase, deps=["analyze"])
+        dag.add("hierarchy", hierarchy_phase, deps=["extract"])
+        dag.add("match", match_phase, deps=["hierarchy", "images"])
+        dag.add("enrich", enrich_phase, deps=["match"])
+        dag.add("persist", persist_phase, deps=["enrich"])
+        results = dag.run_sync()
+
+        temp_blocks = results["persist"]
+        images_by_page, image_index, _ = results["images"]
 
         # ===== Summary =====
         total_elapsed = time.time() - total_start
@@ -0,0 +1,262 @@
+"""
+Token-aware batching for embedding requests.
+
+The OpenAI embeddings endpoint accepts a list of inputs per request (up to
+2048 items / ~300k tokens), but ingestion used to send one block per
+request. This module packs texts into as few requests as the limits allow,
+runs a bounded number of batches concurrently, and keeps input order.
+
+Failures are isolated: a failed batch is retried with backoff. Errors caused
+by the inputs (HTTP 400/413/422, or a wrong number of vectors back) split
+the batch in half so only the failing sub-batch is redone; a single input
+that still fails gets [] (same contract as embed_text()). Anything else -
+auth errors, rate limits or outages that outlast the retries - aborts the
+whole run and is raised, since bisecting would only multiply the requests.
+
+The actual API call is injected, so the packing/retry logic has no OpenAI
+dependency:
+
+Usage:
+    from lib.embedding_batcher import embed_batched
+
+    def call(batch):  # List[str] -> List[List[float]] in the same order
+        response = client.embeddings.create(model=model, input=batch)
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    vectors = embed_batched(texts, call)
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+# OpenAI limits for text-embedding-3-*; kept below the hard caps for headroom
+EMBED_MAX_ITEMS_PER_REQUEST = int(os.getenv("EMBED_MAX_ITEMS_PER_REQUEST", "2048"))
+EMBED_MAX_TOKENS_PER_REQUEST = int(os.getenv("EMBED_MAX_TOKENS_PER_REQUEST", "250000"))
+EMBED_MAX_TOKENS_PER_INPUT = 8191
+EMBED_BATCH_CONCURRENCY = int(os.getenv("EMBED_BATCH_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BACKOFF_SECONDS = 1.0
+
+# Conservative fallback when tiktoken is unavailable (English averages ~4 chars/token)
+CHARS_PER_TOKEN_ESTIMATE = 3
+
+INPUT_ERROR_STATUSES = {400, 413, 422}  # The batch itself is bad: bisect
+FATAL_ERROR_STATUSES = {401, 403, 404}  # Retrying cannot help: abort at once
+
+EmbedBatchFn = Callable[[List[str]], List[List[float]]]
+
+
+class EmbeddingCountMismatch(ValueError):
+    """The endpoint returned a different number of vectors than inputs."""
+
+
+def _status_code(error: Exception):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_input_error(error: Exception) -> bool:
+    """True if the failure is specific to the batch's inputs (worth bisecting)."""
+    return isinstance(error, EmbeddingCountMismatch) or _status_code(error) in INPUT_ERROR_STATUSES
+
+
+def _is_retryable(error: Exception) -> bool:
+    return not is_input_error(error) and _status_code(error) not in FATAL_ERROR_STATUSES
+
+
+# =============================================================================
+# Token Counting
+# =============================================================================
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """cl100k_base tokenizer (used by text-embedding-3-*), or None without tiktoken."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Token count of text (estimated from length if tiktoken is missing)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // CHARS_PER_TOKEN_ESTIMATE + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int = EMBED_MAX_TOKENS_PER_INPUT) -> str:
+    """Cut text so it fits the per-input token limit."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN_ESTIMATE]
+
+
+# =============================================================================
+# Packing
+# =============================================================================
+
+def pack_batches(
+    token_counts: Sequence[int],
+    max_tokens: int = EMBED_MAX_TOKENS_PER_REQUEST,
+    max_items: int = EMBED_MAX_ITEMS_PER_REQUEST,
+) -> List[List[int]]:
+    """
+    Greedily pack inputs (in order) into batches under both request limits.
+
+    Args:
+        token_counts: Token count per input
+        max_tokens: Token budget per request
+        max_items: Max inputs per request
+
+    Returns:
+        Batches as lists of input indices, in input order
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for idx, tokens in enumerate(token_counts):
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(idx)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _prepare(texts: Sequence[str], max_tokens: int, max_items: int):
+    """Truncate oversized inputs and pack the non-empty ones into batches."""
+    indices = [i for i, text in enumerate(texts) if text and text.strip()]
+    inputs, counts = [], []
+    for i in indices:
+        text = texts[i]
+        tokens = count_tokens(text)
+        if tokens > EMBED_MAX_TOKENS_PER_INPUT:
+            text = truncate_to_tokens(text, EMBED_MAX_TOKENS_PER_INPUT)
+            tokens = EMBED_MAX_TOKENS_PER_INPUT
+        inputs.append(text)
+        counts.append(tokens)
+
+    batches = [[indices[j] for j in batch] for batch in pack_batches(counts, max_tokens, max_items)]
+    by_index = dict(zip(indices, inputs))
+    return batches, by_index
+
+
+# =============================================================================
+# Running Batches
+# =============================================================================
+
+def _run_batch(
+    embed_batch: EmbedBatchFn,
+    batch: List[int],
+    inputs: dict,
+    results: List[List[float]],
+    max_retries: int,
+    aborted: threading.Event,
+) -> None:
+    """Embed one batch, retrying transient errors and bisecting input errors."""
+    texts = [inputs[i] for i in batch]
+    error = None
+
+    for attempt in range(max_retries):
+        if aborted.is_set():
+            return
+        try:
+            vectors = embed_batch(texts)
+            if len(vectors) != len(texts):
+                raise EmbeddingCountMismatch(f"expected {len(texts)} embeddings, got {len(vectors)}")
+            for i, vector in zip(batch, vectors):
+                results[i] = vector
+            return
+        except Exception as e:
+            error = e
+            if not _is_retryable(e):
+                break
+            if attempt < max_retries - 1:
+                time.sleep(EMBED_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+    if error is None:
+        return
+    if not is_input_error(error):
+        aborted.set()
+        raise error
+
+    if len(batch) == 1:
+        print(f"❌ Failed to generate embedding: {error}")
+        return
+
+    mid = len(batch) // 2
+    print(f"   ⚠️ Embedding batch of {len(batch)} failed ({error}), splitting")
+    _run_batch(embed_batch, batch[:mid], inputs, results, max_retries, aborted)
+    _run_batch(embed_batch, batch[mid:], inputs, results, max_retries, aborted)
+
+
+def embed_batched(
+    texts: Sequence[str],
+    embed_batch: EmbedBatchFn,
+    max_tokens: int = EMBED_MAX_TOKENS_PER_REQUEST,
+    max_items: int = EMBED_MAX_ITEMS_PER_REQUEST,
+    concurrency: int = EMBED_BATCH_CONCURRENCY,
+    max_retries: int = EMBED_MAX_RETRIES,
+) -> List[List[float]]:
+    """
+    Embed many texts with as few requests as possible.
+
+    Args:
+        texts: Inputs; empty/blank ones get [] without an API call
+        embed_batch: Sends one request, returns vectors in input order
+        max_tokens: Token budget per request
+        max_items: Max inputs per request
+        concurrency: Batches in flight at once
+        max_retries: Attempts per (sub-)batch for transient errors
+
+    Returns:
+        One vector per input, in input order ([] where an input was rejected)
+
+    Raises:
+        The provider error when it is not input-specific (auth, outage,
+        persistent rate limiting); batches not yet sent are skipped
+    """
+    results: List[List[float]] = [[] for _ in texts]
+    batches, inputs = _prepare(texts, max_tokens, max_items)
+    if not batches:
+        return results
+    aborted = threading.Event()
+
+    if len(batches) == 1 or concurrency <= 1:
+        for batch in batches:
+            _run_batch(embed_batch, batch, inputs, results, max_retries, aborted)
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as executor:
+        futures = [
+            executor.submit(_run_batch, embed_batch, batch, inputs, results, max_retries, aborted)
+            for batch in batches
+        ]
+        for future in futures:
+            future.result()
+    return results
@@ -0,0 +1,232 @@
+"""
+Two-tier cache for query embeddings (in-process LRU + Redis).
+
+Chat users repeat and paraphrase the same questions, and every retrieval
+used to re-embed the query through OpenAI (150-400 ms) before touching
+Neo4j. Query embeddings are deterministic per (model, text), so we cache
+them:
+
+- Tier 1: per-process LRU (no network at all)
+- Tier 2: Redis, shared by every API worker (float32 bytes, ~6 KB/entry)
+
+Keys are the model name + a hash of the normalized query (trimmed,
+whitespace-collapsed, case-folded). Failed embeddings ([]) are never
+cached. When Redis is down, the first lookup pays its timeout and then
+Redis is skipped for a cooldown (lib.optional_redis), so queries use the
+LRU alone instead of paying a GET and a SET timeout each.
+
+Usage:
+    from lib.embedding_cache import get_query_embedding, aget_query_embedding
+
+    qvec = get_query_embedding(query_text, embed_text, model=EMBED_MODEL_SMALL)
+    qvec = await aget_query_embedding(query_text, aembed_text, model=EMBED_MODEL_SMALL)
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from lib.optional_redis import OptionalRedis
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2048"))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+KEY_PREFIX = "embedding_cache:"
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used for the cache key (case and whitespace insensitive)."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(text: str, model: str) -> str:
+    """Redis / LRU key for a query under a given embedding model."""
+    digest = hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}{model}:{digest}"
+
+
+def _encode(vector: List[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _decode(raw: bytes) -> List[float]:
+    return np.frombuffer(raw, dtype=np.float32).tolist()
+
+
+# =============================================================================
+# In-process LRU
+# =============================================================================
+
+class EmbeddingLRU:
+    """Thread-safe LRU of query embeddings with a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            vector, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: List[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (vector, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_lru = EmbeddingLRU(EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_TTL_SECONDS)
+
+_stats_lock = threading.Lock()
+_stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+# =============================================================================
+# Redis Tier
+# =============================================================================
+
+# Short timeouts: this sits on the chat request path (binary values)
+_redis = OptionalRedis(
+    "Embedding cache", "using in-process cache only",
+    socket_timeout=0.2, socket_connect_timeout=0.2,
+)
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def get_query_embedding(
+    text: str,
+    embed_fn: Callable[[str], List[float]],
+    model: str,
+) -> List[float]:
+    """
+    Embed a query, serving repeats from the LRU or Redis.
+
+    Args:
+        text: Query text (normalized only for the key - embed_fn sees it as-is)
+        embed_fn: Fallback embedder, e.g. ingestion_workflow.embed_text
+        model: Embedding model name (part of the key)
+
+    Returns:
+        The embedding, or [] if embedding failed
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return embed_fn(text)
+
+    key = cache_key(text, model)
+    vector = _lru.get(key)
+    if vector is not None:
+        _count("local_hits")
+        return vector
+
+    try:
+        raw = _redis.client().get(key)
+        if raw:
+            vector = _decode(raw)
+            _lru.put(key, vector)
+            _count("redis_hits")
+            return vector
+    except Exception as e:
+        _redis.failed(e)
+
+    _count("misses")
+    vector = embed_fn(text)
+    if vector:
+        _lru.put(key, vector)
+        try:
+            _redis.client().set(key, _encode(vector), ex=EMBEDDING_CACHE_TTL_SECONDS)
+        except Exception as e:
+            _redis.failed(e)
+    return vector
+
+
+async def aget_query_embedding(
+    text: str,
+    aembed_fn: Callable[[str], Awaitable[List[float]]],
+    model: str,
+) -> List[float]:
+    """Async variant of get_query_embedding() (uses redis.asyncio)."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return await aembed_fn(text)
+
+    key = cache_key(text, model)
+    vector = _lru.get(key)
+    if vector is not None:
+        _count("local_hits")
+        return vector
+
+    try:
+        raw = await _redis.aclient().get(key)
+        if raw:
+            vector = _decode(raw)
+            _lru.put(key, vector)
+            _count("redis_hits")
+            return vector
+    except Exception as e:
+        _redis.failed(e)
+
+    _count("misses")
+    vector = await aembed_fn(text)
+    if vector:
+        _lru.put(key, vector)
+        try:
+            await _redis.aclient().set(key, _encode(vector), ex=EMBEDDING_CACHE_TTL_SECONDS)
+        except Exception as e:
+            _redis.failed(e)
+    return vector
+
+
+def cache_info() -> dict:
+    """Hit/miss counters and LRU size."""
+    with _stats_lock:
+        info = dict(_stats)
+    lookups = info["local_hits"] + info["redis_hits"] + info["misses"]
+    info["entries"] = len(_lru)
+    info["hit_rate"] = round((info["local_hits"] + info["redis_hits"]) / lookups, 3) if lookups else 0.0
+    return info
+
+
+def clear() -> None:
+    """Empty the in-process tier and reset counters (Redis entries expire on their own)."""
+    _lru.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -474,13 +474,16 @@ def check_page_encoding(page: fitz.Page) -> Dict:
     return result
 
 
-def check_pdf_encoding(pdf_path: str) -> Dict:
+def check_pdf_encoding(pdf_path: str, analysis=None) -> Dict:
     """
     Check entire PDF for encoding issues (V1 + V2 combined).
 
     V1: Symbol corruption (? replacements)
     V2: Layout issues (scattered equations, multi-column artifacts)
 
+    Pass the PdfAnalysis from lib.pdf_analyzer.analyze_pdf() to reuse its
+    per-page checks instead of re-extracting every page.
+
     Returns:
         {
             'total_pages': int,
@@ -496,10 +499,20 @@ def check_pdf_encoding(pdf_path: str) -> Dict:
             }
         }
     """
-    doc = fitz.open(pdf_path)
+    if analysis is not None:
+        page_checks = [page.encoding for page in analysis.pages]
+    else:
+        doc = fitz.open(pdf_path)
+        page_checks = [check_page_encoding(page) for page in doc]
+        doc.close()
+
+    return summarize_page_checks(page_checks)
+
 
+def summarize_page_checks(page_checks: List[Dict]) -> Dict:
+    """Aggregate per-page check_page_encoding() results into the PDF-level report."""
     results = {
-        'total_pages': len(doc),
+        'total_pages': len(page_checks),
         'pages_with_issues': [],
         'problem_page_numbers': [],
         'overall_score': 0.0,
@@ -514,13 +527,12 @@ def check_pdf_encoding(pdf_path: str) -> Dict:
 
     quality_scores = []
 
-    for page in doc:
-        check = check_page_encoding(page)
+    for check in page_checks:
         quality_scores.append(check.get('quality_score', 100))
 
         if check['has_issues']:
             results['pages_with_issues'].append(check)
-            results['problem_page_numbers'].append(page.number + 1)
+            results['problem_page_numbers'].append(check['page_num'])
 
             # Track which V2 checks triggered
             v2_checks = check.get('v2_checks', {})
@@ -531,8 +543,6 @@ def check_pdf_encoding(pdf_path: str) -> Dict:
             if v2_checks.get('symbol_corruption'):
                 results['issue_summary']['symbol_corruption'] += 1
 
-    doc.close()
-
     # Calculate overall metrics
     if quality_scores:
         results['avg_quality_score'] = sum(quality_scores) / len(quality_scores)
@@ -619,6 +629,10 @@ DEEPINFRA_OCR_MODELS = {
     },
 }
 
+# Bump when DEEPINFRA_OCR_PROMPT or the Gemini OCR prompt changes (keys lib/ocr_cache entries)
+OCR_PROMPT_VERSION = "v1"
+GEMINI_OCR_MODEL = "gemini-2.0-flash"
+
 # OCR prompt for DeepInfra models
 DEEPINFRA_OCR_PROMPT = """You are an expert document OCR system. Extract ALL text content from this document page.
 
@@ -636,7 +650,7 @@ Output the extracted text in clean markdown format."""
 # Handwriting Detection
 # =============================================================================
 
-def detect_handwriting(image_b64: str, api_key: str = None) -> Dict:
+def detect_handwriting(image_b64: str, api_key: str = None, mime_type: str = "image/png") -> Dict:
     """
     Detect if an image contains handwritten content using Gemini vision.
 
@@ -648,6 +662,7 @@ def detect_handwriting(image_b64: str, api_key: str = None) -> Dict:
     Args:
         image_b64: Base64 encoded image (PNG/JPEG)
         api_key: Google API key (uses env var if not provided)
+        mime_type: Encoding of image_b64 (see lib.image_encoding)
 
     Returns:
         {
@@ -657,7 +672,9 @@ def detect_handwriting(image_b64: str, api_key: str = None) -> Dict:
         }
     """
     import os
-    import httpx
+    from lib import provider_clients
+
+    from lib.rate_limiter import get_limiter
 
     api_key = api_key or os.getenv("GOOGLE_API_KEY")
     if not api_key:
@@ -669,7 +686,7 @@ def detect_handwriting(image_b64: str, api_key: str = None) -> Dict:
         }
 
     try:
-        response = httpx.post(
+        response = get_limiter("gemini").call(lambda: provider_clients.post(
             f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
             headers={"Content-Type": "application/json"},
             json={
@@ -683,7 +700,7 @@ Answer with ONLY one of these exact responses:
 - MIXED (if significant amounts of both)
 
 Just respond with the single word, nothing else."""},
-                        {"inline_data": {"mime_type": "image/png", "data": image_b64}}
+                        {"inline_data": {"mime_type": mime_type, "data": image_b64}}
                     ]
                 }],
                 "generationConfig": {
@@ -692,7 +709,7 @@ Just respond with the single word, nothing else."""},
                 }
             },
             timeout=15.0
-        )
+        ), tokens=1500)
 
         if response.status_code == 200:
             result = response.json()
@@ -747,10 +764,7 @@ def detect_document_type(pdf_path: str) -> Dict:
             "needs_full_ocr": bool
         }
     """
-    import os
-    import base64
-    from pdf2image import convert_from_path
-    from io import BytesIO
+    from lib.page_rasterizer import encode_pages
 
     doc = fitz.open(pdf_path)
     total_chars = sum(len(page.get_text()) for page in doc)
@@ -764,13 +778,9 @@ def detect_document_type(pdf_path: str) -> Dict:
     if is_scanned or avg_chars < 500:
         # Convert first page to image for handwriting check
         try:
-            images = convert_from_path(pdf_path, first_page=1, last_page=1, dpi=100)
-            if images:
-                buffer = BytesIO()
-                images[0].save(buffer, format="PNG")
-                b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-                hw_check = detect_handwriting(b64)
+            page = encode_pages(pdf_path, [1], model="gemini-preview", dpi=100).get(1)
+            if page:
+                hw_check = detect_handwriting(page.b64, mime_type=page.mime_type)
 
                 return {
                     "pdf_type": "scanned" if is_scanned else "native",
@@ -818,9 +828,7 @@ def extract_image_with_ocr(
         List with single string (to match PDF extraction format)
     """
     import os
-    import base64
-    from PIL import Image
-    from io import BytesIO
+    from lib.image_encoding import encode_image
 
     ext = os.path.splitext(image_path)[1].lower()
     if ext not in SUPPORTED_IMAGE_FORMATS:
@@ -828,31 +836,25 @@ def extract_image_with_ocr(
 
     print(f"🖼️  Processing image: {os.path.basename(image_path)}")
 
-    # Load and convert image to PNG base64
-    img = Image.open(image_path)
-
-    # Convert to RGB if necessary (for RGBA or palette images)
-    if img.mode in ('RGBA', 'P'):
-        img = img.convert('RGB')
-
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
 
     # Auto-detect handwriting if provider is "auto"
     if ocr_provider == "auto":
         print("   🔍 Detecting content type...")
-        hw_check = detect_handwriting(b64)
+        preview = encode_image(image_bytes, model="gemini-preview")
+        hw_check = detect_handwriting(preview.b64, mime_type=preview.mime_type)
         ocr_provider = hw_check["recommended_ocr"]
         print(f"   📝 Content type: {hw_check['content_type']} → using {ocr_provider}")
 
-    # Run OCR
+    # Run OCR on an encoding sized for the chosen model
     api_key = os.getenv("GOOGLE_API_KEY") if ocr_provider == "gemini" else os.getenv("DEEPINFRA_API_KEY")
+    image = encode_image(image_bytes, model="gemini" if ocr_provider == "gemini" else deepinfra_model)
 
     if ocr_provider == "gemini":
-        text = ocr_page_gemini(b64, 1, api_key)
+        text = ocr_page_gemini(image.b64, 1, api_key, mime_type=image.mime_type)
     else:
-        text = ocr_page_deepinfra(b64, 1, api_key, deepinfra_model)
+        text = ocr_page_deepinfra(image.b64, 1, api_key, deepinfra_model, mime_type=image.mime_type)
 
     if text:
         print(f"   ✅ Extracted {len(text)} characters")
@@ -883,50 +885,56 @@ def extract_images_with_ocr(
         List of extracted text strings (one per image)
     """
     import os
-    import base64
-    import asyncio
-    import httpx
-    from PIL import Image
-    from io import BytesIO
+    from lib.image_encoding import encode_image
 
     print(f"🖼️  Processing {len(image_paths)} images...")
 
-    # Convert all images to base64
-    images_b64 = []
+    images_bytes = []
     for path in image_paths:
         try:
-            img = Image.open(path)
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            buffer = BytesIO()
-            img.save(buffer, format="PNG")
-            images_b64.append(base64.b64encode(buffer.getvalue()).decode("utf-8"))
+            with open(path, "rb") as f:
+                images_bytes.append(f.read())
         except Exception as e:
             print(f"   ⚠️ Failed to load {path}: {e}")
-            images_b64.append(None)
+            images_bytes.append(None)
 
     # Detect content type from first valid image
-    first_valid = next((b64 for b64 in images_b64 if b64), None)
+    first_valid = next((data for data in images_bytes if data), None)
     if ocr_provider == "auto" and first_valid:
         print("   🔍 Detecting content type...")
-        hw_check = detect_handwriting(first_valid)
+        try:
+            preview = encode_image(first_valid, model="gemini-preview")
+            hw_check = detect_handwriting(preview.b64, mime_type=preview.mime_type)
+        except Exception as e:
+            print(f"   ⚠️ Handwriting detection failed: {e}")
+            hw_check = {"content_type": "printed", "recommended_ocr": "deepinfra"}
         ocr_provider = hw_check["recommended_ocr"]
         print(f"   📝 Content type: {hw_check['content_type']} → using {ocr_provider}")
 
+    # Encode once per image, sized for the chosen model
+    encode_model = "gemini" if ocr_provider == "gemini" else deepinfra_model
+    images = []
+    for path, data in zip(image_paths, images_bytes):
+        try:
+            images.append(encode_image(data, model=encode_model) if data else None)
+        except Exception as e:
+            print(f"   ⚠️ Failed to load {path}: {e}")
+            images.append(None)
+
     # For now, process sequentially (can add parallel later if needed)
     # Gemini doesn't have async support in our current implementation
     results = []
     api_key = os.getenv("GOOGLE_API_KEY") if ocr_provider == "gemini" else os.getenv("DEEPINFRA_API_KEY")
 
-    for i, b64 in enumerate(images_b64):
-        if b64 is None:
+    for i, image in enumerate(images):
+        if image is None:
             results.append("")
             continue
 
         if ocr_provider == "gemini":
-            text = ocr_page_gemini(b64, i + 1, api_key)
+            text = ocr_page_gemini(image.b64, i + 1, api_key, mime_type=image.mime_type)
         else:
-            text = ocr_page_deepinfra(b64, i + 1, api_key, deepinfra_model)
+            text = ocr_page_deepinfra(image.b64, i + 1, api_key, deepinfra_model, mime_type=image.mime_type)
 
         results.append(text or "")
         print(f"   ✅ Image {i + 1}/{len(image_paths)}: {len(text or '')} chars")
@@ -934,24 +942,30 @@ def extract_images_with_ocr(
     return results
 
 
-def ocr_page_gemini(image_b64: str, page_num: int, api_key: str) -> Optional[str]:
+def _payload_kb(images: Dict[int, "EncodedImage"]) -> int:
+    """Total upload size of encoded page images, for logging."""
+    return sum(len(image.data) for image in images.values()) // 1024
+
+
+def ocr_page_gemini(image_b64: str, page_num: int, api_key: str, mime_type: str = "image/png") -> Optional[str]:
     """OCR a page using Gemini API."""
-    import httpx
+    from lib import provider_clients
+    from lib.rate_limiter import get_limiter
 
     try:
-        response = httpx.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
+        response = get_limiter("gemini").call(lambda: provider_clients.post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_OCR_MODEL}:generateContent?key={api_key}",
             headers={"Content-Type": "application/json"},
             json={
                 "contents": [{
                     "parts": [
                         {"text": "Extract ALL text from this image. Preserve formatting, line breaks, and structure. Include all equations, formulas, and symbols. Output only the extracted text."},
-                        {"inline_data": {"mime_type": "image/png", "data": image_b64}}
+                        {"inline_data": {"mime_type": mime_type, "data": image_b64}}
                     ]
                 }]
             },
             timeout=60.0
-        )
+        ), tokens=5000)
 
         if response.status_code == 200:
             result = response.json()
@@ -968,21 +982,24 @@ def ocr_page_deepinfra(
     image_b64: str,
     page_num: int,
     api_key: str,
-    model: str = "olmocr2"
+    model: str = "olmocr2",
+    mime_type: str = "image/png"
 ) -> Optional[str]:
     """
     OCR a page using DeepInfra API.
 
     Args:
-        image_b64: Base64 encoded PNG image
+        image_b64: Base64 encoded image
         page_num: Page number for logging
         api_key: DeepInfra API key
         model: Model key from DEEPINFRA_OCR_MODELS
+        mime_type: Encoding of image_b64 (see lib.image_encoding)
 
     Returns:
         Extracted text or None on error
     """
-    import httpx
+    from lib import provider_clients
+    from lib.rate_limiter import get_limiter
 
     model_info = DEEPINFRA_OCR_MODELS.get(model)
     if not model_info:
@@ -992,7 +1009,7 @@ def ocr_page_deepinfra(
     model_id = model_info["id"]
 
     try:
-        response = httpx.post(
+        response = get_limiter("deepinfra").call(lambda: provider_clients.post(
             "https://api.deepinfra.com/v1/openai/chat/completions",
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -1008,7 +1025,7 @@ def ocr_page_deepinfra(
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/png;base64,{image_b64}"
+                                    "url": f"data:{mime_type};base64,{image_b64}"
                                 },
                             },
                         ],
@@ -1017,7 +1034,7 @@ def ocr_page_deepinfra(
                 "max_tokens": 4096,
             },
             timeout=120.0,
-        )
+        ), tokens=5000)
 
         if response.status_code == 200:
             data = response.json()
@@ -1035,7 +1052,8 @@ async def async_ocr_page_deepinfra(
     page_num: int,
     api_key: str,
     model: str = "mistral-small",
-    client: "httpx.AsyncClient" = None
+    client: "httpx.AsyncClient" = None,
+    mime_type: str = "image/png"
 ) -> tuple[int, Optional[str]]:
     """
     Async OCR a page using DeepInfra API.
@@ -1043,7 +1061,8 @@ async def async_ocr_page_deepinfra(
     Returns:
         Tuple of (page_num, extracted_text or None)
     """
-    import httpx
+    from lib import provider_clients
+    from lib.rate_limiter import get_limiter
 
     model_info = DEEPINFRA_OCR_MODELS.get(model)
     if not model_info:
@@ -1052,62 +1071,34 @@ async def async_ocr_page_deepinfra(
     model_id = model_info["id"]
 
     try:
-        # Use provided client or create new one
-        if client:
-            response = await client.post(
-                "https://api.deepinfra.com/v1/openai/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": model_id,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": DEEPINFRA_OCR_PROMPT},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/png;base64,{image_b64}"
-                                    },
-                                },
-                            ],
-                        }
-                    ],
-                    "max_tokens": 4096,
-                },
-                timeout=120.0,
-            )
-        else:
-            async with httpx.AsyncClient() as temp_client:
-                response = await temp_client.post(
-                    "https://api.deepinfra.com/v1/openai/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": model_id,
-                        "messages": [
+        url = "https://api.deepinfra.com/v1/openai/chat/completions"
+        client = client or provider_clients.get_async_client(url)
+        response = await get_limiter("deepinfra").acall(lambda: client.post(
+            url,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": model_id,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": DEEPINFRA_OCR_PROMPT},
                             {
-                                "role": "user",
-                                "content": [
-                                    {"type": "text", "text": DEEPINFRA_OCR_PROMPT},
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/png;base64,{image_b64}"
-                                        },
-                                    },
-                                ],
-                            }
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:{mime_type};base64,{image_b64}"
+                                },
+                            },
                         ],
-                        "max_tokens": 4096,
-                    },
-                    timeout=120.0,
-                )
+                    }
+                ],
+                "max_tokens": 4096,
+            },
+            timeout=120.0,
+        ), tokens=5000)
 
         if response.status_code == 200:
             data = response.json()
@@ -1127,7 +1118,7 @@ async def ocr_problem_pages_async(
     page_numbers: List[int],
     ocr_provider: str = "deepinfra",
     deepinfra_model: str = "mistral-small",
-    max_concurrent: int = 10
+    max_concurrent: Optional[int] = None
 ) -> Dict[int, str]:
     """
     OCR multiple pages in PARALLEL using async requests.
@@ -1141,17 +1132,17 @@ async def ocr_problem_pages_async(
         page_numbers: 1-indexed page numbers to OCR
         ocr_provider: "deepinfra" (gemini not yet async)
         deepinfra_model: Model key (mistral-small recommended)
-        max_concurrent: Max concurrent API requests (default 10)
+        max_concurrent: Ceiling on in-flight requests from this call (default: the
+            DeepInfra limiter's max). The shared rate limiter adapts below it.
 
     Returns:
         Dict mapping page_number -> ocr_text
     """
     import os
-    import base64
     import asyncio
-    import httpx
-    from pdf2image import convert_from_path
-    from io import BytesIO
+    from lib import ocr_cache, provider_clients
+    from lib.page_rasterizer import encode_pages
+    from lib.rate_limiter import get_limiter
 
     if ocr_provider != "deepinfra":
         print(f"   ⚠️ Async OCR only supports deepinfra, falling back to sequential")
@@ -1164,52 +1155,55 @@ async def ocr_problem_pages_async(
 
     model_info = DEEPINFRA_OCR_MODELS.get(deepinfra_model)
     provider_name = f"DeepInfra ({model_info['name'] if model_info else deepinfra_model})"
+    max_concurrent = max_concurrent or get_limiter("deepinfra").max_concurrency
 
     print(f"   🚀 Parallel OCR for {len(page_numbers)} pages using {provider_name} (max {max_concurrent} concurrent)")
 
-    # Step 1: Convert all pages to images first (CPU-bound, done sequentially)
+    # Step 1: Render all pages from one open document (CPU-bound, no subprocesses),
+    # encoded and sized for the OCR model
     print(f"      📄 Converting pages to images...")
-    page_images = {}
-    for page_num in page_numbers:
-        try:
-            images = convert_from_path(
-                pdf_path,
-                first_page=page_num,
-                last_page=page_num,
-                dpi=150
-            )
-            if images:
-                buffer = BytesIO()
-                images[0].save(buffer, format="PNG")
-                page_images[page_num] = base64.b64encode(buffer.getvalue()).decode("utf-8")
-        except Exception as e:
-            print(f"      ⚠️ Page {page_num}: Image conversion error - {e}")
+    page_images = encode_pages(pdf_path, page_numbers, model=deepinfra_model, dpi=150)
+
+    print(f"      ✅ Converted {len(page_images)} pages to images ({_payload_kb(page_images)} KB)")
 
-    print(f"      ✅ Converted {len(page_images)} pages to images")
+    # Pages already OCR'd with this model and prompt (retries, re-uploads) are free
+    results = ocr_cache.get_many(
+        "ocr", "deepinfra", deepinfra_model, OCR_PROMPT_VERSION,
+        {p: image.data for p, image in page_images.items()},
+    )
+    if results:
+        print(f"      ♻️  {len(results)} pages served from OCR cache")
+    page_images = {p: image for p, image in page_images.items() if p not in results}
 
-    # Step 2: OCR all pages in parallel (I/O-bound, async)
+    # Step 2: OCR remaining pages in parallel (I/O-bound, async)
     print(f"      🔄 Starting parallel OCR requests...")
 
     semaphore = asyncio.Semaphore(max_concurrent)
 
-    async def bounded_ocr(page_num: int, b64: str, client: httpx.AsyncClient):
+    async def bounded_ocr(page_num: int, image, client):
         async with semaphore:
-            return await async_ocr_page_deepinfra(b64, page_num, api_key, deepinfra_model, client)
-
-    results = {}
-    async with httpx.AsyncClient() as client:
-        tasks = [
-            bounded_ocr(page_num, b64, client)
-            for page_num, b64 in page_images.items()
-        ]
-        completed = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for result in completed:
-            if isinstance(result, Exception):
-                print(f"      ⚠️ OCR task error: {result}")
-            elif result and result[1]:
-                page_num, text = result
-                results[page_num] = text
+            return await async_ocr_page_deepinfra(
+                image.b64, page_num, api_key, deepinfra_model, client, mime_type=image.mime_type
+            )
+
+    # Shared keep-alive pool: pages multiplex over the same DeepInfra connections
+    client = provider_clients.get_async_client("https://api.deepinfra.com")
+    tasks = [
+        bounded_ocr(page_num, image, client)
+        for page_num, image in page_images.items()
+    ]
+    completed = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for result in completed:
+        if isinstance(result, Exception):
+            print(f"      ⚠️ OCR task error: {result}")
+        elif result and result[1]:
+            page_num, text = result
+            results[page_num] = text
+            ocr_cache.put(
+                "ocr", "deepinfra", deepinfra_model, OCR_PROMPT_VERSION,
+                page_images[page_num].data, text,
+            )
 
     print(f"      ✅ Completed OCR for {len(results)}/{len(page_numbers)} pages")
     return results
@@ -1220,7 +1214,7 @@ def ocr_problem_pages_parallel(
     page_numbers: List[int],
     ocr_provider: str = "deepinfra",
     deepinfra_model: str = "mistral-small",
-    max_concurrent: int = 10
+    max_concurrent: Optional[int] = None
 ) -> Dict[int, str]:
     """
     Synchronous wrapper for parallel OCR.
@@ -1229,6 +1223,8 @@ def ocr_problem_pages_parallel(
     """
     import asyncio
 
+    from lib import provider_clients
+
     try:
         # Check if we're already in an async context
         loop = asyncio.get_running_loop()
@@ -1236,13 +1232,13 @@ def ocr_problem_pages_parallel(
         import concurrent.futures
         with concurrent.futures.ThreadPoolExecutor() as executor:
             future = executor.submit(
-                asyncio.run,
+                provider_clients.run,
                 ocr_problem_pages_async(pdf_path, page_numbers, ocr_provider, deepinfra_model, max_concurrent)
             )
             return future.result()
     except RuntimeError:
-        # No running loop - safe to use asyncio.run
-        return asyncio.run(
+        # No running loop - provider_clients.run closes the loop's HTTP clients afterwards
+        return provider_clients.run(
             ocr_problem_pages_async(pdf_path, page_numbers, ocr_provider, deepinfra_model, max_concurrent)
         )
 
@@ -1266,9 +1262,8 @@ def ocr_problem_pages(
         Dict mapping page_number -> ocr_text
     """
     import os
-    import base64
-    from pdf2image import convert_from_path
-    from io import BytesIO
+    from lib import ocr_cache
+    from lib.page_rasterizer import encode_pages
 
     # Get API key based on provider
     if ocr_provider == "gemini":
@@ -1277,6 +1272,7 @@ def ocr_problem_pages(
             print("   ⚠️ No GOOGLE_API_KEY, skipping OCR fallback")
             return {}
         provider_name = "Gemini"
+        cache_model = GEMINI_OCR_MODEL
     elif ocr_provider == "deepinfra":
         api_key = os.getenv("DEEPINFRA_API_KEY")
         if not api_key:
@@ -1284,42 +1280,37 @@ def ocr_problem_pages(
             return {}
         model_info = DEEPINFRA_OCR_MODELS.get(deepinfra_model)
         provider_name = f"DeepInfra ({model_info['name'] if model_info else deepinfra_model})"
+        cache_model = deepinfra_model
     else:
         print(f"   ⚠️ Unknown OCR provider: {ocr_provider}")
         return {}
 
     print(f"   🔄 OCR fallback for pages: {page_numbers} using {provider_name}")
 
-    results = {}
-
-    for page_num in page_numbers:
-        try:
-            # Convert single page to image
-            images = convert_from_path(
-                pdf_path,
-                first_page=page_num,
-                last_page=page_num,
-                dpi=150
-            )
-
-            if not images:
-                continue
+    # Render every page from one open document up front, encoded for the OCR model
+    encode_model = "gemini" if ocr_provider == "gemini" else deepinfra_model
+    page_images = encode_pages(pdf_path, page_numbers, model=encode_model, dpi=150)
 
-            img = images[0]
-
-            # Convert to base64
-            buffer = BytesIO()
-            img.save(buffer, format="PNG")
-            b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    results = ocr_cache.get_many(
+        "ocr", ocr_provider, cache_model, OCR_PROMPT_VERSION,
+        {p: image.data for p, image in page_images.items()},
+    )
+    if results:
+        print(f"      ♻️  {len(results)} pages served from OCR cache")
 
+    for page_num, image in page_images.items():
+        if page_num in results:
+            continue
+        try:
             # Call appropriate OCR provider
             if ocr_provider == "gemini":
-                text = ocr_page_gemini(b64, page_num, api_key)
+                text = ocr_page_gemini(image.b64, page_num, api_key, mime_type=image.mime_type)
             else:  # deepinfra
-                text = ocr_page_deepinfra(b64, page_num, api_key, deepinfra_model)
+                text = ocr_page_deepinfra(image.b64, page_num, api_key, deepinfra_model, mime_type=image.mime_type)
 
             if text:
                 results[page_num] = text
+                ocr_cache.put("ocr", ocr_provider, cache_model, OCR_PROMPT_VERSION, image.data, text)
                 print(f"      ✅ Page {page_num}: {len(text)} chars via OCR")
 
         except Exception as e:
@@ -1334,7 +1325,8 @@ def extract_pdf_with_fallback(
     ocr_provider: str = "auto",
     deepinfra_model: str = "mistral-small",
     parallel: bool = True,
-    max_concurrent: int = 10
+    max_concurrent: Optional[int] = None,
+    analysis=None
 ) -> List[str]:
     """
     Extract PDF text using PyMuPDF with OCR fallback for problem pages.
@@ -1355,25 +1347,23 @@ def extract_pdf_with_fallback(
         deepinfra_model: Model key for deepinfra - "mistral-small" (default, best for LaTeX),
                         "olmocr2", "gemma-12b", or "deepseek-ocr"
         parallel: Use parallel async OCR (default True, 10x faster)
-        max_concurrent: Max concurrent OCR requests (default 10)
+        max_concurrent: Ceiling on concurrent OCR requests (default: DeepInfra limiter max)
+        analysis: PdfAnalysis from lib.pdf_analyzer.analyze_pdf() (computed here,
+                  text only, if not given) - text and checks come from one parse
 
     Returns:
         List of page texts (1 string per page), with OCR substitutions applied
     """
-    import base64
-    from pdf2image import convert_from_path
-    from io import BytesIO
+    from lib.page_rasterizer import encode_pages
+    from lib.pdf_analyzer import analyze_pdf
 
-    doc = fitz.open(pdf_path)
-    pages_text = []
-
-    # Step 1: Extract all pages with PyMuPDF
-    for page in doc:
-        pages_text.append(page.get_text())
-    doc.close()
+    # Step 1: Extract all pages with PyMuPDF (single pass: text + encoding checks)
+    if analysis is None:
+        analysis = analyze_pdf(pdf_path, extract_images=False)
+    pages_text = analysis.pages_text
 
     # Step 2: Check for encoding issues
-    encoding_check = check_pdf_encoding(pdf_path)
+    encoding_check = check_pdf_encoding(pdf_path, analysis=analysis)
 
     if encoding_check['pages_with_issues']:
         log_encoding_issues(encoding_check, doc_id)
@@ -1385,13 +1375,9 @@ def extract_pdf_with_fallback(
             # Check first problem page
             first_problem_page = encoding_check['problem_page_numbers'][0]
             try:
-                images = convert_from_path(pdf_path, first_page=first_problem_page, last_page=first_problem_page, dpi=100)
-                if images:
-                    buffer = BytesIO()
-                    images[0].save(buffer, format="PNG")
-                    b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-                    hw_check = detect_handwriting(b64)
+                page = encode_pages(pdf_path, [first_problem_page], model="gemini-preview", dpi=100).get(first_problem_page)
+                if page:
+                    hw_check = detect_handwriting(page.b64, mime_type=page.mime_type)
                     actual_provider = hw_check["recommended_ocr"]
                     print(f"   📝 Content type: {hw_check['content_type']} → using {actual_provider}")
                 else:
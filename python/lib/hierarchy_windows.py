@@ -0,0 +1,273 @@
+"""
+Windowed (map-reduce) hierarchy creation for large documents.
+
+create_hierarchy_with_llm() puts one preview line per chunk into a single
+prompt with max_tokens=2000 and a 30s timeout. A 1000-chunk book needs more
+output tokens than that just to list its chunk indices, so the response was
+truncated (invalid JSON) or timed out, and the whole book silently got
+_fallback_hierarchy()'s "Document Content" chapter.
+
+Large documents are now processed in overlapping windows:
+
+1. plan_windows(): split the chunk range into balanced windows of about
+   HIERARCHY_WINDOW_SIZE chunks, neighbours sharing HIERARCHY_WINDOW_OVERLAP
+2. Map: each window gets its own prompt (global chunk numbering), run concurrently
+3. Reduce - merge_windows():
+   - window_labels() turns each window's JSON into one (chapter, section)
+     label per chunk: out-of-range and duplicate indices are dropped,
+     missing chunks join the preceding section, and labels only move forward,
+     so every section ends up contiguous
+   - in each overlap a seam is chosen where both windows agree on a chapter
+     (or else section) boundary; failing that, the middle of the overlap
+   - if neither window breaks at the seam, the chapter/section on both sides
+     is the same one and keeps the earlier window's title (it saw the start)
+   - a window whose call failed has no boundaries of its own: it continues
+     its neighbours' sections, so one bad window does not fragment the book
+
+The single-prompt path goes through the same merge (one window), so every
+hierarchy returned has each chunk index exactly once, in ascending order.
+
+Usage:
+    from lib.hierarchy_windows import merge_windows, plan_windows
+
+    windows = plan_windows(len(chunks))
+    results = [(window, call_llm(window)) for window in windows]  # concurrently
+    hierarchy = merge_windows(results, len(chunks))
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+HIERARCHY_WINDOW_THRESHOLD = int(os.getenv("HIERARCHY_WINDOW_THRESHOLD", "150"))  # Above this many chunks, use windows
+HIERARCHY_WINDOW_SIZE = int(os.getenv("HIERARCHY_WINDOW_SIZE", "120"))  # ~8k prompt tokens, answer fits max_tokens
+HIERARCHY_WINDOW_OVERLAP = int(os.getenv("HIERARCHY_WINDOW_OVERLAP", "12"))
+HIERARCHY_WINDOW_WORKERS = int(os.getenv("HIERARCHY_WINDOW_WORKERS", "8"))
+
+FALLBACK_TITLE = "Document Content"
+
+Window = Tuple[int, int]  # [start, stop) chunk range
+Label = Tuple[int, int]   # (chapter, section) position within one window's hierarchy
+
+
+# =============================================================================
+# Windows
+# =============================================================================
+
+def plan_windows(
+    total: int,
+    size: int = HIERARCHY_WINDOW_SIZE,
+    overlap: int = HIERARCHY_WINDOW_OVERLAP,
+) -> List[Window]:
+    """
+    Balanced, overlapping windows covering range(total).
+
+    The window count is the minimum for `size`; windows are then shrunk evenly
+    so the last one is not a sliver of the overlap.
+    """
+    if total <= size:
+        return [(0, total)]
+    overlap = max(0, min(overlap, size // 2))
+    count = math.ceil((total - overlap) / (size - overlap))
+    width = math.ceil((total + (count - 1) * overlap) / count)
+    step = width - overlap
+    return [(i * step, min(i * step + width, total)) for i in range(count)]
+
+
+# =============================================================================
+# Per-window Labels
+# =============================================================================
+
+@dataclass
+class WindowLabels:
+    """One window's hierarchy as a (chapter, section) label per chunk."""
+    start: int
+    labels: List[Label]
+    chapter_titles: List[str]
+    section_titles: List[List[str]]
+
+    @property
+    def stop(self) -> int:
+        return self.start + len(self.labels)
+
+    def at(self, index: int) -> Label:
+        return self.labels[index - self.start]
+
+    def chapter_break(self, index: int) -> bool:
+        return self.at(index)[0] != self.at(index - 1)[0]
+
+    def section_break(self, index: int) -> bool:
+        return self.at(index) != self.at(index - 1)
+
+
+def _as_index(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def window_labels(hierarchy: Optional[dict], start: int, stop: int) -> Optional[WindowLabels]:
+    """
+    Validate one LLM hierarchy for chunks [start, stop).
+
+    Returns:
+        WindowLabels, or None if no chunk of the window was assigned
+    """
+    chapters = hierarchy.get("chapters") if isinstance(hierarchy, dict) else None
+    if not isinstance(chapters, list):
+        return None
+
+    assigned: Dict[int, Label] = {}
+    chapter_titles: List[str] = []
+    section_titles: List[List[str]] = []
+    for chapter in chapters:
+        if not isinstance(chapter, dict):
+            continue
+        ci = len(chapter_titles)
+        chapter_titles.append(str(chapter.get("title") or f"Chapter {ci + 1}"))
+        section_titles.append([])
+        for section in chapter.get("sections") or []:
+            if not isinstance(section, dict):
+                continue
+            si = len(section_titles[ci])
+            section_titles[ci].append(str(section.get("title") or chapter_titles[ci]))
+            for value in section.get("chunk_indices") or []:
+                index = _as_index(value)
+                if index is not None and start <= index < stop and index not in assigned:
+                    assigned[index] = (ci, si)
+
+    if not assigned:
+        return None
+
+    # Labels only move forward: a chunk listed under an earlier section stays in the current one
+    labels: List[Label] = []
+    current = assigned[min(assigned)]
+    for index in range(start, stop):
+        label = assigned.get(index)
+        if label is not None and label > current:
+            current = label
+        labels.append(current)
+    return WindowLabels(start, labels, chapter_titles, section_titles)
+
+
+def _fallback_labels(start: int, stop: int) -> WindowLabels:
+    return WindowLabels(start, [(0, 0)] * (stop - start), [FALLBACK_TITLE], [[FALLBACK_TITLE]])
+
+
+# =============================================================================
+# Merge
+# =============================================================================
+
+def _choose_seam(a: WindowLabels, b: WindowLabels, after: int) -> Optional[int]:
+    """Chunk where window b takes over from a; None if the windows do not overlap."""
+    lo = max(b.start + 1, after + 1)
+    hi = a.stop - 1
+    if lo > hi:
+        return None
+    mid = min(max((b.start + a.stop) // 2, lo), hi)
+    candidates = sorted(range(lo, hi + 1), key=lambda j: abs(j - mid))
+    for agree in (
+        lambda j: a.chapter_break(j) and b.chapter_break(j),
+        lambda j: a.section_break(j) and b.section_break(j),
+    ):
+        seam = next((j for j in candidates if agree(j)), None)
+        if seam is not None:
+            return seam
+    return mid
+
+
+def merge_windows(results: Sequence[Tuple[Window, Optional[dict]]], total: int) -> Optional[dict]:
+    """
+    Reduce per-window hierarchies into one global hierarchy.
+
+    Args:
+        results: ((start, stop), hierarchy) per window in order; windows must
+            cover range(total). A None / invalid window has no boundaries of
+            its own, so it continues the neighbouring section and takes its
+            title.
+        total: Number of chunks
+
+    Returns:
+        {"chapters": [...]} with every chunk index exactly once, ascending and
+        contiguous per section; None if no window produced a usable hierarchy
+    """
+    windows = [window_labels(hierarchy, start, stop) for (start, stop), hierarchy in results]
+    if total <= 0 or all(w is None for w in windows):
+        return None
+    failed = {k for k, w in enumerate(windows) if w is None}
+    windows = [
+        w if w is not None else _fallback_labels(start, stop)
+        for w, ((start, stop), _) in zip(windows, results)
+    ]
+
+    parent: Dict[Hashable, Hashable] = {}
+
+    def find(node):
+        while parent.get(node, node) != node:
+            node = parent[node]
+        return node
+
+    def union(earlier, later):
+        # The merged node keeps the earlier window's title, unless that window failed
+        root_a, root_b = find(earlier), find(later)
+        if root_a == root_b:
+            return
+        if root_a[1] in failed and root_b[1] not in failed:
+            parent[root_a] = root_b
+        else:
+            parent[root_b] = root_a
+
+    seams = [0]
+    for k in range(len(windows) - 1):
+        a, b = windows[k], windows[k + 1]
+        seam = _choose_seam(a, b, seams[-1])
+        if seam is None:
+            # Adjacent windows without overlap: assume the chapter continues
+            seam = a.stop
+            continues_chapter = continues_section = True
+        else:
+            continues_chapter = not a.chapter_break(seam) and not b.chapter_break(seam)
+            continues_section = continues_chapter and not a.section_break(seam) and not b.section_break(seam)
+
+        (a_ch, a_sec), (b_ch, b_sec) = a.at(seam - 1), b.at(seam)
+        if continues_chapter:
+            union(("chapter", k, a_ch), ("chapter", k + 1, b_ch))
+        if continues_section:
+            union(("section", k, a_ch, a_sec), ("section", k + 1, b_ch, b_sec))
+        seams.append(seam)
+    seams.append(total)
+
+    def chapter_title(node) -> str:
+        _, k, ci = node
+        return windows[k].chapter_titles[ci]
+
+    def section_title(node) -> str:
+        _, k, ci, si = node
+        return windows[k].section_titles[ci][si]
+
+    chapters: List[dict] = []
+    prev_chapter = prev_section = None
+    for k, window in enumerate(windows):
+        for index in range(seams[k], seams[k + 1]):
+            ci, si = window.at(index)
+            chapter = find(("chapter", k, ci))
+            section = find(("section", k, ci, si))
+            if chapter != prev_chapter:
+                chapters.append({"title": chapter_title(chapter), "sections": []})
+                prev_section = None
+            if section != prev_section:
+                chapters[-1]["sections"].append({"title": section_title(section), "chunk_indices": []})
+            chapters[-1]["sections"][-1]["chunk_indices"].append(index)
+            prev_chapter, prev_section = chapter, section
+
+    return {"chapters": chapters}
@@ -0,0 +1,221 @@
+"""
+Perceptual-hash deduplication of extracted PDF images.
+
+extract_images_from_pdf() yields every logo, header graphic and repeated
+diagram once per page it appears on. Each copy was then classified by
+Gemini and uploaded to R2 separately - in slide decks 60-80% of the
+extracted images are repeats.
+
+dedupe_images() clusters near-identical images so only one representative
+per cluster is classified and uploaded; filter_and_describe_images() and
+upload_images_to_r2() fan the result back out to every occurrence.
+
+Matching happens in two tiers:
+- Exact: same PDF xref, or identical bytes (sha256) under different xrefs
+- Near-identical: re-encoded / rescaled copies whose 64-bit perceptual hash
+  (DCT pHash) AND average hash (aHash) are both within
+  IMAGE_DEDUP_MAX_DISTANCE bits, with a similar aspect ratio
+
+Hashes are computed in one vectorized NumPy pass over all images (one DCT
+as two matrix products on a (N, 32, 32) stack), and clustering compares
+each new leader against every remaining image with packed-bit popcounts.
+
+Usage:
+    from lib.image_dedup import dedupe_images
+
+    duplicates = dedupe_images(images_by_page)
+    # Every image dict now has "dedup_key"; one per key has "dedup_representative"
+"""
+
+import hashlib
+import os
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+IMAGE_DEDUP_ENABLED = os.getenv("IMAGE_DEDUP_ENABLED", "true").lower() == "true"
+IMAGE_DEDUP_MAX_DISTANCE = int(os.getenv("IMAGE_DEDUP_MAX_DISTANCE", "6"))  # Hamming bits out of 64
+IMAGE_DEDUP_MAX_ASPECT_DIFF = 0.15  # Relative difference in width/height
+
+DCT_SIZE = 32    # Images are reduced to 32x32 grayscale before hashing
+HASH_SIZE = 8    # 8x8 = 64-bit hashes
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis (rows = frequencies)."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# =============================================================================
+# Hashing
+# =============================================================================
+
+def _grayscale_thumbnail(image_bytes: bytes) -> Optional[np.ndarray]:
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(image_bytes)) as img:
+            thumb = img.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS)
+        return np.asarray(thumb, dtype=np.float32)
+    except Exception:
+        return None  # Undecodable images only match on exact bytes
+
+
+def perceptual_hashes(images: Sequence[bytes]) -> tuple:
+    """
+    Compute pHash and aHash for a batch of encoded images.
+
+    Returns:
+        (phash, ahash, valid): phash / ahash are (N, 8) uint8 arrays of packed
+        64-bit hashes; valid[i] is False for images that could not be decoded.
+    """
+    n = len(images)
+    phash = np.zeros((n, HASH_SIZE), dtype=np.uint8)
+    ahash = np.zeros((n, HASH_SIZE), dtype=np.uint8)
+    thumbs = [_grayscale_thumbnail(b) for b in images]
+    valid = np.array([t is not None for t in thumbs], dtype=bool)
+    if not valid.any():
+        return phash, ahash, valid
+
+    stack = np.stack([t for t in thumbs if t is not None])          # (M, 32, 32)
+
+    # pHash: low-frequency 8x8 DCT coefficients vs. their median (DC excluded)
+    dct = np.einsum("ij,mjk,lk->mil", _DCT, stack, _DCT)[:, :HASH_SIZE, :HASH_SIZE]
+    low = dct.reshape(len(stack), -1)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    p_bits = low > median
+
+    # aHash: 8x8 block means vs. their mean
+    blocks = stack.reshape(len(stack), HASH_SIZE, DCT_SIZE // HASH_SIZE, HASH_SIZE, DCT_SIZE // HASH_SIZE).mean(axis=(2, 4))
+    flat = blocks.reshape(len(stack), -1)
+    a_bits = flat > flat.mean(axis=1, keepdims=True)
+
+    phash[valid] = np.packbits(p_bits, axis=1)
+    ahash[valid] = np.packbits(a_bits, axis=1)
+    return phash, ahash, valid
+
+
+def hamming_distances(hashes: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Bit distance from one packed hash to each row of `hashes`."""
+    return _POPCOUNT[np.bitwise_xor(hashes, target)].sum(axis=1)
+
+
+# =============================================================================
+# Clustering
+# =============================================================================
+
+def cluster_images(images: List[dict], max_distance: int = IMAGE_DEDUP_MAX_DISTANCE) -> List[int]:
+    """
+    Assign every image to a cluster leader.
+
+    Args:
+        images: Image dicts with "image_bytes" and optionally "xref",
+                "width", "height" (extract_images_from_pdf format)
+
+    Returns:
+        leaders[i] = position of the image that represents image i
+    """
+    n = len(images)
+    leaders = list(range(n))
+
+    # Tier 1: exact duplicates (same xref, or same bytes under another xref)
+    first_by_key: Dict[str, int] = {}
+    for i, img in enumerate(images):
+        keys = [f"sha:{hashlib.sha256(img['image_bytes']).hexdigest()}"]
+        if img.get("xref"):
+            keys.append(f"xref:{img['xref']}")
+        match = next((first_by_key[k] for k in keys if k in first_by_key), None)
+        if match is not None:
+            leaders[i] = match
+        for key in keys:
+            first_by_key.setdefault(key, leaders[i])
+
+    # Tier 2: near-identical copies among the remaining distinct images
+    distinct = [i for i in range(n) if leaders[i] == i]
+    if len(distinct) < 2:
+        return leaders
+
+    phash, ahash, valid = perceptual_hashes([images[i]["image_bytes"] for i in distinct])
+    aspect = np.array([
+        (images[i].get("width") or 1) / (images[i].get("height") or 1) for i in distinct
+    ], dtype=np.float64)
+    assigned = ~valid  # Undecodable images stay their own cluster
+
+    for pos in range(len(distinct)):
+        if assigned[pos]:
+            continue
+        assigned[pos] = True
+        close = (
+            ~assigned
+            & (hamming_distances(phash, phash[pos]) <= max_distance)
+            & (hamming_distances(ahash, ahash[pos]) <= max_distance)
+            & (np.abs(aspect - aspect[pos]) <= IMAGE_DEDUP_MAX_ASPECT_DIFF * aspect[pos])
+        )
+        for other in np.flatnonzero(close):
+            assigned[other] = True
+            leaders[distinct[other]] = distinct[pos]
+
+    # Exact duplicates follow their leader into its near-duplicate cluster
+    return [leaders[leader] for leader in leaders]
+
+
+def dedupe_images(images_by_page: Dict[int, List[dict]], max_distance: int = IMAGE_DEDUP_MAX_DISTANCE) -> int:
+    """
+    Annotate images_by_page in place with duplicate clusters.
+
+    Every image gets "dedup_key" (shared by all members of a cluster). The
+    highest-resolution member gets "dedup_representative": True - it is the
+    one that is classified and uploaded.
+
+    Returns:
+        Number of images that are duplicates of another one
+    """
+    images = [img for page_num in sorted(images_by_page) for img in images_by_page[page_num]]
+    if not images:
+        return 0
+
+    leaders = cluster_images(images, max_distance) if IMAGE_DEDUP_ENABLED else list(range(len(images)))
+
+    clusters: Dict[int, List[int]] = {}
+    for i, leader in enumerate(leaders):
+        clusters.setdefault(leader, []).append(i)
+
+    for leader, members in clusters.items():
+        best = max(members, key=lambda i: (images[i].get("width") or 0) * (images[i].get("height") or 0))
+        key = hashlib.sha256(images[best]["image_bytes"]).hexdigest()[:16]
+        for i in members:
+            images[i]["dedup_key"] = key
+            images[i]["dedup_representative"] = i == best
+
+    duplicates = len(images) - len(clusters)
+    if duplicates:
+        print(f"   🧬 Dedup: {len(images)} images → {len(clusters)} unique ({duplicates} repeats)")
+    return duplicates
+
+
+def group_by_dedup_key(images: List[dict]) -> Dict[str, List[dict]]:
+    """
+    Group image dicts by cluster, representative first.
+
+    Images without a dedup_key (dedupe_images() not run) form their own group.
+    """
+    groups: Dict[str, List[dict]] = {}
+    for img in images:
+        groups.setdefault(img.get("dedup_key") or f"id:{id(img)}", []).append(img)
+    for members in groups.values():
+        members.sort(key=lambda img: not img.get("dedup_representative", False))
+    return groups
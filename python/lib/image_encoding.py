@@ -0,0 +1,242 @@
+"""
+Adaptive encoding of page renders and extracted images for vision / OCR calls.
+
+Every vision payload used to be a full-colour PNG: OCR pages were rendered at
+150 DPI and sent as RGB PNG, and extracted images went to Gemini at whatever
+resolution the PDF embedded them. Models downsample large inputs to their
+own working resolution, so pixels beyond it were uploaded (and base64-inflated
+by a third) for nothing, and colour PNG is the worst case for scanned pages -
+sensor noise defeats PNG's compression entirely.
+
+encode_page() / encode_image() pick the encoding from the pixels:
+
+- line_art: mostly flat background (vector-rendered text pages, diagrams,
+  charts) → PNG, grayscale when there is no colour. Sharp glyph edges make
+  JPEG both larger and blurrier here.
+- text: grayscale continuous tone (scans, photocopies, handwriting) →
+  grayscale JPEG
+- photo: colour continuous tone → JPEG
+
+and cap the longest side at the target model's effective input size
+(VISION_MAX_SIDE). Page renders are rasterized directly at the capped DPI
+instead of being resized afterwards. Base64 is computed once, lazily, on the
+EncodedImage and reused by every request part built from it.
+
+Typical reductions vs. the old 150-DPI RGB PNG: 2x for native text pages,
+10-20x for scanned pages.
+
+Usage:
+    from lib.image_encoding import encode_image
+
+    encoded = encode_image(img["image_bytes"], model="gemini")
+    parts = [{"text": prompt}, encoded.gemini_part()]          # Gemini REST
+    content = [{"type": "text", "text": prompt}, encoded.openai_part()]  # OpenAI-style
+"""
+
+import base64
+import os
+from dataclasses import dataclass
+from functools import cached_property
+from io import BytesIO
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+IMAGE_ENCODING_ENABLED = os.getenv("IMAGE_ENCODING_ENABLED", "true").lower() == "true"
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+
+# Longest side (px) each model actually looks at; larger inputs are downsampled
+# by the provider anyway
+VISION_MAX_SIDE = {
+    "gemini": 3072,          # Gemini scales inputs to fit 3072x3072
+    "gemini-preview": 768,   # One 768px tile - enough for a quick page classification
+    "mistral-small": 1540,   # Pixtral vision encoder limit
+    "olmocr2": 1288,         # olmOCR's page render resolution
+    "gemma-12b": 896,        # SigLIP 896x896 input
+    "deepseek-ocr": 1280,    # "Large" resolution mode
+    "llama-4-scout": 1344,   # 4x4 grid of 336px tiles
+}
+DEFAULT_MAX_SIDE = 2048
+
+COLOR_CHROMA_THRESHOLD = 32       # max(R,G,B) - min(R,G,B) for a pixel to count as coloured
+COLOR_PIXEL_FRACTION = 0.002      # Share of coloured pixels before an image is kept in colour (thin coloured arrows count)
+FLAT_BACKGROUND_FRACTION = 0.5    # Share of the dominant gray value for "line_art"
+ANALYSIS_SAMPLE_SIDE = 256        # Classification runs on a strided sample of about this size
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp", "gif": "image/gif"}
+
+
+@dataclass
+class EncodedImage:
+    """Encoded image bytes ready to embed in a vision request."""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    kind: str  # "line_art" | "text" | "photo" | "original"
+
+    @cached_property
+    def b64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.b64}"
+
+    def gemini_part(self) -> dict:
+        """Gemini REST `parts` entry."""
+        return {"inline_data": {"mime_type": self.mime_type, "data": self.b64}}
+
+    def openai_part(self) -> dict:
+        """OpenAI-compatible `content` entry (DeepInfra, Groq)."""
+        return {"type": "image_url", "image_url": {"url": self.data_url}}
+
+
+def max_side_for(model: str) -> int:
+    """Effective input resolution of a vision model (longest side, px)."""
+    return VISION_MAX_SIDE.get(model, DEFAULT_MAX_SIDE)
+
+
+def sniff_image_format(data: bytes) -> Optional[str]:
+    """Format key of encoded bytes if it is one vision APIs accept directly."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:2] == b"\xff\xd8":
+        return "jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+# =============================================================================
+# Classification
+# =============================================================================
+
+def classify_pixels(pixels: np.ndarray) -> tuple:
+    """
+    Decide how an image should be encoded.
+
+    Args:
+        pixels: (H, W) grayscale or (H, W, 3) RGB uint8 array
+
+    Returns:
+        (kind, grayscale): kind is "line_art", "text" or "photo"
+    """
+    step = max(1, max(pixels.shape[:2]) // ANALYSIS_SAMPLE_SIDE)
+    sample = pixels[::step, ::step]
+
+    if sample.ndim == 3:
+        chroma = sample.max(axis=2).astype(np.int16) - sample.min(axis=2)
+        grayscale = bool((chroma > COLOR_CHROMA_THRESHOLD).mean() < COLOR_PIXEL_FRACTION)
+        gray = sample.mean(axis=2).astype(np.uint8)
+    else:
+        grayscale = True
+        gray = sample
+
+    flat = np.bincount(gray.ravel(), minlength=256).max() / gray.size
+    if flat >= FLAT_BACKGROUND_FRACTION:
+        return "line_art", grayscale
+    return ("text" if grayscale else "photo"), grayscale
+
+
+# =============================================================================
+# Encoding
+# =============================================================================
+
+def _encode_pil(img: Image.Image) -> EncodedImage:
+    """Classify and encode an RGB / L image."""
+    kind, grayscale = classify_pixels(np.asarray(img))
+    if grayscale and img.mode != "L":
+        img = img.convert("L")
+
+    buffer = BytesIO()
+    if kind == "line_art":
+        img.save(buffer, format="PNG")
+        image_format = "png"
+    else:
+        img.save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY)
+        image_format = "jpeg"
+    return EncodedImage(buffer.getvalue(), MIME_TYPES[image_format], img.width, img.height, kind)
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Flatten alpha onto white and normalise palette / CMYK / 16-bit modes."""
+    if img.mode in ("RGB", "L"):
+        return img
+    if img.mode in ("RGBA", "LA", "P", "PA"):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, "white")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def encode_image(image_bytes: bytes, model: str = "gemini") -> EncodedImage:
+    """
+    Re-encode an image for a vision model.
+
+    The original bytes are kept when they are already in an accepted format,
+    within the model's resolution and not larger than the re-encoded version.
+
+    Args:
+        image_bytes: Encoded image (any format PIL reads)
+        model: Key of VISION_MAX_SIDE the image is sent to
+
+    Returns:
+        EncodedImage (kind "original" when the input bytes are reused)
+    """
+    original_format = sniff_image_format(image_bytes)
+
+    with Image.open(BytesIO(image_bytes)) as source:
+        width, height = source.size
+        original = EncodedImage(
+            image_bytes, MIME_TYPES.get(original_format, "image/png"), width, height, "original"
+        )
+        if not IMAGE_ENCODING_ENABLED:
+            return original
+
+        max_side = max_side_for(model)
+        needs_resize = max(width, height) > max_side
+        if source.format == "JPEG" and needs_resize:
+            source.draft("RGB", (max_side, max_side))  # Decode at a reduced DCT scale
+        img = _to_rgb(source)
+        if needs_resize:
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        encoded = _encode_pil(img)
+
+    if original_format and not needs_resize and len(image_bytes) <= len(encoded.data):
+        return original
+    return encoded
+
+
+def encode_page(page, model: str = "gemini", dpi: int = 150) -> EncodedImage:
+    """
+    Render a PDF page for a vision model.
+
+    The page is rasterized at `dpi`, or lower when that would exceed the
+    model's resolution, so no resize pass is needed.
+
+    Args:
+        page: Open fitz.Page
+        model: Key of VISION_MAX_SIDE the page is sent to
+        dpi: Preferred render resolution
+    """
+    import fitz
+
+    longest_pt = max(page.rect.width, page.rect.height) or 1
+    zoom = min(dpi / 72, max_side_for(model) / longest_pt)
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+
+    if not IMAGE_ENCODING_ENABLED:
+        return EncodedImage(pixmap.tobytes("png"), MIME_TYPES["png"], pixmap.width, pixmap.height, "original")
+
+    pixels = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+    return _encode_pil(Image.fromarray(pixels[..., 0] if pixmap.n == 1 else pixels[..., :3]))
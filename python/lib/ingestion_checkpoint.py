@@ -0,0 +1,215 @@
+"""
+Per-phase checkpoints for resumable document ingestion.
+
+IngestionPipeline runs its phases (extraction, image filtering + R2 upload,
+hierarchy, image matching, embeddings + questions, Neo4j persistence) in
+memory. A failure in question generation or persistence used to make the
+Celery retry redo every earlier phase - paying again for OCR, vision,
+uploads, hierarchy and embeddings.
+
+Each phase's output is now stored in Redis as a zlib-compressed pickle:
+
+    ingest_ckpt:{doc_id}:{sha256(file)[:16]}:{variant}:{phase}
+
+Unpickling runs code chosen by whoever wrote the bytes, and Redis is shared,
+so every value is prefixed with an HMAC-SHA256 over its key and payload,
+signed with INGEST_CHECKPOINT_SECRET. A value whose signature does not
+verify is ignored (the phase reruns) and never unpickled. Without a secret
+checkpointing is disabled.
+
+The file content hash means a re-upload with different bytes never resumes
+from stale artifacts, and the variant (pipeline + options) keeps e.g. a
+no-questions run from being resumed as a full one. A retry loads phases in
+order and resumes from the first one that is missing. Forcing a phase drops
+its checkpoint and every later one, since they were derived from it.
+Checkpoints are cleared once the document is persisted, and expire after
+INGEST_CHECKPOINT_TTL_SECONDS otherwise. Redis being down only disables
+resuming.
+
+Usage:
+    from lib.ingestion_checkpoint import IngestionCheckpoint
+
+    ckpt = IngestionCheckpoint(doc_id, file_path, variant="fast-q1", force=["hierarchy"])
+    chunks = ckpt.load("extract")
+    if chunks is None:
+        chunks = extract(...)
+        ckpt.save("extract", chunks)
+    ...
+    ckpt.clear()  # after persistence succeeds
+"""
+
+import hashlib
+import hmac
+import os
+import pickle
+import zlib
+from typing import Any, Iterable, List, Optional, Sequence
+
+from lib.optional_redis import OptionalRedis
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+INGEST_CHECKPOINT_ENABLED = os.getenv("INGEST_CHECKPOINT_ENABLED", "true").lower() == "true"
+INGEST_CHECKPOINT_TTL_SECONDS = int(os.getenv("INGEST_CHECKPOINT_TTL_SECONDS", str(3 * 24 * 3600)))
+# Shared by every worker that may resume a document; checkpoints are off without it
+INGEST_CHECKPOINT_SECRET = os.getenv("INGEST_CHECKPOINT_SECRET", "")
+
+KEY_PREFIX = "ingest_ckpt:"
+
+# Phase names in execution order (shared by both IngestionPipeline entry points)
+PHASES = ["extract", "images", "hierarchy", "match", "enrich"]
+
+
+def file_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the file content (first 16 hex chars are used in keys)."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def expand_force(force: Optional[Iterable[str]], phases: Sequence[str] = PHASES) -> List[str]:
+    """
+    Phases that must rerun: each forced phase plus every phase after it.
+
+    "all" forces every phase. Unknown names raise ValueError so a typo in
+    a retry request fails loudly instead of silently resuming.
+    """
+    names = [name.strip() for name in (force or []) if name and name.strip()]
+    if not names:
+        return []
+    if "all" in names:
+        return list(phases)
+
+    unknown = [name for name in names if name not in phases]
+    if unknown:
+        raise ValueError(f"Unknown ingestion phase(s): {unknown} (expected one of {list(phases)} or 'all')")
+
+    first = min(phases.index(name) for name in names)
+    return list(phases[first:])
+
+
+_secret_warned = False
+
+
+def _checkpoint_secret() -> bytes:
+    """The signing key, or b"" (with a one-time warning) when unset."""
+    global _secret_warned
+    if not INGEST_CHECKPOINT_SECRET and not _secret_warned:
+        _secret_warned = True
+        print("⚠️  INGEST_CHECKPOINT_SECRET not set, ingestion checkpoints disabled")
+    return INGEST_CHECKPOINT_SECRET.encode()
+
+
+def _signature(secret: bytes, key: str, payload: bytes) -> bytes:
+    """HMAC-SHA256 binding the payload to its Redis key."""
+    return hmac.new(secret, key.encode() + b"\0" + payload, hashlib.sha256).digest()
+
+
+SIGNATURE_BYTES = hashlib.sha256().digest_size
+
+
+# =============================================================================
+# Redis
+# =============================================================================
+
+# Binary values
+_redis = OptionalRedis(
+    "Ingestion checkpoints", "retries will start from scratch",
+    socket_timeout=5.0, socket_connect_timeout=1.0,
+)
+
+
+# =============================================================================
+# Checkpoint store
+# =============================================================================
+
+class IngestionCheckpoint:
+    """Load / save phase artifacts for one (document, file content, variant)."""
+
+    def __init__(
+        self,
+        doc_id: str,
+        file_path: str,
+        variant: str = "default",
+        force: Optional[Iterable[str]] = None,
+        phases: Sequence[str] = PHASES,
+    ):
+        self.doc_id = doc_id
+        self.phases = list(phases)
+        self.secret = _checkpoint_secret() if INGEST_CHECKPOINT_ENABLED else b""
+        self.enabled = bool(self.secret)
+        self.content_hash = file_hash(file_path)[:16] if self.enabled else ""
+        self.prefix = f"{KEY_PREFIX}{doc_id}:{self.content_hash}:{variant}:"
+        self.forced = expand_force(force, self.phases)
+
+        if self.forced:
+            print(f"   🔁 Forcing phases to rerun: {', '.join(self.forced)}")
+            self._delete(self.forced)
+
+    def key(self, phase: str) -> str:
+        return f"{self.prefix}{phase}"
+
+    def has(self, phase: str) -> bool:
+        """Whether a usable checkpoint exists (without loading it)."""
+        if not self.enabled or phase in self.forced:
+            return False
+        try:
+            return bool(_redis.client().exists(self.key(phase)))
+        except Exception as e:
+            _redis.failed(e)
+            return False
+
+    def load(self, phase: str) -> Optional[Any]:
+        """Artifact saved by a previous attempt, or None if the phase must run."""
+        if not self.enabled or phase in self.forced:
+            return None
+        key = self.key(phase)
+        try:
+            raw = _redis.client().get(key)
+        except Exception as e:
+            _redis.failed(e)
+            return None
+        if raw is None:
+            return None
+
+        signature, payload = raw[:SIGNATURE_BYTES], raw[SIGNATURE_BYTES:]
+        if not hmac.compare_digest(signature, _signature(self.secret, key, payload)):
+            print(f"   ⚠️  Ignoring '{phase}' checkpoint with an invalid signature")
+            return None
+        try:
+            value = pickle.loads(zlib.decompress(payload))
+        except Exception as e:
+            print(f"   ⚠️  Ignoring unreadable '{phase}' checkpoint: {e}")
+            return None
+
+        print(f"   ⏩ Resumed '{phase}' from checkpoint")
+        return value
+
+    def save(self, phase: str, value: Any) -> None:
+        """Store a phase's output for later retries."""
+        if not self.enabled:
+            return
+        key = self.key(phase)
+        payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 3)
+        try:
+            _redis.client().set(key, _signature(self.secret, key, payload) + payload, ex=INGEST_CHECKPOINT_TTL_SECONDS)
+        except Exception as e:
+            _redis.failed(e)
+
+    def clear(self) -> None:
+        """Drop every checkpoint for this document/content/variant."""
+        if self.enabled:
+            self._delete(self.phases)
+
+    def _delete(self, phases: Iterable[str]) -> None:
+        if not self.enabled:
+            return
+        try:
+            _redis.client().delete(*[self.key(phase) for phase in phases])
+        except Exception as e:
+            _redis.failed(e)
@@ -0,0 +1,123 @@
+"""
+Incremental extraction of array items from streamed (or broken) LLM JSON.
+
+Question generation used to json.loads() the whole response: one malformed
+question, a stray trailing comma or a response cut off by max_tokens threw
+away all twelve questions and the block was regenerated from scratch.
+
+JsonArrayStream is fed the response text as it arrives and decodes each
+element of one top-level array (e.g. "questions") the moment its closing
+brace is seen. Elements that do not decode are kept as raw text in
+`failed`; everything before them and after them is still returned. The
+scanner tracks only string / escape state and bracket depth, so it tolerates
+prose or ``` fences around the JSON object.
+
+Usage:
+    from lib.json_stream import JsonArrayStream
+
+    stream = JsonArrayStream("questions")
+    for chunk in sse_chunks:
+        for question in stream.feed(chunk):
+            ...                      # complete, decoded dicts as they arrive
+    stream.items                     # every decoded element so far
+    stream.failed                    # raw text of elements that did not decode
+"""
+
+import json
+from typing import Any, List, Optional
+
+
+class JsonArrayStream:
+    """Decode the elements of `root_object[key]` incrementally."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.items: List[Any] = []
+        self.failed: List[str] = []
+        self.text = ""
+
+        self._pos = 0
+        self._stack: List[str] = []      # Open '{' / '[' from the root object down
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._pending_key: Optional[str] = None   # Last string seen at root level
+        self._current_key: Optional[str] = None   # Key whose value is being parsed at root level
+        self._array_depth: Optional[int] = None   # Stack depth inside the target array
+        self._item_start = -1
+        self._finished = False
+
+    @property
+    def complete(self) -> bool:
+        """True once the target array (or the root object) has been closed."""
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Append text; return the elements completed by this chunk."""
+        self.text += chunk
+        text = self.text
+        new_items: List[Any] = []
+
+        i = self._pos
+        while i < len(text) and not self._finished:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        try:
+                            self._pending_key = json.loads(text[self._string_start:i + 1])
+                        except ValueError:
+                            self._pending_key = None
+            elif not self._stack:
+                if c == "{":  # Skip prose / fences until the root object opens
+                    self._stack.append(c)
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if self._array_depth is not None and len(self._stack) == self._array_depth and self._item_start < 0:
+                    self._item_start = i
+                self._stack.append(c)
+                if c == "[" and self._array_depth is None and len(self._stack) == 2 and self._current_key == self.key:
+                    self._array_depth = 2
+            elif c in "}]":
+                self._stack.pop()
+                depth = len(self._stack)
+                if self._array_depth is not None:
+                    if depth == self._array_depth and self._item_start >= 0:
+                        self._decode(text[self._item_start:i + 1], new_items)
+                        self._item_start = -1
+                    elif depth < self._array_depth:
+                        self._finished = True
+                if depth == 0:
+                    self._finished = True
+            elif len(self._stack) == 1:
+                if c == ":":
+                    self._current_key = self._pending_key
+                elif c == ",":
+                    self._current_key = self._pending_key = None
+            i += 1
+
+        self._pos = i
+        return new_items
+
+    def _decode(self, raw: str, new_items: List[Any]) -> None:
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            self.failed.append(raw)
+            return
+        self.items.append(item)
+        new_items.append(item)
+
+
+def parse_array_items(text: str, key: str) -> JsonArrayStream:
+    """Run a complete text through JsonArrayStream in one go."""
+    stream = JsonArrayStream(key)
+    stream.feed(text)
+    return stream
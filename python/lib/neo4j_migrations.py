@@ -0,0 +1,250 @@
+"""
+Versioned Neo4j schema migrations + query-plan verification.
+
+setup_vector_index.py only creates the vector / fulltext indexes, but the hot
+queries MATCH / MERGE on Document.documentId, ContentBlock.block_id,
+Chapter(doc_id, title), Section(doc_id, title, chapter) and User.id. Without
+constraints or range indexes every one of those lookups is a label scan.
+
+Migrations are an ordered list of (version, description, statements). Every
+statement is idempotent (IF NOT EXISTS) and the highest applied version is
+recorded on a single (:SchemaVersion {id: 'voxam'}) node, so running the tool
+again only applies what is new.
+
+Verification runs EXPLAIN on every query constant (module-level strings named
+*_QUERY / *_QUERY_*) in the hot-path modules and fails if a plan contains a
+label scan or all-nodes scan.
+
+Usage:
+    python -m lib.neo4j_migrations            # apply pending migrations
+    python -m lib.neo4j_migrations --status   # show applied version
+    python -m lib.neo4j_migrations --verify   # EXPLAIN hot queries, exit 1 on label scans
+"""
+
+import argparse
+import importlib
+import re
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+# =============================================================================
+# Migrations
+# =============================================================================
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    statements: Tuple[str, ...]
+
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(1, "Vector + fulltext indexes for hybrid retrieval", (
+        """
+        CREATE VECTOR INDEX contentBlockEmbeddingIdx IF NOT EXISTS
+        FOR (cb:ContentBlock) ON cb.embedding
+        OPTIONS {indexConfig: {`vector.dimensions`: 1536, `vector.similarity_function`: 'cosine'}}
+        """,
+        """
+        CREATE FULLTEXT INDEX contentBlockFulltextIdx IF NOT EXISTS
+        FOR (n:ContentBlock) ON EACH [n.text_content]
+        """,
+    )),
+    Migration(2, "Lookup constraints and indexes for hot MATCH / MERGE keys", (
+        # MERGE targets - uniqueness also gives an index-backed lookup
+        "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+        "CREATE CONSTRAINT document_id_unique IF NOT EXISTS FOR (d:Document) REQUIRE d.documentId IS UNIQUE",
+        # Range indexes (not unique): deleted documents can leave orphaned blocks
+        # behind, and a uniqueness constraint would then block re-ingestion
+        "CREATE INDEX content_block_id IF NOT EXISTS FOR (cb:ContentBlock) ON (cb.block_id)",
+        "CREATE INDEX question_set_id IF NOT EXISTS FOR (qs:QuestionSet) ON (qs.questionset_id)",
+        "CREATE INDEX chapter_doc_title IF NOT EXISTS FOR (c:Chapter) ON (c.doc_id, c.title)",
+        "CREATE INDEX section_doc_title_chapter IF NOT EXISTS FOR (s:Section) ON (s.doc_id, s.title, s.chapter)",
+    )),
+)
+
+SCHEMA_VERSION_ID = "voxam"
+
+GET_SCHEMA_VERSION_QUERY = """
+MATCH (v:SchemaVersion {id: $id})
+RETURN v.version AS version
+"""
+
+SET_SCHEMA_VERSION_QUERY = """
+MERGE (v:SchemaVersion {id: $id})
+SET v.version = $version, v.description = $description, v.applied_at = datetime()
+"""
+
+
+def get_schema_version(session) -> int:
+    """Highest applied migration version (0 for a fresh database)."""
+    record = session.run(GET_SCHEMA_VERSION_QUERY, id=SCHEMA_VERSION_ID).single()
+    return (record["version"] or 0) if record else 0
+
+
+def pending_migrations(current_version: int, migrations: Iterable[Migration] = MIGRATIONS) -> List[Migration]:
+    """Migrations newer than current_version, in order."""
+    return sorted((m for m in migrations if m.version > current_version), key=lambda m: m.version)
+
+
+def apply_migrations(driver, migrations: Iterable[Migration] = MIGRATIONS) -> int:
+    """
+    Apply every pending migration and record the new schema version.
+
+    Schema statements cannot share a transaction with data writes, so each one
+    runs as its own auto-commit query; the version is recorded after all of a
+    migration's statements succeed. A failure stops the run (and re-raises)
+    with the version left at the last fully applied migration.
+
+    Returns:
+        The schema version after applying
+    """
+    with driver.session() as session:
+        version = get_schema_version(session)
+        pending = pending_migrations(version, migrations)
+
+        if not pending:
+            print(f"✅ Neo4j schema up to date (version {version})")
+            return version
+
+        for migration in pending:
+            print(f"🔧 Applying migration {migration.version}: {migration.description}")
+            for statement in migration.statements:
+                session.run(statement).consume()
+            session.run(
+                SET_SCHEMA_VERSION_QUERY,
+                id=SCHEMA_VERSION_ID, version=migration.version, description=migration.description,
+            ).consume()
+            version = migration.version
+            print(f"   ✅ Schema version {version}")
+
+        # Index population is asynchronous - wait so verification sees the new indexes
+        session.run("CALL db.awaitIndexes(300)").consume()
+
+    return version
+
+
+# =============================================================================
+# Query-Plan Verification
+# =============================================================================
+
+# Modules whose query constants sit on request / ingestion hot paths
+HOT_QUERY_MODULES = ("retrieval", "qp_agent", "lp_agent", "agents.chat_tools", "lib.vector_cache")
+
+FORBIDDEN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
+
+_QUERY_NAME = re.compile(r"^[A-Z][A-Z0-9_]*QUERY(_[A-Z0-9_]+)?$")
+
+# Representative values for EXPLAIN (types matter to the planner, values do not)
+SAMPLE_PARAMS: Dict[str, object] = {
+    "qvec": [0.0] * 1536, "index_name": "contentBlockEmbeddingIdx", "query_text": "entropy",
+    "limit": 8, "k": 8, "leg_k": 24, "fetch_k": 24, "keyword_fetch_k": 100, "top_k": 10,
+    "min_vector_score": 0.6, "version": 1,
+    "element_ids": ["4:00000000-0000-0000-0000-000000000000:0"],
+    "topics": ["Topic"], "rows": [], "chapters": [], "sections": [],
+}
+
+
+def collect_queries(module_names: Iterable[str] = HOT_QUERY_MODULES) -> Dict[str, str]:
+    """
+    Import each module and collect its query constants.
+
+    Returns:
+        {"module.NAME": cypher}
+    """
+    queries = {}
+    for module_name in module_names:
+        module = importlib.import_module(module_name)
+        for name, value in vars(module).items():
+            if isinstance(value, str) and _QUERY_NAME.match(name):
+                queries[f"{module_name}.{name}"] = value
+    return queries
+
+
+def sample_params(query: str) -> Dict[str, object]:
+    """Parameters referenced by a query, filled with SAMPLE_PARAMS or ''."""
+    names = set(re.findall(r"\$([A-Za-z_][A-Za-z0-9_]*)", query))
+    return {name: SAMPLE_PARAMS.get(name, "") for name in names}
+
+
+def find_operators(plan, forbidden: Iterable[str] = FORBIDDEN_OPERATORS) -> List[str]:
+    """
+    Walk a plan tree and return the forbidden operators it contains.
+
+    Accepts the dict form returned by ResultSummary.plan (operatorType,
+    children); operator names carry a runtime suffix like "@neo4j".
+    """
+    found = []
+    stack = [plan] if plan else []
+    while stack:
+        node = stack.pop()
+        operator = (node.get("operatorType") or "").split("@")[0]
+        if any(operator.startswith(name) for name in forbidden):
+            found.append(operator)
+        stack.extend(node.get("children") or [])
+    return found
+
+
+def verify_query_plans(driver, queries: Optional[Dict[str, str]] = None) -> Dict[str, List[str]]:
+    """
+    EXPLAIN every query and report the ones that scan a whole label.
+
+    Returns:
+        {query_name: [forbidden operators]} - empty when every plan is clean
+    """
+    queries = queries if queries is not None else collect_queries()
+    failures = {}
+
+    with driver.session() as session:
+        for name, query in sorted(queries.items()):
+            try:
+                summary = session.run("EXPLAIN " + query, sample_params(query)).consume()
+                operators = find_operators(summary.plan)
+            except Exception as e:
+                print(f"❌ {name}: EXPLAIN failed: {e}")
+                failures[name] = [f"error: {e}"]
+                continue
+
+            if operators:
+                print(f"❌ {name}: {', '.join(sorted(set(operators)))}")
+                failures[name] = operators
+            else:
+                print(f"✅ {name}")
+
+    return failures
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Neo4j schema migrations")
+    parser.add_argument("--status", action="store_true", help="Show the applied schema version")
+    parser.add_argument("--verify", action="store_true", help="EXPLAIN hot queries and fail on label scans")
+    args = parser.parse_args(argv)
+
+    from lib.neo4j_pool import get_driver
+    driver = get_driver()
+
+    if args.status:
+        with driver.session() as session:
+            version = get_schema_version(session)
+        latest = max(m.version for m in MIGRATIONS)
+        print(f"📋 Neo4j schema version {version} (latest {latest})")
+        return 0
+
+    if args.verify:
+        failures = verify_query_plans(driver)
+        if failures:
+            print(f"\n❌ {len(failures)} queries scan a whole label - run migrations or fix the query")
+            return 1
+        print("\n✅ All hot query plans use index lookups")
+        return 0
+
+    apply_migrations(driver)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
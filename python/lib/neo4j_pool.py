@@ -0,0 +1,206 @@
+"""
+Process-wide Neo4j driver registry.
+
+A neo4j Driver already owns a connection pool, so creating one per call
+(plus a RETURN 1 ping) throws that pool away and pays DNS + TCP + TLS on
+every request. This module keeps ONE sync driver and ONE async driver per
+(uri, user) for the lifetime of the process.
+
+Features:
+- Lazy connect: drivers are created on first use, no ping on the request path
+- Configurable pool size / lifetimes via env vars
+- Idle connections are health-checked by the driver (liveness_check_timeout)
+- warm_up() to verify connectivity at startup (FastAPI / Celery worker init)
+- close_all() / aclose_all() shutdown hooks
+
+Usage:
+    from lib.neo4j_pool import get_driver, get_async_driver
+
+    with get_driver().session() as session:
+        session.run(...)
+
+    async with get_async_driver().session() as session:
+        await session.run(...)
+
+NOTE: Never call .close() on a driver returned from here - it is shared.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+from neo4j import AsyncDriver, AsyncGraphDatabase, Driver, GraphDatabase
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3000"))  # < Aura's 60 min idle cut
+NEO4J_LIVENESS_CHECK_TIMEOUT = float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", "60"))  # Re-check idle conns older than this
+NEO4J_KEEP_ALIVE = os.getenv("NEO4J_KEEP_ALIVE", "true").lower() == "true"
+
+_DriverKey = Tuple[str, str]
+
+_lock = threading.Lock()
+_sync_drivers: Dict[_DriverKey, Driver] = {}
+# Async drivers are bound to the event loop they were first used on, so keep
+# one set per loop (Celery tasks spin up short-lived loops with asyncio.run).
+_async_drivers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[_DriverKey, AsyncDriver]]" = weakref.WeakKeyDictionary()
+
+
+def _resolve_credentials(
+    uri: Optional[str] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+) -> Tuple[str, str, str]:
+    """Fill missing credentials from the environment and validate them."""
+    uri = uri or os.getenv("NEO4J_URI")
+    user = user or os.getenv("NEO4J_USER")
+    password = password or os.getenv("NEO4J_PASSWORD")
+
+    if not all([uri, user, password]):
+        raise ValueError("Missing Neo4j credentials in .env: NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD")
+
+    return uri, user, password
+
+
+def _driver_config() -> dict:
+    """Shared pool settings for sync and async drivers."""
+    return {
+        "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": NEO4J_ACQUISITION_TIMEOUT,
+        "max_connection_lifetime": NEO4J_MAX_CONNECTION_LIFETIME,
+        "liveness_check_timeout": NEO4J_LIVENESS_CHECK_TIMEOUT,
+        "keep_alive": NEO4J_KEEP_ALIVE,
+    }
+
+
+# =============================================================================
+# Driver Access
+# =============================================================================
+
+def get_driver(
+    uri: Optional[str] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+) -> Driver:
+    """
+    Get the shared sync driver for (uri, user), creating it on first use.
+
+    Creation is lazy: no network round trip happens until the first session
+    actually runs a query.
+    """
+    uri, user, password = _resolve_credentials(uri, user, password)
+    key = (uri, user)
+
+    driver = _sync_drivers.get(key)
+    if driver is not None:
+        return driver
+
+    with _lock:
+        driver = _sync_drivers.get(key)
+        if driver is None:
+            driver = GraphDatabase.driver(uri, auth=(user, password), **_driver_config())
+            _sync_drivers[key] = driver
+            print(f"✅ Neo4j driver pool created (max {NEO4J_MAX_POOL_SIZE} connections)")
+    return driver
+
+
+def get_async_driver(
+    uri: Optional[str] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+) -> AsyncDriver:
+    """
+    Get the shared async driver for (uri, user) on the running event loop.
+
+    Must be called from inside a coroutine.
+    """
+    uri, user, password = _resolve_credentials(uri, user, password)
+    key = (uri, user)
+    loop = asyncio.get_running_loop()
+
+    with _lock:
+        loop_drivers = _async_drivers.setdefault(loop, {})
+        driver = loop_drivers.get(key)
+        if driver is None:
+            driver = AsyncGraphDatabase.driver(uri, auth=(user, password), **_driver_config())
+            loop_drivers[key] = driver
+            print(f"✅ Neo4j async driver pool created (max {NEO4J_MAX_POOL_SIZE} connections)")
+    return driver
+
+
+# =============================================================================
+# Lifecycle Hooks
+# =============================================================================
+
+def warm_up() -> bool:
+    """
+    Verify connectivity once, off the request path (call at process startup).
+
+    Returns:
+        True if Neo4j is reachable, False otherwise (never raises).
+    """
+    try:
+        get_driver().verify_connectivity()
+        print("✅ Connected to Neo4j")
+        return True
+    except Exception as e:
+        print(f"⚠️  Neo4j warm-up failed: {e}")
+        return False
+
+
+async def awarm_up() -> bool:
+    """Async variant of warm_up() for the FastAPI startup hook."""
+    try:
+        await get_async_driver().verify_connectivity()
+        print("✅ Connected to Neo4j (async)")
+        return True
+    except Exception as e:
+        print(f"⚠️  Neo4j async warm-up failed: {e}")
+        return False
+
+
+def close_all() -> None:
+    """Close every sync driver (Celery worker shutdown, atexit)."""
+    with _lock:
+        drivers = list(_sync_drivers.values())
+        _sync_drivers.clear()
+
+    for driver in drivers:
+        try:
+            driver.close()
+        except Exception as e:
+            print(f"⚠️  Error closing Neo4j driver: {e}")
+
+
+async def aclose_all() -> None:
+    """Close the async drivers owned by the running loop (FastAPI shutdown)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        drivers = list(_async_drivers.pop(loop, {}).values())
+
+    for driver in drivers:
+        try:
+            await driver.close()
+        except Exception as e:
+            print(f"⚠️  Error closing Neo4j async driver: {e}")
+
+
+def _reset_after_fork() -> None:
+    """Forked children (Celery prefork) must build their own pools."""
+    global _lock
+    _lock = threading.Lock()
+    _sync_drivers.clear()
+    _async_drivers.clear()
+
+
+atexit.register(close_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,184 @@
+"""
+Content-addressed cache for OCR text and vision classifications.
+
+Document retries (/documents/{id}/retry, Celery self.retry) and re-uploads
+used to re-OCR every problem page and re-classify every image through
+DeepInfra / Gemini from scratch - paying again for identical inputs.
+
+Results are keyed by what actually determines them:
+
+    ocr_cache:{kind}:{provider}:{model}:{prompt_version}:{sha256(image)}
+
+so the same page image (or embedded image bytes) under the same provider,
+model and prompt is only ever sent once. Bump the caller's prompt version
+constant when a prompt changes and old entries simply stop matching.
+
+Entries live in Redis (shared by every Celery worker) with a TTL and a
+global entry cap: each hit / store refreshes the key's score in a sorted
+set, and stores evict the least recently used keys above the cap. Redis
+being down only disables caching.
+
+Usage:
+    from lib.ocr_cache import get_many, put
+
+    cached = get_many("ocr", "deepinfra", model, OCR_PROMPT_VERSION, page_images)
+    ...
+    put("ocr", "deepinfra", model, OCR_PROMPT_VERSION, page_images[page_num], text)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Union
+
+from lib.optional_redis import OptionalRedis
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "100000"))
+OCR_CACHE_TTL_SECONDS = int(os.getenv("OCR_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+KEY_PREFIX = "ocr_cache:"
+LRU_KEY = "ocr_cache_lru"  # Sorted set: key -> last access time
+
+Content = Union[bytes, str]  # Raw image bytes or their base64 form
+
+
+def content_hash(data: Content) -> str:
+    """SHA-256 of the image content (str is hashed as its UTF-8 bytes)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(kind: str, provider: str, model: str, prompt_version: str, data: Content) -> str:
+    """Redis key for one (input, provider, model, prompt) combination."""
+    return f"{KEY_PREFIX}{kind}:{provider}:{model}:{prompt_version}:{content_hash(data)}"
+
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+# =============================================================================
+# Redis
+# =============================================================================
+
+_redis = OptionalRedis(
+    "OCR cache", "results will not be cached",
+    decode_responses=True, socket_timeout=1.0, socket_connect_timeout=1.0,
+)
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def get_many(
+    kind: str,
+    provider: str,
+    model: str,
+    prompt_version: str,
+    items: Dict[Hashable, Content],
+) -> Dict[Hashable, Any]:
+    """
+    Look up cached results for several inputs in one round trip.
+
+    Args:
+        kind: Result type, e.g. "ocr" or "vision"
+        provider: API provider, e.g. "deepinfra"
+        model: Model name / id
+        prompt_version: Caller's prompt version constant
+        items: {caller_key: image bytes or base64} - e.g. page_num -> b64
+
+    Returns:
+        {caller_key: cached result} for the hits only
+    """
+    if not OCR_CACHE_ENABLED or not items:
+        return {}
+
+    names = list(items)
+    keys = [cache_key(kind, provider, model, prompt_version, items[name]) for name in names]
+
+    try:
+        client = _redis.client()
+        values = client.mget(keys)
+        hits = {}
+        touched = {}
+        now = time.time()
+        for name, key, raw in zip(names, keys, values):
+            if raw is not None:
+                hits[name] = json.loads(raw)
+                touched[key] = now
+        if touched:
+            client.zadd(LRU_KEY, touched)
+    except Exception as e:
+        _redis.failed(e)
+        return {}
+
+    _count("hits", len(hits))
+    _count("misses", len(items) - len(hits))
+    return hits
+
+
+def get(kind: str, provider: str, model: str, prompt_version: str, data: Content) -> Optional[Any]:
+    """Cached result for one input, or None."""
+    return get_many(kind, provider, model, prompt_version, {0: data}).get(0)
+
+
+def put(kind: str, provider: str, model: str, prompt_version: str, data: Content, value: Any) -> None:
+    """
+    Store a result (JSON-serializable) and evict least recently used entries above the cap.
+
+    Empty results (None, "", {}) are never cached so failures are retried.
+    """
+    if not OCR_CACHE_ENABLED or not value:
+        return
+
+    key = cache_key(kind, provider, model, prompt_version, data)
+    try:
+        client = _redis.client()
+        pipe = client.pipeline()
+        pipe.set(key, json.dumps(value), ex=OCR_CACHE_TTL_SECONDS)
+        pipe.zadd(LRU_KEY, {key: time.time()})
+        pipe.zcard(LRU_KEY)
+        size = pipe.execute()[-1]
+
+        overflow = size - OCR_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = [member for member, _ in client.zpopmin(LRU_KEY, overflow)]
+            if evicted:
+                client.delete(*evicted)
+                _count("evictions", len(evicted))
+    except Exception as e:
+        _redis.failed(e)
+        return
+
+    _count("stores")
+
+
+def cache_info() -> dict:
+    """Hit / miss / store / eviction counters for this process."""
+    with _stats_lock:
+        info = dict(_stats)
+    lookups = info["hits"] + info["misses"]
+    info["hit_rate"] = round(info["hits"] / lookups, 3) if lookups else 0.0
+    return info
+
+
+def reset_stats() -> None:
+    """Zero the counters (Redis entries are left alone)."""
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,133 @@
+"""
+Optional Redis access with a circuit breaker.
+
+Caches, checkpoints and the rate limiter all treat Redis as optional: on any
+Redis error they fall back to in-process state. Each module used to keep its
+own lazy client and warn-once flag, and retried Redis on every call - so
+with Redis unreachable, every chat query paid a 0.2s timeout per lookup and
+every rate limiter poll (every 50ms) paid a 1s connect timeout, on the path
+that was supposed to be the safe fallback.
+
+OptionalRedis wraps one lazily created client per module:
+
+- client() / aclient() return the sync client / the asyncio client for the
+  running loop (async connections are loop-bound)
+- failed(e) opens the breaker: for REDIS_BREAKER_COOLDOWN_SECONDS, client()
+  and aclient() raise RedisUnavailable immediately instead of connecting, so
+  callers skip straight to their fallback; the first call after the cooldown
+  tries Redis again
+- the first failure is logged once per module
+
+Callers keep their usual `try: ... except Exception as e: _redis.failed(e)`
+shape; RedisUnavailable is an Exception and does not extend the cooldown.
+
+Usage:
+    from lib.optional_redis import OptionalRedis
+
+    _redis = OptionalRedis("Embedding cache", "using in-process cache only",
+                           socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    try:
+        raw = _redis.client().get(key)
+    except Exception as e:
+        _redis.failed(e)
+        raw = None
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Any, Optional
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+REDIS_URI = os.getenv("REDIS_URI", "redis://localhost:6379/0")
+REDIS_BREAKER_COOLDOWN_SECONDS = float(os.getenv("REDIS_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+class RedisUnavailable(ConnectionError):
+    """Redis is being skipped after a recent error."""
+
+
+# =============================================================================
+# Client
+# =============================================================================
+
+class OptionalRedis:
+    """One module's lazily connected Redis, skipped for a cooldown after any error."""
+
+    def __init__(
+        self,
+        name: str,
+        fallback: str,
+        cooldown: Optional[float] = None,
+        client: Any = None,
+        **options: Any,
+    ):
+        """
+        Args:
+            name: Module label for the warning, e.g. "OCR cache"
+            fallback: What happens without Redis, e.g. "results will not be cached"
+            cooldown: Seconds to skip Redis after an error (default REDIS_BREAKER_COOLDOWN_SECONDS)
+            client: Pre-built sync client (tests); created from REDIS_URI otherwise
+            **options: Passed to Redis.from_url (timeouts, decode_responses)
+        """
+        self.name = name
+        self.fallback = fallback
+        self.cooldown = REDIS_BREAKER_COOLDOWN_SECONDS if cooldown is None else cooldown
+        self.options = options
+        self._client = client
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self._open_until = 0.0
+        self._warned = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """True while Redis is being skipped."""
+        return time.monotonic() < self._open_until
+
+    def _check(self) -> None:
+        if self.is_open:
+            raise RedisUnavailable(f"{self.name}: skipping Redis after a recent error")
+
+    def client(self):
+        """The sync client; raises RedisUnavailable while the breaker is open."""
+        self._check()
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    from redis import Redis
+                    self._client = Redis.from_url(REDIS_URI, **self.options)
+                client = self._client
+        return client
+
+    def aclient(self):
+        """The asyncio client for the running loop; raises RedisUnavailable while the breaker is open."""
+        self._check()
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            from redis.asyncio import Redis
+            client = Redis.from_url(REDIS_URI, **self.options)
+            self._async_clients[loop] = client
+        return client
+
+    def failed(self, error: Exception) -> None:
+        """Record a Redis error: skip Redis for the cooldown, warn on the first one."""
+        if isinstance(error, RedisUnavailable):
+            return
+        self._open_until = time.monotonic() + self.cooldown
+        if not self._warned:
+            self._warned = True
+            print(f"⚠️  {self.name}: Redis unavailable, {self.fallback} ({error})")
+
+    def reset(self) -> None:
+        """Close the breaker (tests, or after Redis is known to be back)."""
+        self._open_until = 0.0
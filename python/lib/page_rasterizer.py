@@ -0,0 +1,101 @@
+"""
+In-process page rasterization with PyMuPDF.
+
+The OCR fallback used pdf2image's convert_from_path(first_page=n, last_page=n)
+once per problem page: every call launched a pdftoppm subprocess that
+re-parsed the whole PDF, and the PIL image it returned was re-encoded to PNG
+before base64. A document with 40 problem pages meant 40 process launches and
+40 full parses.
+
+encode_pages() opens the document once and renders the requested pages
+through lib.image_encoding, which picks format and resolution per page for
+the model the images are sent to - no subprocess and no PIL round trip.
+MuPDF objects must not be shared between threads and rendering holds the
+GIL, so parallelism (for large page sets) uses processes, each rendering a
+contiguous slice of the selected pages from its own open document. The pool
+comes from lib.pdf_analyzer.pool_starmap, so it also starts inside Celery
+prefork children.
+
+Usage:
+    from lib.page_rasterizer import encode_pages
+
+    encoded = encode_pages(pdf_path, [3, 7, 12], model="mistral-small")
+    # {3: EncodedImage(mime_type="image/jpeg", ...), ...}
+"""
+
+import os
+from typing import Dict, Iterable, List
+
+import fitz
+
+from lib.image_encoding import EncodedImage, encode_page
+from lib.pdf_analyzer import page_ranges, pool_starmap
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+RASTER_DPI = int(os.getenv("RASTER_DPI", "150"))
+RASTER_WORKERS = int(os.getenv("RASTER_WORKERS", "1"))  # >1 renders in a process pool
+RASTER_PARALLEL_MIN_PAGES = int(os.getenv("RASTER_PARALLEL_MIN_PAGES", "16"))
+
+
+# =============================================================================
+# Rendering
+# =============================================================================
+
+def _encode_range(pdf_path: str, page_numbers: List[int], model: str, dpi: int) -> Dict[int, EncodedImage]:
+    """Encode 1-indexed pages from one open document (runs in the caller or a pool worker)."""
+    encoded = {}
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num in page_numbers:
+            if not 1 <= page_num <= len(doc):
+                print(f"      ⚠️ Page {page_num}: out of range (document has {len(doc)} pages)")
+                continue
+            try:
+                encoded[page_num] = encode_page(doc[page_num - 1], model, dpi)
+            except Exception as e:
+                print(f"      ⚠️ Page {page_num}: Image conversion error - {e}")
+    finally:
+        doc.close()
+    return encoded
+
+
+def encode_pages(
+    pdf_path: str,
+    page_numbers: Iterable[int],
+    model: str,
+    dpi: int = RASTER_DPI,
+    workers: int = RASTER_WORKERS
+) -> Dict[int, EncodedImage]:
+    """
+    Render selected pages for a vision model (see lib.image_encoding).
+
+    Args:
+        pdf_path: Path to PDF file
+        page_numbers: 1-indexed page numbers (duplicates ignored)
+        model: Key of image_encoding.VISION_MAX_SIDE the pages are sent to
+        dpi: Preferred resolution; lowered to the model's input size if needed
+        workers: Process count; only used for at least RASTER_PARALLEL_MIN_PAGES pages
+
+    Returns:
+        Dict mapping page_number -> EncodedImage (failed pages omitted)
+    """
+    pages = sorted(set(page_numbers))
+    if not pages:
+        return {}
+
+    if workers > 1 and len(pages) >= RASTER_PARALLEL_MIN_PAGES:
+        shards = [pages[start:stop] for start, stop in page_ranges(len(pages), workers)]
+        try:
+            encoded = {}
+            results = pool_starmap(_encode_range, [(pdf_path, shard, model, dpi) for shard in shards], len(shards))
+            for shard_encoded in results:
+                encoded.update(shard_encoded)
+            return encoded
+        except Exception as e:
+            print(f"      ⚠️ Parallel rasterization unavailable ({e}), rendering serially")
+
+    return _encode_range(pdf_path, pages, model, dpi)
@@ -0,0 +1,340 @@
+"""
+Single-pass PDF page analysis.
+
+The fast pipeline used to parse every PDF three times: once for text
+(extract_pdf_with_fallback), once more for the encoding check
+(check_pdf_encoding re-extracts every page) and a third time for images
+(extract_images_from_pdf, with a get_image_rects call per image). On
+500-page textbooks that duplicated fitz work dominated the CPU time before
+any LLM call.
+
+analyze_pdf() opens the document once and produces, per page:
+- the extracted text
+- the encoding / quality check (same dict as check_page_encoding)
+- the image inventory with bboxes (one get_image_info call per page) and
+  image bytes (extracted once per xref, so a logo on every page costs one decode)
+- rasterization hints for OCR (needs_ocr, is_scanned, image_coverage)
+
+Downstream phases take the PdfAnalysis instead of a path.
+
+Extraction is CPU-bound (MuPDF holds the GIL), so large documents are sharded
+into contiguous page ranges and analyzed in a process pool (each worker opens
+its own fitz.Document); results are merged back in page order. Shards return
+only the image inventory; the distinct xrefs are then split across the pool
+and each image's bytes are extracted and sent back exactly once. Inside a
+Celery prefork child - a daemonic process, which the stdlib pools refuse to
+start children from - the pool comes from billiard, Celery's multiprocessing
+fork. Small documents, or hosts where no pool can be started, use the serial
+path.
+
+Usage:
+    from lib.pdf_analyzer import analyze_pdf
+
+    analysis = analyze_pdf(pdf_path)
+    pages_text = extract_pdf_with_fallback(pdf_path, analysis=analysis)
+    images_by_page = extract_images_from_pdf(pdf_path, analysis=analysis)
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import fitz
+
+from lib.encoding_check import check_text_encoding
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+SCANNED_MAX_CHARS = 50           # Pages with less text than this...
+SCANNED_MIN_IMAGE_COVERAGE = 0.5  # ...and images covering half the page are scans
+
+PDF_ANALYZER_WORKERS = int(os.getenv("PDF_ANALYZER_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))  # Below this, pool startup costs more than it saves
+
+
+# =============================================================================
+# Results
+# =============================================================================
+
+@dataclass
+class PageImage:
+    """One image placement on a page."""
+    xref: int
+    bbox: Optional[List[float]]      # [x0, y0, x1, y1] in page points
+    width: int                       # Pixel size of the embedded image
+    height: int
+    image_bytes: Optional[bytes] = None
+    ext: Optional[str] = None
+
+
+@dataclass
+class PageAnalysis:
+    """Everything downstream phases need from one page."""
+    page_num: int                    # 1-indexed
+    text: str
+    encoding: Dict                   # check_text_encoding() result + page_num / char_count
+    images: List[PageImage] = field(default_factory=list)
+    page_width: float = 0.0
+    page_height: float = 0.0
+    image_coverage: float = 0.0      # Fraction of page area covered by images (capped at 1)
+
+    @property
+    def quality_score(self) -> float:
+        return self.encoding.get('quality_score', 100)
+
+    @property
+    def needs_ocr(self) -> bool:
+        """Text layer is garbled - rasterize and OCR this page."""
+        return bool(self.encoding.get('has_issues')) or self.is_scanned
+
+    @property
+    def is_scanned(self) -> bool:
+        """Page is essentially one big image with no usable text layer."""
+        return (
+            len(self.text.strip()) < SCANNED_MAX_CHARS
+            and self.image_coverage >= SCANNED_MIN_IMAGE_COVERAGE
+        )
+
+
+@dataclass
+class PdfAnalysis:
+    """Result of one analyze_pdf() pass."""
+    path: str
+    pages: List[PageAnalysis]
+    elapsed: float = 0.0
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def pages_text(self) -> List[str]:
+        return [page.text for page in self.pages]
+
+    @property
+    def ocr_page_numbers(self) -> List[int]:
+        """Pages whose rasterization hints ask for OCR."""
+        return [page.page_num for page in self.pages if page.needs_ocr]
+
+
+# =============================================================================
+# Analysis
+# =============================================================================
+
+def _extract_image(doc, xref: int) -> tuple:
+    """(bytes, ext) for one xref, (None, None) if it cannot be extracted."""
+    try:
+        base_image = doc.extract_image(xref)
+        return base_image["image"], base_image["ext"]
+    except Exception as e:
+        print(f"   ⚠️ Could not extract image xref {xref}: {e}")
+        return None, None
+
+
+def _analyze_images(doc, page, image_cache: Optional[Dict[int, tuple]]) -> List[PageImage]:
+    """
+    Image inventory for one page (bboxes from a single get_image_info call).
+
+    Bytes are extracted once per xref into `image_cache`; with None, only the
+    inventory is collected (pool shards - the parent fetches bytes per xref).
+    """
+    images = []
+    for info in page.get_image_info(xrefs=True):
+        xref = info.get("xref") or 0
+        if xref <= 0:
+            continue  # Inline image without an xref - cannot be extracted
+
+        image_bytes = ext = None
+        if image_cache is not None:
+            if xref not in image_cache:
+                image_cache[xref] = _extract_image(doc, xref)
+            image_bytes, ext = image_cache[xref]
+
+        bbox = info.get("bbox")
+        images.append(PageImage(
+            xref=xref,
+            bbox=list(bbox) if bbox else None,
+            width=info.get("width") or 0,
+            height=info.get("height") or 0,
+            image_bytes=image_bytes,
+            ext=ext,
+        ))
+    return images
+
+
+def _image_coverage(images: List[PageImage], page_area: float) -> float:
+    """Approximate fraction of the page covered by images (overlaps not removed)."""
+    if page_area <= 0:
+        return 0.0
+    covered = 0.0
+    for image in images:
+        if image.bbox:
+            x0, y0, x1, y1 = image.bbox
+            covered += max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    return min(1.0, covered / page_area)
+
+
+def _analyze_page_range(
+    pdf_path: str,
+    start: int,
+    stop: int,
+    extract_images: bool,
+    image_bytes: bool = True
+) -> List[PageAnalysis]:
+    """Analyze pages [start, stop) - runs in the caller or in a pool worker."""
+    pages = []
+    image_cache: Optional[Dict[int, tuple]] = {} if image_bytes else None
+
+    doc = fitz.open(pdf_path)
+    try:
+        for page_index in range(start, stop):
+            page = doc[page_index]
+            text = page.get_text()
+
+            encoding = check_text_encoding(text)
+            encoding['page_num'] = page.number + 1
+            encoding['char_count'] = len(text)
+
+            images = _analyze_images(doc, page, image_cache) if extract_images else []
+            rect = page.rect
+            pages.append(PageAnalysis(
+                page_num=page.number + 1,
+                text=text,
+                encoding=encoding,
+                images=images,
+                page_width=rect.width,
+                page_height=rect.height,
+                image_coverage=_image_coverage(images, rect.width * rect.height),
+            ))
+    finally:
+        doc.close()
+    return pages
+
+
+def page_ranges(page_count: int, shards: int) -> List[Tuple[int, int]]:
+    """Split [0, page_count) into at most `shards` contiguous, near-equal ranges."""
+    shards = max(1, min(shards, page_count))
+    size, extra = divmod(page_count, shards)
+    ranges, start = [], 0
+    for i in range(shards):
+        stop = start + size + (1 if i < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _extract_images(pdf_path: str, xrefs: List[int]) -> Dict[int, tuple]:
+    """Extract (bytes, ext) for the given xrefs - runs in a pool worker."""
+    doc = fitz.open(pdf_path)
+    try:
+        return {xref: _extract_image(doc, xref) for xref in xrefs}
+    finally:
+        doc.close()
+
+
+def _in_daemon_process() -> bool:
+    """True inside a Celery prefork child (daemonic, so stdlib pools cannot start)."""
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        import billiard
+    except ImportError:
+        return False
+    return billiard.current_process().daemon
+
+
+def pool_starmap(func: Callable, arg_tuples: Sequence[tuple], processes: int) -> list:
+    """
+    func(*args) for every tuple in a process pool, results in order.
+
+    Works inside Celery prefork children too (billiard's pool there); also
+    used by lib.page_rasterizer.
+    """
+    if _in_daemon_process():
+        # billiard (ships with Celery) lets daemonic processes have children
+        from billiard import Pool
+
+        with Pool(processes) as pool:
+            return pool.starmap(func, arg_tuples)
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(func, *args) for args in arg_tuples]
+        return [future.result() for future in futures]
+
+
+def _analyze_parallel(pdf_path: str, page_count: int, extract_images: bool, workers: int) -> List[PageAnalysis]:
+    """
+    Analyze page-range shards in a process pool and merge them in page order.
+
+    Shards return the image inventory without bytes (a logo on every page
+    would otherwise be extracted and pickled once per shard); the distinct
+    xrefs are then extracted in a second pool pass, each exactly once.
+    """
+    ranges = page_ranges(page_count, workers)
+    results = pool_starmap(
+        _analyze_page_range,
+        [(pdf_path, start, stop, extract_images, False) for start, stop in ranges],
+        len(ranges),
+    )
+    pages = [page for shard in results for page in shard]
+
+    xrefs = sorted({image.xref for page in pages for image in page.images})
+    if xrefs:
+        batches = [xrefs[start:stop] for start, stop in page_ranges(len(xrefs), workers)]
+        image_cache: Dict[int, tuple] = {}
+        for extracted in pool_starmap(_extract_images, [(pdf_path, batch) for batch in batches], len(batches)):
+            image_cache.update(extracted)
+        for page in pages:
+            for image in page.images:
+                image.image_bytes, image.ext = image_cache.get(image.xref, (None, None))
+    return pages
+
+
+def analyze_pdf(
+    pdf_path: str,
+    extract_images: bool = True,
+    workers: Optional[int] = None
+) -> PdfAnalysis:
+    """
+    Parse a PDF once and collect text, quality checks and images per page.
+
+    Args:
+        pdf_path: Path to PDF file
+        extract_images: Also collect the image inventory + bytes (skip for text-only callers)
+        workers: Process count for sharded extraction (default PDF_ANALYZER_WORKERS;
+                 1 forces the serial path). Also used inside Celery prefork
+                 children, through billiard's pool
+
+    Returns:
+        PdfAnalysis with one PageAnalysis per page
+    """
+    start = time.time()
+    workers = workers or PDF_ANALYZER_WORKERS
+
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+
+    pages = None
+    mode = "serial"
+    if workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        try:
+            pages = _analyze_parallel(pdf_path, page_count, extract_images, workers)
+            mode = f"{min(workers, page_count)} processes"
+        except Exception as e:
+            # e.g. no fork/spawn support, or billiard missing in a daemonic process
+            print(f"   ⚠️ Parallel PDF analysis unavailable ({e}), falling back to serial")
+
+    if pages is None:
+        pages = _analyze_page_range(pdf_path, 0, page_count, extract_images)
+
+    analysis = PdfAnalysis(path=pdf_path, pages=pages, elapsed=time.time() - start)
+    image_count = sum(len(page.images) for page in pages)
+    print(f"   ✅ Analyzed {analysis.page_count} pages ({image_count} image placements) in {analysis.elapsed:.2f}s ({mode})")
+    return analysis
@@ -0,0 +1,120 @@
+"""
+Asyncio scheduler that runs ingestion phases as a dependency DAG.
+
+ingest_document_fast used to run every phase strictly in sequence, although
+the image branch (extraction -> vision classification -> R2 upload) never
+depends on text extraction or hierarchy creation. Expressing the pipeline as
+a DAG lets independent branches overlap, so wall-clock time approaches the
+longest branch instead of the sum of all phases:
+
+    analyze ─┬─ extract ── hierarchy ─┬─ match ── enrich ── persist
+             └─ images ───────────────┘
+
+Phase functions are ordinary blocking callables (HTTP clients, fitz, Neo4j
+driver); each one runs on a worker thread via asyncio.to_thread as soon as
+all of its dependencies have finished, and receives their results as
+positional arguments in the order the dependencies were declared. A failing
+phase fails every phase downstream of it, and run() re-raises the first error.
+
+Usage:
+    from lib.phase_dag import PhaseDAG
+
+    dag = PhaseDAG("fast ingestion")
+    dag.add("analyze", lambda: analyze_pdf(path))
+    dag.add("text", extract_text, deps=["analyze"])
+    dag.add("images", extract_images, deps=["analyze"])
+    dag.add("match", match, deps=["text", "images"])
+    results = dag.run_sync()      # or: await dag.run()
+    results["match"]
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+
+@dataclass
+class _Phase:
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...]
+
+
+@dataclass
+class PhaseTiming:
+    """When a phase started and finished, relative to the DAG start."""
+    name: str
+    start: float
+    end: float
+
+    @property
+    def elapsed(self) -> float:
+        return self.end - self.start
+
+
+class PhaseDAG:
+    """A set of phases with dependencies, executed with maximum overlap."""
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self._phases: Dict[str, _Phase] = {}
+        self.timings: List[PhaseTiming] = []
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> "PhaseDAG":
+        """
+        Register a phase. Dependencies must already be registered, which
+        keeps the graph acyclic by construction.
+        """
+        if name in self._phases:
+            raise ValueError(f"Phase '{name}' is already registered")
+        missing = [dep for dep in deps if dep not in self._phases]
+        if missing:
+            raise ValueError(f"Phase '{name}' depends on unregistered phase(s): {missing}")
+        self._phases[name] = _Phase(name, fn, tuple(deps))
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every phase once its dependencies are done; return {name: result}."""
+        dag_start = time.time()
+        self.timings = []
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_phase(phase: _Phase) -> Any:
+            args = [await tasks[dep] for dep in phase.deps]
+            start = time.time() - dag_start
+            result = await asyncio.to_thread(phase.fn, *args)
+            self.timings.append(PhaseTiming(phase.name, start, time.time() - dag_start))
+            return result
+
+        # Registration order is a topological order (deps must exist first)
+        for phase in self._phases.values():
+            tasks[phase.name] = asyncio.create_task(run_phase(phase), name=phase.name)
+
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+
+        self._print_timings(time.time() - dag_start)
+        return {name: task.result() for name, task in tasks.items()}
+
+    def run_sync(self) -> Dict[str, Any]:
+        """Run from sync code, including from inside a running event loop."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run())
+
+        # Already in an async context - run on a fresh loop in a helper thread
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.run()).result()
+
+    def _print_timings(self, total: float) -> None:
+        serial = sum(t.elapsed for t in self.timings)
+        print(f"⏱️  {self.name}: {total:.2f}s wall-clock vs {serial:.2f}s if run serially")
+        for t in sorted(self.timings, key=lambda t: t.start):
+            print(f"   {t.name:<12} {t.start:7.2f}s → {t.end:7.2f}s ({t.elapsed:.2f}s)")
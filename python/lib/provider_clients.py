@@ -0,0 +1,244 @@
+"""
+Process-wide HTTP client pools for LLM / vision / OCR providers.
+
+Ingestion and agent code used to call httpx.post() (a throwaway client per
+request) or build a fresh ChatOpenAI per invocation, so every call paid
+DNS + TCP + TLS again. Most of these requests (8B summaries, vision
+classification, single-page OCR) finish in well under a second, so the
+handshake was a large share of their latency.
+
+This module keeps ONE keep-alive connection pool per origin
+(scheme://host:port) for the lifetime of the process:
+
+- Sync httpx.Client per origin, shared by all threads
+- Async httpx.AsyncClient per origin per event loop (Celery tasks spin up
+  short-lived loops with asyncio.run, and async clients are loop-bound);
+  run() is asyncio.run() that closes the loop's clients before the loop ends
+- HTTP/2 when the optional `h2` package is installed (pip install
+  "httpx[http2]"), which multiplexes concurrent requests over one
+  connection; plain HTTP/1.1 keep-alive otherwise
+- get_chat_model() caches LangChain ChatOpenAI instances by their settings
+  and hands them the shared sync pool for their base URL
+- close_all() / aclose_all() shutdown hooks (FastAPI shutdown, Celery
+  worker_process_shutdown), fresh pools after fork
+
+Usage:
+    from lib import provider_clients
+
+    response = provider_clients.post(url, headers=headers, json=payload, timeout=60.0)
+    response = await provider_clients.apost(url, headers=headers, json=payload)
+
+    results = provider_clients.run(ocr_pages_async(...))  # from sync code
+
+    llm = provider_clients.get_chat_model(
+        model="llama-3.1-8b-instant",
+        api_key=GROQ_API_KEY,
+        base_url="https://api.groq.com/openai/v1",
+        temperature=0,
+    )
+
+NOTE: Never close a client returned from here - it is shared.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+from typing import Any, Dict, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60"))  # Idle seconds before closing
+HTTP_DEFAULT_TIMEOUT = float(os.getenv("HTTP_DEFAULT_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_POOL_HTTP2 = os.getenv("HTTP_POOL_HTTP2", "true").lower() == "true"
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+try:
+    import h2  # noqa: F401  (httpx[http2] extra)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+_lock = threading.Lock()
+_sync_clients: Dict[str, httpx.Client] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+_chat_models: Dict[Tuple, Any] = {}
+
+
+def origin(url: str) -> str:
+    """scheme://host[:port] - the unit of connection reuse."""
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        raise ValueError(f"Not an absolute URL: {url!r}")
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _client_config() -> dict:
+    """Shared pool settings for sync and async clients."""
+    return {
+        "http2": HTTP_POOL_HTTP2 and HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(HTTP_DEFAULT_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    }
+
+
+# =============================================================================
+# Client Access
+# =============================================================================
+
+def get_client(url: str) -> httpx.Client:
+    """Get the shared sync client for the URL's origin, creating it on first use."""
+    key = origin(url)
+
+    client = _sync_clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            client = httpx.Client(**_client_config())
+            _sync_clients[key] = client
+    return client
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """
+    Get the shared async client for the URL's origin on the running loop.
+
+    Must be called from inside a coroutine.
+    """
+    key = origin(url)
+    loop = asyncio.get_running_loop()
+
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(**_client_config())
+            loop_clients[key] = client
+    return client
+
+
+def post(url: str, **kwargs) -> httpx.Response:
+    """Drop-in for httpx.post() that reuses the origin's pooled connections."""
+    return get_client(url).post(url, **kwargs)
+
+
+async def apost(url: str, **kwargs) -> httpx.Response:
+    """Async variant of post()."""
+    return await get_async_client(url).post(url, **kwargs)
+
+
+def get_chat_model(**kwargs) -> Any:
+    """
+    Shared ChatOpenAI for a given configuration (model, base_url, temperature...).
+
+    ChatOpenAI builds its own OpenAI SDK client, so constructing one per call
+    also threw its connection pool away. Instances are cached by their
+    keyword arguments and use the shared sync pool for their base URL.
+    Arguments must be hashable.
+    """
+    key = tuple(sorted(kwargs.items()))
+
+    model = _chat_models.get(key)
+    if model is not None:
+        return model
+
+    from langchain_openai import ChatOpenAI
+
+    http_client = get_client(kwargs.get("base_url") or OPENAI_BASE_URL)
+    with _lock:
+        model = _chat_models.get(key)
+        if model is None:
+            model = ChatOpenAI(http_client=http_client, **kwargs)
+            _chat_models[key] = model
+    return model
+
+
+def pool_info() -> dict:
+    """Which origins currently hold a pool (for debugging / health endpoints)."""
+    with _lock:
+        return {
+            "http2": HTTP_POOL_HTTP2 and HTTP2_AVAILABLE,
+            "sync_origins": sorted(_sync_clients),
+            "async_loops": len(_async_clients),
+            "chat_models": len(_chat_models),
+        }
+
+
+# =============================================================================
+# Lifecycle Hooks
+# =============================================================================
+
+def close_all() -> None:
+    """Close every sync client (Celery worker shutdown, atexit)."""
+    with _lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+        _chat_models.clear()
+
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"⚠️  Error closing HTTP client: {e}")
+
+
+def run(coro) -> Any:
+    """
+    asyncio.run() for coroutines that use the async pools.
+
+    The fresh loop's clients are closed before the loop goes away; otherwise
+    their sockets stay open until the loop happens to be garbage-collected.
+    """
+    async def main():
+        try:
+            return await coro
+        finally:
+            await aclose_all()
+
+    return asyncio.run(main())
+
+
+async def aclose_all() -> None:
+    """Close the async clients owned by the running loop (FastAPI shutdown)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = list(_async_clients.pop(loop, {}).values())
+
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"⚠️  Error closing async HTTP client: {e}")
+
+
+def _reset_after_fork() -> None:
+    """Forked children (Celery prefork) must not share the parent's sockets."""
+    global _lock
+    _lock = threading.Lock()
+    _sync_clients.clear()
+    _async_clients.clear()
+    _chat_models.clear()
+
+
+atexit.register(close_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
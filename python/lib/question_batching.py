@@ -0,0 +1,168 @@
+"""
+Packing of small content blocks into shared question-generation requests.
+
+Question generation used to make one LLM call per ContentBlock. The prompt
+carries a long Bloom's-taxonomy instruction block (~1.5k tokens) that is the
+same for every block, so for documents with many short sections most of the
+prompt tokens - and most of the requests - were that repeated overhead.
+
+Small blocks are now packed into one request under a content budget, and
+the model returns one question array per block:
+
+    {"blocks": [{"block": 1, "questions": [...]}, {"block": 2, "questions": [...]}]}
+
+Large blocks keep their own call (their content already dominates the prompt,
+and a single truncated response should not cost several blocks).
+
+Every block is then checked against the Bloom's quota (2 questions per
+level). Missing levels are topped up with a small follow-up request instead
+of regenerating the block.
+
+This module is pure packing / response splitting with no LLM dependency; the
+calls themselves live in ingestion_workflow.IngestionPipeline.
+
+Usage:
+    from lib.question_batching import pack_question_batches, split_batched_questions
+
+    batches = pack_question_batches([len(b.combined_context) for b in blocks])
+    # [[0], [1, 2, 3], [4, 5]] - singletons go through the per-block path
+
+    per_block = split_batched_questions(data, len(batch))  # {0: [...], 1: [...]}
+    missing_bloom_levels(["remember", "apply", "apply"])   # {"remember": 1, "understand": 2, ...}
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Sequence
+
+from lib.json_stream import parse_array_items
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+QUESTION_BATCHING_ENABLED = os.getenv("QUESTION_BATCHING_ENABLED", "true").lower() == "true"
+QUESTION_BATCH_SMALL_BLOCK_CHARS = int(os.getenv("QUESTION_BATCH_SMALL_BLOCK_CHARS", "2500"))  # Larger blocks get their own call
+QUESTION_BATCH_MAX_CHARS = int(os.getenv("QUESTION_BATCH_MAX_CHARS", "12000"))  # Content budget per request (~3k tokens)
+QUESTION_BATCH_MAX_BLOCKS = int(os.getenv("QUESTION_BATCH_MAX_BLOCKS", "5"))
+QUESTION_BATCH_OUTPUT_TOKENS_PER_BLOCK = 5000  # 12 questions with options and key points
+QUESTION_OUTPUT_TOKENS_PER_QUESTION = 600       # Budget for follow-up requests
+
+BLOOM_LEVELS = ("remember", "understand", "apply", "analyze", "evaluate", "create")
+QUESTIONS_PER_BLOOM_LEVEL = 2
+
+
+# =============================================================================
+# Packing
+# =============================================================================
+
+def pack_question_batches(
+    sizes: Sequence[int],
+    small_block_chars: int = QUESTION_BATCH_SMALL_BLOCK_CHARS,
+    max_chars: int = QUESTION_BATCH_MAX_CHARS,
+    max_blocks: int = QUESTION_BATCH_MAX_BLOCKS,
+) -> List[List[int]]:
+    """
+    Group block indices into requests.
+
+    Blocks larger than small_block_chars are returned as singletons. Small
+    blocks are packed greedily in document order (neighbouring topics share
+    context, which keeps the batched prompt coherent) until either the
+    content budget or the block cap would be exceeded.
+
+    Args:
+        sizes: Content length (chars) of each block, in document order
+
+    Returns:
+        List of index groups covering every block exactly once
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_chars = 0
+
+    for idx, size in enumerate(sizes):
+        if size > small_block_chars or max_blocks <= 1:
+            batches.append([idx])
+            continue
+        if current and (current_chars + size > max_chars or len(current) >= max_blocks):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(idx)
+        current_chars += size
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def salvage_batched_entries(failed: Iterable[str]) -> List[dict]:
+    """
+    Recover block entries whose JSON did not decode as a whole.
+
+    One malformed question makes its whole {"block": n, "questions": [...]}
+    entry undecodable; the block number and every valid question in it are
+    still usable.
+    """
+    entries = []
+    for raw in failed:
+        match = re.search(r'"block(?:_id)?"\s*:\s*"?(\d+)', raw)
+        if not match:
+            continue
+        questions = parse_array_items(raw, "questions").items
+        entries.append({"block": int(match.group(1)), "questions": questions})
+    return entries
+
+
+def split_batched_questions(data: Any, block_count: int) -> Dict[int, List[dict]]:
+    """
+    Map a batched response to {0-based block position: raw question dicts}.
+
+    Entries are matched by their "block" number (1-based, as numbered in the
+    prompt). If the model dropped the numbers but returned exactly one entry
+    per block, entries are matched by position. Blocks the response does not
+    cover are simply absent, so the caller can regenerate them individually.
+    """
+    entries = data.get("blocks") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return {}
+
+    result: Dict[int, List[dict]] = {}
+    unnumbered = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        questions = entry.get("questions")
+        if not isinstance(questions, list):
+            continue
+        number = entry.get("block", entry.get("block_id"))
+        try:
+            position = int(number) - 1
+        except (TypeError, ValueError):
+            unnumbered.append(questions)
+            continue
+        if 0 <= position < block_count and position not in result:
+            result[position] = [q for q in questions if isinstance(q, dict)]
+
+    if not result and len(unnumbered) == block_count:
+        result = {i: [q for q in qs if isinstance(q, dict)] for i, qs in enumerate(unnumbered)}
+    return result
+
+
+# =============================================================================
+# Bloom's Quota
+# =============================================================================
+
+def missing_bloom_levels(
+    levels: Iterable[str],
+    per_level: int = QUESTIONS_PER_BLOOM_LEVEL,
+) -> Dict[str, int]:
+    """
+    How many questions each Bloom's level still needs.
+
+    Levels that already meet (or exceed) the quota are omitted, so an empty
+    dict means the block is complete.
+    """
+    counts = Counter(levels)
+    return {level: per_level - counts[level] for level in BLOOM_LEVELS if counts[level] < per_level}
@@ -0,0 +1,292 @@
+"""
+Shared Cloudflare R2 (S3 API) storage client.
+
+Every R2 touchpoint used to build its own boto3 client: upload_to_r2() called
+get_r2_client() for every single image - from a 10-thread upload pool - and
+/upload/presign, DELETE /documents/{id}, /documents/{id}/url and r2.get_file
+did the same per request. Client construction loads the service model and
+credential chain (tens of ms) and each new client starts with an empty
+connection pool, so every image paid a fresh TLS handshake.
+
+This module keeps one client per process:
+- Created lazily from a dedicated boto3 Session (sessions are not
+  thread-safe, low-level clients are) under a lock
+- Connection pool sized for the upload workers, TCP keep-alive on
+- botocore "standard" retries: throttling, 5xx and connection errors are
+  retried with exponential backoff inside each call
+- Recreated after fork (Celery prefork), like lib/neo4j_pool.py
+
+On top of it:
+- put_objects(): concurrent batched puts for extracted images
+- upload_file(): multipart upload for large originals
+- download_file(): streams to disk; large objects are fetched with parallel
+  ranged GETs (s3transfer) instead of one presigned GET held in memory
+- presign_put() / presign_get() / delete_prefix() for the API endpoints
+
+Usage:
+    from lib import r2_storage
+
+    urls = r2_storage.put_objects([(key, image_bytes, "image/png"), ...])
+    r2_storage.download_file("uploads/u1/123_book.pdf", "./content/123_book.pdf")
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+R2_ENDPOINT = os.getenv("R2_ENDPOINT")
+R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
+R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
+R2_BUCKET = os.getenv("R2_BUCKET")
+R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", "https://r2.voxam.dev")
+
+R2_UPLOAD_WORKERS = int(os.getenv("R2_UPLOAD_WORKERS", "16"))
+R2_MAX_POOL_CONNECTIONS = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "32"))
+R2_MAX_ATTEMPTS = int(os.getenv("R2_MAX_ATTEMPTS", "5"))
+R2_CONNECT_TIMEOUT = float(os.getenv("R2_CONNECT_TIMEOUT", "5"))
+R2_READ_TIMEOUT = float(os.getenv("R2_READ_TIMEOUT", "60"))
+
+# Multipart upload / ranged download (s3transfer)
+R2_MULTIPART_THRESHOLD = int(os.getenv("R2_MULTIPART_THRESHOLD", str(16 * 1024 * 1024)))
+R2_MULTIPART_CHUNKSIZE = int(os.getenv("R2_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+R2_TRANSFER_CONCURRENCY = int(os.getenv("R2_TRANSFER_CONCURRENCY", "8"))
+
+# Pool must fit every concurrent put / transfer part, or urllib3 discards connections
+POOL_SIZE = max(R2_MAX_POOL_CONNECTIONS, R2_UPLOAD_WORKERS, R2_TRANSFER_CONCURRENCY)
+
+UploadItem = Tuple[str, bytes, str]  # (key, body, content_type)
+
+
+# =============================================================================
+# Client
+# =============================================================================
+
+_lock = threading.Lock()
+_client = None
+
+
+def is_configured() -> bool:
+    """True if every R2 setting is present."""
+    return all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET])
+
+
+def get_client():
+    """
+    Shared boto3 S3 client for R2 (None if R2 is not configured).
+
+    Safe to call from any thread; the same client (and connection pool) is
+    returned for the life of the process.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    if not is_configured():
+        return None
+
+    with _lock:
+        if _client is None:
+            import boto3
+            from botocore.config import Config
+
+            _client = boto3.session.Session().client(
+                "s3",
+                endpoint_url=R2_ENDPOINT,
+                aws_access_key_id=R2_ACCESS_KEY_ID,
+                aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+                region_name="auto",
+                config=Config(
+                    signature_version="s3v4",
+                    max_pool_connections=POOL_SIZE,
+                    retries={"max_attempts": R2_MAX_ATTEMPTS, "mode": "standard"},
+                    connect_timeout=R2_CONNECT_TIMEOUT,
+                    read_timeout=R2_READ_TIMEOUT,
+                    tcp_keepalive=True,
+                ),
+            )
+    return _client
+
+
+def _require_client():
+    client = get_client()
+    if client is None:
+        raise RuntimeError("R2 credentials not fully configured")
+    return client
+
+
+def _transfer_config():
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=R2_MULTIPART_THRESHOLD,
+        multipart_chunksize=R2_MULTIPART_CHUNKSIZE,
+        max_concurrency=R2_TRANSFER_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+def public_url(key: str) -> str:
+    return f"{R2_PUBLIC_URL}/{key}"
+
+
+# =============================================================================
+# Uploads
+# =============================================================================
+
+def put_object(body: bytes, key: str, content_type: str = "application/octet-stream") -> Optional[str]:
+    """
+    Upload one object and return its public URL.
+
+    Returns the URL without uploading when R2 is not configured (local runs),
+    and None if the upload failed after botocore's retries.
+    """
+    client = get_client()
+    if client is None:
+        print(f"   📤 [MOCK] Would upload {len(body)} bytes to R2: {key}")
+        return public_url(key)
+
+    try:
+        client.put_object(Bucket=R2_BUCKET, Key=key, Body=body, ContentType=content_type)
+        return public_url(key)
+    except Exception as e:
+        print(f"   ❌ R2 upload failed for {key}: {e}")
+        return None
+
+
+def put_objects(items: Iterable[UploadItem], max_workers: int = R2_UPLOAD_WORKERS) -> Dict[str, str]:
+    """
+    Upload many small objects concurrently over the shared pool.
+
+    Args:
+        items: (key, body, content_type) tuples
+        max_workers: Concurrent puts (capped by the client's pool size)
+
+    Returns:
+        Dict mapping key -> public URL for every successful upload
+    """
+    items = list(items)
+    if not items:
+        return {}
+
+    urls: Dict[str, str] = {}
+    workers = max(1, min(max_workers, len(items), POOL_SIZE))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(put_object, body, key, content_type): key
+            for key, body, content_type in items
+        }
+        for future in as_completed(futures):
+            url = future.result()
+            if url:
+                urls[futures[future]] = url
+
+    failed = len(items) - len(urls)
+    if failed:
+        print(f"   ⚠️ R2: {failed}/{len(items)} uploads failed")
+    return urls
+
+
+def upload_file(path: str, key: str, content_type: Optional[str] = None) -> str:
+    """
+    Upload a local file; files above R2_MULTIPART_THRESHOLD go up as parallel parts.
+
+    Returns:
+        Public URL of the object
+    """
+    extra_args = {"ContentType": content_type} if content_type else None
+    _require_client().upload_file(path, R2_BUCKET, key, ExtraArgs=extra_args, Config=_transfer_config())
+    return public_url(key)
+
+
+# =============================================================================
+# Downloads
+# =============================================================================
+
+def download_file(key: str, path: str) -> str:
+    """
+    Stream an object to a local file.
+
+    Objects above R2_MULTIPART_THRESHOLD are fetched as parallel ranged GETs;
+    the file only appears at `path` once the download completed.
+
+    Returns:
+        `path`
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    _require_client().download_file(R2_BUCKET, key, path, Config=_transfer_config())
+    return path
+
+
+# =============================================================================
+# Presigning / Deletion
+# =============================================================================
+
+def presign_put(key: str, content_type: str, expires_in: int = 300) -> str:
+    """Presigned PUT URL for direct browser uploads."""
+    return _require_client().generate_presigned_url(
+        "put_object",
+        Params={"Bucket": R2_BUCKET, "Key": key, "ContentType": content_type},
+        ExpiresIn=expires_in,
+    )
+
+
+def presign_get(key: str, expires_in: int = 3600) -> str:
+    """Presigned GET URL for viewing an object."""
+    return _require_client().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": R2_BUCKET, "Key": key},
+        ExpiresIn=expires_in,
+    )
+
+
+def delete_prefix(prefix: str) -> int:
+    """
+    Delete every object under a prefix (one delete_objects call per listed page).
+
+    Returns:
+        Number of objects deleted
+    """
+    client = _require_client()
+    deleted = 0
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=R2_BUCKET, Prefix=prefix):
+        objects = page.get("Contents", [])
+        if objects:
+            client.delete_objects(
+                Bucket=R2_BUCKET,
+                Delete={"Objects": [{"Key": obj["Key"]} for obj in objects], "Quiet": True},
+            )
+            deleted += len(objects)
+    return deleted
+
+
+# =============================================================================
+# Lifecycle
+# =============================================================================
+
+def pool_info() -> Dict[str, Any]:
+    """Client state for debugging."""
+    return {
+        "configured": is_configured(),
+        "client_created": _client is not None,
+        "max_pool_connections": POOL_SIZE,
+        "upload_workers": R2_UPLOAD_WORKERS,
+    }
+
+
+def _reset_after_fork() -> None:
+    """Forked children (Celery prefork) must not share the parent's sockets."""
+    global _lock, _client
+    _lock = threading.Lock()
+    _client = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,69 @@
+"""
+Reciprocal Rank Fusion (RRF) for multi-leg hybrid retrieval.
+
+Each retrieval leg (vector, fulltext, ...) returns its own ranked list of
+(id, score) pairs. RRF ignores the raw scores - which are not comparable
+across legs - and scores every id by its rank in each list:
+
+    score(id) = sum over legs of  weight_leg / (k + rank_leg(id) + 1)
+
+with 0-based ranks, matching the formula previously computed in Cypher.
+Fusion is a single pass over each list (dict lookups), so it stays linear
+in the number of hits instead of the quadratic rank search in Cypher.
+
+Usage:
+    from lib.rank_fusion import reciprocal_rank_fusion
+
+    fused = reciprocal_rank_fusion(
+        {"vector": [("b1", 0.91), ("b2", 0.88)], "keyword": [("b2", 7.1)]},
+        weights={"vector": 1.0, "keyword": 0.5},
+    )
+    # [("b2", 0.0245...), ("b1", 0.0163...)]
+"""
+
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    legs: Dict[str, Sequence[Tuple[Hashable, float]]],
+    weights: Optional[Dict[str, float]] = None,
+    k: int = DEFAULT_RRF_K,
+    limit: Optional[int] = None,
+) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse ranked lists with (weighted) Reciprocal Rank Fusion.
+
+    Args:
+        legs: Leg name -> hits ordered best first, as (id, leg_score) pairs.
+              Duplicate ids within a leg keep their best (first) rank.
+        weights: Optional leg name -> weight (missing legs default to 1.0)
+        k: RRF constant; larger values flatten the rank curve
+        limit: Return only the top N fused ids
+
+    Returns:
+        [(id, fused_score), ...] best first. Ties keep first-seen order
+        (legs in dict order), so the result is deterministic.
+    """
+    weights = weights or {}
+    fused: Dict[Hashable, float] = {}
+
+    for leg_name, hits in legs.items():
+        weight = weights.get(leg_name, 1.0)
+        if weight == 0:
+            continue
+
+        seen = set()
+        rank = 0
+        for hit_id, _ in hits:
+            if hit_id in seen:
+                continue
+            seen.add(hit_id)
+            fused[hit_id] = fused.get(hit_id, 0.0) + weight / (k + rank + 1)
+            rank += 1
+
+    # sorted() is stable, so equal scores stay in insertion (first-seen) order
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ranked[:limit] if limit is not None else ranked
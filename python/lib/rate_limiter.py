@@ -0,0 +1,468 @@
+"""
+Adaptive, fleet-wide rate limiter for outbound LLM / vision / OCR calls.
+
+Concurrency used to be hard-coded per call site (4 question workers, 5 vision
+threads, 10 OCR requests) with `time.sleep(attempt)` backoff, and every
+Celery worker tuned itself independently - so two workers together blew
+through Groq / Gemini quotas and spent their time being throttled.
+
+Every provider now has one limiter shared by the whole fleet through Redis:
+
+- Token buckets for requests/minute and tokens/minute (estimated up front)
+- AIMD concurrency: each success adds ~1 slot per window, a 429/503 halves
+  the limit (at most once per second), and a latency spike above 2x the
+  moving average trims it by 10%
+- Retry-After: a throttled response sets a provider-wide cooldown that every
+  process waits out before sending the next request
+- In-flight slots are leases with an expiry, so a crashed worker cannot
+  leak capacity
+
+Acquire and release are single Lua scripts, so the check-and-take is atomic
+across processes. If Redis is unavailable the same algorithm runs on
+in-process state, which still protects a single worker; after an error Redis
+is skipped for a cooldown (lib.optional_redis) so polling does not stall on
+connect timeouts.
+
+Limits come from PROVIDER_LIMITS and can be overridden per provider with
+RATE_LIMIT_<PROVIDER>_RPM / _TPM / _CONCURRENCY (0 = unlimited for RPM/TPM).
+
+Usage:
+    from lib.rate_limiter import get_limiter
+
+    limiter = get_limiter("gemini")
+    response = limiter.call(lambda: httpx.post(url, json=payload), tokens=1500)
+    response = await limiter.acall(lambda: client.post(url, json=payload), tokens=1500)
+
+    max_workers = limiter.max_concurrency  # Ceiling for thread pools / semaphores
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from lib.optional_redis import OptionalRedis
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+# Defaults sit just under each provider's paid-tier limits for the models we use
+PROVIDER_LIMITS = {
+    "gemini": {"rpm": 2000, "tpm": 4_000_000, "concurrency": 20},
+    "groq": {"rpm": 1000, "tpm": 300_000, "concurrency": 16},
+    "cerebras": {"rpm": 900, "tpm": 1_000_000, "concurrency": 8},
+    "deepinfra": {"rpm": 3000, "tpm": 0, "concurrency": 20},
+    "openai": {"rpm": 3000, "tpm": 1_000_000, "concurrency": 8},
+}
+DEFAULT_LIMITS = {"rpm": 600, "tpm": 0, "concurrency": 4}
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+KEY_PREFIX = "ratelimit:"
+LEASE_TTL_SECONDS = 300          # Longest request we expect; expired leases free their slot
+STATE_TTL_SECONDS = 3600
+THROTTLE_STATUSES = (429, 503)
+DEFAULT_COOLDOWN_SECONDS = 1.0   # When a 429 carries no Retry-After
+MAX_COOLDOWN_SECONDS = 60.0
+POLL_SECONDS = 0.05              # Wait when all slots are taken
+
+
+def _env_limit(provider: str, name: str, default: int) -> int:
+    return int(os.getenv(f"RATE_LIMIT_{provider.upper()}_{name.upper()}", str(default)))
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# =============================================================================
+# Shared state (Redis Lua) and local fallback
+# =============================================================================
+
+# KEYS: bucket, inflight, aimd, cooldown
+# ARGV: now, lease, lease_ttl, rpm, tpm, cost, initial_limit, state_ttl
+# Returns seconds to wait before trying again ("0" = slot acquired)
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+local cooldown = tonumber(redis.call('GET', KEYS[4]) or '0')
+if cooldown > now then return tostring(cooldown - now) end
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local limit = tonumber(redis.call('HGET', KEYS[3], 'limit') or ARGV[7])
+if redis.call('ZCARD', KEYS[2]) >= math.max(1, math.floor(limit)) then return '-1' end
+
+local rpm = tonumber(ARGV[4])
+local tpm = tonumber(ARGV[5])
+local cost = tonumber(ARGV[6])
+if tpm > 0 then cost = math.min(cost, tpm) end
+local b = redis.call('HMGET', KEYS[1], 'req', 'tok', 'ts')
+local req = tonumber(b[1]) or rpm
+local tok = tonumber(b[2]) or tpm
+local dt = math.max(0, now - (tonumber(b[3]) or now))
+req = math.min(rpm, req + dt * rpm / 60)
+tok = math.min(tpm, tok + dt * tpm / 60)
+
+local wait = 0
+if rpm > 0 and req < 1 then wait = (1 - req) * 60 / rpm end
+if tpm > 0 and tok < cost then wait = math.max(wait, (cost - tok) * 60 / tpm) end
+if wait == 0 then
+    if rpm > 0 then req = req - 1 end
+    if tpm > 0 then tok = tok - cost end
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), ARGV[2])
+    redis.call('EXPIRE', KEYS[2], ARGV[8])
+end
+redis.call('HSET', KEYS[1], 'req', req, 'tok', tok, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ARGV[8])
+return tostring(wait)
+"""
+
+# KEYS: inflight, aimd, cooldown
+# ARGV: lease, now, latency, throttled, error, cooldown_seconds,
+#       initial_limit, min_limit, max_limit, state_ttl
+# Returns the new concurrency limit
+_RELEASE_LUA = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+local now = tonumber(ARGV[2])
+local latency = tonumber(ARGV[3])
+local s = redis.call('HMGET', KEYS[2], 'limit', 'ewma', 'dec_ts')
+local limit = tonumber(s[1]) or tonumber(ARGV[7])
+local ewma = tonumber(s[2])
+local dec_ts = tonumber(s[3]) or 0
+local min_limit = tonumber(ARGV[8])
+local max_limit = tonumber(ARGV[9])
+
+local factor = 1
+if ARGV[4] == '1' then factor = 0.5
+elseif ARGV[5] == '1' or (ewma and latency > 2 * ewma) then factor = 0.9 end
+
+if factor < 1 then
+    if now - dec_ts >= 1 then
+        limit = math.max(min_limit, limit * factor)
+        dec_ts = now
+    end
+else
+    limit = math.min(max_limit, limit + 1 / limit)
+end
+if ARGV[5] ~= '1' then
+    if ewma then ewma = 0.8 * ewma + 0.2 * latency else ewma = latency end
+end
+redis.call('HSET', KEYS[2], 'limit', limit, 'ewma', ewma or latency, 'dec_ts', dec_ts)
+redis.call('EXPIRE', KEYS[2], ARGV[10])
+
+local cooldown = tonumber(ARGV[6])
+if cooldown > 0 then
+    local until_ts = now + cooldown
+    local current = tonumber(redis.call('GET', KEYS[3]) or '0')
+    if until_ts > current then
+        redis.call('SET', KEYS[3], until_ts, 'EX', math.ceil(cooldown) + 1)
+    end
+end
+return tostring(limit)
+"""
+
+
+class _LocalState:
+    """In-process equivalent of the Redis state, used when Redis is down."""
+
+    def __init__(self, rpm: int, tpm: int, initial_limit: float):
+        self.lock = threading.Lock()
+        self.req = float(rpm)
+        self.tok = float(tpm)
+        self.ts = time.time()
+        self.leases: Dict[str, float] = {}
+        self.limit = initial_limit
+        self.ewma: Optional[float] = None
+        self.dec_ts = 0.0
+        self.cooldown_until = 0.0
+
+    def acquire(self, now: float, lease: str, rpm: int, tpm: int, cost: float) -> float:
+        with self.lock:
+            if self.cooldown_until > now:
+                return self.cooldown_until - now
+            self.leases = {k: exp for k, exp in self.leases.items() if exp > now}
+            if len(self.leases) >= max(1, int(self.limit)):
+                return -1.0
+
+            if tpm > 0:
+                cost = min(cost, tpm)
+            dt = max(0.0, now - self.ts)
+            self.req = min(rpm, self.req + dt * rpm / 60)
+            self.tok = min(tpm, self.tok + dt * tpm / 60)
+            self.ts = now
+
+            wait = 0.0
+            if rpm > 0 and self.req < 1:
+                wait = (1 - self.req) * 60 / rpm
+            if tpm > 0 and self.tok < cost:
+                wait = max(wait, (cost - self.tok) * 60 / tpm)
+            if wait == 0:
+                if rpm > 0:
+                    self.req -= 1
+                if tpm > 0:
+                    self.tok -= cost
+                self.leases[lease] = now + LEASE_TTL_SECONDS
+            return wait
+
+    def release(
+        self, lease: str, now: float, latency: float, throttled: bool, error: bool,
+        cooldown: float, min_limit: float, max_limit: float,
+    ) -> float:
+        with self.lock:
+            self.leases.pop(lease, None)
+            if throttled:
+                factor = 0.5
+            elif error or (self.ewma is not None and latency > 2 * self.ewma):
+                factor = 0.9
+            else:
+                factor = 1.0
+
+            if factor < 1:
+                if now - self.dec_ts >= 1:
+                    self.limit = max(min_limit, self.limit * factor)
+                    self.dec_ts = now
+            else:
+                self.limit = min(max_limit, self.limit + 1 / self.limit)
+            if not error:
+                self.ewma = latency if self.ewma is None else 0.8 * self.ewma + 0.2 * latency
+            if cooldown > 0:
+                self.cooldown_until = max(self.cooldown_until, now + cooldown)
+            return self.limit
+
+
+_redis = OptionalRedis(
+    "Rate limiter", "limiting per process only",
+    decode_responses=True, socket_timeout=1.0, socket_connect_timeout=1.0,
+)
+_scripts: Dict[str, Any] = {}
+
+
+def _script(name: str, source: str):
+    client = _redis.client()
+    cached = _scripts.get(name)
+    if cached is None or cached[0] is not client:
+        cached = (client, client.register_script(source))
+        _scripts[name] = cached
+    return cached[1]
+
+
+# =============================================================================
+# Limiter
+# =============================================================================
+
+class RateLimiter:
+    """Token buckets + AIMD concurrency + Retry-After for one provider."""
+
+    def __init__(
+        self,
+        provider: str,
+        rpm: int,
+        tpm: int,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+    ):
+        self.provider = provider
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.initial_limit = max(self.min_concurrency, self.max_concurrency // 2)
+        self._local = _LocalState(rpm, tpm, self.initial_limit)
+
+        prefix = f"{KEY_PREFIX}{provider}:"
+        self._bucket_key = prefix + "bucket"
+        self._inflight_key = prefix + "inflight"
+        self._aimd_key = prefix + "aimd"
+        self._cooldown_key = prefix + "cooldown"
+
+    # ---- one attempt against shared state ----
+
+    def _try_acquire(self, lease: str, tokens: float) -> float:
+        now = time.time()
+        try:
+            wait = _script("acquire", _ACQUIRE_LUA)(
+                keys=[self._bucket_key, self._inflight_key, self._aimd_key, self._cooldown_key],
+                args=[now, lease, LEASE_TTL_SECONDS, self.rpm, self.tpm, tokens,
+                      self.initial_limit, STATE_TTL_SECONDS],
+            )
+            return float(wait)
+        except Exception as e:
+            _redis.failed(e)
+            return self._local.acquire(now, lease, self.rpm, self.tpm, tokens)
+
+    def _release(self, lease: str, latency: float, throttled: bool, error: bool, cooldown: float) -> float:
+        now = time.time()
+        if lease in self._local.leases:
+            # Acquired while Redis was skipped - the slot lives in local state
+            return self._local.release(
+                lease, now, latency, throttled, error, cooldown,
+                self.min_concurrency, self.max_concurrency,
+            )
+        try:
+            limit = _script("release", _RELEASE_LUA)(
+                keys=[self._inflight_key, self._aimd_key, self._cooldown_key],
+                args=[lease, now, latency, int(throttled), int(error), cooldown,
+                      self.initial_limit, self.min_concurrency, self.max_concurrency, STATE_TTL_SECONDS],
+            )
+            return float(limit)
+        except Exception as e:
+            _redis.failed(e)
+            return self._local.release(
+                lease, now, latency, throttled, error, cooldown,
+                self.min_concurrency, self.max_concurrency,
+            )
+
+    @staticmethod
+    def _sleep_for(wait: float) -> float:
+        # -1 means "no free slot": poll; otherwise wait for the bucket/cooldown plus jitter
+        return POLL_SECONDS if wait < 0 else wait + random.uniform(0, POLL_SECONDS)
+
+    # ---- acquire / release ----
+
+    def acquire(self, tokens: float = 0) -> str:
+        """Block until a slot and budget are available; returns the lease id."""
+        lease = uuid.uuid4().hex
+        if not RATE_LIMIT_ENABLED:
+            return lease
+        while True:
+            wait = self._try_acquire(lease, tokens)
+            if wait == 0:
+                return lease
+            time.sleep(self._sleep_for(wait))
+
+    async def aacquire(self, tokens: float = 0) -> str:
+        """Async variant of acquire()."""
+        lease = uuid.uuid4().hex
+        if not RATE_LIMIT_ENABLED:
+            return lease
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, lease, tokens)
+            if wait == 0:
+                return lease
+            await asyncio.sleep(self._sleep_for(wait))
+
+    def release(
+        self,
+        lease: str,
+        latency: float,
+        throttled: bool = False,
+        error: bool = False,
+        retry_after: Optional[float] = None,
+        attempt: int = 0,
+    ) -> None:
+        """Return the slot and feed the outcome into AIMD / cooldown."""
+        if not RATE_LIMIT_ENABLED:
+            return
+        cooldown = 0.0
+        if throttled:
+            cooldown = retry_after if retry_after is not None else DEFAULT_COOLDOWN_SECONDS * (2 ** attempt)
+            cooldown = min(cooldown, MAX_COOLDOWN_SECONDS)
+        self._release(lease, latency, throttled, error, cooldown)
+
+    # ---- call wrappers ----
+
+    def _outcome(self, response: Any = None, exc: Optional[BaseException] = None):
+        """(throttled, error, retry_after) for a response or an SDK exception."""
+        if exc is not None:
+            status = getattr(exc, "status_code", None)
+            if status in THROTTLE_STATUSES:
+                return True, False, parse_retry_after(getattr(getattr(exc, "response", None), "headers", None))
+            return False, True, None
+        status = getattr(response, "status_code", None)
+        if not isinstance(status, int):  # SDK result objects carry no status
+            return False, False, None
+        if status in THROTTLE_STATUSES:
+            return True, False, parse_retry_after(getattr(response, "headers", None))
+        return False, status >= 500, None
+
+    def call(self, fn: Callable[[], Any], tokens: float = 0, max_retries: int = 2) -> Any:
+        """
+        Run fn() (an HTTP request or SDK call) inside a slot.
+
+        Throttled responses (429/503) are retried up to max_retries times
+        after the shared cooldown; the last response is returned as-is.
+        Exceptions are recorded and re-raised.
+        """
+        for attempt in range(max_retries + 1):
+            lease = self.acquire(tokens)
+            start = time.time()
+            try:
+                response = fn()
+            except Exception as e:
+                throttled, error, retry_after = self._outcome(exc=e)
+                self.release(lease, time.time() - start, throttled, error, retry_after, attempt)
+                raise
+            throttled, error, retry_after = self._outcome(response)
+            self.release(lease, time.time() - start, throttled, error, retry_after, attempt)
+            if not throttled or attempt == max_retries:
+                return response
+            print(f"   ⏳ {self.provider} throttled ({response.status_code}), retry {attempt + 1}/{max_retries}")
+        return response
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: float = 0, max_retries: int = 2) -> Any:
+        """Async variant of call(); fn returns an awaitable."""
+        for attempt in range(max_retries + 1):
+            lease = await self.aacquire(tokens)
+            start = time.time()
+            try:
+                response = await fn()
+            except Exception as e:
+                throttled, error, retry_after = self._outcome(exc=e)
+                await asyncio.to_thread(self.release, lease, time.time() - start, throttled, error, retry_after, attempt)
+                raise
+            throttled, error, retry_after = self._outcome(response)
+            await asyncio.to_thread(self.release, lease, time.time() - start, throttled, error, retry_after, attempt)
+            if not throttled or attempt == max_retries:
+                return response
+            print(f"   ⏳ {self.provider} throttled ({response.status_code}), retry {attempt + 1}/{max_retries}")
+        return response
+
+
+# =============================================================================
+# Registry
+# =============================================================================
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    """The process-wide limiter for a provider (state is shared fleet-wide)."""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                limits = PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS)
+                limiter = RateLimiter(
+                    provider,
+                    rpm=_env_limit(provider, "rpm", limits["rpm"]),
+                    tpm=_env_limit(provider, "tpm", limits["tpm"]),
+                    max_concurrency=_env_limit(provider, "concurrency", limits["concurrency"]),
+                )
+                _limiters[provider] = limiter
+    return limiter
+
+
+def estimate_tokens(text: str, max_output_tokens: int = 0) -> int:
+    """Rough prompt + completion budget (~4 chars/token) for TPM accounting."""
+    return len(text) // 4 + max_output_tokens
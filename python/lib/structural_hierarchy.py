@@ -0,0 +1,382 @@
+"""
+Deterministic chapter/section hierarchy from PDF structure.
+
+create_hierarchy_with_llm() sends a preview of every chunk to Groq, even for
+textbooks that carry their structure explicitly: an embedded outline
+(bookmarks), headings set in a larger or bold font, and numbering such as
+"Chapter 3" or "1.2". That costs an LLM round trip per document, and when the
+call times out the document ends up with _fallback_hierarchy()'s
+"Document Content" chapter despite having perfectly good headings.
+
+detect_structural_hierarchy() reads the structure directly:
+
+1. Outline: doc.get_toc() entries (authored, so trusted most)
+2. Fonts: lines set noticeably larger than the body text, or bold lines with
+   section numbering. Heading levels come from font size rank, overridden by
+   numbering ("Chapter 3" / "Unit 2" → chapter, "1.2" → section). Running
+   headers and footers (same text on many pages) are discarded.
+
+Headings are mapped onto chunks by page, refined by finding the heading text
+in the chunk, and the result is the same {"chapters": [...]} structure the
+LLM returns, with every chunk index appearing exactly once and contiguous
+within its section. Each result carries a confidence score; below
+STRUCTURAL_MIN_CONFIDENCE the caller should fall back to the LLM.
+
+Usage:
+    from lib.structural_hierarchy import detect_structural_hierarchy
+
+    hierarchy = detect_structural_hierarchy(pdf_path, chunks)
+    if hierarchy is None:
+        hierarchy = create_hierarchy_with_llm(chunks)
+"""
+
+import os
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import fitz
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+STRUCTURAL_HIERARCHY_ENABLED = os.getenv("STRUCTURAL_HIERARCHY_ENABLED", "true").lower() == "true"
+STRUCTURAL_MIN_CONFIDENCE = float(os.getenv("STRUCTURAL_MIN_CONFIDENCE", "0.6"))
+
+OUTLINE_CONFIDENCE = 0.95          # Bookmarks are authored structure
+HEADING_SIZE_RATIO = 1.15          # Font size vs. body text for a line to count as a heading
+MAX_HEADING_CHARS = 120
+MAX_HEADINGS_PER_PAGE = 3.0        # Denser than this, "headings" are emphasised body text
+RUNNING_HEADER_MIN_PAGES = 3      # Same heading-like line on this many pages = running header/footer
+FRONT_MATTER_TITLE = "Front Matter"
+
+CHAPTER_RE = re.compile(r"^(?:chapter|unit|module|part|lesson)\s+(?:\d+|[ivxlc]+)\b", re.IGNORECASE)
+SUBSECTION_RE = re.compile(r"^\d+\.\d+\.\d+\.?\s+\S")
+SECTION_RE = re.compile(r"^\d+\.\d+\.?\s+\S")
+
+BOLD_FLAG = 16  # fitz span flag
+
+
+@dataclass
+class Heading:
+    """A detected heading: level 1 = chapter, 2 = section, 3+ = deeper."""
+    level: int
+    title: str
+    page: int  # 1-based
+    numbered: bool = False
+
+
+def numbering_level(title: str) -> Optional[int]:
+    """Heading level implied by the title's numbering, if any."""
+    title = title.strip()
+    if CHAPTER_RE.match(title):
+        return 1
+    if SUBSECTION_RE.match(title):
+        return 3
+    if SECTION_RE.match(title):
+        return 2
+    return None
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.lower()).split())
+
+
+# =============================================================================
+# Heading Sources
+# =============================================================================
+
+def outline_headings(doc) -> List[Heading]:
+    """Headings from the PDF outline (bookmarks)."""
+    headings = []
+    for level, title, page in doc.get_toc(simple=True):
+        title = " ".join(title.split())
+        if title and page >= 1:
+            headings.append(Heading(level, title, page, numbering_level(title) is not None))
+    return headings
+
+
+@dataclass
+class _Line:
+    page: int
+    order: int  # Line position on the page
+    text: str
+    size: float
+    bold: bool
+
+
+def _scan_lines(doc) -> Tuple[List[_Line], float]:
+    """Short text lines of every page plus the body font size (most common size by characters)."""
+    lines: List[_Line] = []
+    chars_by_size: Counter = Counter()
+
+    for page_index in range(doc.page_count):
+        page_dict = doc[page_index].get_text("dict", flags=fitz.TEXTFLAGS_TEXT)
+        order = 0
+        for block in page_dict["blocks"]:
+            for line in block.get("lines", []):
+                spans = [s for s in line["spans"] if s["text"].strip()]
+                if not spans:
+                    continue
+                text = " ".join("".join(s["text"] for s in spans).split())
+                size = round(max(s["size"] for s in spans) * 2) / 2
+                chars_by_size[size] += len(text)
+                order += 1
+                if len(text) <= MAX_HEADING_CHARS and sum(c.isalpha() for c in text) >= 3:
+                    bold = all(s["flags"] & BOLD_FLAG or "bold" in s["font"].lower() for s in spans)
+                    lines.append(_Line(page_index + 1, order, text, size, bold))
+
+    body_size = chars_by_size.most_common(1)[0][0] if chars_by_size else 0.0
+    return lines, body_size
+
+
+def _merge_wrapped(lines: List[_Line]) -> List[_Line]:
+    """Join consecutive heading lines of the same size ("Chapter 3" / "Motion in a Plane")."""
+    merged: List[_Line] = []
+    for line in lines:
+        prev = merged[-1] if merged else None
+        if prev and prev.page == line.page and prev.size == line.size and line.order == prev.order + 1:
+            merged[-1] = _Line(prev.page, line.order, f"{prev.text} {line.text}", prev.size, prev.bold)
+        else:
+            merged.append(line)
+    return merged
+
+
+def font_headings(doc) -> List[Heading]:
+    """Headings inferred from font size / weight and numbering patterns."""
+    lines, body_size = _scan_lines(doc)
+    if not lines or not body_size:
+        return []
+
+    candidates = [
+        line for line in lines
+        if line.size >= body_size * HEADING_SIZE_RATIO
+        or (line.bold and numbering_level(line.text) is not None)
+    ]
+    candidates = _merge_wrapped(candidates)
+
+    # Running headers / footers repeat page after page; real headings appear once
+    # (twice with a contents page)
+    pages_by_text = defaultdict(set)
+    for line in candidates:
+        pages_by_text[_normalize(line.text)].add(line.page)
+    candidates = [
+        line for line in candidates
+        if len(pages_by_text[_normalize(line.text)]) < RUNNING_HEADER_MIN_PAGES
+    ]
+
+    # Rank heading sizes; a size used once at the top is the document title
+    size_counts = Counter(line.size for line in candidates if line.size >= body_size * HEADING_SIZE_RATIO)
+    sizes = sorted(size_counts, reverse=True)
+    if len(sizes) > 1 and size_counts[sizes[0]] == 1:
+        title_size = sizes.pop(0)
+        candidates = [line for line in candidates if line.size != title_size]
+    size_rank = {size: rank for rank, size in enumerate(sizes)}
+
+    headings = []
+    for line in candidates:
+        level = numbering_level(line.text)
+        numbered = level is not None
+        if level is None:
+            level = min(size_rank.get(line.size, 2) + 1, 3)
+        headings.append(Heading(level, line.text, line.page, numbered))
+    return headings
+
+
+# =============================================================================
+# Mapping Headings to Chunks
+# =============================================================================
+
+def _chunk_pages(chunk) -> Tuple[Optional[int], Optional[int]]:
+    if isinstance(chunk, dict):
+        start = chunk.get("page_start", chunk.get("page_number"))
+        end = chunk.get("page_end", start)
+    else:
+        start = getattr(chunk, "page_start", None) or getattr(chunk, "page_number", None)
+        end = getattr(chunk, "page_end", None)
+    if start is None:
+        return None, None
+    return start, max(end or start, start)
+
+
+def _chunk_text(chunk) -> str:
+    if isinstance(chunk, dict):
+        return chunk.get("text", "")
+    return getattr(chunk, "text_content", "") or ""
+
+
+def _heading_levels(headings: List[Heading]) -> Optional[Tuple[int, int]]:
+    """(chapter_level, section_level): the shallowest level used more than once is chapters."""
+    counts = Counter(h.level for h in headings)
+    repeated = sorted(level for level, count in counts.items() if count >= 2)
+    if not repeated:
+        return None
+    return repeated[0], repeated[0] + 1
+
+
+def _locate(heading: Heading, spans: List[Tuple[int, int]], texts: Dict[int, str], chunks, floor: int) -> Optional[int]:
+    """First chunk of a heading: the last chunk on its page that contains its text, else the first on its page."""
+    needle = _normalize(heading.title)[:60]
+    first_on_page = None
+    match = None
+    for i in range(floor, len(spans)):
+        start, end = spans[i]
+        if start > heading.page:
+            break
+        if end < heading.page:
+            continue
+        if first_on_page is None:
+            first_on_page = i
+        if i not in texts:
+            texts[i] = _normalize(_chunk_text(chunks[i]))
+        if needle and needle in texts[i]:
+            match = i
+    if match is not None:
+        return match
+    if first_on_page is not None:
+        return first_on_page
+    # Heading on a page that starts no chunk (e.g. a blank divider page): next chunk
+    return next((i for i in range(floor, len(spans)) if spans[i][0] > heading.page), None)
+
+
+def build_hierarchy(headings: List[Heading], chunks: Sequence) -> Optional[dict]:
+    """
+    Assign chunks to the detected chapters / sections.
+
+    Returns:
+        {"chapters": [...], "coverage": float} or None if the headings do not
+        describe at least two sections. coverage is the share of chunks at or
+        after the first chapter heading.
+    """
+    levels = _heading_levels(headings)
+    if levels is None or not chunks:
+        return None
+    chapter_level, section_level = levels
+
+    spans = [_chunk_pages(chunk) for chunk in chunks]
+    if any(start is None for start, _ in spans):
+        return None
+    if any(spans[i][0] < spans[i - 1][0] for i in range(1, len(spans))):
+        return None  # Not in reading order
+
+    texts: Dict[int, str] = {}
+    starts = defaultdict(list)
+    floor = 0
+    first_chapter = None
+    for heading in sorted((h for h in headings if chapter_level <= h.level <= section_level), key=lambda h: h.page):
+        index = _locate(heading, spans, texts, chunks, floor)
+        if index is None:
+            continue
+        floor = index
+        starts[index].append(heading)
+        if heading.level == chapter_level and first_chapter is None:
+            first_chapter = index
+    if first_chapter is None:
+        return None
+
+    chapters: List[dict] = []
+    chapter_title = section_title = FRONT_MATTER_TITLE
+    for i in range(len(chunks)):
+        new_chapter = new_section = False
+        for heading in starts.get(i, []):
+            if heading.level == chapter_level:
+                chapter_title = section_title = heading.title
+                new_chapter = True
+            else:
+                section_title = heading.title
+                new_section = True
+        if new_chapter or not chapters:
+            chapters.append({"title": chapter_title, "sections": []})
+            new_section = True
+        if new_section:
+            chapters[-1]["sections"].append({"title": section_title, "chunk_indices": []})
+        chapters[-1]["sections"][-1]["chunk_indices"].append(i)
+
+    if sum(len(ch["sections"]) for ch in chapters) < 2:
+        return None
+    return {"chapters": chapters, "coverage": (len(chunks) - first_chapter) / len(chunks)}
+
+
+# =============================================================================
+# Confidence
+# =============================================================================
+
+def font_confidence(headings: List[Heading], page_count: int) -> float:
+    """
+    How far font-detected headings can be trusted.
+
+    Numbered headings and more than one heading level raise it; unnumbered
+    headings of a single size stay below the default threshold.
+    """
+    if not headings or len(headings) / max(page_count, 1) > MAX_HEADINGS_PER_PAGE:
+        return 0.0
+    numbered = sum(h.numbered for h in headings) / len(headings)
+    multi_level = len({min(h.level, 2) for h in headings}) > 1
+    return min(1.0, 0.5 + 0.4 * numbered + (0.1 if multi_level else 0.0))
+
+
+def _score(hierarchy: Optional[dict], quality: float, source: str) -> Optional[dict]:
+    if hierarchy is None:
+        return None
+    coverage = hierarchy.pop("coverage")
+    hierarchy["source"] = source
+    hierarchy["confidence"] = round(quality * coverage, 3)
+    return hierarchy
+
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+def detect_structural_hierarchy(
+    pdf_path: str,
+    chunks: Sequence,
+    min_confidence: float = STRUCTURAL_MIN_CONFIDENCE,
+) -> Optional[dict]:
+    """
+    Build a chapter/section hierarchy from the PDF's outline or heading fonts.
+
+    The outline is tried first; fonts are only scanned when the outline is
+    missing or not confident enough.
+
+    Args:
+        pdf_path: Source PDF
+        chunks: ContentBlocks (page_start/page_end/text_content) or chunk dicts
+            (page_start/page_end/text) in reading order
+        min_confidence: Results below this are discarded
+
+    Returns:
+        {"chapters": [...], "source": "outline" | "fonts", "confidence": float},
+        or None when the structure is not confident enough (use the LLM)
+    """
+    if not STRUCTURAL_HIERARCHY_ENABLED or not chunks:
+        return None
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            best = _score(build_hierarchy(outline_headings(doc), chunks), OUTLINE_CONFIDENCE, "outline")
+            if best is None or best["confidence"] < min_confidence:
+                headings = font_headings(doc)
+                fonts = _score(build_hierarchy(headings, chunks), font_confidence(headings, doc.page_count), "fonts")
+                if fonts is not None and (best is None or fonts["confidence"] > best["confidence"]):
+                    best = fonts
+    except Exception as e:
+        print(f"   ⚠️ Structural hierarchy detection failed: {e}")
+        return None
+
+    if best is None:
+        print("   📋 No structural hierarchy found")
+        return None
+    if best["confidence"] < min_confidence:
+        print(f"   📋 Structural hierarchy ({best['source']}) confidence {best['confidence']:.2f} too low")
+        return None
+
+    total_sections = sum(len(ch["sections"]) for ch in best["chapters"])
+    print(
+        f"   ✅ Structural hierarchy from {best['source']}: {len(best['chapters'])} chapters, "
+        f"{total_sections} sections (confidence {best['confidence']:.2f})"
+    )
+    return best
@@ -0,0 +1,329 @@
+"""
+In-process per-document vector cache for doc-scoped retrieval.
+
+Most chat / learn traffic is scoped to one doc_id, i.e. a few hundred
+ContentBlock embeddings. Instead of asking Neo4j's ANN index for every
+query, we keep each document's embeddings as a normalized NumPy matrix and
+score them locally (a single matrix-vector product). Neo4j is then only
+needed for the fulltext leg + fusion.
+
+Features:
+- Lazy load from Neo4j on first query for a document
+- LRU eviction under a memory budget (VECTOR_CACHE_MAX_MB)
+- Cross-process invalidation via a per-document version token in Redis
+  (ingestion runs in Celery, retrieval in FastAPI)
+- TTL safety net when Redis is unreachable
+
+Usage:
+    from lib.vector_cache import get_doc_vectors, invalidate_document
+
+    entry = get_doc_vectors(session, doc_id)
+    if entry is not None:
+        hits = entry.search(qvec, top_k=24, min_score=0.6)
+
+    invalidate_document(doc_id)  # after re-ingesting or deleting
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from lib.optional_redis import OptionalRedis
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+VECTOR_CACHE_ENABLED = os.getenv("VECTOR_CACHE_ENABLED", "true").lower() == "true"
+VECTOR_CACHE_MAX_MB = float(os.getenv("VECTOR_CACHE_MAX_MB", "256"))
+VECTOR_CACHE_TTL_SECONDS = float(os.getenv("VECTOR_CACHE_TTL_SECONDS", "600"))
+
+VERSION_KEY_PREFIX = "vector_cache:version:"
+
+# Everything the local scorer needs: id, vector, and the hierarchy filter fields
+LOAD_DOC_VECTORS_QUERY = """
+MATCH (d:Document {documentId: $doc_id})-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+WHERE cb.embedding IS NOT NULL AND size(cb.embedding) > 0
+RETURN cb.block_id AS block_id, elementId(cb) AS element_id, cb.embedding AS embedding,
+       cb.chapter_title AS chapter_title, cb.section_title AS section_title,
+       cb.content_type AS content_type
+"""
+
+
+# =============================================================================
+# Cache Entry
+# =============================================================================
+
+@dataclass
+class DocVectors:
+    """Embeddings of one document, ready for local cosine scoring."""
+    block_ids: List[str]
+    matrix: np.ndarray                      # (n_blocks, dim) float32, L2-normalized rows
+    chapter_titles: List[Optional[str]] = field(default_factory=list)
+    section_titles: List[Optional[str]] = field(default_factory=list)
+    content_types: List[Optional[str]] = field(default_factory=list)
+    element_id_by_block: Dict[str, str] = field(default_factory=dict)  # For fetching hits by node id
+    version: str = "0"
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes)
+
+    @classmethod
+    def from_records(cls, records, version: str = "0") -> Optional["DocVectors"]:
+        """Build an entry from LOAD_DOC_VECTORS_QUERY rows (None if nothing usable)."""
+        rows = [r for r in records if r["embedding"]]
+        if not rows:
+            return None
+
+        # Skip blocks embedded with a different model/dimension
+        dim = len(rows[0]["embedding"])
+        rows = [r for r in rows if len(r["embedding"]) == dim]
+
+        matrix = np.asarray([r["embedding"] for r in rows], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        return cls(
+            block_ids=[r["block_id"] for r in rows],
+            matrix=matrix,
+            chapter_titles=[r["chapter_title"] for r in rows],
+            section_titles=[r["section_title"] for r in rows],
+            content_types=[r["content_type"] for r in rows],
+            element_id_by_block={r["block_id"]: r.get("element_id") for r in rows},
+            version=version,
+        )
+
+    def search(
+        self,
+        qvec: List[float],
+        top_k: int,
+        min_score: float = 0.0,
+        chapter: Optional[str] = None,
+        section: Optional[str] = None,
+        content_type: Optional[str] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Exact cosine search over this document.
+
+        Scores use Neo4j's normalized cosine ((1 + cos) / 2) so thresholds like
+        min_vector_score mean the same thing as with the vector index.
+
+        Returns:
+            [(block_id, score), ...] best first
+        """
+        q = np.asarray(qvec, dtype=np.float32)
+        if q.shape[0] != self.matrix.shape[1]:
+            return []
+        q_norm = np.linalg.norm(q)
+        if q_norm == 0:
+            return []
+
+        scores = (1.0 + self.matrix @ (q / q_norm)) / 2.0
+
+        mask = scores >= min_score
+        if chapter:
+            mask &= np.asarray([c == chapter for c in self.chapter_titles])
+        if section:
+            mask &= np.asarray([s == section for s in self.section_titles])
+        if content_type:
+            mask &= np.asarray([t == content_type for t in self.content_types])
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > top_k:
+            top = np.argpartition(-scores[candidates], top_k)[:top_k]
+            candidates = candidates[top]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [(self.block_ids[i], float(scores[i])) for i in ranked]
+
+
+# =============================================================================
+# LRU Cache
+# =============================================================================
+
+class DocVectorCache:
+    """Thread-safe LRU of DocVectors bounded by total matrix bytes."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, DocVectors]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, doc_id: str, version: Optional[str] = None) -> Optional[DocVectors]:
+        """Return a fresh entry, or None (missing, expired, or stale version)."""
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expired = time.time() - entry.loaded_at > self.ttl_seconds
+            stale = version is not None and version != entry.version
+            if expired or stale:
+                self._drop(doc_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(doc_id)
+            self.hits += 1
+            return entry
+
+    def put(self, doc_id: str, entry: DocVectors) -> None:
+        """Insert an entry, evicting least-recently-used documents over budget."""
+        if entry.nbytes > self.max_bytes:
+            return  # Larger than the whole budget - always go to Neo4j
+
+        with self._lock:
+            if doc_id in self._entries:
+                self._drop(doc_id)
+            self._entries[doc_id] = entry
+            self._bytes += entry.nbytes
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate(self, doc_id: str) -> None:
+        with self._lock:
+            if doc_id in self._entries:
+                self._drop(doc_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _drop(self, doc_id: str) -> None:
+        """Remove an entry (caller holds the lock)."""
+        entry = self._entries.pop(doc_id)
+        self._bytes -= entry.nbytes
+
+
+_cache = DocVectorCache(
+    max_bytes=int(VECTOR_CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=VECTOR_CACHE_TTL_SECONDS,
+)
+
+
+# =============================================================================
+# Cross-process Versioning (Redis)
+# =============================================================================
+
+# Short timeouts: this sits on the chat request path
+_redis = OptionalRedis(
+    "Vector cache", "falling back to TTL",
+    decode_responses=True, socket_timeout=0.2, socket_connect_timeout=0.2,
+)
+
+
+def _current_version(doc_id: str) -> Optional[str]:
+    """
+    Current version of a document's embeddings.
+
+    Returns None when Redis is unavailable (cache then relies on the TTL);
+    after an error Redis is skipped for a cooldown instead of paying the
+    timeout on every chat query.
+    """
+    try:
+        return _redis.client().get(f"{VERSION_KEY_PREFIX}{doc_id}") or "0"
+    except Exception as e:
+        _redis.failed(e)
+        return None
+
+
+async def _acurrent_version(doc_id: str) -> Optional[str]:
+    """_current_version() without blocking the event loop."""
+    try:
+        return await _redis.aclient().get(f"{VERSION_KEY_PREFIX}{doc_id}") or "0"
+    except Exception as e:
+        _redis.failed(e)
+        return None
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def get_doc_vectors(session, doc_id: str) -> Optional[DocVectors]:
+    """
+    Get a document's vectors, loading them through a sync Neo4j session on miss.
+
+    Returns:
+        DocVectors, or None if caching is disabled / the document has no embeddings
+    """
+    if not VECTOR_CACHE_ENABLED:
+        return None
+
+    version = _current_version(doc_id)
+    entry = _cache.get(doc_id, version)
+    if entry is not None:
+        return entry
+
+    records = list(session.run(LOAD_DOC_VECTORS_QUERY, doc_id=doc_id))
+    entry = DocVectors.from_records(records, version=version or "0")
+    if entry is not None:
+        _cache.put(doc_id, entry)
+        print(f"✅ Vector cache: loaded {len(entry.block_ids)} blocks for {doc_id}")
+    return entry
+
+
+async def aget_doc_vectors(session, doc_id: str) -> Optional[DocVectors]:
+    """Async variant of get_doc_vectors() for an async Neo4j session."""
+    if not VECTOR_CACHE_ENABLED:
+        return None
+
+    version = await _acurrent_version(doc_id)
+    entry = _cache.get(doc_id, version)
+    if entry is not None:
+        return entry
+
+    result = await session.run(LOAD_DOC_VECTORS_QUERY, doc_id=doc_id)
+    records = [record async for record in result]
+    entry = DocVectors.from_records(records, version=version or "0")
+    if entry is not None:
+        _cache.put(doc_id, entry)
+        print(f"✅ Vector cache: loaded {len(entry.block_ids)} blocks for {doc_id}")
+    return entry
+
+
+def invalidate_document(doc_id: str) -> None:
+    """
+    Drop a document from every process's cache.
+
+    Call after persisting or deleting a document. Sets a fresh random Redis
+    version (not a counter, so a deleted-then-recreated key can never match an
+    old entry) and other processes reload on their next query; never raises.
+    """
+    _cache.invalidate(doc_id)
+    try:
+        _redis.client().set(f"{VERSION_KEY_PREFIX}{doc_id}", uuid.uuid4().hex)
+    except Exception as e:
+        print(f"⚠️  Vector cache: could not publish invalidation for {doc_id}: {e}")
+
+
+def cache_info() -> dict:
+    """Current cache size and hit/miss counters."""
+    return _cache.info()
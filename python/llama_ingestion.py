@@ -23,7 +23,8 @@ from enum import Enum
 from dotenv import load_dotenv
 from pdf2image import convert_from_path
 from PIL import Image
-import httpx
+from lib import provider_clients
+from lib.page_rasterizer import encode_pages
 import fitz  # PyMuPDF for image extraction
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -202,6 +203,21 @@ def image_to_base64(pil_image: Image.Image) -> str:
     return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
+def encode_pdf_pages(file_path: str, model: str, dpi: int = 150, max_pages: Optional[int] = None) -> Dict[int, Any]:
+    """
+    Render PDF pages encoded and sized for a vision model (see lib/image_encoding.py).
+
+    Returns:
+        Dict mapping page_number (1-indexed) -> EncodedImage
+    """
+    with fitz.open(file_path) as doc:
+        page_count = len(doc) if max_pages is None else min(len(doc), max_pages)
+    print(f"📄 Rendering {page_count} pages for {model}...")
+    pages = encode_pages(file_path, range(1, page_count + 1), model=model, dpi=dpi)
+    print(f"   ✅ Rendered {len(pages)} pages ({sum(len(p.data) for p in pages.values()) // 1024} KB)")
+    return pages
+
+
 def get_neo4j_driver():
     """Get Neo4j driver."""
     driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
@@ -267,16 +283,13 @@ def extract_text_ocr(file_path: str) -> Dict[int, str]:
     """
     print("🔍 OCR extraction with olmOCR...")
     
-    # Convert PDF to images
-    images = pdf_to_images(file_path)
+    # Render pages at olmOCR's input resolution
+    images = encode_pdf_pages(file_path, model="olmocr2")
     text_by_page = {}
     
-    for page_num, img in enumerate(images, 1):
-        # Prepare image for API
-        b64 = image_to_base64(img)
-        
+    for page_num, img in sorted(images.items()):
         # Call olmOCR via DeepInfra
-        response = httpx.post(
+        response = provider_clients.post(
             DEEPINFRA_URL,
             headers={
                 "Authorization": f"Bearer {DEEPINFRA_API_KEY}",
@@ -288,7 +301,7 @@ def extract_text_ocr(file_path: str) -> Dict[int, str]:
                     "role": "user",
                     "content": [
                         {"type": "text", "text": "Extract all text from this document page. Output only the text, no commentary."},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
+                        img.openai_part()
                     ]
                 }],
                 "max_tokens": 8000,
@@ -596,12 +609,10 @@ def describe_images_from_pages(
     """
     print("🖼️  Analyzing pages for diagrams with Llama-4-Scout...")
     
-    # Convert PDF to page images
-    images = pdf_to_images(file_path, dpi=100)  # Lower DPI for faster processing
-    
     # Limit pages to avoid API timeout (skip first page often has title only)
-    # Focus on content pages
-    max_pages = min(len(images), 10)
+    # Focus on content pages - only those pages are rendered
+    images = encode_pdf_pages(file_path, model="llama-4-scout", dpi=100, max_pages=10)  # Lower DPI for faster processing
+    max_pages = len(images)
     print(f"   📋 Processing {max_pages} pages for diagrams...")
     
     # Build content - one image per page
@@ -627,16 +638,12 @@ Output a JSON array. Example:
 If no diagrams found, output: []
 """}]
     
-    for i, img in enumerate(images[:max_pages]):
-        content.append({"type": "text", "text": f"--- PAGE {i + 1} ---"})
-        b64 = image_to_base64(img)
-        content.append({
-            "type": "image_url",
-            "image_url": {"url": f"data:image/png;base64,{b64}"}
-        })
+    for page_num, img in sorted(images.items()):
+        content.append({"type": "text", "text": f"--- PAGE {page_num} ---"})
+        content.append(img.openai_part())
     
     # Call Llama-4-Scout
-    response = httpx.post(
+    response = provider_clients.post(
         DEEPINFRA_URL,
         headers={
             "Authorization": f"Bearer {DEEPINFRA_API_KEY}",
@@ -985,7 +992,7 @@ Return JSON with this structure:
 }}"""
 
         # Call GPT OSS 120B via DeepInfra
-        response = httpx.post(
+        response = provider_clients.post(
             DEEPINFRA_URL,
             headers={
                 "Authorization": f"Bearer {DEEPINFRA_API_KEY}",
@@ -7,7 +7,6 @@ Similar to qp_agent.py but for Learn Packs instead of Question Papers.
 
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from neo4j import GraphDatabase
 from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
@@ -35,6 +34,30 @@ r = Redis.from_url(REDIS_URI, decode_responses=True)
 # LLM for key concept extraction
 llm = init_chat_model(model="gpt-4.1", temperature=0)
 
+# Topics (parent_header) of a document, in reading order
+AVAILABLE_TOPICS_QUERY = """
+MATCH (d:Document {documentId: $doc_id})
+      -[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+WHERE cb.parent_header IS NOT NULL AND cb.parent_header <> ''
+RETURN DISTINCT cb.parent_header AS topic,
+       count(cb) AS chunk_count,
+       collect(DISTINCT cb.page_number) AS pages
+ORDER BY min(cb.chunk_index)
+"""
+
+# Full content of the selected topics
+TOPIC_CONTENT_QUERY = """
+MATCH (d:Document {documentId: $doc_id})
+      -[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+WHERE cb.parent_header IN $topics
+RETURN cb.parent_header AS topic,
+       cb.block_id AS chunk_id,
+       cb.text_content AS content,
+       cb.combined_context AS context,
+       cb.page_number AS page
+ORDER BY cb.parent_header, cb.chunk_index
+"""
+
 
 # ============================================================
 # MODELS
@@ -73,16 +96,10 @@ class LPInputState(BaseModel):
 # ============================================================
 
 def get_neo4j_driver():
-    """Get Neo4j driver."""
-    try:
-        driver = GraphDatabase.driver(NEO4J_URI, auth=NEO4J_AUTH)
-        with driver.session() as session:
-            session.run("RETURN 1")
-        print("✅ Connected to Neo4j")
-        return driver
-    except Exception as e:
-        print(f"❌ Cannot connect to Neo4j: {e}")
-        raise e
+    """Get the shared, pooled Neo4j driver (do not close it)."""
+    from lib.neo4j_pool import get_driver
+
+    return get_driver(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
 
 
 def get_available_topics(document_id: str) -> List[Dict[str, Any]]:
@@ -95,18 +112,8 @@ def get_available_topics(document_id: str) -> List[Dict[str, Any]]:
     """
     driver = get_neo4j_driver()
 
-    query = """
-    MATCH (d:Document {documentId: $doc_id})
-          -[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
-    WHERE cb.parent_header IS NOT NULL AND cb.parent_header <> ''
-    RETURN DISTINCT cb.parent_header AS topic,
-           count(cb) AS chunk_count,
-           collect(DISTINCT cb.page_number) AS pages
-    ORDER BY min(cb.chunk_index)
-    """
-
     with driver.session() as session:
-        result = session.run(query, doc_id=document_id)
+        result = session.run(AVAILABLE_TOPICS_QUERY, doc_id=document_id)
         topics = []
         for record in result:
             topics.append({
@@ -115,7 +122,6 @@ def get_available_topics(document_id: str) -> List[Dict[str, Any]]:
                 "pages": sorted([p for p in record["pages"] if p is not None])
             })
 
-    driver.close()
     print(f"📚 Found {len(topics)} topics in document {document_id}")
     return topics
 
@@ -133,20 +139,8 @@ def fetch_content_for_topics(document_id: str, selected_topics: List[str]) -> Li
     """
     driver = get_neo4j_driver()
 
-    query = """
-    MATCH (d:Document {documentId: $doc_id})
-          -[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
-    WHERE cb.parent_header IN $topics
-    RETURN cb.parent_header AS topic,
-           cb.block_id AS chunk_id,
-           cb.text_content AS content,
-           cb.combined_context AS context,
-           cb.page_number AS page
-    ORDER BY cb.parent_header, cb.chunk_index
-    """
-
     with driver.session() as session:
-        result = session.run(query, doc_id=document_id, topics=selected_topics)
+        result = session.run(TOPIC_CONTENT_QUERY, doc_id=document_id, topics=selected_topics)
 
         # Group by topic
         topic_data: Dict[str, Dict] = {}
@@ -168,7 +162,6 @@ def fetch_content_for_topics(document_id: str, selected_topics: List[str]) -> Li
             if record["chunk_id"]:
                 topic_data[topic_name]["chunk_ids"].append(record["chunk_id"])
 
-    driver.close()
 
     # Convert to TopicInfo objects
     topics = []
@@ -6,7 +6,6 @@ form a object with questions with their block content
 
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from neo4j import GraphDatabase
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
 from langchain.chat_models import init_chat_model
@@ -29,18 +28,37 @@ AUTH = (NEO4J_USER, NEO4J_PASSWORD)
 
 llm = init_chat_model(model="gpt-4.1",temperature=0)
 
+# Question metadata for planning (QuestionSet JSON, parsed in Python)
+QUESTION_METADATA_QUERY = """
+MATCH (d:Document {documentId: $document_id})
+      -[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+      -[:HAS_QUESTIONS]->(qs:QuestionSet)
+RETURN 
+    cb.block_id as chunk_id,
+    coalesce(cb.chunk_index, 0) as chunk_index,
+    qs.questions as questions_json
+ORDER BY cb.chunk_index
+"""
+
+# QuestionSets with their ContentBlock context. Reached through the Document
+# (index seek) - filtering cb.doc_id / qs.doc_id scanned every ContentBlock.
+SELECTED_QUESTIONS_QUERY = """
+MATCH (d:Document {documentId: $document_id})
+      -[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+      -[:HAS_QUESTIONS]->(qs:QuestionSet)
+RETURN 
+    cb.block_id as chunk_id,
+    coalesce(cb.chunk_index, 0) as chunk_index,
+    coalesce(cb.combined_context, '') as context_content,
+    qs.questions as questions_json
+ORDER BY cb.chunk_index
+"""
+
 def get_database_driver():
-    """Get Neo4j driver"""
-    try:
-        driver = GraphDatabase.driver(URI, auth=AUTH)
-        # Test the connection
-        with driver.session() as session:
-            session.run("RETURN 1")
-        print("✅ Connected to Neo4j AuraDB")
-        return driver
-    except Exception as e:
-        print(f"❌ Cannot connect to Neo4j AuraDB: {e}")
-        raise e
+    """Get the shared, pooled Neo4j driver (do not close it)."""
+    from lib.neo4j_pool import get_driver
+
+    return get_driver(URI, NEO4J_USER, NEO4J_PASSWORD)
 
 class QuestionGroupResponse(BaseModel):
     """Response containing questions grouped by context"""
@@ -84,62 +102,50 @@ def get_all_questions_metadata(input_state: QPInputState):
     print(f"📋 Fetching question metadata for document: {input_state.document_id}")
     
     driver = get_database_driver()
-    with driver as session:
-        # Query QuestionSet nodes (not individual Question nodes)
-        query = """
-        MATCH (d:Document {documentId: $document_id})
-              -[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
-              -[:HAS_QUESTIONS]->(qs:QuestionSet)
-        RETURN 
-            cb.block_id as chunk_id,
-            coalesce(cb.chunk_index, 0) as chunk_index,
-            qs.questions as questions_json
-        ORDER BY cb.chunk_index
-        """
-        
-        result = session.execute_query(
-            query,
-            document_id=input_state.document_id
-        )
+    # Query QuestionSet nodes (not individual Question nodes)
+    result = driver.execute_query(
+        QUESTION_METADATA_QUERY,
+        document_id=input_state.document_id
+    )
         
-        # Parse JSON and flatten questions with filtering
-        questions_metadata = []
-        for record in result.records:
-            try:
-                chunk_id = record.get("chunk_id", "")
-                chunk_index = record.get("chunk_index", 0)
-                questions_json = record.get("questions_json", "[]")
+    # Parse JSON and flatten questions with filtering
+    questions_metadata = []
+    for record in result.records:
+        try:
+            chunk_id = record.get("chunk_id", "")
+            chunk_index = record.get("chunk_index", 0)
+            questions_json = record.get("questions_json", "[]")
                 
-                # Parse the JSON array of questions
-                block_questions = json.loads(questions_json) if questions_json else []
+            # Parse the JSON array of questions
+            block_questions = json.loads(questions_json) if questions_json else []
                 
-                for q in block_questions:
-                    # Apply filters
-                    if input_state.difficulty_levels and q.get("difficulty") not in input_state.difficulty_levels:
-                        continue
-                    if input_state.question_types and q.get("question_type") not in input_state.question_types:
-                        continue
-                    if input_state.bloom_levels and q.get("bloom_level") not in input_state.bloom_levels:
-                        continue
+            for q in block_questions:
+                # Apply filters
+                if input_state.difficulty_levels and q.get("difficulty") not in input_state.difficulty_levels:
+                    continue
+                if input_state.question_types and q.get("question_type") not in input_state.question_types:
+                    continue
+                if input_state.bloom_levels and q.get("bloom_level") not in input_state.bloom_levels:
+                    continue
                     
-                    questions_metadata.append({
-                        "question_id": q.get("question_id", ""),
-                        "expected_time": q.get("expected_time", 5),
-                        "bloom_level": q.get("bloom_level", "remember"),
-                        "difficulty": q.get("difficulty", "basic"),
-                        "question_type": q.get("question_type", "multiple_choice"),
-                        "chunk_id": chunk_id,
-                        "chunk_index": chunk_index
-                    })
-            except Exception as e:
-                print(f"⚠️ Error processing record: {e}")
-                continue
+                questions_metadata.append({
+                    "question_id": q.get("question_id", ""),
+                    "expected_time": q.get("expected_time", 5),
+                    "bloom_level": q.get("bloom_level", "remember"),
+                    "difficulty": q.get("difficulty", "basic"),
+                    "question_type": q.get("question_type", "multiple_choice"),
+                    "chunk_id": chunk_id,
+                    "chunk_index": chunk_index
+                })
+        except Exception as e:
+            print(f"⚠️ Error processing record: {e}")
+            continue
         
-        print(f"✅ Found {len(questions_metadata)} questions matching criteria")
+    print(f"✅ Found {len(questions_metadata)} questions matching criteria")
         
-        # Update state
-        input_state.all_questions_metadata = questions_metadata
-        return input_state
+    # Update state
+    input_state.all_questions_metadata = questions_metadata
+    return input_state
 
 
 def get_selected_questions_with_content(input_state: QPInputState):
@@ -157,65 +163,53 @@ def get_selected_questions_with_content(input_state: QPInputState):
     selected_ids_set = set(input_state.selected_question_ids)
     
     driver = get_database_driver()
-    with driver as session:
-        # Query QuestionSet nodes with their ContentBlock context
-        query = """
-        MATCH (cb:ContentBlock)-[:HAS_QUESTIONS]->(qs:QuestionSet)
-        WHERE cb.doc_id = $document_id OR qs.doc_id = $document_id
-        RETURN 
-            cb.block_id as chunk_id,
-            coalesce(cb.chunk_index, 0) as chunk_index,
-            coalesce(cb.combined_context, '') as context_content,
-            qs.questions as questions_json
-        ORDER BY cb.chunk_index
-        """
-        
-        result = session.execute_query(
-            query,
-            document_id=input_state.document_id
-        )
+    # Query QuestionSet nodes with their ContentBlock context
+    result = driver.execute_query(
+        SELECTED_QUESTIONS_QUERY,
+        document_id=input_state.document_id
+    )
         
-        # Parse JSON and filter to only selected questions
-        questions_with_content = []
-        for record in result.records:
-            try:
-                chunk_id = record.get("chunk_id", "")
-                chunk_index = record.get("chunk_index", 0)
-                context_content = record.get("context_content", "")
-                questions_json = record.get("questions_json", "[]")
+    # Parse JSON and filter to only selected questions
+    questions_with_content = []
+    for record in result.records:
+        try:
+            chunk_id = record.get("chunk_id", "")
+            chunk_index = record.get("chunk_index", 0)
+            context_content = record.get("context_content", "")
+            questions_json = record.get("questions_json", "[]")
                 
-                # Parse the JSON array of questions
-                block_questions = json.loads(questions_json) if questions_json else []
+            # Parse the JSON array of questions
+            block_questions = json.loads(questions_json) if questions_json else []
                 
-                for q in block_questions:
-                    # Only include selected questions
-                    if q.get("question_id") in selected_ids_set:
-                        questions_with_content.append({
-                            "question_id": q.get("question_id", ""),
-                            "text": q.get("text", ""),
-                            "options": q.get("options", []),
-                            "correct_answer": q.get("correct_answer", ""),
-                            "explanation": q.get("explanation", ""),
-                            "key_points": q.get("key_points", []),
-                            "expected_time": q.get("expected_time", 0),
-                            "bloom_level": q.get("bloom_level", ""),
-                            "difficulty": q.get("difficulty", ""),
-                            "question_type": q.get("question_type", ""),
-                            "context_content": context_content,
-                            "chunk_index": chunk_index,
-                            "chunk_id": chunk_id,
-                            # Image URL for frontend display (description is inline in context)
-                            "image_url": q.get("image_url"),
-                        })
-            except Exception as e:
-                print(f"⚠️ Error processing record: {e}")
-                continue
+            for q in block_questions:
+                # Only include selected questions
+                if q.get("question_id") in selected_ids_set:
+                    questions_with_content.append({
+                        "question_id": q.get("question_id", ""),
+                        "text": q.get("text", ""),
+                        "options": q.get("options", []),
+                        "correct_answer": q.get("correct_answer", ""),
+                        "explanation": q.get("explanation", ""),
+                        "key_points": q.get("key_points", []),
+                        "expected_time": q.get("expected_time", 0),
+                        "bloom_level": q.get("bloom_level", ""),
+                        "difficulty": q.get("difficulty", ""),
+                        "question_type": q.get("question_type", ""),
+                        "context_content": context_content,
+                        "chunk_index": chunk_index,
+                        "chunk_id": chunk_id,
+                        # Image URL for frontend display (description is inline in context)
+                        "image_url": q.get("image_url"),
+                    })
+        except Exception as e:
+            print(f"⚠️ Error processing record: {e}")
+            continue
         
-        print(f"✅ Retrieved full content for {len(questions_with_content)} questions")
+    print(f"✅ Retrieved full content for {len(questions_with_content)} questions")
         
-        # Update state
-        input_state.selected_questions_with_content = questions_with_content
-        return input_state
+    # Update state
+    input_state.selected_questions_with_content = questions_with_content
+    return input_state
 
 
 def _format_questions_by_chunk(questions_metadata):
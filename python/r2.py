@@ -1,39 +1,22 @@
-import boto3
-from botocore.client import Config
-import httpx
+import asyncio
 import os
-import uuid
+
+from lib import r2_storage
+
 
 async def get_file(file_key: str, expires_in: int = 60):
-    session = boto3.session.Session()
-    r2 = session.client(
-        service_name='s3',
-        region_name='auto',
-        endpoint_url=os.environ['R2_ENDPOINT'],
-        aws_access_key_id=os.environ['R2_ACCESS_KEY_ID'],
-        aws_secret_access_key=os.environ['R2_SECRET_ACCESS_KEY'],
-        config=Config(signature_version='s3v4'),
-    )
-    signed_url = r2.generate_presigned_url(
-        'get_object',
-        Params={
-            'Bucket': os.environ['R2_BUCKET'],
-            'Key': file_key,
-        },
-        ExpiresIn=expires_in
-    )
+    """
+    Download an uploaded file from R2 into ./content and return its local path.
 
+    Streams to disk through the shared client; large PDFs are fetched with
+    parallel ranged GETs (see lib/r2_storage.py). expires_in is kept for
+    callers of the old presigned-URL download and is no longer used.
+    """
     # Create output path - use just the filename, not full key path
     filename = os.path.basename(file_key)
     output_path = f"./content/{filename}"
-    os.makedirs("./content", exist_ok=True)
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(signed_url)
 
-    if response.status_code == 200:
-        with open(output_path, "wb") as f:
-            f.write(response.content)
-        return output_path
-    else:
-        raise Exception(f"Failed to download file: {response.status_code} - {response.text}")
\ No newline at end of file
+    try:
+        return await asyncio.to_thread(r2_storage.download_file, file_key, output_path)
+    except Exception as e:
+        raise Exception(f"Failed to download file: {file_key} - {e}") from e
@@ -4,223 +4,420 @@ Uses Neo4j vector indexes + Fulltext indexes with Reciprocal Rank Fusion (RRF).
 Supports user-scoped retrieval for document isolation.
 """
 
-from typing import List, Dict, Any, Optional
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
-from ingestion_workflow import embed_text, get_neo4j_driver
+from ingestion_workflow import EMBED_MODEL_SMALL, aembed_text, embed_text, get_async_neo4j_driver, get_neo4j_driver
+from lib.embedding_cache import aget_query_embedding, get_query_embedding
+from lib.rank_fusion import DEFAULT_RRF_K, reciprocal_rank_fusion
+from lib.vector_cache import aget_doc_vectors, get_doc_vectors
 
 load_dotenv()
 
-# USER-FILTERED HYBRID SEARCH QUERY (Vector + Keyword + RRF Fusion)
-# Pre-fetches user's ContentBlocks, then runs vector/keyword search within that set
-# Supports optional doc_id for single-document scoping
-# Now also filters by min_vector_score to exclude semantically distant results
-RETRIEVAL_QUERY = """
-// Step 1: Get ContentBlocks owned by this user (optionally filtered to single doc)
+# Scoped vector candidate generation (see RETRIEVAL ENGINE)
+# candidate_mode="auto" scores doc-scoped queries in-process (lib.vector_cache),
+# otherwise scores a user's blocks exactly while the scope is small, and switches
+# to an adaptive over-fetch of the global ANN index above this size.
+RETRIEVAL_EXACT_MAX_BLOCKS = int(os.getenv("RETRIEVAL_EXACT_MAX_BLOCKS", "5000"))
+RETRIEVAL_MAX_FETCH_K = int(os.getenv("RETRIEVAL_MAX_FETCH_K", "2000"))  # Upper bound for adaptive widening
+RETRIEVAL_WIDEN_FACTOR = 4            # fetch_k multiplier per widening round
+RETRIEVAL_KEYWORD_FETCH_K = 100       # Fulltext hits to scan before scope filtering
+
+CANDIDATE_MODES = ("auto", "local", "exact", "adaptive", "global")
+
+# Python-side RRF fusion of the retrieval legs (see RETRIEVAL ENGINE)
+RRF_K = int(os.getenv("RETRIEVAL_RRF_K", str(DEFAULT_RRF_K)))
+RETRIEVAL_LEG_WEIGHTS = {
+    "vector": float(os.getenv("RETRIEVAL_VECTOR_WEIGHT", "1.0")),
+    "keyword": float(os.getenv("RETRIEVAL_KEYWORD_WEIGHT", "1.0")),
+}
+
+# LEAN CANDIDATE PROJECTION
+# Only the fields the context builder reads. Returning the whole node would ship the
+# 1536-float embedding (~12 KB), full text_content and tables JSON over Bolt per hit.
+# text_content is only sent as a (truncated) fallback when combined_context is missing.
+CANDIDATE_PROJECTION = """candidate {
+    .block_id, .combined_context,
+    .page_start, .page_end, .page_number, .page_from, .page_to,
+    .chapter_title, .section_title, .content_type,
+    text_content: CASE WHEN coalesce(candidate.combined_context, '') = ''
+                       THEN left(coalesce(candidate.text_content, ''), 3500) END
+} AS candidate"""
+
+# Debug variant - same fields plus the stored embedding vector
+CANDIDATE_PROJECTION_WITH_EMBEDDING = CANDIDATE_PROJECTION.replace(
+    ".content_type,", ".content_type, .embedding,"
+)
+
+# RETRIEVAL ENGINE (two legs + Python fusion)
+# Fusing inside Cypher needs a list scan per candidate to find its rank (quadratic)
+# and runs the vector and keyword legs serially in one query. Instead each leg is an
+# independent query returning ranked (block_id, score) hits; the legs run
+# concurrently, are fused with lib.rank_fusion, then only the winning blocks are fetched.
+#
+# Vector leg candidate generation (candidate_mode) - taking the global top
+# ($limit * 3) ANN hits and filtering them to the user means that with many tenants
+# in one index recall for a given user drops towards zero. Scoped modes avoid that:
+#   - LOCAL:    doc-scoped queries score cached embeddings in-process (lib.vector_cache)
+#   - EXACT:    cosine-score every block in scope (cheap while the scope is small)
+#   - ADAPTIVE: over-fetch the global index with $fetch_k, widened from Python until
+#               enough in-scope hits survive (see _next_fetch_k)
+#   - GLOBAL:   global top-k then filter (unscoped ANN)
+# Scope membership is a per-hit graph check, not an IN list over every user block.
+
+# Per-hit scope check on `node` ('' user_id = no user filter, testing mode)
+_SCOPE_PREDICATE = """($user_id = '' OR EXISTS {
+        MATCH (:User {id: $user_id})-[:UPLOADED]->(sd:Document)-[:HAS_CONTENT_BLOCK]->(node)
+        WHERE $doc_id = '' OR sd.documentId = $doc_id
+    })
+    AND ($chapter = '' OR node.chapter_title = $chapter)
+    AND ($section = '' OR node.section_title = $section)
+    AND ($content_type = '' OR node.content_type = $content_type)"""
+
+# Number of blocks in the caller's scope - decides exact vs adaptive in "auto" mode
+SCOPE_SIZE_QUERY = """
 MATCH (u:User {id: $user_id})-[:UPLOADED]->(d:Document)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
-WHERE $doc_id = '' OR d.documentId = $doc_id
-WITH collect(cb) AS userBlocks, collect(id(cb)) AS userBlockIds, $qvec AS qvec, $query_text AS qt, $min_vector_score AS minVecScore
-
-// Step 2: Vector Search (returns top candidates from ENTIRE index)
-CALL db.index.vector.queryNodes($index_name, $limit * 3, qvec)
-YIELD node, score AS vectorScore
-// Filter to only user's blocks AND filter by min vector similarity
-WHERE id(node) IN userBlockIds AND vectorScore >= minVecScore
-WITH userBlocks, userBlockIds, qt, collect({node: node, score: vectorScore}) AS vectorResults
-
-// Step 3: Keyword Search
-CALL db.index.fulltext.queryNodes('contentBlockFulltextIdx', qt, {limit: $limit * 3})
-YIELD node, score AS keywordScore
-// Filter to only user's blocks
-WHERE id(node) IN userBlockIds
-WITH vectorResults, collect({node: node, score: keywordScore}) AS keywordResults
-
-// Step 4: Prepare ranked lists for RRF
-WITH [r IN vectorResults | r.node] AS vectorNodes,
-     [r IN keywordResults | r.node] AS keywordNodes
-
-// Step 5: RRF Fusion - combine all unique candidates
-UNWIND (vectorNodes + keywordNodes) AS candidate
-WITH DISTINCT candidate, vectorNodes, keywordNodes
-
-// Calculate 0-based Rank in each list (or null if not found)
-WITH candidate, 
-     [x IN range(0, size(vectorNodes)-1) WHERE vectorNodes[x] = candidate][0] AS vRank,
-     [x IN range(0, size(keywordNodes)-1) WHERE keywordNodes[x] = candidate][0] AS kRank
-
-// Apply RRF Formula: Score = 1 / (60 + rank + 1)
-WITH candidate,
-     CASE WHEN vRank IS NOT NULL THEN 1.0 / (60 + vRank + 1) ELSE 0.0 END AS vScore,
-     CASE WHEN kRank IS NOT NULL THEN 1.0 / (60 + kRank + 1) ELSE 0.0 END AS kScore
-
-// Step 6: Traverse to parent Document to get doc_id and title
-MATCH (d:Document)-[:HAS_CONTENT_BLOCK]->(candidate)
+WHERE ($doc_id = '' OR d.documentId = $doc_id)
+  AND ($chapter = '' OR cb.chapter_title = $chapter)
+  AND ($section = '' OR cb.section_title = $section)
+  AND ($content_type = '' OR cb.content_type = $content_type)
+RETURN count(cb) AS scope_size
+"""
 
-RETURN candidate, (vScore + kScore) AS score, d.documentId AS doc_id, d.title AS doc_title
+# Vector leg, EXACT: score only the caller's own blocks (no global ANN top-k)
+VECTOR_LEG_EXACT_QUERY = """
+MATCH (u:User {id: $user_id})-[:UPLOADED]->(d:Document)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
+WHERE ($doc_id = '' OR d.documentId = $doc_id)
+  AND ($chapter = '' OR cb.chapter_title = $chapter)
+  AND ($section = '' OR cb.section_title = $section)
+  AND ($content_type = '' OR cb.content_type = $content_type)
+  AND cb.embedding IS NOT NULL
+// Same normalized [0, 1] cosine score as the vector index, so min_vector_score still applies
+WITH cb, vector.similarity.cosine(cb.embedding, $qvec) AS score
+WHERE score >= $min_vector_score
+RETURN cb.block_id AS block_id, elementId(cb) AS element_id, score
 ORDER BY score DESC
-LIMIT $limit
+LIMIT $leg_k
 """
 
-# Fallback query without user filtering (for backwards compatibility / testing)
-# Also filters by min_vector_score to exclude semantically distant results
-RETRIEVAL_QUERY_NO_USER = """
-// 1. Vector Search (Semantic) - filter by min similarity
-CALL db.index.vector.queryNodes($index_name, $limit * 2, $qvec)
+# Vector leg, ANN (ADAPTIVE / GLOBAL / no user): global index with $fetch_k over-fetch.
+# Always returns one row; the stats tell the caller whether widening could help.
+VECTOR_LEG_ANN_QUERY = """
+CALL db.index.vector.queryNodes($index_name, $fetch_k, $qvec)
 YIELD node, score
-WHERE score >= $min_vector_score
-WITH collect(node) AS vectorNodes, $query_text AS qt
+WITH node, score, score >= $min_vector_score AND """ + _SCOPE_PREDICATE + """ AS inScope
+ORDER BY score DESC
+WITH count(*) AS fetched, min(score) AS floor,
+     collect(CASE WHEN inScope THEN {block_id: node.block_id, element_id: elementId(node), score: score} END) AS hits
+RETURN hits[..$leg_k] AS hits, size(hits) AS in_scope, fetched, floor
+"""
 
-// 2. Keyword Search (Exact Match)
-CALL db.index.fulltext.queryNodes('contentBlockFulltextIdx', qt, {limit: $limit})
+# Keyword leg: fulltext search, keeping only hits inside the caller's scope
+KEYWORD_LEG_QUERY = """
+CALL db.index.fulltext.queryNodes('contentBlockFulltextIdx', $query_text, {limit: $keyword_fetch_k})
 YIELD node, score
-WITH vectorNodes, collect(node) AS keywordNodes
-
-// 3. RRF Fusion Calculation
-UNWIND (vectorNodes + keywordNodes) AS candidate
-WITH DISTINCT candidate, vectorNodes, keywordNodes
-
-WITH candidate,
-     [x IN range(0, size(vectorNodes)-1) WHERE vectorNodes[x] = candidate][0] AS vRank,
-     [x IN range(0, size(keywordNodes)-1) WHERE keywordNodes[x] = candidate][0] AS kRank
-
-WITH candidate,
-     CASE WHEN vRank IS NOT NULL THEN 1.0 / (60 + vRank + 1) ELSE 0.0 END AS vScore,
-     CASE WHEN kRank IS NOT NULL THEN 1.0 / (60 + kRank + 1) ELSE 0.0 END AS kScore
-
-// Traverse to parent Document to get doc_id and title
-MATCH (d:Document)-[:HAS_CONTENT_BLOCK]->(candidate)
-
-RETURN candidate, (vScore + kScore) AS score, d.documentId AS doc_id, d.title AS doc_title
+WHERE """ + _SCOPE_PREDICATE + """
+RETURN node.block_id AS block_id, elementId(node) AS element_id, score
 ORDER BY score DESC
-LIMIT $limit
+LIMIT $leg_k
 """
 
-# HIERARCHY-AWARE RETRIEVAL QUERY
-# Supports optional chapter/section filtering for scoped queries
-RETRIEVAL_QUERY_HIERARCHY = """
-// Step 1: Get ContentBlocks owned by user, optionally filtered by chapter/section
-MATCH (u:User {id: $user_id})-[:UPLOADED]->(d:Document)-[:HAS_CONTENT_BLOCK]->(cb:ContentBlock)
-WHERE ($doc_id = '' OR d.documentId = $doc_id)
-  AND ($chapter = '' OR cb.chapter_title = $chapter)
-  AND ($section = '' OR cb.section_title = $section)
-  AND ($content_type = '' OR cb.content_type = $content_type)
-WITH collect(cb) AS userBlocks, collect(id(cb)) AS userBlockIds, $qvec AS qvec, $query_text AS qt, $min_vector_score AS minVecScore
-
-// Step 2: Vector Search
-CALL db.index.vector.queryNodes($index_name, $limit * 3, qvec)
-YIELD node, score AS vectorScore
-WHERE id(node) IN userBlockIds AND vectorScore >= minVecScore
-WITH userBlocks, userBlockIds, qt, collect({node: node, score: vectorScore}) AS vectorResults
-
-// Step 3: Keyword Search
-CALL db.index.fulltext.queryNodes('contentBlockFulltextIdx', qt, {limit: $limit * 3})
-YIELD node, score AS keywordScore
-WHERE id(node) IN userBlockIds
-WITH vectorResults, collect({node: node, score: keywordScore}) AS keywordResults
-
-// Step 4: RRF Fusion
-WITH [r IN vectorResults | r.node] AS vectorNodes,
-     [r IN keywordResults | r.node] AS keywordNodes
-UNWIND (vectorNodes + keywordNodes) AS candidate
-WITH DISTINCT candidate, vectorNodes, keywordNodes
-
-WITH candidate,
-     [x IN range(0, size(vectorNodes)-1) WHERE vectorNodes[x] = candidate][0] AS vRank,
-     [x IN range(0, size(keywordNodes)-1) WHERE keywordNodes[x] = candidate][0] AS kRank
-
-WITH candidate,
-     CASE WHEN vRank IS NOT NULL THEN 1.0 / (60 + vRank + 1) ELSE 0.0 END AS vScore,
-     CASE WHEN kRank IS NOT NULL THEN 1.0 / (60 + kRank + 1) ELSE 0.0 END AS kScore
-
-// Traverse to parent Document to get doc_id and title
+# Fetch the fused winners by node id, with their parent Document (ownership re-checked)
+FETCH_CANDIDATES_QUERY = """
+UNWIND $element_ids AS eid
+MATCH (candidate:ContentBlock) WHERE elementId(candidate) = eid
 MATCH (d:Document)-[:HAS_CONTENT_BLOCK]->(candidate)
-
-RETURN candidate, (vScore + kScore) AS score, d.documentId AS doc_id, d.title AS doc_title
-ORDER BY score DESC
-LIMIT $limit
+WHERE $user_id = '' OR EXISTS { MATCH (:User {id: $user_id})-[:UPLOADED]->(d) }
+RETURN elementId(candidate) AS element_id, """ + CANDIDATE_PROJECTION + """,
+       d.documentId AS doc_id, d.title AS doc_title
 """
 
+# Threads for running sync legs concurrently (each leg uses its own session)
+_LEG_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval-leg")
 
-def retrieve_context_with_sources(
+
+def _build_retrieval_params(
     query_text: str,
-    user_id: str = None,
-    doc_id: str = None,
-    chapter: str = None,
-    section: str = None,
-    content_type: str = None,
-    index_name: str = "contentBlockEmbeddingIdx",
-    k: int = 8,
-    min_score: float = 0.018,
-    min_vector_score: float = 0.60,
-    max_chars: int = 12000
-) -> tuple[str, List[Dict[str, Any]]]:
+    qvec: List[float],
+    user_id: Optional[str],
+    doc_id: Optional[str],
+    chapter: Optional[str],
+    section: Optional[str],
+    content_type: Optional[str],
+    index_name: str,
+    k: int,
+    min_vector_score: float,
+) -> Dict[str, Any]:
+    """Build the parameters shared by every leg ('' = no filter)."""
+    return {
+        "qvec": qvec,
+        "query_text": query_text,
+        "index_name": index_name,
+        "limit": k,
+        "min_vector_score": min_vector_score,
+        "user_id": user_id or "",
+        "doc_id": doc_id or "",
+        "chapter": chapter or "",
+        "section": section or "",
+        "content_type": content_type or "",
+        # Each leg contributes up to $limit * 3 ranked hits to the fusion
+        "leg_k": k * 3,
+        "fetch_k": k * 3,
+        "keyword_fetch_k": max(k * 3, RETRIEVAL_KEYWORD_FETCH_K),
+    }
+
+
+def _fetch_query(include_embedding: bool) -> str:
+    """Candidate fetch query, optionally with the embedding for debugging."""
+    if include_embedding:
+        return FETCH_CANDIDATES_QUERY.replace(CANDIDATE_PROJECTION, CANDIDATE_PROJECTION_WITH_EMBEDDING)
+    return FETCH_CANDIDATES_QUERY
+
+
+def _resolve_candidate_mode(candidate_mode: str, scope_size: int) -> str:
+    """Resolve "auto" to exact scoring for small scopes, adaptive over-fetch otherwise."""
+    if candidate_mode != "auto":
+        return candidate_mode
+    return "exact" if scope_size <= RETRIEVAL_EXACT_MAX_BLOCKS else "adaptive"
+
+
+def _next_fetch_k(stats: Optional[dict], fetch_k: int, k: int, min_vector_score: float) -> Optional[int]:
     """
-    Retrieve context with optional hierarchy filtering and return both formatted context and sources.
+    Decide whether the adaptive vector leg should widen $fetch_k and re-run.
 
     Args:
-        query_text: User query string
-        user_id: User ID for document isolation
-        doc_id: Optional document ID to scope to single document
-        chapter: Optional chapter title to scope retrieval
-        section: Optional section title to scope retrieval
-        content_type: Optional content type filter (definition, example, theorem, etc.)
-        index_name: Name of Neo4j vector index
-        k: Number of candidate results
-        min_score: Minimum RRF score threshold
-        min_vector_score: Minimum vector similarity
-        max_chars: Character budget for context
+        stats: The VECTOR_LEG_ANN_QUERY row (in_scope, fetched, floor)
 
     Returns:
-        Tuple of (context_string, sources_list)
-        sources_list contains dicts with: page, title, excerpt, doc_id, chapter, section, content_type
+        The widened fetch_k, or None when widening cannot improve the result
     """
-    driver = get_neo4j_driver()
-    qvec = embed_text(query_text)
+    if fetch_k >= RETRIEVAL_MAX_FETCH_K:
+        return None
+
+    if stats:
+        if (stats.get("in_scope") or 0) >= k:
+            return None  # Enough in-scope hits
+        if (stats.get("fetched") or 0) < fetch_k:
+            return None  # Index exhausted
+        floor = stats.get("floor")
+        if floor is not None and floor < min_vector_score:
+            return None  # Anything further down scores below the threshold
+
+    return min(fetch_k * RETRIEVAL_WIDEN_FACTOR, RETRIEVAL_MAX_FETCH_K)
+
+
+def _wants_local(candidate_mode: str, params: dict) -> bool:
+    """Doc-scoped user queries can score vectors in-process instead of in Neo4j."""
+    return candidate_mode in ("auto", "local") and bool(params["user_id"]) and bool(params["doc_id"])
+
+
+def _local_vector_hits(entry, params: dict) -> List[Dict[str, Any]]:
+    """Rank a cached document's blocks locally (same $leg_k pool as Neo4j)."""
+    hits = entry.search(
+        params["qvec"],
+        top_k=params["leg_k"],
+        min_score=params["min_vector_score"],
+        chapter=params["chapter"] or None,
+        section=params["section"] or None,
+        content_type=params["content_type"] or None,
+    )
+    return [
+        {"block_id": block_id, "element_id": entry.element_id_by_block.get(block_id), "score": score}
+        for block_id, score in hits
+    ]
+
+
+def _fuse(
+    legs: Dict[str, List[Dict[str, Any]]],
+    k: int,
+    rrf_k: int,
+    leg_weights: Optional[Dict[str, float]],
+) -> Tuple[List[Tuple[str, float]], Dict[str, str]]:
+    """Fuse leg hits with RRF; also return block_id -> element_id for the fetch."""
+    element_ids: Dict[str, str] = {}
+    ranked_legs = {}
+    for name, hits in legs.items():
+        ranked_legs[name] = [(hit["block_id"], hit["score"]) for hit in hits]
+        for hit in hits:
+            if hit.get("element_id"):
+                element_ids.setdefault(hit["block_id"], hit["element_id"])
+
+    weights = leg_weights if leg_weights is not None else RETRIEVAL_LEG_WEIGHTS
+    fused = reciprocal_rank_fusion(ranked_legs, weights=weights, k=rrf_k, limit=k)
+    return fused, element_ids
+
+
+def _order_fetched(rows, fused: List[Tuple[str, float]], element_ids: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Attach fused scores to fetched rows, keeping the fused order."""
+    by_element = {row["element_id"]: row for row in rows}
+    items = []
+    for block_id, score in fused:
+        row = by_element.get(element_ids.get(block_id))
+        if row is None:
+            continue  # Deleted meanwhile, or outside the caller's scope
+        items.append({
+            "node": dict(row["candidate"]),
+            "score": score,
+            "doc_id": row["doc_id"],
+            "doc_title": row["doc_title"] or "Document",
+        })
+    return items
 
-    if not qvec:
-        return "", []
 
-    # Use hierarchy-aware query if any hierarchy filters are specified
-    use_hierarchy = chapter or section or content_type
-    if user_id:
-        query = RETRIEVAL_QUERY_HIERARCHY if use_hierarchy else RETRIEVAL_QUERY
-    else:
-        query = RETRIEVAL_QUERY_NO_USER
+# ---------------------------------------------------------------- sync legs
 
+def _vector_leg(driver, candidate_mode: str, params: dict) -> List[Dict[str, Any]]:
+    """Run the vector leg on its own session."""
     with driver.session() as session:
-        try:
-            params = {
-                "qvec": qvec,
-                "query_text": query_text,
-                "index_name": index_name,
-                "limit": k,
-                "min_vector_score": min_vector_score,
-                "user_id": user_id or "",
-                "doc_id": doc_id or "",
-            }
-            # Add hierarchy params only for hierarchy query
-            if use_hierarchy:
-                params["chapter"] = chapter or ""
-                params["section"] = section or ""
-                params["content_type"] = content_type or ""
-
-            result = session.run(query, **params)
-
-            # Extract doc_id and doc_title directly from query results (graph traversal)
-            items = [
-                {
-                    "node": dict(record["candidate"]),
-                    "score": record["score"],
-                    "doc_id": record.get("doc_id"),
-                    "doc_title": record.get("doc_title") or "Document"
-                }
-                for record in result
-            ]
-            items = [item for item in items if item["score"] >= min_score]
-
-        except Exception as e:
-            print(f"❌ Neo4j query failed: {e}")
-            return "", []
+        if _wants_local(candidate_mode, params):
+            entry = get_doc_vectors(session, params["doc_id"])
+            if entry is not None:
+                return _local_vector_hits(entry, params)
+
+        if candidate_mode == "local":
+            candidate_mode = "auto"  # Not cacheable - fall back to Neo4j vector search
+
+        if candidate_mode == "auto" and params["user_id"]:
+            scope_size = session.run(SCOPE_SIZE_QUERY, **params).single()["scope_size"]
+            candidate_mode = _resolve_candidate_mode(candidate_mode, scope_size)
+
+        if candidate_mode == "exact" and params["user_id"]:
+            return [record.data() for record in session.run(VECTOR_LEG_EXACT_QUERY, **params)]
+
+        params = dict(params)
+        stats = session.run(VECTOR_LEG_ANN_QUERY, **params).single()
+        while candidate_mode == "adaptive" and params["user_id"]:
+            fetch_k = _next_fetch_k(stats, params["fetch_k"], params["limit"], params["min_vector_score"])
+            if fetch_k is None:
+                break
+            params["fetch_k"] = fetch_k
+            stats = session.run(VECTOR_LEG_ANN_QUERY, **params).single()
+
+        return list(stats["hits"]) if stats else []
+
+
+def _keyword_leg(driver, params: dict) -> List[Dict[str, Any]]:
+    """Run the fulltext leg on its own session (failures degrade to vector-only)."""
+    try:
+        with driver.session() as session:
+            return [record.data() for record in session.run(KEYWORD_LEG_QUERY, **params)]
+    except Exception as e:
+        print(f"⚠️  Keyword leg failed, using vector results only: {e}")
+        return []
+
+
+def _run_retrieval(
+    driver,
+    candidate_mode: str = "auto",
+    rrf_k: int = RRF_K,
+    leg_weights: Optional[Dict[str, float]] = None,
+    include_embedding: bool = False,
+    **query_args,
+) -> List[Dict[str, Any]]:
+    """Run both legs concurrently, fuse in Python, fetch the top k blocks."""
+    params = _build_retrieval_params(**query_args)
+
+    vector_future = _LEG_EXECUTOR.submit(_vector_leg, driver, candidate_mode, params)
+    keyword_future = _LEG_EXECUTOR.submit(_keyword_leg, driver, params)
+    legs = {"vector": vector_future.result(), "keyword": keyword_future.result()}
+
+    fused, element_ids = _fuse(legs, params["limit"], rrf_k, leg_weights)
+    if not fused:
+        return []
+
+    with driver.session() as session:
+        rows = list(session.run(
+            _fetch_query(include_embedding),
+            element_ids=[element_ids[block_id] for block_id, _ in fused if block_id in element_ids],
+            user_id=params["user_id"],
+        ))
+    return _order_fetched(rows, fused, element_ids)
+
+
+# --------------------------------------------------------------- async legs
+
+async def _avector_leg(driver, candidate_mode: str, params: dict) -> List[Dict[str, Any]]:
+    """Async variant of _vector_leg()."""
+    async with driver.session() as session:
+        if _wants_local(candidate_mode, params):
+            entry = await aget_doc_vectors(session, params["doc_id"])
+            if entry is not None:
+                return _local_vector_hits(entry, params)
+
+        if candidate_mode == "local":
+            candidate_mode = "auto"  # Not cacheable - fall back to Neo4j vector search
+
+        if candidate_mode == "auto" and params["user_id"]:
+            result = await session.run(SCOPE_SIZE_QUERY, **params)
+            scope_size = (await result.single())["scope_size"]
+            candidate_mode = _resolve_candidate_mode(candidate_mode, scope_size)
+
+        if candidate_mode == "exact" and params["user_id"]:
+            result = await session.run(VECTOR_LEG_EXACT_QUERY, **params)
+            return [record.data() async for record in result]
+
+        params = dict(params)
+        stats = await (await session.run(VECTOR_LEG_ANN_QUERY, **params)).single()
+        while candidate_mode == "adaptive" and params["user_id"]:
+            fetch_k = _next_fetch_k(stats, params["fetch_k"], params["limit"], params["min_vector_score"])
+            if fetch_k is None:
+                break
+            params["fetch_k"] = fetch_k
+            stats = await (await session.run(VECTOR_LEG_ANN_QUERY, **params)).single()
+
+        return list(stats["hits"]) if stats else []
+
+
+async def _akeyword_leg(driver, params: dict) -> List[Dict[str, Any]]:
+    """Async variant of _keyword_leg()."""
+    try:
+        async with driver.session() as session:
+            result = await session.run(KEYWORD_LEG_QUERY, **params)
+            return [record.data() async for record in result]
+    except Exception as e:
+        print(f"⚠️  Keyword leg failed, using vector results only: {e}")
+        return []
+
+
+async def _arun_retrieval(
+    driver,
+    candidate_mode: str = "auto",
+    rrf_k: int = RRF_K,
+    leg_weights: Optional[Dict[str, float]] = None,
+    include_embedding: bool = False,
+    **query_args,
+) -> List[Dict[str, Any]]:
+    """Async variant of _run_retrieval() - legs run concurrently on the event loop."""
+    params = _build_retrieval_params(**query_args)
+
+    vector_hits, keyword_hits = await asyncio.gather(
+        _avector_leg(driver, candidate_mode, params),
+        _akeyword_leg(driver, params),
+    )
+    legs = {"vector": vector_hits, "keyword": keyword_hits}
+
+    fused, element_ids = _fuse(legs, params["limit"], rrf_k, leg_weights)
+    if not fused:
+        return []
 
+    async with driver.session() as session:
+        result = await session.run(
+            _fetch_query(include_embedding),
+            element_ids=[element_ids[block_id] for block_id, _ in fused if block_id in element_ids],
+            user_id=params["user_id"],
+        )
+        rows = [record async for record in result]
+    return _order_fetched(rows, fused, element_ids)
+
+
+def _build_context_with_sources(
+    items: List[Dict[str, Any]],
+    max_chars: int,
+    show_score: bool = False
+) -> tuple[str, List[Dict[str, Any]]]:
+    """Format ranked items into a context string plus citation sources (show_score adds the RRF score)."""
     seen_block_ids = set()
     context_parts = []
     sources = []
@@ -249,8 +446,11 @@ def retrieve_context_with_sources(
         else:
             page_info = "page:?"
 
-        content = node.get("combined_context") or node.get("text_content", "")[:3500]
-        prefix = f"[Doc:{doc_id_val} {page_info}]\n"
+        content = node.get("combined_context") or (node.get("text_content") or "")[:3500]
+        prefix = f"[Doc:{doc_id_val} {page_info}]"
+        if show_score:
+            prefix += f" [RRF Score: {item['score']:.4f}]"
+        prefix += "\n"
         block_text = prefix + content
 
         if total_chars + len(block_text) > max_chars:
@@ -265,7 +465,7 @@ def retrieve_context_with_sources(
         title = first_lines[0][:60] + "..." if first_lines else f"Section {len(sources)+1}"
         excerpt = content[:150].strip() + "..." if len(content) > 150 else content.strip()
 
-        sources.append({
+        source = {
             "page": page_start,
             "page_end": page_end if page_end != page_start else None,
             "title": title,
@@ -275,8 +475,12 @@ def retrieve_context_with_sources(
             # Hierarchy fields
             "chapter": node.get("chapter_title"),
             "section": node.get("section_title"),
-            "content_type": node.get("content_type", "narrative"),
-        })
+            "content_type": node.get("content_type") or "narrative",
+        }
+        # Only present when the query ran with include_embedding=True
+        if "embedding" in node:
+            source["embedding"] = node["embedding"]
+        sources.append(source)
 
     context = "\n\n---\n\n".join(context_parts)
     print(f"📄 Built context: {len(context_parts)} blocks, {total_chars} chars, {len(sources)} sources")
@@ -284,6 +488,128 @@ def retrieve_context_with_sources(
     return context, sources
 
 
+def retrieve_context_with_sources(
+    query_text: str,
+    user_id: str = None,
+    doc_id: str = None,
+    chapter: str = None,
+    section: str = None,
+    content_type: str = None,
+    index_name: str = "contentBlockEmbeddingIdx",
+    k: int = 8,
+    min_score: float = 0.018,
+    min_vector_score: float = 0.60,
+    max_chars: int = 12000,
+    include_embedding: bool = False,
+    candidate_mode: str = "auto",
+    rrf_k: int = RRF_K,
+    leg_weights: Optional[Dict[str, float]] = None
+) -> tuple[str, List[Dict[str, Any]]]:
+    """
+    Retrieve context with optional hierarchy filtering and return both formatted context and sources.
+
+    Blocking - from async code (agent graphs, FastAPI) use aretrieve_context_with_sources().
+
+    Args:
+        query_text: User query string
+        user_id: User ID for document isolation
+        doc_id: Optional document ID to scope to single document
+        chapter: Optional chapter title to scope retrieval
+        section: Optional section title to scope retrieval
+        content_type: Optional content type filter (definition, example, theorem, etc.)
+        index_name: Name of Neo4j vector index
+        k: Number of candidate results
+        min_score: Minimum RRF score threshold
+        min_vector_score: Minimum vector similarity
+        max_chars: Character budget for context
+        include_embedding: Also return each block's embedding (debugging only - ~12 KB per hit)
+        candidate_mode: Vector candidate generation for user-scoped search -
+            "auto" (in-process for doc-scoped queries, else exact for small scopes
+            and adaptive over-fetch for large ones), "local", "exact", "adaptive",
+            or "global" (global top-k then filter)
+        rrf_k: RRF constant for fusing the vector and keyword legs
+        leg_weights: Per-leg RRF weights, e.g. {"vector": 1.0, "keyword": 0.5}
+            (defaults to RETRIEVAL_LEG_WEIGHTS)
+
+    Returns:
+        Tuple of (context_string, sources_list)
+        sources_list contains dicts with: page, title, excerpt, doc_id, chapter, section, content_type
+    """
+    driver = get_neo4j_driver()
+    qvec = get_query_embedding(query_text, embed_text, model=EMBED_MODEL_SMALL)
+
+    if not qvec:
+        return "", []
+
+    query_args = dict(
+        query_text=query_text, qvec=qvec, user_id=user_id, doc_id=doc_id,
+        chapter=chapter, section=section, content_type=content_type,
+        index_name=index_name, k=k, min_vector_score=min_vector_score,
+    )
+
+    try:
+        items = _run_retrieval(
+            driver, candidate_mode, rrf_k=rrf_k, leg_weights=leg_weights,
+            include_embedding=include_embedding, **query_args
+        )
+        items = [item for item in items if item["score"] >= min_score]
+
+    except Exception as e:
+        print(f"❌ Neo4j query failed: {e}")
+        return "", []
+
+    return _build_context_with_sources(items, max_chars)
+
+
+async def aretrieve_context_with_sources(
+    query_text: str,
+    user_id: str = None,
+    doc_id: str = None,
+    chapter: str = None,
+    section: str = None,
+    content_type: str = None,
+    index_name: str = "contentBlockEmbeddingIdx",
+    k: int = 8,
+    min_score: float = 0.018,
+    min_vector_score: float = 0.60,
+    max_chars: int = 12000,
+    include_embedding: bool = False,
+    candidate_mode: str = "auto",
+    rrf_k: int = RRF_K,
+    leg_weights: Optional[Dict[str, float]] = None
+) -> tuple[str, List[Dict[str, Any]]]:
+    """
+    Async variant of retrieve_context_with_sources().
+
+    Uses the async OpenAI client and the async Neo4j driver so a search never
+    blocks the event loop (other SSE streams keep flowing while we wait).
+    Same arguments and return value as the sync version.
+    """
+    qvec = await aget_query_embedding(query_text, aembed_text, model=EMBED_MODEL_SMALL)
+
+    if not qvec:
+        return "", []
+
+    query_args = dict(
+        query_text=query_text, qvec=qvec, user_id=user_id, doc_id=doc_id,
+        chapter=chapter, section=section, content_type=content_type,
+        index_name=index_name, k=k, min_vector_score=min_vector_score,
+    )
+
+    try:
+        items = await _arun_retrieval(
+            get_async_neo4j_driver(), candidate_mode, rrf_k=rrf_k, leg_weights=leg_weights,
+            include_embedding=include_embedding, **query_args
+        )
+        items = [item for item in items if item["score"] >= min_score]
+
+    except Exception as e:
+        print(f"❌ Neo4j query failed: {e}")
+        return "", []
+
+    return _build_context_with_sources(items, max_chars)
+
+
 def retrieve_context(
     query_text: str,
     user_id: str = None,    # User ID for document isolation
@@ -292,11 +618,12 @@ def retrieve_context(
     k: int = 8,             # Candidates to fetch (RRF will rank them)
     min_score: float = 0.018,  # RRF threshold - filters low-quality matches
     min_vector_score: float = 0.60,  # Vector similarity threshold - 0.60 filters unrelated (0.55) while keeping relevant (0.65+)
-    max_chars: int = 12000     # Character budget (~3000 tokens)
+    max_chars: int = 12000,    # Character budget (~3000 tokens)
+    candidate_mode: str = "auto"
 ) -> str:
     """
     Retrieve context using Hybrid Search (Vector + Keyword + RRF).
-    
+
     Args:
         query_text: User query string
         user_id: User ID to filter documents (None = all documents, for testing)
@@ -306,126 +633,49 @@ def retrieve_context(
         min_score: Minimum RRF score threshold (0.033 max, 0.018 ≈ top 3-4)
         min_vector_score: Minimum vector similarity (0.0-1.0). 0.65 filters out unrelated queries
         max_chars: Character budget for context (~4 chars = 1 token)
-    
+        candidate_mode: Vector candidate generation (see retrieve_context_with_sources)
+
     Returns:
-        Formatted context string with provenance headers
+        Formatted context string with provenance and RRF score headers
     """
     driver = get_neo4j_driver()
-    
+
     # Generate query embedding
     print("🔍 Generating query embedding...")
-    qvec = embed_text(query_text)
-    
+    qvec = get_query_embedding(query_text, embed_text, model=EMBED_MODEL_SMALL)
+
     if not qvec:
         print("❌ Failed to generate query embedding")
         return ""
-    
-    # Choose query based on whether user_id is provided
+
     if user_id:
         scope = f"doc: {doc_id}" if doc_id else "all docs"
         print(f"🔎 Running User-Scoped Hybrid Search (user: {user_id}, {scope}, min_vec: {min_vector_score})")
-        query = RETRIEVAL_QUERY
     else:
         print(f"🔎 Running Global Hybrid Search (no user filter - testing mode, min_vec: {min_vector_score})")
-        query = RETRIEVAL_QUERY_NO_USER
-    
-    with driver.session() as session:
-        try:
-            result = session.run(
-                query,
-                qvec=qvec,
-                query_text=query_text,
-                index_name=index_name,
-                limit=k,
-                min_vector_score=min_vector_score,  # New parameter for vector similarity filter
-                user_id=user_id or "",  # Pass empty string if None
-                doc_id=doc_id or ""      # Pass empty string for all docs
-            )
-            
-            items = [
-                {
-                    "node": dict(record["candidate"]),
-                    "score": record["score"]
-                }
-                for record in result
-            ]
-            
-            print(f"✅ Fetched {len(items)} candidates via Hybrid Search")
-            
-            # Filter by RRF score threshold (quality gate)
-            pre_filter_count = len(items)
-            items = [item for item in items if item["score"] >= min_score]
-            
-            # If nothing passes the threshold, we have NO relevant context
-            # This allows HITL to trigger and offer web search
-            if not items:
-                print(f"⚠️  0/{pre_filter_count} passed score threshold (>= {min_score}) - no relevant context")
-            else:
-                print(f"✅ {len(items)}/{pre_filter_count} passed score threshold (>= {min_score})")
-            
-        except Exception as e:
-            print(f"❌ Neo4j query failed: {e}")
-            print("💡 Hint: Did you run 'CREATE FULLTEXT INDEX contentBlockFulltextIdx ...'?")
-            return ""
-    
-    # Build context with deduplication and token budget
-    seen_block_ids = set()
-    context_parts = []
-    total_chars = 0
-    
-    for item in items:
-        node = item["node"]
-        block_id = node.get("block_id", "unknown")
-        
-        # Deduplicate
-        if block_id in seen_block_ids:
-            continue
-        seen_block_ids.add(block_id)
-        
-        # Format with provenance (Updated for new schema)
-        doc_id = node.get("doc_id", "?")
-        
-        # Handle page fields from different ingestion sources:
-        # - Llama ingestion: page_start, page_end
-        # - Old unstructured.io: page_from, page_to, page_number
-        page_start = node.get("page_start")
-        page_end = node.get("page_end")
-        
-        if page_start is not None:
-            if page_end and page_end != page_start:
-                page_info = f"pages:{page_start}-{page_end}"
-            else:
-                page_info = f"page:{page_start}"
-        else:
-            # Fallback for older data
-            page_num = node.get("page_number")
-            if page_num is not None:
-                page_info = f"page:{page_num}"
-            else:
-                page_from = node.get("page_from")
-                page_to = node.get("page_to")
-                page_info = f"pgs:{page_from}-{page_to}" if page_from and page_to else "page:?"
-        
-        # Prefix: [Doc:xyz page:5] [RRF Score: 0.03]
-        prefix = f"[Doc:{doc_id} {page_info}] [RRF Score: {item['score']:.4f}]\n"
-        
-        # Use combined_context (same content that was embedded for semantic match)
-        # Fallback to text_content with reasonable truncation
-        content = node.get("combined_context") or node.get("text_content", "")[:3500]
-        
-        block_text = prefix + content
-        
-        # Check character budget
-        if total_chars + len(block_text) > max_chars:
-            print(f"⚠️  Token budget reached, stopping at {len(context_parts)} blocks")
-            break
-        
-        context_parts.append(block_text)
-        total_chars += len(block_text)
-    
-    context = "\n\n---\n\n".join(context_parts)
-    print(f"📄 Built context: {len(context_parts)} blocks, {total_chars} chars")
-    
+
+    try:
+        items = _run_retrieval(
+            driver, candidate_mode,
+            query_text=query_text, qvec=qvec, user_id=user_id, doc_id=doc_id,
+            chapter=None, section=None, content_type=None,
+            index_name=index_name, k=k, min_vector_score=min_vector_score,
+        )
+    except Exception as e:
+        print(f"❌ Neo4j query failed: {e}")
+        print("💡 Hint: Did you run 'CREATE FULLTEXT INDEX contentBlockFulltextIdx ...'?")
+        return ""
+
+    # Filter by RRF score threshold (quality gate)
+    # If nothing passes, we have NO relevant context - this allows HITL to trigger and offer web search
+    pre_filter_count = len(items)
+    items = [item for item in items if item["score"] >= min_score]
+    if not items:
+        print(f"⚠️  0/{pre_filter_count} passed score threshold (>= {min_score}) - no relevant context")
+    else:
+        print(f"✅ {len(items)}/{pre_filter_count} passed score threshold (>= {min_score})")
+
+    context, _ = _build_context_with_sources(items, max_chars, show_score=True)
     return context
 
 
@@ -437,31 +687,28 @@ def search_contentblocks(
     Debug function: Returns raw blocks using Hybrid Search.
     """
     driver = get_neo4j_driver()
-    qvec = embed_text(query_text)
-    
+    qvec = get_query_embedding(query_text, embed_text, model=EMBED_MODEL_SMALL)
+
     if not qvec:
         return []
-    
-    # Re-use the hybrid query for consistency
-    with driver.session() as session:
-        result = session.run(
-            RETRIEVAL_QUERY,
-            qvec=qvec,
-            query_text=query_text,
-            index_name="contentBlockEmbeddingIdx",
-            k=top_k
-        )
-        
-        return [
-            {
-                "block_id": record["candidate"].get("block_id"),
-                "text": record["candidate"].get("text_content", "")[:200],
-                "score": record["score"],
-                "page": record["candidate"].get("page_number")
-            } 
-            for record in result
-        ]
 
+    # Re-use the hybrid engine for consistency
+    items = _run_retrieval(
+        driver,
+        query_text=query_text, qvec=qvec, user_id=None, doc_id=None,
+        chapter=None, section=None, content_type=None,
+        index_name="contentBlockEmbeddingIdx", k=top_k, min_vector_score=0.0,
+    )
+
+    return [
+        {
+            "block_id": item["node"].get("block_id"),
+            "text": (item["node"].get("combined_context") or item["node"].get("text_content") or "")[:200],
+            "score": item["score"],
+            "page": item["node"].get("page_start") or item["node"].get("page_number")
+        }
+        for item in items
+    ]
 
 
 
@@ -493,7 +740,7 @@ if __name__ == "__main__":
         for i, block in enumerate(blocks, 1):
             print(f"\n{i}. Block: {block['block_id']}")
             print(f"   Score: {block['score']:.3f}")
-            print(f"   Pages: {block['page_from']}-{block['page_to']}")
+            print(f"   Page: {block['page']}")
             print(f"   Text: {block['text'][:200]}...")
     else:
         print("❌ No blocks found")
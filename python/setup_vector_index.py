@@ -154,11 +154,19 @@ if __name__ == "__main__":
     print("🚀 Neo4j Vector Index Setup\n")
     
     create_vector_indexes()
+
+    # Lookup constraints / range indexes + schema version (see lib/neo4j_migrations.py)
+    if all([NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD]):
+        from lib.neo4j_migrations import apply_migrations
+        from lib.neo4j_pool import get_driver
+        apply_migrations(get_driver(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD))
+
     verify_indexes()
     
     print("\n" + "="*60)
     print("Next steps:")
     print("1. Run ingestion_workflow.py to ingest documents")
+    print("   (python -m lib.neo4j_migrations --verify checks hot queries use indexes)")
     print("2. Use retrieval.py to test vector search + graph expansion")
     print("3. Integrate retrieve_context() into your chat agent")
     print("="*60)
@@ -56,7 +56,8 @@ def ingest_document(
     file_key: str,
     extract_images: bool = True,
     create_hierarchy: bool = True,
-    generate_questions: bool = True
+    generate_questions: bool = True,
+    force_phases: list = None
 ):
     """
     Background task for enhanced document ingestion.
@@ -68,6 +69,8 @@ def ingest_document(
         extract_images: Whether to extract and upload images to R2
         create_hierarchy: Whether to create chapter/section hierarchy
         generate_questions: Whether to generate questions
+        force_phases: Checkpointed phases to rerun on the first attempt (e.g. ["hierarchy"]).
+            Celery retries always resume from the last completed phase.
 
     Returns:
         dict with success status, counts, and timing
@@ -126,7 +129,9 @@ def ingest_document(
             title=title,
             extract_images=extract_images,
             create_hierarchy=create_hierarchy,
-            generate_questions=generate_questions
+            generate_questions=generate_questions,
+            # self.retry re-sends the same args - only force on the first attempt
+            force_phases=force_phases if self.request.retries == 0 else None
         )
 
         elapsed = time.time() - start_time
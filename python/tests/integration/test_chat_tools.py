@@ -194,7 +194,7 @@ class TestQueryStructure:
 class TestSearchDocuments:
     """Integration tests for search_documents tool."""
 
-    def test_search_documents_with_doc_id(self, config_with_doc):
+    async def test_search_documents_with_doc_id(self, config_with_doc):
         """search_documents should work with valid doc_id."""
         from unittest.mock import patch
         from agents.chat_tools import search_documents
@@ -203,7 +203,7 @@ class TestSearchDocuments:
         doc_id = config_with_doc["_test_doc_id"]
 
         with patch("agents.chat_tools.get_user_context_from_config", return_value=(user_id, doc_id)):
-            result = search_documents.invoke(
+            result = await search_documents.ainvoke(
                 {"query": "introduction"},
                 config=config_with_doc
             )
@@ -212,7 +212,7 @@ class TestSearchDocuments:
         assert isinstance(result, str)
         print(f"✓ Search result: {result[:200]}...")
 
-    def test_search_documents_without_doc_id(self, config_without_doc):
+    async def test_search_documents_without_doc_id(self, config_without_doc):
         """search_documents should search all user docs when doc_id=None."""
         from unittest.mock import patch
         from agents.chat_tools import search_documents
@@ -220,7 +220,7 @@ class TestSearchDocuments:
         user_id = config_without_doc["_test_user_id"]
 
         with patch("agents.chat_tools.get_user_context_from_config", return_value=(user_id, None)):
-            result = search_documents.invoke(
+            result = await search_documents.ainvoke(
                 {"query": "main concepts"},
                 config=config_without_doc
             )
@@ -229,7 +229,7 @@ class TestSearchDocuments:
         assert isinstance(result, str)
         print(f"✓ Search all docs result: {result[:200]}...")
 
-    def test_search_documents_with_sources(self, config_with_doc):
+    async def test_search_documents_with_sources(self, config_with_doc):
         """search_documents should include source citations."""
         from unittest.mock import patch
         from agents.chat_tools import search_documents
@@ -238,7 +238,7 @@ class TestSearchDocuments:
         doc_id = config_with_doc["_test_doc_id"]
 
         with patch("agents.chat_tools.get_user_context_from_config", return_value=(user_id, doc_id)):
-            result = search_documents.invoke(
+            result = await search_documents.ainvoke(
                 {"query": "explain the topic"},
                 config=config_with_doc
             )
@@ -250,7 +250,7 @@ class TestSearchDocuments:
             assert "Found" in result or "passage" in result.lower()
         print(f"✓ Sources result: {result[:300]}...")
 
-    def test_search_documents_no_results(self, config_with_doc):
+    async def test_search_documents_no_results(self, config_with_doc):
         """search_documents should handle no results gracefully."""
         from unittest.mock import patch
         from agents.chat_tools import search_documents
@@ -259,7 +259,7 @@ class TestSearchDocuments:
         doc_id = config_with_doc["_test_doc_id"]
 
         with patch("agents.chat_tools.get_user_context_from_config", return_value=(user_id, doc_id)):
-            result = search_documents.invoke(
+            result = await search_documents.ainvoke(
                 {"query": "xyzzy12345nonexistenttermforsure"},
                 config=config_with_doc
             )
@@ -269,11 +269,11 @@ class TestSearchDocuments:
         assert "No relevant content found" in result or "Found" in result
         print(f"✓ No results: {result}")
 
-    def test_search_documents_invalid_user(self, config_invalid_user):
+    async def test_search_documents_invalid_user(self, config_invalid_user):
         """search_documents should handle invalid user gracefully."""
         from agents.chat_tools import search_documents
 
-        result = search_documents.invoke(
+        result = await search_documents.ainvoke(
             {"query": "anything"},
             config=config_invalid_user
         )
@@ -501,7 +501,7 @@ class TestToolErrorHandling:
         assert "error" not in result.lower() or "Error" not in result
         print(f"✓ Error handling: {result[:200]}...")
 
-    def test_search_documents_handles_embedding_error(self, config_with_doc):
+    async def test_search_documents_handles_embedding_error(self, config_with_doc):
         """search_documents should handle very long queries."""
         from unittest.mock import patch
         from agents.chat_tools import search_documents
@@ -512,7 +512,7 @@ class TestToolErrorHandling:
         with patch("agents.chat_tools.get_user_context_from_config", return_value=(user_id, doc_id)):
             # Very long query
             long_query = "test " * 1000
-            result = search_documents.invoke(
+            result = await search_documents.ainvoke(
                 {"query": long_query},
                 config=config_with_doc
             )
@@ -0,0 +1,157 @@
+"""Tests for lib/embedding_batcher.py - Token-aware embedding batches."""
+
+import threading
+
+import pytest
+
+from lib import embedding_batcher
+from lib.embedding_batcher import embed_batched, pack_batches
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(embedding_batcher, "EMBED_RETRY_BACKOFF_SECONDS", 0)
+
+
+def _fake_vector(text):
+    return [float(len(text))]
+
+
+class ApiError(Exception):
+    """Stand-in for openai.APIStatusError."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class RecordingEmbedder:
+    """Fake embeddings endpoint: records batches, can fail on chosen inputs."""
+
+    def __init__(self, fail_on=(), fail_times=None, status_code=400):
+        self.calls = []
+        self.fail_on = set(fail_on)
+        self.fail_times = fail_times  # None = always fail on fail_on inputs
+        self.status_code = status_code
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self._lock:
+            self.calls.append(list(batch))
+            if self.fail_on & set(batch):
+                if self.fail_times is None or self.fail_times > 0:
+                    if self.fail_times is not None:
+                        self.fail_times -= 1
+                    raise ApiError(self.status_code)
+        return [_fake_vector(text) for text in batch]
+
+
+class TestPackBatches:
+    """Test greedy packing under token and item limits."""
+
+    def test_respects_token_budget(self):
+        assert pack_batches([40, 40, 40, 40], max_tokens=100, max_items=10) == [[0, 1], [2, 3]]
+
+    def test_respects_item_limit(self):
+        assert pack_batches([1] * 5, max_tokens=100, max_items=2) == [[0, 1], [2, 3], [4]]
+
+    def test_oversized_input_gets_own_batch(self):
+        assert pack_batches([10, 500, 10], max_tokens=100, max_items=10) == [[0], [1], [2]]
+
+    def test_empty(self):
+        assert pack_batches([]) == []
+
+
+class TestEmbedBatched:
+    """Test ordering, request count, and partial retries."""
+
+    def test_one_request_for_small_document(self):
+        embedder = RecordingEmbedder()
+        texts = [f"block {i}" for i in range(300)]
+
+        vectors = embed_batched(texts, embedder)
+
+        assert len(embedder.calls) == 1
+        assert vectors == [_fake_vector(t) for t in texts]
+
+    def test_keeps_order_across_concurrent_batches(self):
+        embedder = RecordingEmbedder()
+        texts = ["x" * (i + 1) for i in range(20)]
+
+        vectors = embed_batched(texts, embedder, max_items=3, concurrency=4)
+
+        assert len(embedder.calls) == 7
+        assert vectors == [_fake_vector(t) for t in texts]
+
+    def test_blank_inputs_skip_api(self):
+        embedder = RecordingEmbedder()
+        vectors = embed_batched(["a", "", "  ", "b"], embedder)
+
+        assert embedder.calls == [["a", "b"]]
+        assert vectors == [[1.0], [], [], [1.0]]
+
+    def test_transient_failure_retries_same_batch(self):
+        embedder = RecordingEmbedder(fail_on={"a"}, fail_times=1, status_code=429)
+        vectors = embed_batched(["a", "b"], embedder)
+
+        assert embedder.calls == [["a", "b"], ["a", "b"]]
+        assert vectors == [[1.0], [1.0]]
+
+    def test_persistent_failure_only_drops_bad_input(self):
+        embedder = RecordingEmbedder(fail_on={"bad"})
+        texts = ["good1", "bad", "good2", "good3"]
+
+        vectors = embed_batched(texts, embedder, max_retries=1)
+
+        assert vectors == [[5.0], [], [5.0], [5.0]]
+        # Only sub-batches containing the bad input were sent again
+        assert ["good2", "good3"] in embedder.calls
+        assert embedder.calls.count(["good2", "good3"]) == 1
+
+    def test_bad_request_bisects_without_retrying(self):
+        embedder = RecordingEmbedder(fail_on={"bad"})
+
+        vectors = embed_batched(["good", "bad"], embedder, max_retries=3)
+
+        assert vectors == [[4.0], []]
+        assert embedder.calls == [["good", "bad"], ["good"], ["bad"]]
+
+    def test_auth_error_aborts_without_retry_or_split(self):
+        embedder = RecordingEmbedder(fail_on={"a", "b", "c"}, status_code=401)
+
+        with pytest.raises(ApiError):
+            embed_batched(["a", "b", "c"], embedder, max_retries=3)
+
+        assert embedder.calls == [["a", "b", "c"]]
+
+    def test_outage_retries_then_raises_without_split(self):
+        def unreachable(batch):
+            calls.append(batch)
+            raise ConnectionError("provider down")
+
+        calls = []
+        with pytest.raises(ConnectionError):
+            embed_batched(["a", "b", "c", "d"], unreachable, max_retries=3)
+
+        assert calls == [["a", "b", "c", "d"]] * 3
+
+    def test_abort_skips_remaining_batches(self):
+        embedder = RecordingEmbedder(fail_on={"a"}, status_code=403)
+
+        with pytest.raises(ApiError):
+            embed_batched(["a", "b", "c"], embedder, max_items=1, concurrency=1)
+
+        assert embedder.calls == [["a"]]
+
+    def test_length_mismatch_treated_as_failure(self):
+        vectors = embed_batched(["a", "b"], lambda batch: [[0.0]], max_retries=1)
+        assert vectors == [[0.0], [0.0]]  # Split into singles, each succeeds
+
+    def test_oversized_input_truncated(self, monkeypatch):
+        monkeypatch.setattr(embedding_batcher, "EMBED_MAX_TOKENS_PER_INPUT", 5)
+        monkeypatch.setattr(embedding_batcher, "_get_encoding", lambda: None)
+        embedder = RecordingEmbedder()
+
+        embed_batched(["y" * 100], embedder)
+
+        assert len(embedder.calls[0][0]) == 5 * embedding_batcher.CHARS_PER_TOKEN_ESTIMATE
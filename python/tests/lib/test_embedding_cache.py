@@ -0,0 +1,180 @@
+"""Tests for lib/embedding_cache.py - Two-tier query embedding cache."""
+
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from lib import embedding_cache
+from lib.embedding_cache import (
+    EmbeddingLRU,
+    aget_query_embedding,
+    cache_info,
+    cache_key,
+    get_query_embedding,
+)
+from lib.optional_redis import OptionalRedis
+
+MODEL = "text-embedding-3-small"
+
+class CountingEmbedder:
+    def __init__(self, vector=(0.25, 0.5)):
+        self.vector = list(vector)
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return list(self.vector)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    server = fakeredis.FakeServer()
+    redis = OptionalRedis("Embedding cache", "local only", client=fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(redis, "aclient", lambda: fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(embedding_cache, "_redis", redis)
+    embedding_cache.clear()
+    yield
+    embedding_cache.clear()
+
+
+class TestKeys:
+    """Test query normalization."""
+
+    def test_case_and_whitespace_insensitive(self):
+        assert cache_key("  What is   Entropy?\n", MODEL) == cache_key("what is entropy?", MODEL)
+
+    def test_model_is_part_of_key(self):
+        assert cache_key("entropy", MODEL) != cache_key("entropy", "text-embedding-3-large")
+
+
+class TestEmbeddingLRU:
+    """Test the in-process tier."""
+
+    def test_evicts_least_recently_used(self):
+        lru = EmbeddingLRU(max_entries=2, ttl_seconds=60)
+        lru.put("a", [1.0])
+        lru.put("b", [2.0])
+        lru.get("a")
+        lru.put("c", [3.0])
+
+        assert lru.get("b") is None
+        assert lru.get("a") == [1.0]
+
+    def test_expired_entry_dropped(self):
+        lru = EmbeddingLRU(max_entries=2, ttl_seconds=-1)
+        lru.put("a", [1.0])
+        assert lru.get("a") is None
+
+
+class TestGetQueryEmbedding:
+    """Test tier lookups and counters."""
+
+    def test_repeat_query_served_locally(self):
+        embedder = CountingEmbedder()
+
+        first = get_query_embedding("explain photosynthesis", embedder, MODEL)
+        second = get_query_embedding("Explain  photosynthesis", embedder, MODEL)
+
+        assert first == second == [0.25, 0.5]
+        assert embedder.calls == 1
+        assert cache_info()["local_hits"] == 1
+        assert cache_info()["misses"] == 1
+
+    def test_redis_tier_shared_across_processes(self):
+        embedder = CountingEmbedder()
+        get_query_embedding("what is entropy", embedder, MODEL)
+
+        embedding_cache._lru.clear()  # Simulate another worker process
+        vector = get_query_embedding("what is entropy", embedder, MODEL)
+
+        assert vector == [0.25, 0.5]
+        assert embedder.calls == 1
+        assert cache_info()["redis_hits"] == 1
+
+    def test_failed_embedding_not_cached(self):
+        embedder = CountingEmbedder(vector=())
+        get_query_embedding("entropy", embedder, MODEL)
+        get_query_embedding("entropy", embedder, MODEL)
+        assert embedder.calls == 2
+
+    def test_redis_down_falls_back_to_embedder(self, monkeypatch):
+        class Down:
+            def __getattr__(self, name):
+                raise ConnectionError("down")
+
+        monkeypatch.setattr(embedding_cache._redis, "_client", Down())
+        embedder = CountingEmbedder()
+
+        assert get_query_embedding("entropy", embedder, MODEL) == [0.25, 0.5]
+        assert get_query_embedding("entropy", embedder, MODEL) == [0.25, 0.5]
+        assert embedder.calls == 1
+
+    def test_redis_down_skips_set_and_later_lookups(self, monkeypatch):
+        calls = []
+
+        class Down:
+            def get(self, key):
+                calls.append("get")
+                raise ConnectionError("down")
+
+            def set(self, *args, **kwargs):
+                calls.append("set")
+                raise ConnectionError("down")
+
+        monkeypatch.setattr(embedding_cache, "_redis", OptionalRedis("Embedding cache", "local only", client=Down()))
+
+        get_query_embedding("entropy", CountingEmbedder(), MODEL)
+        get_query_embedding("enthalpy", CountingEmbedder(), MODEL)
+
+        assert calls == ["get"]
+
+    def test_disabled_always_embeds(self, monkeypatch):
+        monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_ENABLED", False)
+        embedder = CountingEmbedder()
+        get_query_embedding("entropy", embedder, MODEL)
+        get_query_embedding("entropy", embedder, MODEL)
+        assert embedder.calls == 2
+
+
+class TestAsyncGetQueryEmbedding:
+    """Test the async path."""
+
+    async def test_async_uses_both_tiers(self):
+        embedder = CountingEmbedder()
+
+        async def aembed(text):
+            return embedder(text)
+
+        await aget_query_embedding("what is entropy", aembed, MODEL)
+        embedding_cache._lru.clear()
+        vector = await aget_query_embedding("what is entropy", aembed, MODEL)
+
+        assert vector == [0.25, 0.5]
+        assert embedder.calls == 1
+        assert cache_info()["redis_hits"] == 1
+
+    async def test_redis_down_costs_one_timeout(self, monkeypatch):
+        calls = []
+
+        class Down:
+            async def get(self, key):
+                calls.append("get")
+                raise ConnectionError("down")
+
+            async def set(self, *args, **kwargs):
+                calls.append("set")
+                raise ConnectionError("down")
+
+        redis = OptionalRedis("Embedding cache", "local only")
+        redis._async_clients[asyncio.get_running_loop()] = Down()
+        monkeypatch.setattr(embedding_cache, "_redis", redis)
+
+        async def aembed(text):
+            return [0.25, 0.5]
+
+        await aget_query_embedding("entropy", aembed, MODEL)
+        await aget_query_embedding("enthalpy", aembed, MODEL)
+
+        assert calls == ["get"]
@@ -0,0 +1,167 @@
+"""Tests for lib/hierarchy_windows.py - Windowed hierarchy map-reduce."""
+
+import random
+
+import pytest
+
+from lib.hierarchy_windows import (
+    FALLBACK_TITLE,
+    merge_windows,
+    plan_windows,
+    window_labels,
+)
+
+
+def _hierarchy(*chapters) -> dict:
+    """chapters: (title, [(section_title, [indices]), ...])"""
+    return {
+        "chapters": [
+            {"title": title, "sections": [{"title": s, "chunk_indices": list(idx)} for s, idx in sections]}
+            for title, sections in chapters
+        ]
+    }
+
+
+def _indices(hierarchy: dict) -> list:
+    return [i for ch in hierarchy["chapters"] for sec in ch["sections"] for i in sec["chunk_indices"]]
+
+
+def _outline(hierarchy: dict) -> list:
+    return [
+        (ch["title"], [(sec["title"], sec["chunk_indices"][0], sec["chunk_indices"][-1]) for sec in ch["sections"]])
+        for ch in hierarchy["chapters"]
+    ]
+
+
+class TestPlanWindows:
+    """Test window layout."""
+
+    def test_small_document_single_window(self):
+        assert plan_windows(50, size=120) == [(0, 50)]
+
+    @pytest.mark.parametrize("total", [121, 229, 1000, 1337])
+    def test_covers_with_overlap(self, total):
+        windows = plan_windows(total, size=120, overlap=12)
+
+        assert windows[0][0] == 0 and windows[-1][1] == total
+        for (a_start, a_stop), (b_start, b_stop) in zip(windows, windows[1:]):
+            assert a_stop - b_start == 12
+        assert all(stop - start <= 120 for start, stop in windows)
+
+    def test_balanced_tail(self):
+        windows = plan_windows(229, size=120, overlap=12)
+        sizes = [stop - start for start, stop in windows]
+
+        assert max(sizes) - min(sizes) <= len(windows)
+
+
+class TestWindowLabels:
+    """Test validation / repair of one window's LLM output."""
+
+    def test_out_of_range_and_duplicate_indices_dropped(self):
+        labels = window_labels(_hierarchy(("A", [("a1", [10, 11, 99]), ("a2", [11, 12])])), 10, 13)
+
+        assert labels.labels == [(0, 0), (0, 0), (0, 1)]
+
+    def test_missing_chunks_join_preceding_section(self):
+        labels = window_labels(_hierarchy(("A", [("a1", [1]), ("a2", [3])])), 0, 5)
+
+        assert labels.labels == [(0, 0), (0, 0), (0, 0), (0, 1), (0, 1)]
+
+    def test_labels_only_move_forward(self):
+        labels = window_labels(_hierarchy(("A", [("a1", [0, 2])]), ("B", [("b1", [1, 3])])), 0, 4)
+
+        assert labels.labels == [(0, 0), (1, 0), (1, 0), (1, 0)]
+
+    def test_string_indices_accepted(self):
+        assert window_labels(_hierarchy(("A", [("a1", ["0", "1"])])), 0, 2).labels == [(0, 0), (0, 0)]
+
+    @pytest.mark.parametrize("hierarchy", [None, {}, {"chapters": "x"}, _hierarchy(("A", [("a1", [50])]))])
+    def test_unusable(self, hierarchy):
+        assert window_labels(hierarchy, 0, 5) is None
+
+
+class TestMergeWindows:
+    """Test reconciling windows into one hierarchy."""
+
+    def test_single_window_repaired(self):
+        hierarchy = merge_windows([((0, 4), _hierarchy(("A", [("a1", [0, 2]), ("a2", [3])])))], 4)
+
+        assert _outline(hierarchy) == [("A", [("a1", 0, 2), ("a2", 3, 3)])]
+
+    def test_chapter_continuing_across_seam_keeps_first_title(self):
+        first = _hierarchy(("Chapter 1: Motion", [("Speed", range(0, 10))]))
+        second = _hierarchy(
+            ("Motion (continued)", [("Speed", range(6, 12))]),
+            ("Chapter 2: Forces", [("Newton", range(12, 16))]),
+        )
+
+        hierarchy = merge_windows([((0, 10), first), ((6, 16), second)], 16)
+
+        assert _outline(hierarchy) == [
+            ("Chapter 1: Motion", [("Speed", 0, 11)]),
+            ("Chapter 2: Forces", [("Newton", 12, 15)]),
+        ]
+
+    def test_seam_on_agreed_chapter_boundary(self):
+        first = _hierarchy(("A", [("a", range(0, 8))]), ("B", [("b", range(8, 10))]))
+        second = _hierarchy(("A'", [("a'", range(6, 8))]), ("B'", [("b'", range(8, 16))]))
+
+        hierarchy = merge_windows([((0, 10), first), ((6, 16), second)], 16)
+
+        assert _outline(hierarchy) == [("A", [("a", 0, 7)]), ("B'", [("b'", 8, 15)])]
+
+    def test_section_boundary_inside_continued_chapter(self):
+        first = _hierarchy(("A", [("a1", range(0, 7)), ("a2", range(7, 10))]))
+        second = _hierarchy(("A'", [("x", range(6, 7)), ("a2'", range(7, 16))]))
+
+        hierarchy = merge_windows([((0, 10), first), ((6, 16), second)], 16)
+
+        assert _outline(hierarchy) == [("A", [("a1", 0, 6), ("a2'", 7, 15)])]
+
+    def test_failed_window_continues_previous_section(self):
+        first = _hierarchy(("A", [("a", range(0, 10))]))
+
+        hierarchy = merge_windows([((0, 10), first), ((6, 16), None)], 16)
+
+        assert _outline(hierarchy) == [("A", [("a", 0, 15)])]
+
+    def test_failed_first_window_takes_next_title(self):
+        second = _hierarchy(("B", [("b", range(6, 16))]))
+
+        hierarchy = merge_windows([((0, 10), None), ((6, 16), second)], 16)
+
+        assert _outline(hierarchy) == [("B", [("b", 0, 15)])]
+
+    def test_failed_window_between_boundaries_titled_fallback(self):
+        first = _hierarchy(("A", [("a", range(0, 8))]), ("B", [("b", range(8, 10))]))
+        third = _hierarchy(("C", [("c", range(12, 14))]), ("D", [("d", range(14, 20))]))
+
+        hierarchy = merge_windows([((0, 10), first), ((6, 16), None), ((12, 20), third)], 20)
+
+        assert _outline(hierarchy) == [
+            ("A", [("a", 0, 7)]),
+            (FALLBACK_TITLE, [(FALLBACK_TITLE, 8, 13)]),
+            ("D", [("d", 14, 19)]),
+        ]
+
+    def test_all_windows_failed(self):
+        assert merge_windows([((0, 10), None), ((6, 16), {"chapters": []})], 16) is None
+
+    def test_random_llm_output_always_valid(self):
+        rng = random.Random(0)
+        total = 500
+        windows = plan_windows(total, size=120, overlap=12)
+        for _ in range(20):
+            results = []
+            for start, stop in windows:
+                indices = [i for i in range(start - 3, stop + 3) if rng.random() > 0.2]
+                rng.shuffle(indices)
+                cuts = sorted(rng.sample(range(1, len(indices)), 4))
+                parts = [indices[i:j] for i, j in zip([0] + cuts, cuts + [len(indices)])]
+                results.append(((start, stop), _hierarchy(*[(f"C{i}", [(f"S{i}", p)]) for i, p in enumerate(parts)])))
+
+            hierarchy = merge_windows(results, total)
+
+            assert _indices(hierarchy) == list(range(total))
+
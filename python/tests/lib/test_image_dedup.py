@@ -0,0 +1,151 @@
+"""Tests for lib/image_dedup.py - Perceptual-hash image deduplication."""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from lib.image_dedup import (
+    cluster_images,
+    dedupe_images,
+    group_by_dedup_key,
+    hamming_distances,
+    perceptual_hashes,
+)
+
+
+def _encode(img: Image.Image, fmt: str = "PNG") -> bytes:
+    buf = BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def _logo(size=(300, 200)) -> Image.Image:
+    img = Image.new("RGB", (300, 200), "white")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((40, 30, 160, 150), fill="navy")
+    draw.rectangle((180, 60, 280, 170), fill="orange")
+    return img.resize(size)
+
+
+def _chart() -> Image.Image:
+    img = Image.new("RGB", (300, 200), "white")
+    draw = ImageDraw.Draw(img)
+    for i, h in enumerate([40, 120, 80, 160, 20]):
+        draw.rectangle((20 + i * 55, 190 - h, 60 + i * 55, 190), fill="green")
+    return img
+
+
+def _image(image_bytes: bytes, xref: int, width: int = 300, height: int = 200, index: int = 0) -> dict:
+    return {"image_bytes": image_bytes, "xref": xref, "width": width, "height": height, "index": index, "ext": "png"}
+
+
+class TestPerceptualHashes:
+    """Test the vectorized hash computation."""
+
+    def test_reencoded_copy_is_close(self):
+        png = _encode(_logo())
+        jpeg = _encode(_logo((600, 400)), "JPEG")
+
+        phash, ahash, valid = perceptual_hashes([png, jpeg])
+
+        assert valid.all()
+        assert hamming_distances(phash, phash[0])[1] <= 6
+        assert hamming_distances(ahash, ahash[0])[1] <= 6
+
+    def test_different_images_are_far(self):
+        phash, _, _ = perceptual_hashes([_encode(_logo()), _encode(_chart())])
+
+        assert hamming_distances(phash, phash[0])[1] > 6
+
+    def test_undecodable_bytes_marked_invalid(self):
+        _, _, valid = perceptual_hashes([b"not an image", _encode(_logo())])
+
+        assert valid.tolist() == [False, True]
+
+    def test_hamming_distance_counts_bits(self):
+        hashes = np.array([[0b1111, 0], [0, 0]], dtype=np.uint8)
+
+        assert hamming_distances(hashes, np.zeros(2, dtype=np.uint8)).tolist() == [4, 0]
+
+
+class TestClusterImages:
+    """Test exact and near-duplicate clustering."""
+
+    def test_same_xref_clusters(self):
+        images = [_image(b"a", xref=7), _image(b"b", xref=7)]
+
+        assert cluster_images(images) == [0, 0]
+
+    def test_same_bytes_under_different_xref_clusters(self):
+        data = _encode(_logo())
+        images = [_image(data, xref=1), _image(data, xref=2)]
+
+        assert cluster_images(images) == [0, 0]
+
+    def test_rescaled_reencoded_copy_clusters(self):
+        images = [
+            _image(_encode(_logo()), xref=1),
+            _image(_encode(_chart()), xref=2),
+            _image(_encode(_logo((600, 400)), "JPEG"), xref=3, width=600, height=400),
+        ]
+
+        assert cluster_images(images) == [0, 1, 0]
+
+    def test_different_aspect_ratio_kept_apart(self):
+        images = [
+            _image(_encode(_logo()), xref=1),
+            _image(_encode(_logo((300, 100))), xref=2, width=300, height=100),
+        ]
+
+        assert cluster_images(images) == [0, 1]
+
+    def test_undecodable_images_stay_separate(self):
+        images = [_image(b"garbage-1", xref=1), _image(b"garbage-2", xref=2)]
+
+        assert cluster_images(images) == [0, 1]
+
+
+class TestDedupeImages:
+    """Test in-place annotation of images_by_page."""
+
+    def test_annotates_clusters_and_picks_largest_representative(self):
+        small = _image(_encode(_logo()), xref=1)
+        large = _image(_encode(_logo((600, 400)), "JPEG"), xref=2, width=600, height=400)
+        chart = _image(_encode(_chart()), xref=3, index=1)
+        images_by_page = {1: [small, chart], 2: [large]}
+
+        duplicates = dedupe_images(images_by_page)
+
+        assert duplicates == 1
+        assert small["dedup_key"] == large["dedup_key"] != chart["dedup_key"]
+        assert large["dedup_representative"] and not small["dedup_representative"]
+        assert chart["dedup_representative"]
+
+    def test_empty(self):
+        assert dedupe_images({}) == 0
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr("lib.image_dedup.IMAGE_DEDUP_ENABLED", False)
+        images_by_page = {1: [_image(b"same", xref=1)], 2: [_image(b"same", xref=1)]}
+
+        assert dedupe_images(images_by_page) == 0
+
+
+class TestGroupByDedupKey:
+    """Test grouping for classification / upload fan-out."""
+
+    def test_representative_first(self):
+        a = {"dedup_key": "k", "dedup_representative": False}
+        b = {"dedup_key": "k", "dedup_representative": True}
+
+        assert group_by_dedup_key([a, b]) == {"k": [b, a]}
+
+    @pytest.mark.parametrize("count", [1, 3])
+    def test_images_without_key_are_their_own_group(self, count):
+        images = [{"index": i} for i in range(count)]
+
+        groups = group_by_dedup_key(images)
+
+        assert sorted(len(members) for members in groups.values()) == [1] * count
@@ -0,0 +1,139 @@
+"""Tests for lib/image_encoding.py - Adaptive vision payload encoding."""
+
+import base64
+from io import BytesIO
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from lib import image_encoding
+from lib.image_encoding import classify_pixels, encode_image, encode_page, max_side_for
+
+
+def _encode(img: Image.Image, fmt: str = "PNG") -> bytes:
+    buf = BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def _diagram(size=(400, 300)) -> Image.Image:
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((40, 40, 160, 120), outline="black", width=3)
+    draw.line((160, 80, 300, 200), fill="red", width=3)
+    return img
+
+
+def _scan(size=(600, 800), color=False) -> Image.Image:
+    rng = np.random.default_rng(0)
+    gray = np.clip(200 + rng.normal(0, 12, (size[1], size[0])), 0, 255).astype(np.uint8)
+    if not color:
+        return Image.fromarray(gray)
+    rgb = np.stack([gray, np.roll(gray, 7, axis=1), rng.integers(0, 255, gray.shape, dtype=np.uint8)], axis=2)
+    return Image.fromarray(rgb)
+
+
+class TestClassifyPixels:
+    """Test the encoding decision."""
+
+    def test_flat_background_is_line_art(self):
+        assert classify_pixels(np.asarray(_diagram())) == ("line_art", False)
+
+    def test_monochrome_diagram_is_grayscale(self):
+        assert classify_pixels(np.asarray(_diagram().convert("L").convert("RGB"))) == ("line_art", True)
+
+    def test_noisy_gray_is_text(self):
+        assert classify_pixels(np.asarray(_scan())) == ("text", True)
+
+    def test_noisy_colour_is_photo(self):
+        assert classify_pixels(np.asarray(_scan(color=True))) == ("photo", False)
+
+
+class TestEncodeImage:
+    """Test re-encoding of extracted images."""
+
+    def test_scan_becomes_grayscale_jpeg(self):
+        data = _encode(_scan().convert("RGB"))
+
+        encoded = encode_image(data, model="gemini")
+
+        assert encoded.mime_type == "image/jpeg"
+        assert len(encoded.data) < len(data)
+        assert Image.open(BytesIO(encoded.data)).mode == "L"
+
+    def test_downsampled_to_model_resolution(self):
+        data = _encode(_scan(size=(3000, 2000)), "JPEG")
+
+        encoded = encode_image(data, model="gemma-12b")
+
+        assert max(encoded.width, encoded.height) == max_side_for("gemma-12b")
+        assert Image.open(BytesIO(encoded.data)).size == (encoded.width, encoded.height)
+
+    def test_small_original_kept(self):
+        data = _encode(_diagram().convert("L"))
+
+        encoded = encode_image(data, model="gemini")
+
+        assert encoded.kind == "original"
+        assert encoded.data is data
+
+    def test_alpha_flattened(self):
+        img = Image.new("RGBA", (100, 100), (0, 0, 0, 0))
+        ImageDraw.Draw(img).ellipse((20, 20, 80, 80), fill=(0, 0, 0, 255))
+
+        encoded = encode_image(_encode(img, "TIFF"), model="gemini")
+
+        assert encoded.mime_type == "image/png"
+        assert Image.open(BytesIO(encoded.data)).getpixel((0, 0)) == 255
+
+    def test_disabled_passes_bytes_through(self, monkeypatch):
+        monkeypatch.setattr(image_encoding, "IMAGE_ENCODING_ENABLED", False)
+        data = _encode(_scan(size=(3000, 2000)))
+
+        assert encode_image(data, model="gemma-12b").data is data
+
+    def test_undecodable_bytes_raise(self):
+        with pytest.raises(Exception):
+            encode_image(b"not an image")
+
+
+class TestEncodedImage:
+    """Test request parts built from one encoding."""
+
+    def test_parts_share_base64(self):
+        encoded = encode_image(_encode(_scan()), model="gemini")
+
+        assert encoded.gemini_part()["inline_data"] == {"mime_type": encoded.mime_type, "data": encoded.b64}
+        assert encoded.openai_part()["image_url"]["url"] == f"data:{encoded.mime_type};base64,{encoded.b64}"
+        assert base64.b64decode(encoded.b64) == encoded.data
+
+
+class TestEncodePage:
+    """Test direct page rendering at the model's resolution."""
+
+    @pytest.fixture
+    def page_doc(self):
+        doc = fitz.open()
+        page = doc.new_page(width=612, height=792)
+        page.insert_text((72, 72), "Native text page")
+        yield doc
+        doc.close()
+
+    def test_render_capped_at_model_resolution(self, page_doc):
+        encoded = encode_page(page_doc[0], model="olmocr2", dpi=150)
+
+        assert max(encoded.width, encoded.height) <= max_side_for("olmocr2")
+        assert encoded.height > max_side_for("olmocr2") - 2
+
+    def test_low_dpi_not_upscaled(self, page_doc):
+        encoded = encode_page(page_doc[0], model="gemini", dpi=72)
+
+        assert (encoded.width, encoded.height) == (612, 792)
+
+    def test_text_page_is_grayscale_png(self, page_doc):
+        encoded = encode_page(page_doc[0], model="gemini", dpi=100)
+
+        assert (encoded.kind, encoded.mime_type) == ("line_art", "image/png")
+        assert Image.open(BytesIO(encoded.data)).mode == "L"
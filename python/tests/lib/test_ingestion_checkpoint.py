@@ -0,0 +1,142 @@
+"""Tests for lib/ingestion_checkpoint.py - Per-phase resumable ingestion."""
+
+import pickle
+import zlib
+
+import fakeredis
+import pytest
+
+from lib import ingestion_checkpoint
+from lib.optional_redis import OptionalRedis
+from lib.ingestion_checkpoint import IngestionCheckpoint, expand_force
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(ingestion_checkpoint, "_redis", OptionalRedis("Checkpoints", "scratch", client=client))
+    monkeypatch.setattr(ingestion_checkpoint, "INGEST_CHECKPOINT_ENABLED", True)
+    monkeypatch.setattr(ingestion_checkpoint, "INGEST_CHECKPOINT_SECRET", "test-secret")
+    return client
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-1.4 first upload")
+    return path
+
+
+class TestExpandForce:
+    """Test which phases a force request invalidates."""
+
+    def test_forcing_a_phase_reruns_everything_after_it(self):
+        assert expand_force(["hierarchy"]) == ["hierarchy", "match", "enrich"]
+
+    def test_earliest_forced_phase_wins(self):
+        assert expand_force(["enrich", "images"]) == ["images", "hierarchy", "match", "enrich"]
+
+    def test_all(self):
+        assert expand_force(["all"]) == ingestion_checkpoint.PHASES
+
+    def test_nothing_forced(self):
+        assert expand_force(None) == []
+        assert expand_force(["", " "]) == []
+
+    def test_unknown_phase_rejected(self):
+        with pytest.raises(ValueError):
+            expand_force(["hierachy"])
+
+
+class TestIngestionCheckpoint:
+    """Test save / load / resume semantics."""
+
+    def test_retry_resumes_saved_phases(self, pdf):
+        first = IngestionCheckpoint("doc1", str(pdf), variant="fast")
+        first.save("extract", [{"text": "chunk", "chunk_index": 0}])
+        first.save("images", ({1: [{"index": 0}]}, {"page_1_img_0": "https://r2/x.png"}, 1))
+
+        retry = IngestionCheckpoint("doc1", str(pdf), variant="fast")
+        assert retry.load("extract") == [{"text": "chunk", "chunk_index": 0}]
+        assert retry.load("images")[1] == {"page_1_img_0": "https://r2/x.png"}
+        assert retry.load("hierarchy") is None
+        assert retry.has("images")
+        assert not retry.has("hierarchy")
+
+    def test_changed_file_content_does_not_resume(self, pdf):
+        IngestionCheckpoint("doc1", str(pdf)).save("extract", ["old"])
+        pdf.write_bytes(b"%PDF-1.4 second upload")
+
+        assert IngestionCheckpoint("doc1", str(pdf)).load("extract") is None
+
+    def test_variant_is_isolated(self, pdf):
+        IngestionCheckpoint("doc1", str(pdf), variant="fast-q0").save("enrich", ["no questions"])
+
+        assert IngestionCheckpoint("doc1", str(pdf), variant="fast-q1").load("enrich") is None
+
+    def test_force_drops_phase_and_later_ones(self, pdf):
+        first = IngestionCheckpoint("doc1", str(pdf))
+        for phase in ingestion_checkpoint.PHASES:
+            first.save(phase, phase)
+
+        forced = IngestionCheckpoint("doc1", str(pdf), force=["match"])
+        assert forced.load("hierarchy") == "hierarchy"
+        assert forced.load("match") is None
+        assert forced.load("enrich") is None
+
+        # A later retry without force must not see the dropped artifacts either
+        assert IngestionCheckpoint("doc1", str(pdf)).load("enrich") is None
+
+    def test_clear_after_success(self, pdf, fake_redis):
+        ckpt = IngestionCheckpoint("doc1", str(pdf))
+        ckpt.save("extract", ["chunk"])
+        ckpt.save("enrich", ["block"])
+
+        ckpt.clear()
+
+        assert fake_redis.keys("ingest_ckpt:*") == []
+
+    def test_redis_down_runs_every_phase(self, pdf, monkeypatch):
+        class Down:
+            def __getattr__(self, name):
+                raise ConnectionError("redis unavailable")
+
+        monkeypatch.setattr(ingestion_checkpoint, "_redis", OptionalRedis("Checkpoints", "scratch", client=Down()))
+        ckpt = IngestionCheckpoint("doc1", str(pdf), force=["all"])
+
+        ckpt.save("extract", ["chunk"])
+        assert ckpt.load("extract") is None
+
+
+class TestSignedPayloads:
+    """Test that only payloads signed with the shared secret are unpickled."""
+
+    def test_tampered_payload_not_unpickled(self, pdf, fake_redis):
+        ckpt = IngestionCheckpoint("doc1", str(pdf))
+        ckpt.save("extract", ["chunk"])
+        key = ckpt.key("extract")
+        signature = fake_redis.get(key)[:ingestion_checkpoint.SIGNATURE_BYTES]
+        fake_redis.set(key, signature + zlib.compress(pickle.dumps(["forged"])))
+
+        assert ckpt.load("extract") is None
+
+    def test_payload_signed_with_another_secret_ignored(self, pdf, monkeypatch):
+        IngestionCheckpoint("doc1", str(pdf)).save("extract", ["chunk"])
+        monkeypatch.setattr(ingestion_checkpoint, "INGEST_CHECKPOINT_SECRET", "other-secret")
+
+        assert IngestionCheckpoint("doc1", str(pdf)).load("extract") is None
+
+    def test_payload_moved_to_another_key_ignored(self, pdf, fake_redis):
+        ckpt = IngestionCheckpoint("doc1", str(pdf))
+        ckpt.save("extract", ["chunk"])
+        fake_redis.set(ckpt.key("hierarchy"), fake_redis.get(ckpt.key("extract")))
+
+        assert ckpt.load("hierarchy") is None
+
+    def test_disabled_without_secret(self, pdf, fake_redis, monkeypatch):
+        monkeypatch.setattr(ingestion_checkpoint, "INGEST_CHECKPOINT_SECRET", "")
+        ckpt = IngestionCheckpoint("doc1", str(pdf))
+        ckpt.save("extract", ["chunk"])
+
+        assert ckpt.load("extract") is None
+        assert fake_redis.keys("ingest_ckpt:*") == []
@@ -0,0 +1,49 @@
+"""Tests for lib/json_stream.py - Incremental JSON array item extraction."""
+
+from lib.json_stream import JsonArrayStream, parse_array_items
+
+
+RESPONSE = """Here are the questions:
+```json
+{"note": "braces {in} strings [are] fine \\" too", "questions": [
+  {"text": "What is {x}?", "bloom_level": "remember", "options": ["A", "B", "C", "D"]},
+  {"text": "broken", "bloom_level": },
+  {"text": "Design a circuit", "bloom_level": "create", "key_points": [["nested"]]}
+]}
+```"""
+
+
+class TestJsonArrayStream:
+    """Test item-by-item decoding."""
+
+    def test_items_decoded_as_chunks_arrive(self):
+        stream = JsonArrayStream("questions")
+        seen = []
+        for i in range(0, len(RESPONSE), 5):
+            seen.extend(stream.feed(RESPONSE[i:i + 5]))
+
+        assert [q["text"] for q in seen] == ["What is {x}?", "Design a circuit"]
+        assert stream.items == seen
+        assert stream.complete
+
+    def test_malformed_item_kept_as_raw_text(self):
+        stream = parse_array_items(RESPONSE, "questions")
+
+        assert stream.failed == ['{"text": "broken", "bloom_level": }']
+
+    def test_truncated_response_keeps_finished_items(self):
+        stream = parse_array_items('{"questions": [{"text": "a"}, {"text": "b"}, {"text": "cut of', "questions")
+
+        assert stream.items == [{"text": "a"}, {"text": "b"}]
+        assert not stream.complete
+
+    def test_only_top_level_key_matched(self):
+        stream = parse_array_items('{"meta": {"questions": [{"x": 1}]}, "questions": [{"y": 2}]}', "questions")
+
+        assert stream.items == [{"y": 2}]
+
+    def test_missing_key(self):
+        stream = parse_array_items('{"answers": [{"y": 2}]}', "questions")
+
+        assert stream.items == []
+        assert stream.complete
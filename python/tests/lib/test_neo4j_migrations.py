@@ -0,0 +1,148 @@
+"""Tests for lib/neo4j_migrations.py - Schema migrations and plan verification."""
+
+import sys
+import types
+from unittest.mock import MagicMock
+
+import pytest
+
+from lib.neo4j_migrations import (
+    GET_SCHEMA_VERSION_QUERY,
+    MIGRATIONS,
+    SET_SCHEMA_VERSION_QUERY,
+    Migration,
+    apply_migrations,
+    collect_queries,
+    find_operators,
+    pending_migrations,
+    sample_params,
+    verify_query_plans,
+)
+
+
+class FakeSession:
+    """Records statements; keeps the SchemaVersion node in memory."""
+
+    def __init__(self, version=None, plans=None, fail_on=None):
+        self.version = version
+        self.plans = plans or {}
+        self.fail_on = fail_on
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, parameters=None, **params):
+        params = {**(parameters or {}), **params}
+        self.statements.append(query)
+        if self.fail_on and self.fail_on in query:
+            raise RuntimeError("constraint violation")
+
+        result = MagicMock()
+        if query == GET_SCHEMA_VERSION_QUERY:
+            result.single.return_value = {"version": self.version} if self.version is not None else None
+        elif query == SET_SCHEMA_VERSION_QUERY:
+            self.version = params["version"]
+        elif query.startswith("EXPLAIN "):
+            result.consume.return_value.plan = self.plans.get(query[len("EXPLAIN "):])
+        return result
+
+
+class FakeDriver:
+    def __init__(self, session):
+        self._session = session
+
+    def session(self):
+        return self._session
+
+
+TEST_MIGRATIONS = (
+    Migration(1, "one", ("CREATE INDEX a IF NOT EXISTS FOR (n:A) ON (n.id)",)),
+    Migration(2, "two", ("CREATE INDEX b IF NOT EXISTS FOR (n:B) ON (n.id)",
+                         "CREATE INDEX c IF NOT EXISTS FOR (n:C) ON (n.id)")),
+)
+
+
+def _plan(operator, *children):
+    return {"operatorType": operator, "children": list(children)}
+
+
+class TestMigrations:
+    """Test ordering, idempotency and version recording."""
+
+    def test_versions_are_unique_and_increasing(self):
+        versions = [m.version for m in MIGRATIONS]
+        assert versions == sorted(set(versions))
+
+    def test_statements_are_idempotent(self):
+        for migration in MIGRATIONS:
+            for statement in migration.statements:
+                assert "IF NOT EXISTS" in statement
+
+    def test_hot_lookup_keys_covered(self):
+        statements = " ".join(s for m in MIGRATIONS for s in m.statements)
+        for key in ("u.id", "d.documentId", "cb.block_id", "c.doc_id, c.title", "s.doc_id, s.title, s.chapter"):
+            assert key in statements
+
+    def test_pending_only_newer(self):
+        assert [m.version for m in pending_migrations(1, TEST_MIGRATIONS)] == [2]
+
+    def test_fresh_database_applies_all(self):
+        session = FakeSession()
+        assert apply_migrations(FakeDriver(session), TEST_MIGRATIONS) == 2
+        assert session.version == 2
+        assert sum("CREATE INDEX" in s for s in session.statements) == 3
+
+    def test_up_to_date_runs_nothing(self):
+        session = FakeSession(version=2)
+        assert apply_migrations(FakeDriver(session), TEST_MIGRATIONS) == 2
+        assert session.statements == [GET_SCHEMA_VERSION_QUERY]
+
+    def test_failure_keeps_last_complete_version(self):
+        session = FakeSession(fail_on="INDEX c")
+        with pytest.raises(RuntimeError):
+            apply_migrations(FakeDriver(session), TEST_MIGRATIONS)
+        assert session.version == 1
+
+
+class TestPlanVerification:
+    """Test query collection and plan checks."""
+
+    def test_find_operators_walks_children(self):
+        plan = _plan("ProduceResults@neo4j", _plan("Filter@neo4j", _plan("NodeByLabelScan@neo4j")))
+        assert find_operators(plan) == ["NodeByLabelScan"]
+
+    def test_index_seek_is_clean(self):
+        plan = _plan("ProduceResults@neo4j", _plan("NodeUniqueIndexSeek@neo4j"))
+        assert find_operators(plan) == []
+
+    def test_sample_params_cover_referenced_names(self):
+        params = sample_params("MATCH (d:Document {documentId: $doc_id}) RETURN $qvec, $limit")
+        assert set(params) == {"doc_id", "qvec", "limit"}
+        assert params["doc_id"] == ""
+        assert len(params["qvec"]) == 1536
+
+    def test_collect_queries_by_name(self, monkeypatch):
+        module = types.ModuleType("fake_queries")
+        module.USER_QUERY = "MATCH (u:User {id: $id}) RETURN u"
+        module.RETRIEVAL_QUERY_NO_USER = "RETURN 1"
+        module.CANDIDATE_PROJECTION = "candidate {.block_id}"
+        module._PRIVATE_QUERY = "RETURN 2"
+        monkeypatch.setitem(sys.modules, "fake_queries", module)
+
+        assert set(collect_queries(["fake_queries"])) == {
+            "fake_queries.USER_QUERY", "fake_queries.RETRIEVAL_QUERY_NO_USER",
+        }
+
+    def test_verify_reports_label_scans(self):
+        queries = {"good": "MATCH (u:User {id: $id}) RETURN u", "bad": "MATCH (cb:ContentBlock) RETURN cb"}
+        session = FakeSession(plans={
+            queries["good"]: _plan("ProduceResults@neo4j", _plan("NodeUniqueIndexSeek@neo4j")),
+            queries["bad"]: _plan("ProduceResults@neo4j", _plan("NodeByLabelScan@neo4j")),
+        })
+
+        failures = verify_query_plans(FakeDriver(session), queries)
+        assert failures == {"bad": ["NodeByLabelScan"]}
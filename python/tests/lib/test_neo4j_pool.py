@@ -0,0 +1,68 @@
+"""Tests for lib/neo4j_pool.py - Shared Neo4j driver registry."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lib import neo4j_pool
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    """Start every test with an empty registry."""
+    neo4j_pool._sync_drivers.clear()
+    yield
+    neo4j_pool._sync_drivers.clear()
+
+
+class TestGetDriver:
+    """Test sync driver reuse and credential handling."""
+
+    def test_same_credentials_reuse_driver(self):
+        with patch.object(neo4j_pool.GraphDatabase, "driver", side_effect=lambda *a, **k: MagicMock()) as factory:
+            first = neo4j_pool.get_driver("neo4j://db", "neo4j", "pw")
+            second = neo4j_pool.get_driver("neo4j://db", "neo4j", "pw")
+
+        assert first is second
+        assert factory.call_count == 1
+
+    def test_different_uri_gets_own_driver(self):
+        with patch.object(neo4j_pool.GraphDatabase, "driver", side_effect=lambda *a, **k: MagicMock()):
+            first = neo4j_pool.get_driver("neo4j://a", "neo4j", "pw")
+            second = neo4j_pool.get_driver("neo4j://b", "neo4j", "pw")
+
+        assert first is not second
+
+    def test_pool_settings_passed_to_driver(self):
+        with patch.object(neo4j_pool.GraphDatabase, "driver", return_value=MagicMock()) as factory:
+            neo4j_pool.get_driver("neo4j://db", "neo4j", "pw")
+
+        kwargs = factory.call_args.kwargs
+        assert kwargs["max_connection_pool_size"] == neo4j_pool.NEO4J_MAX_POOL_SIZE
+        assert kwargs["liveness_check_timeout"] == neo4j_pool.NEO4J_LIVENESS_CHECK_TIMEOUT
+
+    def test_missing_credentials_raise(self, monkeypatch):
+        for var in ("NEO4J_URI", "NEO4J_USER", "NEO4J_PASSWORD"):
+            monkeypatch.delenv(var, raising=False)
+
+        with pytest.raises(ValueError, match="Missing Neo4j credentials"):
+            neo4j_pool.get_driver()
+
+
+class TestLifecycle:
+    """Test warm-up and shutdown hooks."""
+
+    def test_warm_up_returns_false_instead_of_raising(self):
+        driver = MagicMock()
+        driver.verify_connectivity.side_effect = RuntimeError("unreachable")
+        with patch.object(neo4j_pool, "get_driver", return_value=driver):
+            assert neo4j_pool.warm_up() is False
+
+    def test_close_all_closes_and_clears(self):
+        driver = MagicMock()
+        neo4j_pool._sync_drivers[("neo4j://db", "neo4j")] = driver
+
+        neo4j_pool.close_all()
+
+        driver.close.assert_called_once()
+        assert neo4j_pool._sync_drivers == {}
@@ -0,0 +1,91 @@
+"""Tests for lib/ocr_cache.py - Content-addressed OCR / vision result cache."""
+
+import fakeredis
+import pytest
+
+from lib import ocr_cache
+from lib.optional_redis import OptionalRedis
+from lib.ocr_cache import cache_info, cache_key, get, get_many, put
+
+MODEL = "mistral-small"
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(ocr_cache, "_redis", OptionalRedis("OCR cache", "not cached", client=client))
+    monkeypatch.setattr(ocr_cache, "OCR_CACHE_ENABLED", True)
+    ocr_cache.reset_stats()
+    yield
+    ocr_cache.reset_stats()
+
+
+class TestKeys:
+    """Test content addressing."""
+
+    def test_bytes_and_str_content_hashed_alike(self):
+        assert cache_key("ocr", "deepinfra", MODEL, "v1", b"page") == cache_key("ocr", "deepinfra", MODEL, "v1", "page")
+
+    def test_prompt_version_is_part_of_key(self):
+        assert cache_key("ocr", "deepinfra", MODEL, "v1", b"page") != cache_key("ocr", "deepinfra", MODEL, "v2", b"page")
+
+    def test_model_and_kind_are_part_of_key(self):
+        base = cache_key("ocr", "deepinfra", MODEL, "v1", b"page")
+        assert base != cache_key("ocr", "deepinfra", "olmocr2", "v1", b"page")
+        assert base != cache_key("vision", "deepinfra", MODEL, "v1", b"page")
+
+
+class TestGetPut:
+    """Test lookups, stores and counters."""
+
+    def test_round_trip(self):
+        put("ocr", "deepinfra", MODEL, "v1", "b64-page-3", "Page three text")
+
+        assert get("ocr", "deepinfra", MODEL, "v1", "b64-page-3") == "Page three text"
+        assert get("ocr", "deepinfra", MODEL, "v2", "b64-page-3") is None
+
+    def test_get_many_returns_hits_by_caller_key(self):
+        put("vision", "gemini", "gemini-2.0-flash", "v1", b"img-a", {"is_educational": True, "description": "A"})
+
+        hits = get_many("vision", "gemini", "gemini-2.0-flash", "v1", {1: b"img-a", 2: b"img-b"})
+
+        assert hits == {1: {"is_educational": True, "description": "A"}}
+        info = cache_info()
+        assert info["hits"] == 1
+        assert info["misses"] == 1
+        assert info["hit_rate"] == 0.5
+
+    def test_empty_results_not_cached(self):
+        put("ocr", "deepinfra", MODEL, "v1", b"page", "")
+        put("vision", "gemini", MODEL, "v1", b"page", None)
+
+        assert cache_info()["stores"] == 0
+        assert get("ocr", "deepinfra", MODEL, "v1", b"page") is None
+
+    def test_evicts_least_recently_used_above_cap(self, monkeypatch):
+        monkeypatch.setattr(ocr_cache, "OCR_CACHE_MAX_ENTRIES", 2)
+
+        put("ocr", "deepinfra", MODEL, "v1", b"a", "A")
+        put("ocr", "deepinfra", MODEL, "v1", b"b", "B")
+        get("ocr", "deepinfra", MODEL, "v1", b"a")  # refreshes a
+        put("ocr", "deepinfra", MODEL, "v1", b"c", "C")  # evicts b
+
+        assert get("ocr", "deepinfra", MODEL, "v1", b"b") is None
+        assert get("ocr", "deepinfra", MODEL, "v1", b"a") == "A"
+        assert cache_info()["evictions"] == 1
+
+    def test_disabled_cache_is_a_no_op(self, monkeypatch):
+        monkeypatch.setattr(ocr_cache, "OCR_CACHE_ENABLED", False)
+        put("ocr", "deepinfra", MODEL, "v1", b"page", "text")
+
+        assert get("ocr", "deepinfra", MODEL, "v1", b"page") is None
+
+    def test_redis_down_disables_caching(self, monkeypatch):
+        class Down:
+            def __getattr__(self, name):
+                raise ConnectionError("redis unavailable")
+
+        monkeypatch.setattr(ocr_cache, "_redis", OptionalRedis("OCR cache", "not cached", client=Down()))
+
+        put("ocr", "deepinfra", MODEL, "v1", b"page", "text")
+        assert get_many("ocr", "deepinfra", MODEL, "v1", {1: b"page"}) == {}
@@ -0,0 +1,115 @@
+"""Tests for lib/optional_redis.py - Optional Redis with a circuit breaker."""
+
+import asyncio
+import gc
+
+import fakeredis
+import pytest
+
+from lib import optional_redis
+from lib.optional_redis import OptionalRedis, RedisUnavailable
+
+
+class CountingDown:
+    """Client whose every command fails, counting the attempts."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        raise ConnectionError("redis unavailable")
+
+
+def _lookup(redis: OptionalRedis, key: str = "k"):
+    try:
+        return redis.client().get(key)
+    except Exception as e:
+        redis.failed(e)
+        return None
+
+
+class TestCircuitBreaker:
+    """Test skipping Redis after an error."""
+
+    def test_healthy_client_used(self):
+        client = fakeredis.FakeRedis(decode_responses=True)
+        client.set("k", "v")
+        redis = OptionalRedis("Test", "fallback", client=client)
+
+        assert _lookup(redis) == "v"
+        assert not redis.is_open
+
+    def test_error_skips_redis_for_cooldown(self):
+        client = CountingDown()
+        redis = OptionalRedis("Test", "fallback", cooldown=30, client=client)
+
+        for _ in range(5):
+            assert _lookup(redis) is None
+
+        assert client.calls == 1
+        assert redis.is_open
+        with pytest.raises(RedisUnavailable):
+            redis.client()
+
+    def test_retried_after_cooldown(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(optional_redis.time, "monotonic", lambda: now[0])
+        client = CountingDown()
+        redis = OptionalRedis("Test", "fallback", cooldown=30, client=client)
+
+        _lookup(redis)
+        now[0] += 29
+        _lookup(redis)
+        assert client.calls == 1
+
+        now[0] += 2
+        _lookup(redis)
+        assert client.calls == 2
+
+    def test_skipped_calls_do_not_extend_cooldown(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(optional_redis.time, "monotonic", lambda: now[0])
+        redis = OptionalRedis("Test", "fallback", cooldown=30, client=CountingDown())
+
+        _lookup(redis)
+        now[0] += 20
+        _lookup(redis)
+
+        now[0] += 11
+        assert not redis.is_open
+
+    def test_warns_once(self, capsys):
+        redis = OptionalRedis("Test cache", "not cached", cooldown=0, client=CountingDown())
+
+        _lookup(redis)
+        _lookup(redis)
+
+        assert capsys.readouterr().out.count("Test cache: Redis unavailable, not cached") == 1
+
+    async def test_async_client_skipped_while_open(self):
+        redis = OptionalRedis("Test", "fallback", cooldown=30)
+        redis.failed(ConnectionError("down"))
+
+        with pytest.raises(RedisUnavailable):
+            redis.aclient()
+
+    async def test_async_client_per_loop(self):
+        redis = OptionalRedis("Test", "fallback")
+
+        first = redis.aclient()
+        assert redis.aclient() is first
+        await first.aclose()
+
+    def test_async_clients_released_with_their_loop(self):
+        redis = OptionalRedis("Test", "fallback")
+
+        async def client_pair():
+            return redis.aclient(), redis.aclient()
+
+        clients = [asyncio.run(client_pair()) for _ in range(3)]
+        gc.collect()
+
+        assert all(first is second for first, second in clients)
+        assert len({id(first) for first, _ in clients}) == 3
+        assert len(redis._async_clients) == 0
@@ -0,0 +1,57 @@
+"""Tests for lib/page_rasterizer.py - In-process page rasterization."""
+
+import fitz
+import pytest
+
+from lib import page_rasterizer
+from lib.page_rasterizer import encode_pages
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    doc = fitz.open()
+    for i in range(5):
+        page = doc.new_page(width=200, height=100)
+        page.insert_text((20, 50), f"Page {i + 1}")
+    path = tmp_path / "pages.pdf"
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+class TestEncodePages:
+    """Test page selection, adaptive encoding and the process-pool path."""
+
+    def test_pages_encoded_for_model(self, pdf_path):
+        encoded = encode_pages(pdf_path, [3, 1], model="gemini-preview", dpi=72)
+
+        assert sorted(encoded) == [1, 3]
+        assert all(image.mime_type == "image/png" for image in encoded.values())
+        assert (encoded[1].width, encoded[1].height) == (200, 100)
+
+    def test_duplicates_ignored(self, pdf_path):
+        assert sorted(encode_pages(pdf_path, [4, 2, 2], model="gemini", dpi=72)) == [2, 4]
+
+    def test_out_of_range_pages_skipped(self, pdf_path):
+        assert sorted(encode_pages(pdf_path, [0, 5, 6], model="gemini", dpi=72)) == [5]
+
+    def test_empty_selection(self, pdf_path):
+        assert encode_pages(pdf_path, [], model="gemini") == {}
+
+    def test_process_pool_matches_serial(self, pdf_path, monkeypatch):
+        monkeypatch.setattr(page_rasterizer, "RASTER_PARALLEL_MIN_PAGES", 2)
+        serial = encode_pages(pdf_path, range(1, 6), model="gemini", dpi=72, workers=1)
+        parallel = encode_pages(pdf_path, range(1, 6), model="gemini", dpi=72, workers=2)
+
+        assert {p: image.data for p, image in parallel.items()} == {p: image.data for p, image in serial.items()}
+
+    def test_workers_get_contiguous_shards(self, pdf_path, monkeypatch):
+        calls = []
+        monkeypatch.setattr(page_rasterizer, "RASTER_PARALLEL_MIN_PAGES", 2)
+        monkeypatch.setattr(
+            page_rasterizer, "pool_starmap",
+            lambda func, arg_tuples, processes: calls.append([args[1] for args in arg_tuples]) or [{}] * processes,
+        )
+        encode_pages(pdf_path, [5, 1, 2, 4, 3], model="gemini", dpi=72, workers=2)
+
+        assert calls == [[[1, 2, 3], [4, 5]]]
@@ -0,0 +1,167 @@
+"""Tests for lib/pdf_analyzer.py - Single-pass PDF page analysis."""
+
+import fitz
+import pytest
+
+from lib import pdf_analyzer
+from lib.encoding_check import check_pdf_encoding
+from lib.pdf_analyzer import analyze_pdf, page_ranges
+
+BODY = "Newton's second law relates force, mass and acceleration. " * 4
+
+
+def _analyze_in_daemon(pdf_path, queue):
+    """Celery prefork stand-in: a daemonic billiard child running the sharded path."""
+    try:
+        pages = pdf_analyzer._analyze_parallel(pdf_path, 3, True, 2)
+        queue.put([(page.text, [image.image_bytes for image in page.images]) for page in pages])
+    except Exception as e:
+        queue.put(repr(e))
+
+
+def _png(width, height):
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    pixmap.set_rect(pixmap.irect, (200, 30, 30))
+    return pixmap.tobytes("png")
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """Three pages: text + figure, text + repeated logo twice, full-page scan."""
+    logo = _png(40, 40)
+    doc = fitz.open()
+
+    page = doc.new_page()
+    page.insert_text((72, 72), BODY[:80])
+    page.insert_image(fitz.Rect(100, 200, 400, 500), stream=_png(300, 300))
+    page.insert_image(fitz.Rect(20, 20, 60, 60), stream=logo)
+
+    page = doc.new_page()
+    page.insert_text((72, 72), BODY[:80])
+    page.insert_image(fitz.Rect(20, 20, 60, 60), stream=logo)
+
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=_png(200, 280))
+
+    path = tmp_path / "sample.pdf"
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+class TestAnalyzePdf:
+    """Test the per-page inventory."""
+
+    def test_text_and_encoding_per_page(self, pdf_path):
+        analysis = analyze_pdf(pdf_path)
+
+        assert analysis.page_count == 3
+        assert "Newton" in analysis.pages_text[0]
+        assert [p.encoding["page_num"] for p in analysis.pages] == [1, 2, 3]
+        assert analysis.pages[0].encoding["char_count"] == len(analysis.pages[0].text)
+
+    def test_image_bboxes_and_sizes(self, pdf_path):
+        first = analyze_pdf(pdf_path).pages[0]
+        figure = max(first.images, key=lambda img: img.width)
+
+        assert (figure.width, figure.height) == (300, 300)
+        assert figure.bbox == pytest.approx([100, 200, 400, 500])
+        assert figure.image_bytes and figure.ext == "png"
+
+    def test_repeated_image_decoded_once(self, pdf_path):
+        analysis = analyze_pdf(pdf_path)
+        logo_first = min(analysis.pages[0].images, key=lambda img: img.width)
+        logo_second = analysis.pages[1].images[0]
+
+        assert logo_first.xref == logo_second.xref
+        assert logo_first.image_bytes is logo_second.image_bytes
+
+    def test_scanned_page_hint(self, pdf_path):
+        analysis = analyze_pdf(pdf_path)
+
+        assert not analysis.pages[0].is_scanned
+        assert analysis.pages[2].is_scanned
+        assert analysis.pages[2].image_coverage > 0.9
+        assert 3 in analysis.ocr_page_numbers
+
+    def test_text_only_skips_images(self, pdf_path):
+        analysis = analyze_pdf(pdf_path, extract_images=False)
+        assert all(not page.images for page in analysis.pages)
+
+
+class TestEncodingReuse:
+    """The encoding report is the same with or without a shared analysis."""
+
+    def test_report_parity(self, pdf_path):
+        shared = check_pdf_encoding(pdf_path, analysis=analyze_pdf(pdf_path))
+        standalone = check_pdf_encoding(pdf_path)
+
+        for key in ("total_pages", "problem_page_numbers", "avg_quality_score", "needs_ocr_fallback"):
+            assert shared[key] == standalone[key]
+
+
+class TestParallelAnalysis:
+    """Test page-range sharding across processes."""
+
+    def test_page_ranges_contiguous_and_balanced(self):
+        assert page_ranges(10, 3) == [(0, 4), (4, 7), (7, 10)]
+        assert page_ranges(2, 8) == [(0, 1), (1, 2)]
+        assert page_ranges(0, 4) == []
+
+    def test_parallel_matches_serial(self, pdf_path, monkeypatch):
+        monkeypatch.setattr(pdf_analyzer, "PDF_PARALLEL_MIN_PAGES", 1)
+        serial = analyze_pdf(pdf_path, workers=1)
+        parallel = analyze_pdf(pdf_path, workers=2)
+
+        assert parallel.pages_text == serial.pages_text
+        assert [p.encoding for p in parallel.pages] == [p.encoding for p in serial.pages]
+        assert [len(p.images) for p in parallel.pages] == [len(p.images) for p in serial.pages]
+
+    def test_repeated_image_shared_across_shards(self, pdf_path, monkeypatch):
+        monkeypatch.setattr(pdf_analyzer, "PDF_PARALLEL_MIN_PAGES", 1)
+        analysis = analyze_pdf(pdf_path, workers=3)
+        logo_first = min(analysis.pages[0].images, key=lambda img: img.width)
+
+        assert logo_first.image_bytes is analysis.pages[1].images[0].image_bytes
+
+    def test_shards_return_inventory_without_bytes(self, pdf_path):
+        pages = pdf_analyzer._analyze_page_range(pdf_path, 0, 3, True, image_bytes=False)
+
+        assert [len(p.images) for p in pages] == [2, 1, 1]
+        assert all(image.image_bytes is None for page in pages for image in page.images)
+
+    def test_parallel_image_bytes_match_serial(self, pdf_path, monkeypatch):
+        monkeypatch.setattr(pdf_analyzer, "PDF_PARALLEL_MIN_PAGES", 1)
+        serial = analyze_pdf(pdf_path, workers=1)
+        parallel = analyze_pdf(pdf_path, workers=3)
+
+        def inventory(analysis):
+            return [[(img.xref, img.image_bytes, img.ext) for img in page.images] for page in analysis.pages]
+
+        assert inventory(parallel) == inventory(serial)
+
+    def test_pool_starts_inside_daemonic_worker(self, pdf_path):
+        billiard = pytest.importorskip("billiard")
+        queue = billiard.Queue()
+        worker = billiard.Process(target=_analyze_in_daemon, args=(pdf_path, queue), daemon=True)
+        worker.start()
+        result = queue.get(timeout=60)
+        worker.join()
+
+        serial = analyze_pdf(pdf_path, workers=1)
+        assert result == [(page.text, [image.image_bytes for image in page.images]) for page in serial.pages]
+
+    def test_small_document_stays_serial(self, pdf_path, monkeypatch):
+        def no_pool(*args):
+            raise AssertionError("pool should not start")
+
+        monkeypatch.setattr(pdf_analyzer, "_analyze_parallel", no_pool)
+        assert analyze_pdf(pdf_path, workers=4).page_count == 3
+
+    def test_pool_failure_falls_back_to_serial(self, pdf_path, monkeypatch):
+        def broken_pool(*args):
+            raise AssertionError("daemonic processes are not allowed to have children")
+
+        monkeypatch.setattr(pdf_analyzer, "PDF_PARALLEL_MIN_PAGES", 1)
+        monkeypatch.setattr(pdf_analyzer, "_analyze_parallel", broken_pool)
+        assert analyze_pdf(pdf_path, workers=4).page_count == 3
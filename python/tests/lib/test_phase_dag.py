@@ -0,0 +1,82 @@
+"""Tests for lib/phase_dag.py - Asyncio phase DAG scheduler."""
+
+import threading
+import time
+
+import pytest
+
+from lib.phase_dag import PhaseDAG
+
+
+class TestRegistration:
+    """Test graph construction."""
+
+    def test_unknown_dependency_rejected(self):
+        dag = PhaseDAG()
+        with pytest.raises(ValueError):
+            dag.add("match", lambda x: x, deps=["hierarchy"])
+
+    def test_duplicate_phase_rejected(self):
+        dag = PhaseDAG().add("extract", lambda: 1)
+        with pytest.raises(ValueError):
+            dag.add("extract", lambda: 2)
+
+
+class TestRun:
+    """Test scheduling and result passing."""
+
+    def test_results_passed_in_dependency_order(self):
+        dag = PhaseDAG()
+        dag.add("a", lambda: 2)
+        dag.add("b", lambda: 3)
+        dag.add("c", lambda b, a: b - a, deps=["b", "a"])
+
+        results = dag.run_sync()
+
+        assert results == {"a": 2, "b": 3, "c": 1}
+
+    def test_independent_branches_overlap(self):
+        both_running = threading.Barrier(2, timeout=5)
+
+        def branch():
+            both_running.wait()  # Deadlocks (and times out) if run serially
+            return True
+
+        dag = PhaseDAG()
+        dag.add("root", lambda: None)
+        dag.add("text", lambda _: branch(), deps=["root"])
+        dag.add("images", lambda _: branch(), deps=["root"])
+        dag.add("join", lambda t, i: t and i, deps=["text", "images"])
+
+        assert dag.run_sync()["join"] is True
+
+    def test_wall_clock_tracks_longest_branch(self):
+        dag = PhaseDAG()
+        dag.add("slow", lambda: time.sleep(0.2))
+        dag.add("fast", lambda: time.sleep(0.1))
+        dag.add("join", lambda *_: None, deps=["slow", "fast"])
+
+        start = time.time()
+        dag.run_sync()
+
+        assert time.time() - start < 0.29
+        assert {t.name for t in dag.timings} == {"slow", "fast", "join"}
+
+    def test_failure_skips_downstream_and_reraises(self):
+        ran = []
+
+        def fail():
+            raise RuntimeError("vision API down")
+
+        dag = PhaseDAG()
+        dag.add("images", fail)
+        dag.add("match", lambda _: ran.append("match"), deps=["images"])
+
+        with pytest.raises(RuntimeError, match="vision API down"):
+            dag.run_sync()
+        assert ran == []
+
+    async def test_run_sync_inside_event_loop(self):
+        dag = PhaseDAG().add("a", lambda: "ok")
+
+        assert dag.run_sync() == {"a": "ok"}
@@ -0,0 +1,134 @@
+"""Tests for lib/provider_clients.py - Shared provider HTTP pools."""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from lib import provider_clients
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    """Start every test with an empty registry."""
+    provider_clients._sync_clients.clear()
+    provider_clients._async_clients.clear()
+    provider_clients._chat_models.clear()
+    yield
+    provider_clients.close_all()
+    provider_clients._async_clients.clear()
+
+
+class TestOrigin:
+    """Test how URLs map to pools."""
+
+    def test_path_and_query_ignored(self):
+        assert provider_clients.origin("https://api.groq.com/openai/v1/chat/completions?x=1") == "https://api.groq.com"
+
+    def test_port_kept(self):
+        assert provider_clients.origin("http://localhost:8080/v1") == "http://localhost:8080"
+
+    def test_relative_url_rejected(self):
+        with pytest.raises(ValueError):
+            provider_clients.origin("/v1/chat/completions")
+
+
+class TestGetClient:
+    """Test sync pool reuse."""
+
+    def test_same_origin_reuses_client(self):
+        first = provider_clients.get_client("https://api.deepinfra.com/v1/openai/chat/completions")
+        second = provider_clients.get_client("https://api.deepinfra.com/v1/inference/flux")
+
+        assert first is second
+
+    def test_different_origin_gets_own_client(self):
+        first = provider_clients.get_client("https://api.groq.com/openai/v1")
+        second = provider_clients.get_client("https://api.cerebras.ai/v1")
+
+        assert first is not second
+
+    def test_post_goes_through_pooled_client(self):
+        seen = []
+        transport = httpx.MockTransport(lambda request: seen.append(str(request.url)) or httpx.Response(200, json={"ok": True}))
+        provider_clients._sync_clients["https://api.groq.com"] = httpx.Client(transport=transport)
+
+        response = provider_clients.post("https://api.groq.com/openai/v1/chat/completions", json={})
+
+        assert response.json() == {"ok": True}
+        assert seen == ["https://api.groq.com/openai/v1/chat/completions"]
+
+    def test_http2_only_when_h2_installed(self, monkeypatch):
+        monkeypatch.setattr(provider_clients, "HTTP2_AVAILABLE", False)
+
+        assert provider_clients._client_config()["http2"] is False
+
+
+class TestGetAsyncClient:
+    """Test per-loop async pools."""
+
+    async def test_same_loop_reuses_client(self):
+        first = provider_clients.get_async_client("https://api.deepinfra.com/a")
+        second = provider_clients.get_async_client("https://api.deepinfra.com/b")
+
+        assert first is second
+
+    def test_each_loop_gets_own_client(self):
+        async def grab():
+            return provider_clients.get_async_client("https://api.deepinfra.com")
+
+        first = asyncio.run(grab())
+        second = asyncio.run(grab())
+
+        assert first is not second
+
+
+class TestRun:
+    """Test asyncio.run() with client cleanup."""
+
+    def test_loop_clients_closed(self):
+        async def grab():
+            return provider_clients.get_async_client("https://api.deepinfra.com")
+
+        client = provider_clients.run(grab())
+
+        assert client.is_closed
+        assert len(provider_clients._async_clients) == 0
+
+    def test_clients_closed_when_coroutine_raises(self):
+        clients = []
+
+        async def fail():
+            clients.append(provider_clients.get_async_client("https://api.deepinfra.com"))
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            provider_clients.run(fail())
+
+        assert clients[0].is_closed
+
+
+class TestGetChatModel:
+    """Test cached ChatOpenAI construction."""
+
+    def test_same_settings_reuse_model(self):
+        with patch("langchain_openai.ChatOpenAI", side_effect=lambda **k: MagicMock()) as factory:
+            first = provider_clients.get_chat_model(model="llama-3.1-8b-instant", base_url="https://api.groq.com/openai/v1", temperature=0)
+            second = provider_clients.get_chat_model(temperature=0, base_url="https://api.groq.com/openai/v1", model="llama-3.1-8b-instant")
+
+        assert first is second
+        assert factory.call_count == 1
+
+    def test_different_settings_get_own_model(self):
+        with patch("langchain_openai.ChatOpenAI", side_effect=lambda **k: MagicMock()):
+            first = provider_clients.get_chat_model(model="llama-3.1-8b-instant", temperature=0)
+            second = provider_clients.get_chat_model(model="llama-3.1-8b-instant", temperature=0.3)
+
+        assert first is not second
+
+    def test_model_uses_shared_pool_for_base_url(self):
+        with patch("langchain_openai.ChatOpenAI", return_value=MagicMock()) as factory:
+            provider_clients.get_chat_model(model="m", base_url="https://api.groq.com/openai/v1")
+
+        assert factory.call_args.kwargs["http_client"] is provider_clients.get_client("https://api.groq.com")
@@ -0,0 +1,90 @@
+"""Tests for lib/question_batching.py - Multi-block question request packing."""
+
+from lib.question_batching import (
+    missing_bloom_levels,
+    pack_question_batches,
+    salvage_batched_entries,
+    split_batched_questions,
+)
+
+
+class TestPackQuestionBatches:
+    """Test how blocks are grouped into requests."""
+
+    def test_small_blocks_share_requests(self):
+        batches = pack_question_batches([500] * 10, small_block_chars=2500, max_chars=12000, max_blocks=5)
+
+        assert batches == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]
+
+    def test_large_blocks_keep_their_own_call(self):
+        batches = pack_question_batches([400, 6000, 400, 400], small_block_chars=2500, max_chars=12000, max_blocks=5)
+
+        assert [1] in batches
+        assert sorted(i for batch in batches for i in batch) == [0, 1, 2, 3]
+        assert [0, 2, 3] in batches
+
+    def test_content_budget_splits_batches(self):
+        batches = pack_question_batches([2000] * 4, small_block_chars=2500, max_chars=5000, max_blocks=5)
+
+        assert batches == [[0, 1], [2, 3]]
+
+    def test_batching_disabled_by_block_cap(self):
+        assert pack_question_batches([100, 100], max_blocks=1) == [[0], [1]]
+
+    def test_empty(self):
+        assert pack_question_batches([]) == []
+
+
+class TestSplitBatchedQuestions:
+    """Test mapping a batched response back to blocks."""
+
+    def test_numbered_entries(self):
+        data = {"blocks": [
+            {"block": 2, "questions": [{"text": "b"}]},
+            {"block": 1, "questions": [{"text": "a"}]},
+        ]}
+
+        assert split_batched_questions(data, 2) == {0: [{"text": "a"}], 1: [{"text": "b"}]}
+
+    def test_missing_block_left_out(self):
+        data = {"blocks": [{"block": 1, "questions": [{"text": "a"}]}]}
+
+        assert split_batched_questions(data, 3) == {0: [{"text": "a"}]}
+
+    def test_out_of_range_and_malformed_entries_ignored(self):
+        data = {"blocks": [
+            {"block": 9, "questions": [{"text": "x"}]},
+            {"block": 1, "questions": "not a list"},
+            "garbage",
+            {"block": "2", "questions": [{"text": "b"}, "bad"]},
+        ]}
+
+        assert split_batched_questions(data, 2) == {1: [{"text": "b"}]}
+
+    def test_unnumbered_entries_matched_by_position(self):
+        data = {"blocks": [{"questions": [{"text": "a"}]}, {"questions": [{"text": "b"}]}]}
+
+        assert split_batched_questions(data, 2) == {0: [{"text": "a"}], 1: [{"text": "b"}]}
+
+    def test_not_a_batch_response(self):
+        assert split_batched_questions({"questions": []}, 2) == {}
+
+    def test_salvaged_entry_keeps_valid_questions(self):
+        raw = '{"block": 2, "questions": [{"text": "ok"}, {"text": "bad", "bloom_level": }]}'
+
+        assert salvage_batched_entries([raw]) == [{"block": 2, "questions": [{"text": "ok"}]}]
+
+
+class TestMissingBloomLevels:
+    """Test the per-level quota check."""
+
+    def test_complete_block(self):
+        levels = ["remember", "understand", "apply", "analyze", "evaluate", "create"] * 2
+
+        assert missing_bloom_levels(levels) == {}
+
+    def test_reports_only_gaps(self):
+        levels = ["remember", "remember", "remember", "understand", "apply", "apply",
+                  "analyze", "analyze", "evaluate", "evaluate"]
+
+        assert missing_bloom_levels(levels) == {"understand": 1, "create": 2}
@@ -0,0 +1,157 @@
+"""Tests for lib/r2_storage.py - Shared R2 client and transfers."""
+
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.stub import Stubber
+
+from lib import r2_storage
+
+
+@pytest.fixture
+def configured(monkeypatch):
+    """Fake R2 settings and a fresh client."""
+    monkeypatch.setattr(r2_storage, "R2_ENDPOINT", "https://account.r2.cloudflarestorage.com")
+    monkeypatch.setattr(r2_storage, "R2_ACCESS_KEY_ID", "key")
+    monkeypatch.setattr(r2_storage, "R2_SECRET_ACCESS_KEY", "secret")
+    monkeypatch.setattr(r2_storage, "R2_BUCKET", "bucket")
+    monkeypatch.setattr(r2_storage, "R2_PUBLIC_URL", "https://r2.test")
+    monkeypatch.setattr(r2_storage, "_client", None)
+    yield
+    r2_storage._client = None
+
+
+@pytest.fixture
+def fake_client(configured, monkeypatch):
+    client = MagicMock()
+    monkeypatch.setattr(r2_storage, "_client", client)
+    return client
+
+
+class TestGetClient:
+    """Test client caching and configuration."""
+
+    def test_unconfigured_returns_none(self, monkeypatch):
+        monkeypatch.setattr(r2_storage, "R2_BUCKET", None)
+        monkeypatch.setattr(r2_storage, "_client", None)
+
+        assert r2_storage.get_client() is None
+
+    def test_one_client_across_threads(self, configured):
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(r2_storage.get_client())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len({id(c) for c in clients}) == 1
+
+    def test_pool_and_retries_tuned(self, configured):
+        config = r2_storage.get_client().meta.config
+
+        assert config.max_pool_connections == r2_storage.POOL_SIZE
+        assert config.retries["mode"] == "standard"
+
+    def test_fork_reset_drops_client(self, configured):
+        r2_storage.get_client()
+        r2_storage._reset_after_fork()
+
+        assert r2_storage._client is None
+
+
+class TestPutObjects:
+    """Test concurrent batched puts."""
+
+    def test_returns_urls_for_successful_puts(self, fake_client):
+        def put_object(**kwargs):
+            if kwargs["Key"] == "bad.png":
+                raise RuntimeError("boom")
+
+        fake_client.put_object.side_effect = put_object
+        items = [("a.png", b"a", "image/png"), ("bad.png", b"b", "image/png"), ("c.jpeg", b"c", "image/jpeg")]
+
+        urls = r2_storage.put_objects(items, max_workers=3)
+
+        assert urls == {"a.png": "https://r2.test/a.png", "c.jpeg": "https://r2.test/c.jpeg"}
+        assert fake_client.put_object.call_count == 3
+
+    def test_content_type_passed(self, fake_client):
+        r2_storage.put_objects([("x.jpeg", b"x", "image/jpeg")])
+
+        fake_client.put_object.assert_called_once_with(
+            Bucket="bucket", Key="x.jpeg", Body=b"x", ContentType="image/jpeg"
+        )
+
+    def test_unconfigured_returns_public_urls_without_upload(self, monkeypatch):
+        monkeypatch.setattr(r2_storage, "R2_BUCKET", None)
+        monkeypatch.setattr(r2_storage, "_client", None)
+
+        assert r2_storage.put_objects([("k.png", b"x", "image/png")]) == {"k.png": r2_storage.public_url("k.png")}
+
+    def test_empty(self, fake_client):
+        assert r2_storage.put_objects([]) == {}
+
+
+class TestTransfers:
+    """Test multipart upload / ranged download wiring."""
+
+    def test_download_uses_transfer_config(self, fake_client, tmp_path):
+        path = tmp_path / "content" / "book.pdf"
+
+        assert r2_storage.download_file("uploads/u/book.pdf", str(path)) == str(path)
+
+        args, kwargs = fake_client.download_file.call_args
+        assert args == ("bucket", "uploads/u/book.pdf", str(path))
+        assert kwargs["Config"].multipart_threshold == r2_storage.R2_MULTIPART_THRESHOLD
+        assert kwargs["Config"].max_request_concurrency == r2_storage.R2_TRANSFER_CONCURRENCY
+        assert path.parent.is_dir()
+
+    def test_upload_file_sets_content_type(self, fake_client, tmp_path):
+        source = tmp_path / "book.pdf"
+        source.write_bytes(b"%PDF")
+
+        url = r2_storage.upload_file(str(source), "uploads/u/book.pdf", "application/pdf")
+
+        assert url == "https://r2.test/uploads/u/book.pdf"
+        assert fake_client.upload_file.call_args.kwargs["ExtraArgs"] == {"ContentType": "application/pdf"}
+
+    def test_unconfigured_download_raises(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(r2_storage, "R2_BUCKET", None)
+        monkeypatch.setattr(r2_storage, "_client", None)
+
+        with pytest.raises(RuntimeError):
+            r2_storage.download_file("k", str(tmp_path / "k"))
+
+
+class TestPresignAndDelete:
+    """Test API endpoint helpers against a stubbed client."""
+
+    def test_presign_get(self, configured):
+        url = r2_storage.presign_get("uploads/u/book.pdf", expires_in=3600)
+
+        assert "uploads/u/book.pdf" in url
+        assert "X-Amz-Expires=3600" in url
+
+    def test_delete_prefix_pages(self, configured):
+        client = r2_storage.get_client()
+        with Stubber(client) as stubber:
+            stubber.add_response(
+                "list_objects_v2",
+                {"Contents": [{"Key": "documents/d1/images/a.png"}], "IsTruncated": True, "NextContinuationToken": "t"},
+                {"Bucket": "bucket", "Prefix": "documents/d1/"},
+            )
+            stubber.add_response(
+                "delete_objects", {},
+                {"Bucket": "bucket", "Delete": {"Objects": [{"Key": "documents/d1/images/a.png"}], "Quiet": True}},
+            )
+            stubber.add_response(
+                "list_objects_v2",
+                {"Contents": [{"Key": "documents/d1/images/b.png"}, {"Key": "documents/d1/images/c.png"}], "IsTruncated": False},
+                {"Bucket": "bucket", "Prefix": "documents/d1/", "ContinuationToken": "t"},
+            )
+            stubber.add_response("delete_objects", {})
+
+            assert r2_storage.delete_prefix("documents/d1/") == 3
+            stubber.assert_no_pending_responses()
@@ -0,0 +1,63 @@
+"""Tests for lib/rank_fusion.py - Reciprocal Rank Fusion."""
+
+import pytest
+
+from lib.rank_fusion import reciprocal_rank_fusion
+
+
+class TestReciprocalRankFusion:
+    """Test RRF scoring, weights, and ordering."""
+
+    def test_single_leg_keeps_order(self):
+        fused = reciprocal_rank_fusion({"vector": [("a", 0.9), ("b", 0.8), ("c", 0.7)]})
+        assert [hit_id for hit_id, _ in fused] == ["a", "b", "c"]
+
+    def test_matches_cypher_formula(self):
+        # Previous Cypher: 1.0 / (60 + rank + 1) with 0-based rank, summed over legs
+        fused = dict(reciprocal_rank_fusion({
+            "vector": [("a", 0.9), ("b", 0.8)],
+            "keyword": [("b", 3.0)],
+        }))
+        assert fused["a"] == pytest.approx(1 / 61)
+        assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+
+    def test_raw_scores_ignored(self):
+        fused = reciprocal_rank_fusion({
+            "vector": [("a", 0.01)],
+            "keyword": [("b", 1000.0)],
+        })
+        assert fused[0][1] == pytest.approx(fused[1][1])
+
+    def test_weights(self):
+        fused = reciprocal_rank_fusion(
+            {"vector": [("a", 0.9)], "keyword": [("b", 5.0)]},
+            weights={"keyword": 2.0},
+        )
+        assert [hit_id for hit_id, _ in fused] == ["b", "a"]
+
+    def test_zero_weight_drops_leg(self):
+        fused = reciprocal_rank_fusion(
+            {"vector": [("a", 0.9)], "keyword": [("b", 5.0)]},
+            weights={"keyword": 0.0},
+        )
+        assert [hit_id for hit_id, _ in fused] == ["a"]
+
+    def test_custom_k(self):
+        fused = dict(reciprocal_rank_fusion({"vector": [("a", 0.9)]}, k=10))
+        assert fused["a"] == pytest.approx(1 / 11)
+
+    def test_duplicates_within_leg_keep_best_rank(self):
+        fused = dict(reciprocal_rank_fusion({"vector": [("a", 0.9), ("a", 0.9), ("b", 0.5)]}))
+        assert fused["a"] == pytest.approx(1 / 61)
+        assert fused["b"] == pytest.approx(1 / 62)
+
+    def test_ties_keep_first_seen_order(self):
+        fused = reciprocal_rank_fusion({"vector": [("a", 0.9)], "keyword": [("b", 5.0)]})
+        assert [hit_id for hit_id, _ in fused] == ["a", "b"]
+
+    def test_limit(self):
+        fused = reciprocal_rank_fusion({"vector": [("a", 0.9), ("b", 0.8), ("c", 0.7)]}, limit=2)
+        assert len(fused) == 2
+
+    def test_empty_legs(self):
+        assert reciprocal_rank_fusion({"vector": [], "keyword": []}) == []
@@ -0,0 +1,191 @@
+"""Tests for lib/rate_limiter.py - Adaptive shared rate limiter."""
+
+import threading
+import time
+
+import pytest
+
+from lib import rate_limiter
+from lib.optional_redis import OptionalRedis
+from lib.rate_limiter import RateLimiter, parse_retry_after
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RedisDown:
+    def __getattr__(self, name):
+        raise ConnectionError("redis unavailable")
+
+
+@pytest.fixture(params=["local", "redis"])
+def backend(request, monkeypatch):
+    """Run each test against in-process state and against Redis Lua scripts."""
+    monkeypatch.setattr(rate_limiter, "_scripts", {})
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_ENABLED", True)
+    if request.param == "local":
+        monkeypatch.setattr(rate_limiter, "_redis", OptionalRedis("Rate limiter", "local", client=RedisDown()))
+    else:
+        pytest.importorskip("lupa")  # fakeredis needs it for EVALSHA
+        import fakeredis
+        client = fakeredis.FakeRedis(decode_responses=True)
+        monkeypatch.setattr(rate_limiter, "_redis", OptionalRedis("Rate limiter", "local", client=client))
+    return request.param
+
+
+class TestParseRetryAfter:
+    """Test Retry-After header parsing."""
+
+    def test_delta_seconds(self):
+        assert parse_retry_after({"retry-after": "3"}) == 3.0
+
+    def test_http_date_in_past_is_zero(self):
+        assert parse_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+
+    def test_missing_or_garbage(self):
+        assert parse_retry_after({}) is None
+        assert parse_retry_after({"retry-after": "soon"}) is None
+
+
+class TestCall:
+    """Test slots, retries and AIMD feedback."""
+
+    def test_concurrency_never_exceeds_limit(self, backend):
+        limiter = RateLimiter(f"conc-{backend}", rpm=0, tpm=0, max_concurrency=3)
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def work():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return FakeResponse()
+
+        threads = [threading.Thread(target=lambda: limiter.call(work)) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert 1 <= peak[0] <= 3
+
+    def test_throttled_response_retried_after_retry_after(self, backend):
+        limiter = RateLimiter(f"retry-{backend}", rpm=0, tpm=0, max_concurrency=4)
+        responses = iter([FakeResponse(429, {"retry-after": "0.2"}), FakeResponse(200)])
+
+        start = time.time()
+        response = limiter.call(lambda: next(responses), max_retries=2)
+
+        assert response.status_code == 200
+        assert time.time() - start >= 0.2
+
+    def test_last_throttled_response_returned_when_retries_exhausted(self, backend):
+        limiter = RateLimiter(f"exhaust-{backend}", rpm=0, tpm=0, max_concurrency=4)
+        calls = []
+
+        def throttled():
+            calls.append(1)
+            return FakeResponse(429, {"retry-after": "0"})
+
+        assert limiter.call(throttled, max_retries=1).status_code == 429
+        assert len(calls) == 2
+
+    def test_sdk_exception_recorded_and_reraised(self, backend):
+        limiter = RateLimiter(f"exc-{backend}", rpm=0, tpm=0, max_concurrency=4)
+
+        class RateLimitError(Exception):
+            status_code = 429
+
+        def fail():
+            raise RateLimitError()
+
+        with pytest.raises(RateLimitError):
+            limiter.call(fail, max_retries=0)
+
+    def test_request_bucket_paces_calls(self, backend):
+        limiter = RateLimiter(f"rpm-{backend}", rpm=600, tpm=0, max_concurrency=10)  # 1 per 100 ms
+        if backend == "local":
+            limiter._local.req = 1  # Start with an empty-ish bucket
+        else:
+            rate_limiter._redis.client().hset(limiter._bucket_key, mapping={"req": 1, "tok": 0, "ts": time.time()})
+
+        start = time.time()
+        for _ in range(3):
+            limiter.call(lambda: FakeResponse())
+
+        assert time.time() - start >= 0.15
+
+
+class TestAIMD:
+    """Test the in-process AIMD state directly."""
+
+    def test_throttle_halves_once_per_second(self):
+        state = rate_limiter._LocalState(rpm=0, tpm=0, initial_limit=8)
+        now = 1000.0
+
+        state.release("a", now, 1.0, throttled=True, error=False, cooldown=0, min_limit=1, max_limit=16)
+        state.release("b", now + 0.1, 1.0, throttled=True, error=False, cooldown=0, min_limit=1, max_limit=16)
+
+        assert state.limit == 4
+
+    def test_success_grows_additively_up_to_max(self):
+        state = rate_limiter._LocalState(rpm=0, tpm=0, initial_limit=2)
+        for i in range(50):
+            state.release(str(i), 1000.0 + i, 1.0, throttled=False, error=False, cooldown=0, min_limit=1, max_limit=4)
+
+        assert state.limit == 4
+
+    def test_latency_spike_trims_limit(self):
+        state = rate_limiter._LocalState(rpm=0, tpm=0, initial_limit=10)
+        state.ewma = 1.0
+
+        state.release("a", 1000.0, 5.0, throttled=False, error=False, cooldown=0, min_limit=1, max_limit=16)
+
+        assert state.limit == pytest.approx(9.0)
+
+    def test_cooldown_blocks_acquire(self):
+        state = rate_limiter._LocalState(rpm=0, tpm=0, initial_limit=4)
+        state.release("a", 1000.0, 1.0, throttled=True, error=False, cooldown=2.0, min_limit=1, max_limit=4)
+
+        assert state.acquire(1001.0, "b", 0, 0, 0) == pytest.approx(1.0)
+        assert state.acquire(1002.5, "b", 0, 0, 0) == 0
+
+
+class TestRedisOutage:
+    """Test the local fallback when Redis is unreachable."""
+
+    def test_polls_skip_redis_after_first_error(self, monkeypatch):
+        attempts = []
+
+        class CountingDown:
+            def register_script(self, source):
+                attempts.append(source)
+                raise ConnectionError("redis unavailable")
+
+        monkeypatch.setattr(rate_limiter, "_scripts", {})
+        monkeypatch.setattr(rate_limiter, "RATE_LIMIT_ENABLED", True)
+        monkeypatch.setattr(rate_limiter, "_redis", OptionalRedis("Rate limiter", "local", client=CountingDown()))
+        limiter = RateLimiter("test", rpm=0, tpm=0, max_concurrency=1)
+
+        for _ in range(5):
+            limiter.release(limiter.acquire(), latency=0.1)
+
+        assert len(attempts) == 1
+
+    def test_local_lease_released_locally_after_recovery(self, monkeypatch):
+        monkeypatch.setattr(rate_limiter, "_scripts", {})
+        monkeypatch.setattr(rate_limiter, "RATE_LIMIT_ENABLED", True)
+        redis = OptionalRedis("Rate limiter", "local", client=RedisDown())
+        monkeypatch.setattr(rate_limiter, "_redis", redis)
+        limiter = RateLimiter("test", rpm=0, tpm=0, max_concurrency=1)
+
+        lease = limiter.acquire()
+        redis.reset()  # Redis is back before the call finishes
+        limiter.release(lease, latency=0.1)
+
+        assert limiter._local.leases == {}
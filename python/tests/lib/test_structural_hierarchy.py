@@ -0,0 +1,199 @@
+"""Tests for lib/structural_hierarchy.py - Outline / font-based hierarchy detection."""
+
+import fitz
+import pytest
+
+from lib import structural_hierarchy
+from lib.structural_hierarchy import (
+    Heading,
+    build_hierarchy,
+    detect_structural_hierarchy,
+    font_headings,
+    numbering_level,
+    outline_headings,
+)
+
+BODY = "Body text of this page explains the topic in ordinary sentences."
+
+
+def _chunk(text: str, page_start: int, page_end: int = None) -> dict:
+    return {"text": text, "page_start": page_start, "page_end": page_end or page_start}
+
+
+def _pdf(path, pages, toc=None) -> str:
+    """pages: list of [(text, fontsize, bold), ...] per page."""
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page(width=612, height=792)
+        y = 72
+        for text, size, bold in lines:
+            page.insert_text((72, y), text, fontsize=size, fontname="hebo" if bold else "helv")
+            y += size * 1.8
+        page.insert_text((72, 740), "Physics Textbook", fontsize=9)  # Running footer
+    if toc:
+        doc.set_toc(toc)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def _all_indices(hierarchy: dict) -> list:
+    return [i for ch in hierarchy["chapters"] for sec in ch["sections"] for i in sec["chunk_indices"]]
+
+
+@pytest.fixture
+def textbook_pages():
+    return [
+        [("Chapter 1 Motion", 20, True), (BODY, 10, False)],
+        [("1.1 Speed", 13, True), (BODY, 10, False)],
+        [("1.2 Velocity", 13, True), (BODY, 10, False)],
+        [("Chapter 2 Forces", 20, True), (BODY, 10, False)],
+        [("2.1 Newton's Laws", 13, True), (BODY, 10, False)],
+        [("2.2 Friction", 13, True), (BODY, 10, False)],
+    ]
+
+
+@pytest.fixture
+def textbook_chunks():
+    return [
+        _chunk("Chapter 1 Motion\n" + BODY, 1),
+        _chunk("1.1 Speed\n" + BODY, 2),
+        _chunk(BODY + "\n1.2 Velocity\n" + BODY, 2, 3),
+        _chunk("Chapter 2 Forces\n" + BODY, 4),
+        _chunk("2.1 Newton's Laws\n" + BODY, 5),
+        _chunk("2.2 Friction\n" + BODY, 6),
+    ]
+
+
+class TestNumberingLevel:
+    """Test heading numbering patterns."""
+
+    @pytest.mark.parametrize("title,level", [
+        ("Chapter 3 Motion", 1),
+        ("UNIT IV", 1),
+        ("1.2 Velocity", 2),
+        ("1.2.3 Average velocity", 3),
+        ("Introduction", None),
+        ("1.2kg of water", None),
+    ])
+    def test_levels(self, title, level):
+        assert numbering_level(title) == level
+
+
+class TestBuildHierarchy:
+    """Test mapping headings onto chunks."""
+
+    def test_every_chunk_once_and_contiguous(self, textbook_chunks):
+        headings = [
+            Heading(1, "Chapter 1 Motion", 1), Heading(2, "1.1 Speed", 2), Heading(2, "1.2 Velocity", 3),
+            Heading(1, "Chapter 2 Forces", 4), Heading(2, "2.1 Newton's Laws", 5), Heading(2, "2.2 Friction", 6),
+        ]
+
+        hierarchy = build_hierarchy(headings, textbook_chunks)
+
+        assert _all_indices(hierarchy) == list(range(len(textbook_chunks)))
+        assert [ch["title"] for ch in hierarchy["chapters"]] == ["Chapter 1 Motion", "Chapter 2 Forces"]
+        assert hierarchy["chapters"][0]["sections"][1] == {"title": "1.1 Speed", "chunk_indices": [1]}
+        assert hierarchy["coverage"] == 1.0
+
+    def test_heading_text_picks_chunk_within_page(self):
+        chunks = [_chunk(BODY, 1), _chunk(BODY, 2), _chunk("1.2 Velocity\n" + BODY, 2), _chunk(BODY, 3)]
+        headings = [Heading(1, "Chapter 1", 1), Heading(2, "1.2 Velocity", 2), Heading(1, "Chapter 2", 3)]
+
+        hierarchy = build_hierarchy(headings, chunks)
+
+        assert hierarchy["chapters"][0]["sections"][1]["chunk_indices"] == [2]
+
+    def test_front_matter_lowers_coverage(self):
+        chunks = [_chunk("Preface", 1), _chunk("A", 2), _chunk("B", 3), _chunk("C", 4)]
+        headings = [Heading(1, "Chapter 1", 2), Heading(1, "Chapter 2", 4)]
+
+        hierarchy = build_hierarchy(headings, chunks)
+
+        assert hierarchy["chapters"][0]["title"] == structural_hierarchy.FRONT_MATTER_TITLE
+        assert hierarchy["coverage"] == 0.75
+
+    def test_single_book_title_level_skipped(self):
+        chunks = [_chunk("A", 1), _chunk("B", 2), _chunk("C", 3)]
+        headings = [Heading(1, "Physics", 1), Heading(2, "Kinematics", 1), Heading(2, "Dynamics", 3)]
+
+        hierarchy = build_hierarchy(headings, chunks)
+
+        assert [ch["title"] for ch in hierarchy["chapters"]] == ["Kinematics", "Dynamics"]
+
+    def test_too_little_structure(self):
+        assert build_hierarchy([Heading(1, "Only", 1)], [_chunk("A", 1)]) is None
+        assert build_hierarchy([], [_chunk("A", 1)]) is None
+
+
+class TestHeadingSources:
+    """Test extracting headings from real PDFs."""
+
+    def test_outline(self, tmp_path, textbook_pages):
+        path = _pdf(tmp_path / "toc.pdf", textbook_pages, toc=[[1, "Motion", 1], [2, "Speed", 2], [1, "Forces", 4]])
+
+        with fitz.open(path) as doc:
+            headings = outline_headings(doc)
+
+        assert [(h.level, h.title, h.page) for h in headings] == [(1, "Motion", 1), (2, "Speed", 2), (1, "Forces", 4)]
+
+    def test_fonts_levels_and_running_footer(self, tmp_path, textbook_pages):
+        path = _pdf(tmp_path / "fonts.pdf", textbook_pages)
+
+        with fitz.open(path) as doc:
+            headings = font_headings(doc)
+
+        assert [(h.level, h.title) for h in headings] == [
+            (1, "Chapter 1 Motion"), (2, "1.1 Speed"), (2, "1.2 Velocity"),
+            (1, "Chapter 2 Forces"), (2, "2.1 Newton's Laws"), (2, "2.2 Friction"),
+        ]
+        assert all(h.numbered for h in headings)
+
+    def test_wrapped_chapter_title_merged(self, tmp_path):
+        pages = [[("Chapter 1", 20, True), ("Motion", 20, True), (BODY, 10, False)], [(BODY, 10, False)]]
+        path = _pdf(tmp_path / "wrapped.pdf", pages)
+
+        with fitz.open(path) as doc:
+            assert [h.title for h in font_headings(doc)] == ["Chapter 1 Motion"]
+
+
+class TestDetectStructuralHierarchy:
+    """Test source selection and confidence gating."""
+
+    def test_outline_preferred(self, tmp_path, textbook_pages, textbook_chunks):
+        toc = [[1, "Chapter 1 Motion", 1], [2, "1.1 Speed", 2], [1, "Chapter 2 Forces", 4], [2, "2.2 Friction", 6]]
+        path = _pdf(tmp_path / "toc.pdf", textbook_pages, toc=toc)
+
+        hierarchy = detect_structural_hierarchy(path, textbook_chunks)
+
+        assert hierarchy["source"] == "outline"
+        assert hierarchy["confidence"] == structural_hierarchy.OUTLINE_CONFIDENCE
+        assert _all_indices(hierarchy) == list(range(len(textbook_chunks)))
+
+    def test_numbered_fonts_without_outline(self, tmp_path, textbook_pages, textbook_chunks):
+        path = _pdf(tmp_path / "fonts.pdf", textbook_pages)
+
+        hierarchy = detect_structural_hierarchy(path, textbook_chunks)
+
+        assert hierarchy["source"] == "fonts"
+        assert hierarchy["confidence"] >= structural_hierarchy.STRUCTURAL_MIN_CONFIDENCE
+        assert len(hierarchy["chapters"]) == 2
+
+    def test_unstructured_pdf_defers_to_llm(self, tmp_path):
+        path = _pdf(tmp_path / "plain.pdf", [[(BODY, 10, False)]] * 3)
+
+        assert detect_structural_hierarchy(path, [_chunk(BODY, 1), _chunk(BODY, 2, 3)]) is None
+
+    def test_low_confidence_rejected(self, tmp_path, textbook_pages, textbook_chunks):
+        path = _pdf(tmp_path / "fonts.pdf", textbook_pages)
+
+        assert detect_structural_hierarchy(path, textbook_chunks, min_confidence=1.01) is None
+
+    def test_unreadable_file(self, tmp_path):
+        assert detect_structural_hierarchy(str(tmp_path / "missing.pdf"), [_chunk("A", 1)]) is None
+
+    def test_disabled(self, tmp_path, textbook_pages, textbook_chunks, monkeypatch):
+        monkeypatch.setattr(structural_hierarchy, "STRUCTURAL_HIERARCHY_ENABLED", False)
+        path = _pdf(tmp_path / "fonts.pdf", textbook_pages)
+
+        assert detect_structural_hierarchy(path, textbook_chunks) is None
@@ -0,0 +1,201 @@
+"""Tests for lib/vector_cache.py - Per-document in-process vector cache."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from lib import vector_cache
+from lib.optional_redis import OptionalRedis
+from lib.vector_cache import DocVectorCache, DocVectors
+
+
+class RedisDown:
+    def __getattr__(self, name):
+        raise ConnectionError("redis unavailable")
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    """Fresh breaker per test around a mock sync client."""
+    client = MagicMock()
+    monkeypatch.setattr(vector_cache, "_redis", OptionalRedis("Vector cache", "TTL", client=client))
+    return client
+
+
+def _records(vectors, chapters=None):
+    chapters = chapters or [None] * len(vectors)
+    return [
+        {
+            "block_id": f"doc::block::{i}",
+            "embedding": list(vec),
+            "chapter_title": chapters[i],
+            "section_title": None,
+            "content_type": "narrative",
+        }
+        for i, vec in enumerate(vectors)
+    ]
+
+
+class _AsyncRecords:
+    """Async-iterable stand-in for a neo4j AsyncResult."""
+
+    def __init__(self, records):
+        self._records = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._records)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class TestDocVectors:
+    """Test local scoring."""
+
+    def test_ranks_by_cosine(self):
+        entry = DocVectors.from_records(_records([[1, 0], [0, 1], [0.8, 0.6]]))
+        hits = entry.search([1, 0], top_k=2)
+
+        assert [block_id for block_id, _ in hits] == ["doc::block::0", "doc::block::2"]
+
+    def test_scores_use_normalized_cosine(self):
+        # Neo4j vector scores are (1 + cos) / 2: orthogonal -> 0.5, identical -> 1.0
+        entry = DocVectors.from_records(_records([[1, 0], [0, 1]]))
+        scores = dict(entry.search([1, 0], top_k=2))
+
+        assert scores["doc::block::0"] == pytest.approx(1.0)
+        assert scores["doc::block::1"] == pytest.approx(0.5)
+
+    def test_min_score_filters(self):
+        entry = DocVectors.from_records(_records([[1, 0], [0, 1]]))
+        hits = entry.search([1, 0], top_k=5, min_score=0.6)
+        assert [block_id for block_id, _ in hits] == ["doc::block::0"]
+
+    def test_chapter_filter(self):
+        entry = DocVectors.from_records(_records([[1, 0], [0.9, 0.1]], chapters=["Ch 1", "Ch 2"]))
+        hits = entry.search([1, 0], top_k=5, chapter="Ch 2")
+        assert [block_id for block_id, _ in hits] == ["doc::block::1"]
+
+    def test_dimension_mismatch_returns_empty(self):
+        entry = DocVectors.from_records(_records([[1, 0]]))
+        assert entry.search([1, 0, 0], top_k=5) == []
+
+    def test_no_embeddings_returns_none(self):
+        assert DocVectors.from_records([{"block_id": "b", "embedding": []}]) is None
+
+
+class TestDocVectorCache:
+    """Test LRU, memory budget, and invalidation."""
+
+    def _entry(self, version="0"):
+        return DocVectors.from_records(_records(np.eye(4).tolist()), version=version)
+
+    def test_get_after_put(self):
+        cache = DocVectorCache(max_bytes=10_000, ttl_seconds=60)
+        entry = self._entry()
+        cache.put("doc1", entry)
+        assert cache.get("doc1") is entry
+
+    def test_lru_eviction_over_budget(self):
+        entry_bytes = self._entry().nbytes
+        cache = DocVectorCache(max_bytes=entry_bytes * 2, ttl_seconds=60)
+
+        cache.put("doc1", self._entry())
+        cache.put("doc2", self._entry())
+        cache.get("doc1")  # doc2 is now least recently used
+        cache.put("doc3", self._entry())
+
+        assert cache.get("doc2") is None
+        assert cache.get("doc1") is not None
+        assert cache.info()["bytes"] <= entry_bytes * 2
+
+    def test_entry_larger_than_budget_not_cached(self):
+        cache = DocVectorCache(max_bytes=1, ttl_seconds=60)
+        cache.put("doc1", self._entry())
+        assert cache.get("doc1") is None
+
+    def test_stale_version_dropped(self):
+        cache = DocVectorCache(max_bytes=10_000, ttl_seconds=60)
+        cache.put("doc1", self._entry(version="v1"))
+
+        assert cache.get("doc1", version="v2") is None
+        assert cache.info()["documents"] == 0
+
+    def test_expired_entry_dropped(self):
+        cache = DocVectorCache(max_bytes=10_000, ttl_seconds=0)
+        entry = self._entry()
+        entry.loaded_at -= 1
+        cache.put("doc1", entry)
+        assert cache.get("doc1") is None
+
+
+class TestInvalidation:
+    """Test cross-process invalidation hooks."""
+
+    def test_invalidate_drops_local_and_bumps_version(self, redis_client):
+        vector_cache._cache.put("doc-x", DocVectors.from_records(_records([[1, 0]])))
+
+        vector_cache.invalidate_document("doc-x")
+
+        assert vector_cache._cache.get("doc-x") is None
+        key, token = redis_client.set.call_args.args
+        assert key == "vector_cache:version:doc-x"
+        assert token
+
+    def test_invalidate_never_raises(self, monkeypatch):
+        monkeypatch.setattr(vector_cache._redis, "_client", RedisDown())
+        vector_cache.invalidate_document("doc-y")
+
+    def test_get_doc_vectors_loads_once(self):
+        session = MagicMock()
+        session.run.return_value = _records([[1, 0], [0, 1]])
+
+        with patch.object(vector_cache, "_current_version", return_value="v1"):
+            first = vector_cache.get_doc_vectors(session, "doc-z")
+            second = vector_cache.get_doc_vectors(session, "doc-z")
+
+        assert first is second
+        assert session.run.call_count == 1
+        vector_cache._cache.invalidate("doc-z")
+
+    async def test_aget_doc_vectors_reads_version_without_sync_redis(self):
+        redis_client = MagicMock()
+        redis_client.get = AsyncMock(return_value="v2")
+        session = MagicMock()
+        session.run = AsyncMock(return_value=_AsyncRecords(_records([[1, 0]])))
+
+        with patch.object(vector_cache._redis, "aclient", return_value=redis_client), \
+                patch.object(vector_cache._redis, "client", side_effect=AssertionError("sync Redis on the event loop")):
+            entry = await vector_cache.aget_doc_vectors(session, "doc-a")
+
+        assert entry.version == "v2"
+        redis_client.get.assert_awaited_once_with("vector_cache:version:doc-a")
+        vector_cache._cache.invalidate("doc-a")
+
+    async def test_async_redis_down_falls_back_to_ttl(self):
+        redis_client = MagicMock()
+        redis_client.get = AsyncMock(side_effect=ConnectionError("down"))
+
+        vector_cache._redis._async_clients[asyncio.get_running_loop()] = redis_client
+
+        assert await vector_cache._acurrent_version("doc-b") is None
+        assert await vector_cache._acurrent_version("doc-b") is None
+
+        assert redis_client.get.await_count == 1
+
+    def test_redis_down_skipped_until_cooldown(self, redis_client):
+        redis_client.get.side_effect = ConnectionError("down")
+
+        assert vector_cache._current_version("doc-c") is None
+        assert vector_cache._current_version("doc-c") is None
+
+        assert redis_client.get.call_count == 1
+        vector_cache._redis.reset()
+        redis_client.get.side_effect = None
+        redis_client.get.return_value = "v3"
+        assert vector_cache._current_version("doc-c") == "v3"
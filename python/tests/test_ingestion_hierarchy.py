@@ -0,0 +1,90 @@
+"""
+Tests for hierarchy creation (Phase 3) in the ingestion pipelines.
+No LLM, Neo4j or Redis needed - extraction, embeddings and persistence are patched.
+
+Run with: pytest tests/test_ingestion_hierarchy.py -v
+"""
+
+import sys
+import os
+from unittest.mock import patch
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingestion_workflow
+from ingestion_workflow import ContentBlock, IngestionPipeline
+
+HIERARCHY = {
+    "chapters": [
+        {"title": "Chapter 1: Motion", "sections": [{"title": "1.1 Speed", "chunk_indices": [0, 1]}]},
+        {"title": "Chapter 2: Forces", "sections": [{"title": "2.1 Friction", "chunk_indices": [2]}]},
+    ]
+}
+
+
+def _blocks(count):
+    blocks = []
+    for i in range(count):
+        block = ContentBlock()
+        block.text_content = f"Block {i} text about physics"
+        block.page_number = block.page_start = block.page_end = i + 1
+        blocks.append(block)
+    return blocks
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr("lib.ingestion_checkpoint.INGEST_CHECKPOINT_ENABLED", False)
+    # Skip __init__ (it builds LLM clients and connects to Neo4j)
+    pipeline = IngestionPipeline.__new__(IngestionPipeline)
+    pipeline.neo4j_driver = None
+    monkeypatch.setattr(pipeline, "extract_document", lambda path: _blocks(3), raising=False)
+    monkeypatch.setattr(pipeline, "persist_to_neo4j", lambda *args: None, raising=False)
+    monkeypatch.setattr(ingestion_workflow, "embed_texts", lambda texts: [[0.0] for _ in texts])
+    return pipeline
+
+
+class TestIngestDocumentPhase3:
+    """The standard pipeline's hierarchy phase (Celery ingestion path)."""
+
+    def test_hierarchy_applied(self, pipeline, tmp_path):
+        path = tmp_path / "physics.md"
+        path.write_text("# Physics")
+
+        with patch.object(ingestion_workflow, "create_hierarchy_with_llm", return_value=HIERARCHY) as llm:
+            summary = pipeline.ingest_document(
+                str(path), "doc1", "u1", extract_images=False, create_hierarchy=True, generate_questions=False
+            )
+
+        llm.assert_called_once()
+        assert summary["chapters"] == 2
+        assert summary["sections"] == 2
+
+    def test_pdf_path_passed_to_structural_detection(self, pipeline, tmp_path):
+        path = tmp_path / "physics.pdf"
+        path.write_bytes(b"%PDF-1.4")
+
+        with patch("lib.structural_hierarchy.detect_structural_hierarchy", return_value=HIERARCHY) as detect, \
+                patch.object(ingestion_workflow, "create_hierarchy_with_llm") as llm:
+            summary = pipeline.ingest_document(
+                str(path), "doc1", "u1", extract_images=False, create_hierarchy=True, generate_questions=False
+            )
+
+        assert detect.call_args.args[0] == str(path)
+        llm.assert_not_called()
+        assert summary["chapters"] == 2
+
+    def test_disabled(self, pipeline, tmp_path):
+        path = tmp_path / "physics.md"
+        path.write_text("# Physics")
+
+        with patch.object(ingestion_workflow, "create_hierarchy_with_llm") as llm:
+            summary = pipeline.ingest_document(
+                str(path), "doc1", "u1", extract_images=False, create_hierarchy=False, generate_questions=False
+            )
+
+        llm.assert_not_called()
+        assert summary["chapters"] == 0
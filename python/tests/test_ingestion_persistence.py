@@ -0,0 +1,159 @@
+"""
+Tests for bulk Neo4j persistence in the ingestion pipeline.
+No Neo4j needed - transactions are recorded by a fake driver.
+
+Run with: pytest tests/test_ingestion_persistence.py -v
+"""
+
+import json
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingestion_workflow
+from ingestion_workflow import (
+    BloomLevel,
+    ContentBlock,
+    Difficulty,
+    IngestionPipeline,
+    Question,
+    QuestionType,
+)
+
+
+class FakeTx:
+    def __init__(self, log):
+        self.log = log
+
+    def run(self, query, **params):
+        self.log.append((query, params))
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn, *args):
+        statements = []
+        fn(FakeTx(statements), *args)
+        self.driver.transactions.append(statements)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.transactions = []
+
+    def session(self):
+        return FakeSession(self)
+
+
+def _pipeline():
+    # Skip __init__ (it builds LLM clients); persistence only needs the driver
+    pipeline = IngestionPipeline.__new__(IngestionPipeline)
+    pipeline.neo4j_driver = FakeDriver()
+    return pipeline
+
+
+def _block(text, chapter=None, section=None, questions=0):
+    block = ContentBlock()
+    block.text_content = text
+    block.combined_context = text
+    block.embeddings = [0.1, 0.2]
+    block.chapter_title = chapter
+    block.section_title = section
+    block.questions = [
+        Question(
+            text=f"Q{i}", bloom_level=BloomLevel.UNDERSTAND, difficulty=Difficulty.BASIC,
+            question_type=QuestionType.LONG_ANSWER, expected_time=60, key_points=["a"],
+        )
+        for i in range(questions)
+    ]
+    return block
+
+
+def _persist(pipeline, blocks):
+    doc_meta = {"user_id": "u1", "doc_id": "doc1", "title": "Physics", "source": "physics.pdf"}
+    with patch("lib.vector_cache.invalidate_document"):
+        pipeline.persist_to_neo4j("doc1", doc_meta, blocks)
+    return pipeline.neo4j_driver.transactions
+
+
+# ============================================================
+# Test: Row Building
+# ============================================================
+
+class TestRows:
+    """Write rows built before any round trip."""
+
+    def test_block_row_keeps_index_based_id(self):
+        row = _pipeline()._content_block_row("doc1", 3, _block("Ohm's law"))
+        assert row["block_id"] == "doc1::block::3"
+        assert row["props"]["chunk_index"] == 3
+        assert row["props"]["embedding"] == [0.1, 0.2]
+        assert "block_id" not in row["props"]
+
+    def test_question_set_row(self):
+        row = _pipeline()._question_set_row("doc1::block::0", _block("x", questions=2).questions, "doc1")
+        assert row["questionset_id"] == "doc1::block::0::qs"
+        assert row["props"]["total_count"] == 2
+        assert json.loads(row["props"]["questions"])[1]["question_id"] == "doc1::block::0::q::1"
+
+    def test_hierarchy_rows_group_blocks(self):
+        pipeline = _pipeline()
+        rows = [
+            pipeline._content_block_row("doc1", 0, _block("a", "Ch 1", "1.1")),
+            pipeline._content_block_row("doc1", 1, _block("b", "Ch 1", "1.2")),
+            pipeline._content_block_row("doc1", 2, _block("c")),
+        ]
+        chapters, sections = pipeline._hierarchy_rows(rows)
+
+        assert chapters == [{"title": "Ch 1", "block_ids": ["doc1::block::0", "doc1::block::1"]}]
+        assert [s["title"] for s in sections] == ["1.1", "1.2"]
+
+
+# ============================================================
+# Test: Bulk Persistence
+# ============================================================
+
+class TestPersistToNeo4j:
+    """Few batched UNWIND statements instead of one per block."""
+
+    def test_statement_count_independent_of_block_count(self):
+        blocks = [_block(f"text {i}", "Ch 1", "1.1", questions=2) for i in range(50)]
+        transactions = _persist(_pipeline(), blocks)
+
+        # document + blocks + question sets + hierarchy
+        assert len(transactions) == 4
+        block_rows = transactions[1][0][1]["rows"]
+        assert len(block_rows) == 50
+
+    def test_batches_by_configured_size(self, monkeypatch):
+        monkeypatch.setattr(ingestion_workflow, "NEO4J_WRITE_BATCH_SIZE", 20)
+        blocks = [_block(f"text {i}") for i in range(45)]
+        transactions = _persist(_pipeline(), blocks)
+
+        block_batches = [tx[0][1]["rows"] for tx in transactions if "SET cb += row.props" in tx[0][0]]
+        assert [len(rows) for rows in block_batches] == [20, 20, 5]
+
+    def test_empty_blocks_skipped_but_ids_stable(self):
+        transactions = _persist(_pipeline(), [_block("a"), _block("  "), _block("c")])
+        block_ids = [row["block_id"] for row in transactions[1][0][1]["rows"]]
+        assert block_ids == ["doc1::block::0", "doc1::block::2"]
+
+    def test_writes_are_idempotent_merges(self):
+        transactions = _persist(_pipeline(), [_block("a", "Ch 1", "1.1", questions=1)])
+        statements = [query for tx in transactions[1:] for query, _ in tx]
+
+        assert statements
+        for query in statements:
+            assert "CREATE" not in query
@@ -0,0 +1,305 @@
+"""
+Tests for hybrid retrieval: query building, leg fusion and context formatting.
+No Neo4j or OpenAI needed - legs run against a fake driver.
+
+Run with: pytest tests/test_retrieval.py -v
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import (
+    CANDIDATE_PROJECTION,
+    CANDIDATE_PROJECTION_WITH_EMBEDDING,
+    FETCH_CANDIDATES_QUERY,
+    KEYWORD_LEG_QUERY,
+    RETRIEVAL_EXACT_MAX_BLOCKS,
+    RETRIEVAL_MAX_FETCH_K,
+    SCOPE_SIZE_QUERY,
+    VECTOR_LEG_ANN_QUERY,
+    VECTOR_LEG_EXACT_QUERY,
+    _build_context_with_sources,
+    _build_retrieval_params,
+    _fetch_query,
+    _fuse,
+    _next_fetch_k,
+    _resolve_candidate_mode,
+    _run_retrieval,
+    retrieve_context,
+)
+import retrieval
+
+
+def _params(**overrides):
+    args = dict(
+        query_text="ohm's law", qvec=[0.1, 0.2], user_id="u1", doc_id=None,
+        chapter=None, section=None, content_type=None,
+        index_name="contentBlockEmbeddingIdx", k=5, min_vector_score=0.6,
+    )
+    args.update(overrides)
+    return args
+
+
+# ============================================================
+# Fake Neo4j driver (one canned result per query)
+# ============================================================
+
+class FakeRecord(dict):
+    def data(self):
+        return dict(self)
+
+
+class FakeResult(list):
+    def single(self):
+        return self[0] if self else None
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.driver.calls.append((query, params))
+        rows = self.driver.responses.get(query, [])
+        if isinstance(rows, Exception):
+            raise rows
+        return FakeResult(FakeRecord(row) for row in rows)
+
+
+class FakeDriver:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def session(self):
+        return FakeSession(self)
+
+
+def _fetched(element_id, block_id, text):
+    return {
+        "element_id": element_id,
+        "candidate": {"block_id": block_id, "combined_context": text},
+        "doc_id": "doc1",
+        "doc_title": "Physics",
+    }
+
+
+# ============================================================
+# Test: Lean Projection
+# ============================================================
+
+class TestCandidateProjection:
+    """Retrieval queries should not ship the whole ContentBlock node."""
+
+    def test_fetch_query_returns_lean_projection(self):
+        assert CANDIDATE_PROJECTION in FETCH_CANDIDATES_QUERY
+        assert CANDIDATE_PROJECTION_WITH_EMBEDDING not in FETCH_CANDIDATES_QUERY
+        assert "RETURN candidate," not in FETCH_CANDIDATES_QUERY
+
+    def test_include_embedding_swaps_projection(self):
+        assert CANDIDATE_PROJECTION_WITH_EMBEDDING in _fetch_query(include_embedding=True)
+        assert _fetch_query(include_embedding=False) == FETCH_CANDIDATES_QUERY
+
+
+# ============================================================
+# Test: Parameters
+# ============================================================
+
+class TestRetrievalParams:
+    """Shared leg parameters."""
+
+    def test_missing_filters_become_empty_strings(self):
+        params = _build_retrieval_params(**_params(user_id=None))
+        assert params["user_id"] == ""
+        assert params["chapter"] == ""
+
+    def test_leg_sizes(self):
+        params = _build_retrieval_params(**_params(chapter="Electricity"))
+        assert params["chapter"] == "Electricity"
+        assert params["leg_k"] == 15
+        assert params["fetch_k"] == 15
+
+
+# ============================================================
+# Test: Scoped Candidate Generation
+# ============================================================
+
+class TestScopedCandidates:
+    """Mode resolution and adaptive widening decisions."""
+
+    def test_auto_uses_exact_for_small_scope(self):
+        assert _resolve_candidate_mode("auto", 120) == "exact"
+
+    def test_auto_uses_adaptive_for_large_scope(self):
+        assert _resolve_candidate_mode("auto", RETRIEVAL_EXACT_MAX_BLOCKS + 1) == "adaptive"
+
+    def test_explicit_mode_kept(self):
+        assert _resolve_candidate_mode("global", 10) == "global"
+
+    def test_widen_when_global_hits_belong_to_others(self):
+        stats = {"in_scope": 1, "fetched": 24, "floor": 0.8}
+        assert _next_fetch_k(stats, 24, 8, 0.6) == 96
+
+    def test_widen_when_nothing_came_back(self):
+        assert _next_fetch_k(None, 24, 8, 0.6) == 96
+
+    def test_stop_when_enough_hits(self):
+        stats = {"in_scope": 8, "fetched": 24, "floor": 0.8}
+        assert _next_fetch_k(stats, 24, 8, 0.6) is None
+
+    def test_stop_when_floor_below_threshold(self):
+        stats = {"in_scope": 2, "fetched": 24, "floor": 0.55}
+        assert _next_fetch_k(stats, 24, 8, 0.6) is None
+
+    def test_stop_when_index_exhausted(self):
+        stats = {"in_scope": 2, "fetched": 10, "floor": 0.8}
+        assert _next_fetch_k(stats, 24, 8, 0.6) is None
+
+    def test_widening_is_capped(self):
+        stats = {"in_scope": 0, "fetched": 1536, "floor": 0.9}
+        assert _next_fetch_k(stats, 1536, 8, 0.6) == RETRIEVAL_MAX_FETCH_K
+        assert _next_fetch_k(stats, RETRIEVAL_MAX_FETCH_K, 8, 0.6) is None
+
+
+# ============================================================
+# Test: Leg Fusion
+# ============================================================
+
+class TestFusion:
+    """Python-side RRF over the vector and keyword legs."""
+
+    def test_block_in_both_legs_ranks_first(self):
+        legs = {
+            "vector": [{"block_id": "a", "element_id": "e-a", "score": 0.9},
+                       {"block_id": "b", "element_id": "e-b", "score": 0.8}],
+            "keyword": [{"block_id": "b", "element_id": "e-b", "score": 5.0}],
+        }
+        fused, element_ids = _fuse(legs, k=5, rrf_k=60, leg_weights=None)
+
+        assert [block_id for block_id, _ in fused] == ["b", "a"]
+        assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+        assert element_ids == {"a": "e-a", "b": "e-b"}
+
+    def test_leg_weights_applied(self):
+        legs = {
+            "vector": [{"block_id": "a", "element_id": "e-a", "score": 0.9}],
+            "keyword": [{"block_id": "b", "element_id": "e-b", "score": 5.0}],
+        }
+        fused, _ = _fuse(legs, k=5, rrf_k=60, leg_weights={"vector": 1.0, "keyword": 0.0})
+        assert [block_id for block_id, _ in fused] == ["a"]
+
+
+class TestRunRetrieval:
+    """End-to-end engine run against the fake driver."""
+
+    def test_exact_mode_fuses_and_fetches_in_order(self):
+        driver = FakeDriver({
+            VECTOR_LEG_EXACT_QUERY: [
+                {"block_id": "a", "element_id": "e-a", "score": 0.9},
+                {"block_id": "b", "element_id": "e-b", "score": 0.8},
+            ],
+            KEYWORD_LEG_QUERY: [{"block_id": "b", "element_id": "e-b", "score": 4.0}],
+            FETCH_CANDIDATES_QUERY: [_fetched("e-a", "a", "Alpha"), _fetched("e-b", "b", "Beta")],
+        })
+
+        items = _run_retrieval(driver, "exact", **_params())
+
+        assert [item["node"]["block_id"] for item in items] == ["b", "a"]
+        assert items[0]["doc_title"] == "Physics"
+        fetch_params = [p for q, p in driver.calls if q == FETCH_CANDIDATES_QUERY][0]
+        assert fetch_params["element_ids"] == ["e-b", "e-a"]
+
+    def test_keyword_failure_degrades_to_vector_only(self):
+        driver = FakeDriver({
+            VECTOR_LEG_EXACT_QUERY: [{"block_id": "a", "element_id": "e-a", "score": 0.9}],
+            KEYWORD_LEG_QUERY: RuntimeError("Lucene parse error"),
+            FETCH_CANDIDATES_QUERY: [_fetched("e-a", "a", "Alpha")],
+        })
+
+        items = _run_retrieval(driver, "exact", **_params())
+        assert [item["node"]["block_id"] for item in items] == ["a"]
+
+    def test_auto_resolves_via_scope_size(self):
+        driver = FakeDriver({
+            SCOPE_SIZE_QUERY: [{"scope_size": RETRIEVAL_EXACT_MAX_BLOCKS + 1}],
+            VECTOR_LEG_ANN_QUERY: [{"hits": [], "in_scope": 0, "fetched": 3, "floor": 0.7}],
+        })
+
+        assert _run_retrieval(driver, "auto", **_params()) == []
+        queries = [q for q, _ in driver.calls]
+        assert VECTOR_LEG_ANN_QUERY in queries
+        assert VECTOR_LEG_EXACT_QUERY not in queries
+
+
+class TestRetrieveContext:
+    """The plain-context entry point runs on the same engine."""
+
+    @pytest.fixture
+    def driver(self, monkeypatch):
+        driver = FakeDriver({
+            VECTOR_LEG_EXACT_QUERY: [
+                {"block_id": "a", "element_id": "e-a", "score": 0.9},
+                {"block_id": "b", "element_id": "e-b", "score": 0.8},
+            ],
+            KEYWORD_LEG_QUERY: [{"block_id": "b", "element_id": "e-b", "score": 4.0}],
+            FETCH_CANDIDATES_QUERY: [_fetched("e-a", "a", "Alpha"), _fetched("e-b", "b", "Beta")],
+        })
+        monkeypatch.setattr(retrieval, "get_neo4j_driver", lambda: driver)
+        monkeypatch.setattr(retrieval, "get_query_embedding", lambda *args, **kwargs: [0.1, 0.2])
+        return driver
+
+    def test_fused_order_with_scores(self, driver):
+        context = retrieve_context("ohm's law", user_id="u1", candidate_mode="exact", min_score=0.0)
+
+        assert context.index("Beta") < context.index("Alpha")
+        assert "[Doc:doc1 page:?] [RRF Score: 0.0325]" in context
+        assert KEYWORD_LEG_QUERY in [q for q, _ in driver.calls]
+
+    def test_min_score_filters_everything(self, driver):
+        assert retrieve_context("ohm's law", user_id="u1", candidate_mode="exact", min_score=0.05) == ""
+
+
+# ============================================================
+# Test: Context Building
+# ============================================================
+
+class TestBuildContext:
+    """Formatting of projected records into context + sources."""
+
+    def _item(self, block_id, **node):
+        node.setdefault("block_id", block_id)
+        return {"node": node, "score": 0.03, "doc_id": "doc1", "doc_title": "Physics"}
+
+    def test_null_projected_fields_use_defaults(self):
+        # Map projections return missing properties as null, not absent keys
+        items = [self._item("b1", combined_context="Current is the flow of charge.", content_type=None, page_start=3)]
+        context, sources = _build_context_with_sources(items, max_chars=1000)
+
+        assert "[Doc:doc1 page:3]" in context
+        assert sources[0]["content_type"] == "narrative"
+        assert "embedding" not in sources[0]
+
+    def test_falls_back_to_text_content(self):
+        items = [self._item("b1", combined_context=None, text_content="Fallback body text here.")]
+        context, _ = _build_context_with_sources(items, max_chars=1000)
+        assert "Fallback body text here." in context
+
+    def test_duplicate_blocks_skipped(self):
+        items = [self._item("b1", combined_context="Same"), self._item("b1", combined_context="Same")]
+        _, sources = _build_context_with_sources(items, max_chars=1000)
+        assert len(sources) == 1
+
+    def test_embedding_passed_through_when_projected(self):
+        items = [self._item("b1", combined_context="Text", embedding=[0.5, 0.5])]
+        _, sources = _build_context_with_sources(items, max_chars=1000)
+        assert sources[0]["embedding"] == [0.5, 0.5]